@@ -22,7 +22,6 @@ import os
 import gzip
 import sys
 import click
-import re
 import subprocess
 
 
@@ -44,7 +43,14 @@ import subprocess
     show_default=True,
     help="output directory, database files will be downloaded to <out_dir>/<db_release>/<db>",
 )
-def main(make_file, database, output_directory):
+@click.option(
+    "-r",
+    "--mirror_directory",
+    default="/usr/local/ref/mirror",
+    show_default=True,
+    help="mirror directory, release files are kept in <mirror_dir>/refseq_<db> between updates",
+)
+def main(make_file, database, output_directory, mirror_directory):
     """
     generate_download_refseq_db_pipeline -d viral
 
@@ -84,11 +90,10 @@ def main(make_file, database, output_directory):
     print("\t{0:<20} :   {1:<10}".format("make_file", make_file))
     print("\t{0:<20} :   {1:<10}".format("database", database))
     print("\t{0:<20} :   {1:<10}".format("output_directory", output_directory))
+    print("\t{0:<20} :   {1:<10}".format("mirror_directory", mirror_directory))
     print("\n")
-    print(
-        "Please invoked pipeline with not more than 8 jobs running concurrently due to NCBI restrictions"
-    )
-    print("i.e. make -f download_refseq.mk -j 8 -k")
+    print("Downloads are limited to 8 concurrent connections by the mirror due to NCBI restrictions")
+    print("i.e. make -f download_refseq.mk")
 
     release_number = subprocess.run(
         ["curl", f"https://ftp.ncbi.nlm.nih.gov/refseq/release/RELEASE_NUMBER"],
@@ -98,52 +103,37 @@ def main(make_file, database, output_directory):
     output_dir = f"{output_directory}/{release_number}/{database}"
     print(f"\nDatabase will be downloaded to {output_dir}")
     output_dir = f"{output_directory}/{release_number}/{database}"
+    database_mirror_dir = f"{mirror_directory}/refseq_{database}"
+    print(f"Files will be mirrored in {database_mirror_dir}")
 
     try:
         os.makedirs(output_dir, exist_ok=True)
     except OSError as error:
         print(f"Directory {output_dir} cannot be created")
 
-    # get listing of files to download
-    print("Getting directory listings")
-    out = subprocess.run(
-        ["curl", f"https://ftp.ncbi.nlm.nih.gov/refseq/release/{database}/"],
-        text=True,
-        capture_output=True,
-    )
-
-    files = []
-    for line in out.stdout.splitlines():
-        m = re.search(">(.+genomic.fna.gz)<", line)
-        if m != None:
-            files.append(m.group(1))
-
-    print(f"Downloading {len(files)} files.")
-
     # generate make file
     print("Generating pipeline")
     pg = PipelineGenerator(make_file)
 
-    concat_file_list = ""
-    concat_file_OK_list = ""
-
-    # download each file
-    for file_name in files:
-        err = f"{output_dir}/{file_name}.err"
-        tgt = f"{output_dir}/{file_name}.OK"
-        dep = ""
-        cmd = f"wget -c https://ftp.ncbi.nlm.nih.gov/refseq/release/{database}/{file_name} -P {output_dir} 2> {err}"
-        concat_file_list += f" {output_dir}/{file_name}"
-        concat_file_OK_list += f" {output_dir}/{file_name}.OK"
-        pg.add(tgt, dep, cmd)
+    # mirror the release directory, only new or changed files are downloaded and
+    # the files of the release are published as a dated snapshot at <mirror>/current
+    # files are verified against the md5 checksums of the release catalogue
+    checksum_file = f"https://ftp.ncbi.nlm.nih.gov/refseq/release/release-catalog/release{release_number}.files.installed"
+    mirror_db = "/usr/local/cavspipes-1.2.1/mirror_db.py"
+    log = f"{output_dir}/mirror.log"
+    err = f"{output_dir}/mirror.err"
+    tgt = f"{output_dir}/mirror.OK"
+    dep = ""
+    cmd = f'{mirror_db} sync -u https://ftp.ncbi.nlm.nih.gov/refseq/release/{database}/ -p "genomic\\.fna\\.gz$$" -c {checksum_file} -d {database_mirror_dir} -l {release_number} -j 8 > {log} 2> {err}'
+    pg.add(tgt, dep, cmd)
 
-    # combine into one file
+    # combine into one file, concatenated gzip members form a valid gzip file so no recompression is needed
     output_file = f"{output_dir}/refseq.{release_number}.{database}.fasta.gz"
     err = f"{output_file}.err"
     tgt = f"{output_file}.OK"
-    dep = concat_file_OK_list
+    dep = f"{output_dir}/mirror.OK"
     # using wild card for FASTA files here because the list can be too long resulting in a failure
-    cmd = f"cd {output_dir}; gunzip -c *.fna.gz | gzip > {output_file} 2> {err}"
+    cmd = f"cd {database_mirror_dir}/current; cat *.fna.gz > {output_file} 2> {err}"
     pg.add(tgt, dep, cmd)
 
     # get headers
@@ -155,8 +145,8 @@ def main(make_file, database, output_directory):
     cmd = f'gunzip -c {input_file} | grep -P "^>" > {output_file} 2> {err}'
     pg.add(tgt, dep, cmd)
 
-    # clean files
-    cmd = f"rm {output_dir}/*.fna.gz  {output_dir}/*.OK {output_dir}/*.err"
+    # clean files, the mirrored files are kept for the next incremental update
+    cmd = f"rm {output_dir}/*.OK {output_dir}/*.err"
     pg.add_clean(cmd)
 
     # write make file
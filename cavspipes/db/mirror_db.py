@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2025 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import re
+import json
+import time
+import click
+import shutil
+import hashlib
+import urllib.request
+import urllib.error
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+
+
+@click.group()
+def main():
+    """
+    Incremental mirror of a remote database release directory with verified, dated snapshots.
+
+    The mirror keeps a manifest of the name, size, remote signature and md5 of every file.  A sync
+    diffs the remote listing against the manifest and downloads only new or changed files, verified
+    against the remote checksum file, into a pool.  The files are then hard linked
+    into a dated snapshot directory, and the current link is switched to it atomically so that readers
+    never see a partially updated release.
+
+    \b
+    <mirror_dir>/manifest.json
+    <mirror_dir>/pool/<files>
+    <mirror_dir>/snapshots/<yyyymmdd>/<files>, MANIFEST.tsv, SNAPSHOT
+    <mirror_dir>/current -> snapshots/<yyyymmdd>
+
+    e.g. mirror_db.py sync -u https://ftp.ncbi.nlm.nih.gov/refseq/release/viral/ -p "genomic\\.fna\\.gz$" -c https://ftp.ncbi.nlm.nih.gov/refseq/release/release-catalog/release230.files.installed -d /usr/local/ref/mirror/refseq_viral
+         mirror_db.py status -d /usr/local/ref/mirror/refseq_viral
+    """
+    pass
+
+
+@main.command("sync")
+@click.option("-u", "--url", required=True, help="remote directory URL")
+@click.option("-p", "--pattern", default=".", show_default=True, help="regular expression selecting files in the listing")
+@click.option("-d", "--mirror_dir", required=True, help="local mirror directory")
+@click.option("-c", "--checksum_file", required=True, help="md5sum style or metalink checksum file, a local file, a name in the remote directory or a URL")
+@click.option("-l", "--label", default="", help="release label recorded in the snapshot, e.g. the release number")
+@click.option("-j", "--jobs", default=8, show_default=True, help="concurrent downloads, NCBI allows up to 8")
+@click.option("-x", "--retries", default=3, show_default=True, help="download attempts per file")
+@click.option("-k", "--keep", default=3, show_default=True, help="number of snapshots kept")
+def sync(url, pattern, mirror_dir, checksum_file, label, jobs, retries, keep):
+    """
+    Brings the mirror up to date with the remote directory and publishes a snapshot.
+    """
+    url = url if url.endswith("/") else f"{url}/"
+    print("\t{0:<20} :   {1:<10}".format("url", url))
+    print("\t{0:<20} :   {1:<10}".format("pattern", pattern))
+    print("\t{0:<20} :   {1:<10}".format("mirror dir", mirror_dir))
+    print("\t{0:<20} :   {1:<10}".format("checksum file", checksum_file))
+    print("\t{0:<20} :   {1:<10}".format("label", label))
+    print("\t{0:<20} :   {1:<10}".format("jobs", jobs))
+
+    mirror = Mirror(mirror_dir)
+    remote = list_remote(url, pattern, jobs)
+    if len(remote) == 0:
+        print(f"no files matching {pattern} in {url}")
+        exit(1)
+    if "://" in checksum_file:
+        checksum_url = checksum_file
+    elif os.path.isfile(checksum_file):
+        checksum_url = f"file://{os.path.abspath(checksum_file)}"
+    else:
+        checksum_url = f"{url}{checksum_file}"
+    checksums = read_remote_checksums(checksum_url)
+
+    changed = [name for name in sorted(remote) if mirror.is_changed(name, remote[name], checksums.get(name))]
+    removed = [name for name in mirror.files if name not in remote]
+    print(f"{len(remote)} remote files, {len(changed)} new or changed, {len(removed)} removed")
+
+    # every fetched file is verified, a file without a checksum is not fetched
+    failed = [name for name in changed if name not in checksums]
+    for name in failed:
+        print(f"failed {name}: no checksum in {checksum_file}")
+    changed = [name for name in changed if name in checksums]
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            name: executor.submit(mirror.fetch, url, name, remote[name], checksums.get(name), retries) for name in changed
+        }
+        for name, future in futures.items():
+            error = future.result()
+            if error is None:
+                print(f"fetched {name}")
+            else:
+                print(f"failed {name}: {error}")
+                failed.append(name)
+
+    for name in removed:
+        mirror.remove(name)
+    mirror.write()
+
+    if len(failed) > 0:
+        print(f"{len(failed)} files failed, snapshot not published")
+        exit(1)
+
+    if len(changed) == 0 and len(removed) == 0 and mirror.current() is not None:
+        print(f"mirror unchanged, current snapshot is {mirror.current()}")
+        return
+
+    snapshot = mirror.publish(url, label)
+    print(f"published snapshot {snapshot}")
+    mirror.prune(keep)
+
+
+@main.command("status")
+@click.option("-d", "--mirror_dir", required=True, help="local mirror directory")
+def status(mirror_dir):
+    """
+    Reports the snapshots of a mirror.
+    """
+    mirror = Mirror(mirror_dir)
+    current = mirror.current()
+    for snapshot in mirror.snapshots():
+        info = read_snapshot_info(f"{mirror.snapshot_dir}/{snapshot}")
+        marker = "*" if snapshot == current else " "
+        print(f"{marker} {snapshot}\t{info.get('label', '')}\t{info.get('files', '')} files\t{info.get('url', '')}")
+
+
+@main.command("verify")
+@click.option("-d", "--mirror_dir", required=True, help="local mirror directory")
+def verify(mirror_dir):
+    """
+    Rehashes the files of the current snapshot against its manifest.
+    """
+    mirror = Mirror(mirror_dir)
+    current = mirror.current()
+    if current is None:
+        print("no snapshot published")
+        exit(1)
+    bad = 0
+    with open(f"{mirror.snapshot_dir}/{current}/MANIFEST.tsv", "r") as file:
+        for line in file:
+            if line.startswith("#"):
+                continue
+            name, size, md5 = line.rstrip("\n").split("\t")
+            if md5_file(f"{mirror.snapshot_dir}/{current}/{name}") != md5:
+                print(f"{name} does not match its checksum")
+                bad += 1
+    print(f"{current}: {bad} files failed verification")
+    exit(1 if bad > 0 else 0)
+
+
+class Mirror(object):
+    def __init__(self, mirror_dir):
+        self.mirror_dir = os.path.abspath(mirror_dir)
+        self.pool_dir = f"{self.mirror_dir}/pool"
+        self.snapshot_dir = f"{self.mirror_dir}/snapshots"
+        self.manifest_file = f"{self.mirror_dir}/manifest.json"
+        os.makedirs(self.pool_dir, exist_ok=True)
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        self.files = {}
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, "r") as file:
+                self.files = json.load(file)
+
+    def is_changed(self, name, signature, remote_md5):
+        """
+        A file is fetched when it is not in the manifest, is missing from the pool, or its
+        remote checksum, or failing that its listed size and modification time, differ.
+        """
+        entry = self.files.get(name)
+        if entry is None or not os.path.exists(f"{self.pool_dir}/{name}"):
+            return True
+        if remote_md5 is not None:
+            return entry["md5"] != remote_md5
+        return entry["signature"] != signature
+
+    def fetch(self, url, name, signature, remote_md5, retries):
+        """
+        Downloads a file into the pool through a partial file, resuming where possible, and verifies it.
+        Returns None on success or the last error.
+        """
+        part_file = f"{self.pool_dir}/{name}.part"
+        error = None
+        for attempt in range(retries):
+            try:
+                size = download(f"{url}{name}", part_file, signature)
+                md5 = md5_file(part_file)
+                if remote_md5 is not None and md5 != remote_md5:
+                    remove_part_file(part_file)
+                    raise ValueError(f"md5 {md5} does not match {remote_md5}")
+                # replacing the pool file gives it a new inode, snapshots keep their hard links to the old one
+                os.replace(part_file, f"{self.pool_dir}/{name}")
+                remove_part_file(part_file)
+                self.files[name] = {
+                    "size": size,
+                    "md5": md5,
+                    "signature": signature,
+                    "fetched": datetime.now().isoformat(timespec="seconds"),
+                }
+                return None
+            except (OSError, ValueError, urllib.error.URLError) as e:
+                error = e
+                time.sleep(2 ** attempt)
+        return error
+
+    def remove(self, name):
+        """
+        Drops a file gone from the remote, snapshots keep their own hard links to it.
+        """
+        del self.files[name]
+        if os.path.exists(f"{self.pool_dir}/{name}"):
+            os.remove(f"{self.pool_dir}/{name}")
+
+    def write(self):
+        tmp_file = f"{self.manifest_file}.tmp"
+        with open(tmp_file, "w") as file:
+            json.dump(self.files, file, indent=1, sort_keys=True)
+        os.replace(tmp_file, self.manifest_file)
+
+    def publish(self, url, label):
+        """
+        Hard links the pool into a new dated snapshot and atomically switches the current link to it.
+        """
+        name = datetime.now().strftime("%Y%m%d")
+        suffix = 1
+        while os.path.exists(f"{self.snapshot_dir}/{name}"):
+            suffix += 1
+            name = f"{datetime.now().strftime('%Y%m%d')}_{suffix}"
+        tmp_dir = f"{self.snapshot_dir}/.{name}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        with open(f"{tmp_dir}/MANIFEST.tsv", "w") as out:
+            out.write("#name\tsize\tmd5\n")
+            for file_name in sorted(self.files):
+                entry = self.files[file_name]
+                os.link(f"{self.pool_dir}/{file_name}", f"{tmp_dir}/{file_name}")
+                out.write(f"{file_name}\t{entry['size']}\t{entry['md5']}\n")
+        with open(f"{tmp_dir}/SNAPSHOT", "w") as out:
+            out.write(f"url\t{url}\n")
+            out.write(f"label\t{label}\n")
+            out.write(f"files\t{len(self.files)}\n")
+            out.write(f"bytes\t{sum(entry['size'] for entry in self.files.values())}\n")
+            out.write(f"created\t{datetime.now().isoformat(timespec='seconds')}\n")
+        os.rename(tmp_dir, f"{self.snapshot_dir}/{name}")
+
+        tmp_link = f"{self.mirror_dir}/.current.tmp"
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        os.symlink(f"snapshots/{name}", tmp_link)
+        os.replace(tmp_link, f"{self.mirror_dir}/current")
+        return name
+
+    def current(self):
+        link = f"{self.mirror_dir}/current"
+        if not os.path.islink(link):
+            return None
+        return os.path.basename(os.readlink(link))
+
+    def snapshots(self):
+        return sorted(d for d in os.listdir(self.snapshot_dir) if not d.startswith("."))
+
+    def prune(self, keep):
+        current = self.current()
+        snapshots = self.snapshots()
+        for snapshot in snapshots[:max(0, len(snapshots) - keep)]:
+            if snapshot != current:
+                shutil.rmtree(f"{self.snapshot_dir}/{snapshot}")
+                print(f"removed snapshot {snapshot}")
+
+
+def list_remote(url, pattern, jobs):
+    """
+    Returns the signature of each matching file in an HTML directory listing, the listed date and size
+    of NCBI and Apache listings, or the Last-Modified and Content-Length headers when the listing has none.
+    """
+    with urllib.request.urlopen(url) as response:
+        listing = response.read().decode("utf-8", errors="replace")
+    regex = re.compile(pattern)
+    files = {}
+    for m in re.finditer(r'<a href="([^"?/][^"]*)">[^<]*</a>([^<\n]*)', listing):
+        name = urllib.request.unquote(m.group(1))
+        if "/" in name or not regex.search(name):
+            continue
+        fields = m.group(2).split()
+        files[name] = " ".join(fields[:3]) if len(fields) >= 3 else ""
+
+    missing = [name for name, signature in files.items() if signature == ""]
+    if len(missing) > 0:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            for name, signature in zip(missing, executor.map(lambda n: head_signature(f"{url}{n}"), missing)):
+                files[name] = signature
+    return files
+
+
+def head_signature(url):
+    request = urllib.request.Request(url, method="HEAD")
+    with urllib.request.urlopen(request) as response:
+        modified = response.headers.get("Last-Modified", "")
+        if modified != "":
+            modified = parsedate_to_datetime(modified).strftime("%Y-%m-%d %H:%M:%S")
+        return f"{modified} {response.headers.get('Content-Length', '')}".strip()
+
+
+def read_remote_checksums(url):
+    """
+    Reads an md5sum style checksum file, md5 followed by the file name optionally prefixed by ./ or *,
+    or the md5 hashes of a metalink file such as the RELEASE.metalink of UniProt directories.
+    """
+    checksums = {}
+    with urllib.request.urlopen(url) as response:
+        text = response.read().decode()
+        if "<metalink" in text:
+            for m in re.finditer(r'<file name="([^"]+)">(.*?)</file>', text, re.DOTALL):
+                md5 = re.search(r'<hash type="md5">\s*([0-9a-fA-F]{32})\s*</hash>', m.group(2))
+                if md5 is not None:
+                    checksums[os.path.basename(m.group(1))] = md5.group(1).lower()
+            return checksums
+        for line in text.splitlines():
+            fields = line.split()
+            if len(fields) >= 2 and re.fullmatch(r"[0-9a-fA-F]{32}", fields[0]):
+                checksums[os.path.basename(fields[-1].lstrip("*"))] = fields[0].lower()
+    return checksums
+
+
+def download(url, part_file, signature):
+    """
+    Downloads to part_file, resuming a previous partial download when the server honours the range.
+    The remote signature and ETag of the download are kept in <part_file>.info, a partial file of
+    another version of the remote file is discarded rather than resumed, and the ETag is sent as
+    If-Range so that the server returns the whole file when it has changed since.
+    Returns the size of the file, raises ValueError when it is short of the announced length.
+    """
+    info_file = f"{part_file}.info"
+    etag = ""
+    if os.path.exists(part_file) and os.path.exists(info_file):
+        with open(info_file, "r") as file:
+            part_signature, _, etag = file.read().rstrip("\n").partition("\t")
+        if part_signature != signature:
+            remove_part_file(part_file)
+            etag = ""
+    elif os.path.exists(part_file):
+        remove_part_file(part_file)
+
+    offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+    request = urllib.request.Request(url)
+    if offset > 0:
+        request.add_header("Range", f"bytes={offset}-")
+        if etag != "":
+            request.add_header("If-Range", etag)
+    with urllib.request.urlopen(request) as response:
+        if offset > 0 and response.status != 206:
+            offset = 0
+        if offset == 0:
+            with open(info_file, "w") as file:
+                file.write(f"{signature}\t{response.headers.get('ETag', '')}\n")
+        length = response.headers.get("Content-Length")
+        expected = offset + int(length) if length is not None else None
+        with open(part_file, "ab" if offset > 0 else "wb") as out:
+            shutil.copyfileobj(response, out, 1 << 20)
+    size = os.path.getsize(part_file)
+    if expected is not None and size != expected:
+        raise ValueError(f"received {size} of {expected} bytes")
+    return size
+
+
+def remove_part_file(part_file):
+    for file_name in [part_file, f"{part_file}.info"]:
+        if os.path.exists(file_name):
+            os.remove(file_name)
+
+
+def md5_file(file_name):
+    md5 = hashlib.md5()
+    with open(file_name, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def read_snapshot_info(snapshot_dir):
+    info = {}
+    if os.path.exists(f"{snapshot_dir}/SNAPSHOT"):
+        with open(f"{snapshot_dir}/SNAPSHOT", "r") as file:
+            for line in file:
+                key, _, value = line.rstrip("\n").partition("\t")
+                info[key] = value
+    return info
+
+
+if __name__ == "__main__":
+    main() # type: ignore
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2025 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import re
+import html
+import json
+import click
+import fcntl
+import zipfile
+from datetime import datetime
+
+# modified z-score above which a metric is flagged, Iglewicz and Hoaglin
+OUTLIER_Z = 3.5
+
+# minimum number of samples with a metric before outliers are flagged
+OUTLIER_MIN_SAMPLES = 4
+
+
+@click.command()
+@click.option("-i", "--analysis_dir", required=True, help="run analysis directory with one <idx>_<sample> directory per sample")
+@click.option(
+    "-o",
+    "--output_dir",
+    default="",
+    help="output directory for qc_report.tsv, qc_report.html and the store, defaults to <analysis_dir>/all/qc",
+)
+@click.option("-n", "--run_name", default="", help="run name shown in the report, defaults to the run directory name")
+def main(analysis_dir, output_dir, run_name):
+    """
+    Compiles a run level QC report from per sample FastQC, kraken2, samtools stats and coverage,
+    QUAST and NanoPlot outputs.
+
+    Parsed metrics are kept in a per run store keyed by the size and mtime of each file so that
+    only new or changed outputs are parsed again, cheap enough to rerun on every sample completion.
+    Runs on the same output directory wait for each other so that samples completing together do
+    not overwrite each other's updates.
+    Samples whose metrics lie far from the run median are flagged.
+
+    e.g. compile_qc_report.py -i illu20/analysis
+    """
+    analysis_dir = os.path.abspath(analysis_dir)
+    if output_dir == "":
+        output_dir = f"{analysis_dir}/all/qc"
+    if run_name == "":
+        run_name = os.path.basename(os.path.dirname(analysis_dir))
+    os.makedirs(output_dir, exist_ok=True)
+
+    print("\t{0:<20} :   {1:<10}".format("analysis dir", analysis_dir))
+    print("\t{0:<20} :   {1:<10}".format("output dir", output_dir))
+    print("\t{0:<20} :   {1:<10}".format("run name", run_name))
+
+    with open(f"{output_dir}/qc_store.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        store = QCStore(f"{output_dir}/qc_store.json")
+        parsed, reused = store.update(analysis_dir)
+        store.write()
+        print(f"{parsed} files parsed, {reused} unchanged files reused")
+
+        samples, metrics = store.table()
+        flags = flag_outliers(samples, metrics)
+        write_tsv(f"{output_dir}/qc_report.tsv", samples, metrics, flags)
+        write_html(f"{output_dir}/qc_report.html", run_name, samples, metrics, flags)
+    print(f"{len(samples)} samples, {len(metrics)} metrics, {sum(len(f) for f in flags.values())} outliers flagged")
+
+
+def parse_fastqc(file_name):
+    """
+    Basic statistics and module results from fastqc_data.txt, read from the FastQC zip when not extracted.
+    """
+    if file_name.endswith(".zip"):
+        with zipfile.ZipFile(file_name) as zip:
+            name = next(n for n in zip.namelist() if n.endswith("/fastqc_data.txt"))
+            lines = zip.read(name).decode().splitlines()
+    else:
+        with open(file_name, "r") as file:
+            lines = file.read().splitlines()
+
+    metrics = {}
+    fails = 0
+    warns = 0
+    for line in lines:
+        if line.startswith(">>") and line != ">>END_MODULE":
+            status = line.split("\t")[-1]
+            fails += status == "fail"
+            warns += status == "warn"
+        elif line.startswith("Total Sequences"):
+            metrics["total_sequences"] = int(line.split("\t")[1])
+        elif line.startswith("%GC"):
+            metrics["gc_percent"] = float(line.split("\t")[1])
+        elif line.startswith("Sequence length"):
+            lengths = line.split("\t")[1].split("-")
+            metrics["max_length"] = int(lengths[-1])
+        elif line.startswith("#Total Deduplicated Percentage"):
+            metrics["deduplicated_percent"] = float(line.split("\t")[1])
+    metrics["failed_modules"] = fails
+    metrics["warned_modules"] = warns
+    return metrics
+
+
+def parse_kraken2(file_name):
+    """
+    Unclassified percentage and top species of a kraken2 report.
+    """
+    metrics = {"unclassified_percent": 0.0, "top_species": "", "top_species_percent": 0.0}
+    with open(file_name, "r") as file:
+        for line in file:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 6:
+                continue
+            percent = float(fields[0])
+            rank = fields[3]
+            name = fields[5].strip()
+            if rank == "U":
+                metrics["unclassified_percent"] = percent
+            elif rank == "S" and percent > metrics["top_species_percent"]:
+                metrics["top_species"] = name
+                metrics["top_species_percent"] = percent
+    return metrics
+
+
+def parse_samtools_stats(file_name):
+    """
+    Summary numbers of samtools stats.
+    """
+    keys = {
+        "raw total sequences": "total_reads",
+        "reads mapped": "mapped_reads",
+        "reads properly paired": "properly_paired_reads",
+        "error rate": "error_rate",
+        "average length": "average_length",
+        "insert size average": "insert_size_average",
+        "bases mapped (cigar)": "bases_mapped",
+    }
+    metrics = {}
+    with open(file_name, "r") as file:
+        for line in file:
+            if not line.startswith("SN\t"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            key = fields[1].rstrip(":")
+            if key in keys:
+                metrics[keys[key]] = float(fields[2])
+    if metrics.get("total_reads", 0) > 0:
+        metrics["mapped_percent"] = 100 * metrics.get("mapped_reads", 0) / metrics["total_reads"]
+    return metrics
+
+
+def parse_samtools_coverage(file_name):
+    """
+    Length weighted mean depth and breadth of samtools coverage over all references.
+    """
+    length = 0
+    covered = 0
+    depth = 0.0
+    with open(file_name, "r") as file:
+        for line in file:
+            if line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            ref_length = int(fields[2]) - int(fields[1]) + 1
+            length += ref_length
+            covered += int(fields[4])
+            depth += float(fields[6]) * ref_length
+    if length == 0:
+        return {}
+    return {"coverage_percent": 100 * covered / length, "mean_depth": depth / length}
+
+
+def parse_quast(file_name):
+    """
+    Assembly summary of a QUAST report.tsv.
+    """
+    keys = {
+        "# contigs": "contigs",
+        "Total length": "total_length",
+        "Largest contig": "largest_contig",
+        "N50": "n50",
+        "GC (%)": "gc_percent",
+    }
+    metrics = {}
+    with open(file_name, "r") as file:
+        for line in file:
+            fields = line.rstrip("\n").split("\t")
+            if fields[0] in keys and len(fields) > 1:
+                metrics[keys[fields[0]]] = float(fields[1])
+    return metrics
+
+
+def parse_nanostats(file_name):
+    """
+    General summary of NanoPlot's NanoStats.txt, also written by demux_to_fastq.py.
+    """
+    keys = {
+        "Number of reads": "reads",
+        "Total bases": "bases",
+        "Mean read length": "mean_length",
+        "Read length N50": "n50",
+        "Mean read quality": "mean_quality",
+        "Median read quality": "median_quality",
+    }
+    metrics = {}
+    with open(file_name, "r") as file:
+        for line in file:
+            key, _, value = line.partition(":")
+            if key in keys:
+                metrics[keys[key]] = float(value.split()[0].replace(",", ""))
+    return metrics
+
+
+# per sample files and their parsers, the prefix of a metric is the tool and, for FastQC, the read
+PARSERS = [
+    (re.compile(r"fastqc_result/.*_(R?[12])_fastqc\.zip$"), "fastqc_{0}", parse_fastqc),
+    (re.compile(r"fastqc_result/[^/]*(?<!_R1)(?<!_R2)_fastqc\.zip$"), "fastqc", parse_fastqc),
+    (re.compile(r"kraken2_result/[^/]+\.txt$"), "kraken2", parse_kraken2),
+    (re.compile(r"align_result/general_stats/[^/]+\.txt$"), "samtools", parse_samtools_stats),
+    (re.compile(r"align_result/coverage_stats/[^/]+\.txt$"), "coverage", parse_samtools_coverage),
+    (re.compile(r"quast_result/report\.tsv$"), "quast", parse_quast),
+    (re.compile(r"nanoplot_result/[^/]+\.read_stats\.txt$"), "read_stats", parse_nanostats),
+    (re.compile(r"nanoplot_result/[^/]+(?<!_post_filtering)\.txt$"), "nanoplot", parse_nanostats),
+]
+
+
+class QCStore(object):
+    """
+    Parsed metrics of every per sample QC file, keyed by sample and relative path, with the size and
+    mtime of the file when it was parsed.
+    """
+
+    def __init__(self, store_file):
+        self.store_file = store_file
+        self.samples = {}
+        if os.path.exists(store_file):
+            with open(store_file, "r") as file:
+                self.samples = json.load(file)
+
+    def update(self, analysis_dir):
+        """
+        Parses new and changed files, drops files that no longer exist, returns counts of parsed and reused files.
+        """
+        parsed = 0
+        reused = 0
+        samples = {}
+        for sample_dir in sorted(os.listdir(analysis_dir), key=sample_order):
+            path = f"{analysis_dir}/{sample_dir}"
+            if sample_dir == "all" or not os.path.isdir(path) or not re.match(r"\d+_", sample_dir):
+                continue
+            previous = self.samples.get(sample_dir, {})
+            files = {}
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    file_name = os.path.join(dirpath, filename)
+                    rel_path = os.path.relpath(file_name, path)
+                    prefix, parser = match_parser(rel_path)
+                    if parser is None:
+                        continue
+                    stat = os.stat(file_name)
+                    signature = [stat.st_size, stat.st_mtime_ns]
+                    entry = previous.get(rel_path)
+                    if entry is not None and entry["signature"] == signature:
+                        files[rel_path] = entry
+                        reused += 1
+                        continue
+                    try:
+                        metrics = parser(file_name)
+                    except (OSError, ValueError, IndexError, StopIteration, zipfile.BadZipFile) as e:
+                        print(f"{file_name} cannot be parsed: {e}")
+                        continue
+                    files[rel_path] = {"signature": signature, "prefix": prefix, "metrics": metrics}
+                    parsed += 1
+            samples[sample_dir] = files
+        self.samples = samples
+        return parsed, reused
+
+    def write(self):
+        tmp_file = f"{self.store_file}.tmp"
+        with open(tmp_file, "w") as file:
+            json.dump(self.samples, file, indent=1)
+        os.replace(tmp_file, self.store_file)
+
+    def table(self):
+        """
+        Returns the sample names and, for each metric, its value in each sample.
+        """
+        samples = list(self.samples)
+        metrics = {}
+        for sample, files in self.samples.items():
+            for rel_path, entry in files.items():
+                for key, value in entry["metrics"].items():
+                    metrics.setdefault(f"{entry['prefix']}.{key}", {})[sample] = value
+        return samples, dict(sorted(metrics.items()))
+
+
+def match_parser(rel_path):
+    for pattern, prefix, parser in PARSERS:
+        m = pattern.search(rel_path)
+        if m is not None:
+            return prefix.format(*m.groups()), parser
+    return None, None
+
+
+def sample_order(sample_dir):
+    m = re.match(r"(\d+)_", sample_dir)
+    return (int(m.group(1)) if m else 0, sample_dir)
+
+
+def flag_outliers(samples, metrics):
+    """
+    Flags numeric metrics with a modified z-score, based on the median absolute deviation, above OUTLIER_Z.
+    """
+    flags = {sample: {} for sample in samples}
+    for metric, values in metrics.items():
+        numbers = {s: v for s, v in values.items() if isinstance(v, (int, float))}
+        if len(numbers) < OUTLIER_MIN_SAMPLES:
+            continue
+        median = median_of(list(numbers.values()))
+        deviations = [abs(v - median) for v in numbers.values()]
+        # when most samples are identical the mean absolute deviation stands in for the MAD
+        scale = median_of(deviations) / 0.6745
+        if scale == 0:
+            scale = 1.253314 * sum(deviations) / len(deviations)
+        if scale == 0:
+            continue
+        for sample, value in numbers.items():
+            z = (value - median) / scale
+            if abs(z) > OUTLIER_Z:
+                flags[sample][metric] = z
+    return flags
+
+
+def median_of(values):
+    values = sorted(values)
+    n = len(values)
+    return values[n // 2] if n % 2 else (values[n // 2 - 1] + values[n // 2]) / 2
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return f"{value:.2f}" if abs(value) < 1e6 else f"{value:.0f}"
+    return str(value)
+
+
+def write_tsv(tsv_file, samples, metrics, flags):
+    with open(tsv_file, "w") as out:
+        out.write("\t".join(["#sample"] + list(metrics) + ["outliers"]) + "\n")
+        for sample in samples:
+            row = [sample]
+            for metric, values in metrics.items():
+                row.append(format_value(values[sample]) if sample in values else "NA")
+            row.append(",".join(f"{m}({z:+.1f})" for m, z in flags[sample].items()))
+            out.write("\t".join(row) + "\n")
+
+
+def write_html(html_file, run_name, samples, metrics, flags):
+    rows = []
+    for sample in samples:
+        cells = [f"<th>{html.escape(sample)}</th>"]
+        for metric, values in metrics.items():
+            if sample not in values:
+                cells.append("<td class=\"na\">NA</td>")
+            elif metric in flags[sample]:
+                z = flags[sample][metric]
+                cells.append(f"<td class=\"outlier\" title=\"modified z {z:+.1f}\">{html.escape(format_value(values[sample]))}</td>")
+            else:
+                cells.append(f"<td>{html.escape(format_value(values[sample]))}</td>")
+        rows.append("<tr>" + "".join(cells) + "</tr>")
+    header = "".join(f"<th>{html.escape(m)}</th>" for m in metrics)
+    outliers = sum(len(f) for f in flags.values())
+    with open(html_file, "w") as out:
+        out.write(f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{html.escape(run_name)} QC report</title>
+<style>
+body {{ font-family: sans-serif; font-size: 13px; }}
+table {{ border-collapse: collapse; }}
+th, td {{ border: 1px solid #ccc; padding: 3px 6px; text-align: right; white-space: nowrap; }}
+thead th {{ position: sticky; top: 0; background: #eee; }}
+tbody th {{ text-align: left; }}
+td.outlier {{ background: #f8c4c4; font-weight: bold; }}
+td.na {{ color: #aaa; }}
+</style>
+</head>
+<body>
+<h2>{html.escape(run_name)} QC report</h2>
+<p>{len(samples)} samples, {len(metrics)} metrics, {outliers} outliers flagged (|modified z| &gt; {OUTLIER_Z}), generated {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</p>
+<table>
+<thead><tr><th>sample</th>{header}</tr></thead>
+<tbody>
+{chr(10).join(rows)}
+</tbody>
+</table>
+</body>
+</html>
+""")
+
+
+if __name__ == "__main__":
+    main() # type: ignore
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2025 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import os
+import re
+import click
+import sqlite3
+import fnmatch
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# FASTQ file names of bcl2fastq/bcl-convert output and of CAVSnet deployed runs
+ILLUMINA_FASTQ = re.compile(r"^(.+)_S(\d+)_L(\d+)_R([12])_\d+\.fastq\.gz$")
+CAVSNET_FASTQ = re.compile(r"^(\d+)_(\d+)_(.+)_R([12])\.fastq\.gz$")
+
+# directories of images and per cycle base calls that never hold FASTQ files
+SKIP_DIRS = re.compile(r"^(Thumbnail_Images|C\d+\.\d+)$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (path TEXT PRIMARY KEY, run TEXT, indexed TEXT);
+CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, run TEXT, parent TEXT, mtime INTEGER);
+CREATE TABLE IF NOT EXISTS fastqs (
+    path TEXT PRIMARY KEY, dir TEXT, run TEXT, layout TEXT, run_idx INTEGER, sample_idx INTEGER,
+    sample_id TEXT, lane INTEGER, read INTEGER, size INTEGER, mtime INTEGER
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+CREATE INDEX IF NOT EXISTS fastqs_dir ON fastqs (dir);
+CREATE INDEX IF NOT EXISTS fastqs_run ON fastqs (run, sample_idx);
+"""
+
+
+@click.group()
+def main():
+    """
+    Persistent index of the FASTQ files of sequencing runs.
+
+    Run directories are scanned with os.scandir, a directory level at a time in parallel, into a
+    SQLite catalogue of run, sample, lane and read with the path, size and mtime of each FASTQ
+    file.  A directory is only listed again when its mtime changed, so refreshing an index of
+    years of runs reads little more than the directory entries of the new runs.  Sample files
+    of the deploy pipelines are emitted from queries of the catalogue.
+
+    e.g. index_runs.py update -d /net/singapura/var/hts/runs.sqlite -p /net/singapura/var/hts /net/singapura/illu1
+         index_runs.py sa-file -d /net/singapura/var/hts/runs.sqlite /net/singapura/var/hts/ilm58
+    """
+    pass
+
+
+@main.command("update")
+@click.argument("dirs", nargs=-1, required=True)
+@click.option("-d", "--index_db", required=True, help="index database")
+@click.option("-p", "--parents", is_flag=True, default=False, help="directories hold runs as subdirectories")
+@click.option("-t", "--threads", default=16, show_default=True, help="number of threads for listing directories")
+def update(dirs, index_db, parents, threads):
+    """
+    Indexes run directories, or all runs in parent directories, refreshing changed directories only.
+    """
+    run_dirs = []
+    for dir in dirs:
+        if parents:
+            with os.scandir(dir) as it:
+                run_dirs.extend(sorted(entry.path for entry in it if entry.is_dir() and not entry.name.startswith(".")))
+        else:
+            run_dirs.append(dir)
+    with RunIndex(index_db) as index:
+        no_dirs, no_listed = index.update(run_dirs, threads)
+    print(f"{no_dirs} directories in {len(run_dirs)} runs, {no_listed} listed")
+
+
+@main.command("list")
+@click.option("-d", "--index_db", required=True, help="index database")
+@click.option("-r", "--run", default="*", show_default=True, help="run name pattern")
+@click.option("-s", "--sample", default="*", show_default=True, help="sample id pattern")
+def list_fastqs(index_db, run, sample):
+    """
+    Lists indexed FASTQ files.
+    """
+    with RunIndex(index_db) as index:
+        print("#run\tsample-idx\tsample-id\tlane\tread\tsize\tmtime\tpath")
+        for row in index.fastqs(run, sample):
+            mtime = datetime.fromtimestamp(row["mtime"] / 1e9).strftime("%Y-%m-%d %H:%M:%S")
+            lane = row["lane"] if row["lane"] is not None else "."
+            print(f"{row['run']}\t{row['sample_idx']}\t{row['sample_id']}\t{lane}\t{row['read']}\t{row['size']}\t{mtime}\t{row['path']}")
+
+
+@main.command("fastq-list")
+@click.argument("illumina_raw_data_dir", required=True)
+@click.option("-d", "--index_db", default=":memory:", show_default=True, help="index database")
+def fastq_list(illumina_raw_data_dir, index_db):
+    """
+    Prints the FASTQ file list of an Illumina raw data directory.
+    """
+    with RunIndex(index_db) as index:
+        index.update([illumina_raw_data_dir])
+        print_fastq_list(index, illumina_raw_data_dir)
+
+
+@main.command("sa-file")
+@click.argument("cavsnet_illumina_run_dir", required=True)
+@click.option("-d", "--index_db", default=":memory:", show_default=True, help="index database")
+def sa_file(cavsnet_illumina_run_dir, index_db):
+    """
+    Prints the sample file of a CAVSnet Illumina run data directory.
+    """
+    with RunIndex(index_db) as index:
+        index.update([cavsnet_illumina_run_dir])
+        print_sa_file(index, cavsnet_illumina_run_dir)
+
+
+def print_fastq_list(index, illumina_raw_data_dir):
+    """
+    Prints the FASTQ files of a bcl2fastq Fastq directory, one line per sample number with the
+    unclassified reads of sample 0 last, as make_illumina_fastq_list.py did.
+    """
+    prefix = os.path.abspath(illumina_raw_data_dir) + "/"
+    rows = index.query(
+        """
+        SELECT sample_idx, sample_id, lane, path FROM fastqs
+        WHERE substr(dir, 1, ?) = ? AND layout = 'illumina' AND read = 1 AND dir LIKE '%/Fastq'
+        ORDER BY CASE sample_idx WHEN 0 THEN 1000000 ELSE sample_idx END, lane, path
+        """,
+        (len(prefix), prefix),
+    )
+    observed_samples = set()
+    print(f"#sample-id\tfastq1\tfastq2")
+    for row in rows:
+        if row["sample_idx"] not in observed_samples:
+            observed_samples.add(row["sample_idx"])
+            name = os.path.basename(row["path"]).rsplit("_R1_", 1)[0]
+            print(f"{len(observed_samples)}\t{name}_R1_001.fastq.gz\t{name}_R2_001.fastq.gz")
+
+
+def print_sa_file(index, cavsnet_illumina_run_dir):
+    """
+    Prints the sample file of the FASTQ files deployed to a CAVSnet run directory.
+    """
+    cavsnet_illumina_run_dir = os.path.abspath(cavsnet_illumina_run_dir)
+    rows = index.query(
+        """
+        SELECT run_idx, sample_idx, sample_id FROM fastqs
+        WHERE dir = ? AND layout = 'cavsnet' AND read = 1
+        ORDER BY sample_idx, sample_id
+        """,
+        (cavsnet_illumina_run_dir,),
+    )
+    print(f"#sample-id\tfastq1\tfastq2\tcontigs")
+    for row in rows:
+        id = row["sample_id"]
+        run_idx = row["run_idx"]
+        print(f"{id}\t{cavsnet_illumina_run_dir}/{run_idx}_{id}_R1.fastq.gz\t{cavsnet_illumina_run_dir}/{run_idx}_{id}_R2.fastq.gz\t{cavsnet_illumina_run_dir}/contigs/{run_idx}_{id}.contigs.fasta")
+
+
+class RunIndex(object):
+    """
+    SQLite catalogue of runs, their directories and FASTQ files.
+    """
+    def __init__(self, index_db):
+        self.index_db = index_db
+        self.db = sqlite3.connect(index_db, timeout=60)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def query(self, sql, params=()):
+        return self.db.execute(sql, params).fetchall()
+
+    def fastqs(self, run="*", sample="*"):
+        rows = self.db.execute("SELECT * FROM fastqs ORDER BY run, sample_idx, lane, read, path")
+        for row in rows:
+            if fnmatch.fnmatch(row["run"], run) and fnmatch.fnmatch(row["sample_id"], sample):
+                yield row
+
+    def update(self, run_dirs, threads=16):
+        """
+        Refreshes the index of run directories, a level of directories at a time.  Directories with
+        an unchanged mtime are not listed, their subdirectories are taken from the index.
+        """
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        level = []
+        for run_dir in run_dirs:
+            path = os.path.abspath(run_dir)
+            run = os.path.basename(path)
+            self.db.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?)", (path, run, now))
+            level.append((path, run, ""))
+
+        no_listed = 0
+        no_dirs = 0
+        with ThreadPoolExecutor(max_workers=max(threads, 1)) as executor:
+            while len(level) > 0:
+                no_dirs += len(level)
+                mtimes = list(executor.map(dir_mtime, [path for path, run, parent in level]))
+                changed = []
+                next_level = []
+                for (path, run, parent), mtime in zip(level, mtimes):
+                    row = self.db.execute("SELECT mtime FROM dirs WHERE path = ?", (path,)).fetchone()
+                    if mtime is None:
+                        self.remove_dir(path)
+                    elif row is not None and row["mtime"] == mtime:
+                        for child in self.db.execute("SELECT path FROM dirs WHERE parent = ?", (path,)):
+                            next_level.append((child["path"], run, path))
+                    else:
+                        changed.append((path, run, parent, mtime))
+                # list changed directories in parallel
+                listings = executor.map(list_dir, [path for path, run, parent, mtime in changed])
+                for (path, run, parent, mtime), (subdirs, files) in zip(changed, listings):
+                    no_listed += 1
+                    self.refresh_dir(path, run, parent, mtime, subdirs, files)
+                    next_level.extend((subdir, run, path) for subdir in subdirs)
+                self.db.commit()
+                level = next_level
+        return no_dirs, no_listed
+
+    def refresh_dir(self, path, run, parent, mtime, subdirs, files):
+        """
+        Replaces the FASTQ files and subdirectories of a listed directory.
+        """
+        self.db.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)", (path, run, parent, mtime))
+        self.db.execute("DELETE FROM fastqs WHERE dir = ?", (path,))
+        rows = []
+        for name, size, file_mtime in files:
+            fields = parse_fastq_name(name)
+            if fields is not None:
+                rows.append((f"{path}/{name}", path, run) + fields + (size, file_mtime))
+        self.db.executemany("INSERT OR REPLACE INTO fastqs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        # forget subdirectories that were removed
+        existing = set(subdirs)
+        for child in self.db.execute("SELECT path FROM dirs WHERE parent = ?", (path,)).fetchall():
+            if child["path"] not in existing:
+                self.remove_dir(child["path"])
+
+    def remove_dir(self, path):
+        pattern = path.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "/%"
+        self.db.execute("DELETE FROM fastqs WHERE dir = ? OR dir LIKE ? ESCAPE '\\'", (path, pattern))
+        self.db.execute("DELETE FROM dirs WHERE path = ? OR path LIKE ? ESCAPE '\\'", (path, pattern))
+
+
+def dir_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def list_dir(path):
+    """
+    Returns the subdirectories of a directory and the name, size and mtime of its FASTQ files.
+    """
+    subdirs = []
+    files = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                if not SKIP_DIRS.match(entry.name):
+                    subdirs.append(entry.path)
+            elif entry.name.endswith(".fastq.gz"):
+                stat = entry.stat()
+                files.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    return subdirs, files
+
+
+def parse_fastq_name(name):
+    """
+    Returns layout, run index, sample index, sample id, lane and read of a FASTQ file name.
+    """
+    m = ILLUMINA_FASTQ.match(name)
+    if m is not None:
+        return ("illumina", None, int(m.group(2)), m.group(1), int(m.group(3)), int(m.group(4)))
+    m = CAVSNET_FASTQ.match(name)
+    if m is not None:
+        return ("cavsnet", int(m.group(1)), int(m.group(2)), f"{m.group(2)}_{m.group(3)}", None, int(m.group(4)))
+    return None
+
+
+if __name__ == "__main__":
+    main()  # type: ignore
@@ -18,57 +18,24 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-import os
-from tokenize import Ignore
 import click
-import re
-import fnmatch
+from index_runs import RunIndex, print_fastq_list
 
 
 @click.command()
 @click.argument("illumina_raw_data_dir", required=True)
-def main(illumina_raw_data_dir):
+@click.option("-d", "--index_db", default=":memory:", show_default=True, help="run index database, see index_runs.py")
+def main(illumina_raw_data_dir, index_db):
     """
     Takes in an Illumina raw data directory ilm directory and generates a fastq file list
 
+    The run is refreshed in the run index first, with a persistent index only changed directories are listed.
+
     e.g. make_illumina_fastq_list.py ilm38
     """
-    fastq_path = ""
-
-    for dirpath, dirnames, filenames in os.walk(illumina_raw_data_dir):
-        for dirname in dirnames:
-            if dirname == "Fastq":
-                fastq_path = os.path.join(dirpath, dirname)
-
-    #print(f"FASTQ PATH: {fastq_path}")
-    fastq_dir = os.path.abspath(fastq_path)
-
-    no_fastq_files = int(len(fnmatch.filter(os.listdir(fastq_dir), "*.fastq.gz")) / 2)
-    #print(f'#fastq : {no_fastq_files}')
-
-    samples = []
-    observed_samples = set()
-    for file_name in os.listdir(fastq_dir):
-        #print(file_name)
-        if file_name.endswith("fastq.gz"):
-            #print(file_name)
-            m = re.match(r"^(.+_S(\d+)_L\d+)_R[12].+.fastq.gz", file_name)
-            if m is not None:
-                sample_id = int(m.group(2))
-                name = m.group(1)
-                if sample_id not in observed_samples:
-                    observed_samples.add(sample_id)
-                    #print(f'{sample_id} {name}')
-                    #unclassified reads moved to the back
-                    if sample_id == 0:
-                        sample_id = 1000000
-                    samples.append((sample_id, name))
-
-    sorted_samples = sorted(samples, key = lambda x: x[0])
-
-    print(f"#sample-id\tfastq1\tfastq2")
-    for id, t in enumerate(sorted_samples):
-        print(f"{id+1}\t{t[1]}_R1_001.fastq.gz\t{t[1]}_R2_001.fastq.gz")
+    with RunIndex(index_db) as index:
+        index.update([illumina_raw_data_dir])
+        print_fastq_list(index, illumina_raw_data_dir)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2024 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import json
+import click
+import hashlib
+
+
+@click.group()
+def main():
+    """
+    Content aware completion sentinels for make targets.
+
+    A sentinel records a digest of the command and of the contents of its inputs,
+    the paths of the inputs do not enter the digest so a run directory can be moved
+    between mounts without invalidating its sentinels.  Inputs are recorded relative
+    to a root directory.  The size and mtime of
+    each input are kept so that contents are only rehashed when these change, and an
+    input that is itself a sentinel contributes its own digest.
+
+    e.g. pipeline_sentinel.py check a.OK -r /net/singapura/illu1 -c 3f2a... a.fastq.gz ref.fasta || (cmd)
+         pipeline_sentinel.py record a.OK -r /net/singapura/illu1 -c 3f2a... a.fastq.gz ref.fasta
+    """
+    pass
+
+
+@main.command("check")
+@click.argument("sentinel_file", nargs=1)
+@click.argument("inputs", nargs=-1)
+@click.option("-r", "--root", default="", help="root directory that input paths are recorded relative to")
+@click.option("-c", "--command_hash", required=True, help="hash of the command with the root removed")
+def check(sentinel_file, inputs, root, command_hash):
+    """
+    Exits with 0 if the command and the contents of its inputs are unchanged since the sentinel was recorded.
+    """
+    sentinel = Sentinel.read(sentinel_file)
+    if sentinel is None:
+        exit(1)
+    inputs = Sentinel.hash_inputs(inputs, root, sentinel.inputs)
+    if inputs is None or Sentinel.compute_digest(command_hash, inputs) != sentinel.digest:
+        exit(1)
+    print(f"{sentinel_file} is up to date, skipping")
+    exit(0)
+
+
+@main.command("record")
+@click.argument("sentinel_file", nargs=1)
+@click.argument("inputs", nargs=-1)
+@click.option("-r", "--root", default="", help="root directory that input paths are recorded relative to")
+@click.option("-c", "--command_hash", required=True, help="hash of the command with the root removed")
+def record(sentinel_file, inputs, root, command_hash):
+    """
+    Writes the sentinel for a completed command.
+    """
+    previous = Sentinel.read(sentinel_file)
+    inputs = Sentinel.hash_inputs(inputs, root, previous.inputs if previous is not None else [])
+    if inputs is None:
+        print(f"inputs of {sentinel_file} are missing")
+        exit(1)
+    Sentinel(command_hash, Sentinel.compute_digest(command_hash, inputs), inputs).write(sentinel_file)
+
+
+def hash_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_dir(path):
+    """
+    Directories are hashed by the relative names and sizes of the files in them.
+    """
+    h = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            file = os.path.join(dirpath, filename)
+            h.update(f"{os.path.relpath(file, path)}\t{os.path.getsize(file)}\n".encode())
+    return h.hexdigest()
+
+
+class Sentinel(object):
+
+    def __init__(self, command_hash, digest, inputs):
+        self.command_hash = command_hash
+        self.digest = digest
+        #list of [relative path, size, mtime, content hash]
+        self.inputs = inputs
+
+    @staticmethod
+    def read(sentinel_file):
+        """
+        Returns None for missing files and for plain touched files.
+        """
+        try:
+            with open(sentinel_file, "r") as f:
+                record = json.load(f)
+            return Sentinel(record["command_hash"], record["digest"], record["inputs"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def write(self, sentinel_file):
+        tmp_file = f"{sentinel_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({"command_hash": self.command_hash, "digest": self.digest, "inputs": self.inputs}, f, indent=1)
+        os.replace(tmp_file, sentinel_file)
+
+    @staticmethod
+    def hash_inputs(inputs, root, previous):
+        """
+        Returns [relative path, size, mtime, content hash] of each input, reusing the
+        previous content hash when the relative path, size and mtime are unchanged.
+        Returns None if an input is missing.
+        """
+        cache = {input[0]: input for input in previous}
+        hashed = []
+        for input in inputs:
+            if not os.path.exists(input):
+                return None
+            path = os.path.relpath(os.path.abspath(input), root) if root != "" else input
+            stat = os.stat(input)
+            cached = cache.get(path)
+            if cached is not None and cached[1] == stat.st_size and cached[2] == stat.st_mtime:
+                hashed.append(cached)
+                continue
+            if os.path.isdir(input):
+                content_hash = hash_dir(input)
+            else:
+                sentinel = Sentinel.read(input) if input.endswith(".OK") else None
+                content_hash = sentinel.digest if sentinel is not None else hash_file(input)
+            hashed.append([path, stat.st_size, stat.st_mtime, content_hash])
+        return hashed
+
+    @staticmethod
+    def compute_digest(command_hash, inputs):
+        h = hashlib.sha256(command_hash.encode())
+        for path, size, mtime, content_hash in inputs:
+            h.update(f"\t{content_hash}".encode())
+        return h.hexdigest()
+
+
+if __name__ == "__main__":
+    main()  # type: ignore
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2024 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import re
+import time
+import shlex
+import hashlib
+import click
+import asyncio
+
+
+@click.command()
+@click.argument("make_file")
+@click.option("-c", "--cpus", default=os.cpu_count(), show_default=True, help="number of CPU tokens")
+@click.option("-m", "--memory", default=0, show_default=True, help="memory tokens in GB, 0 for unlimited")
+@click.option("-b", "--blastdb_slots", default=1, show_default=True, help="number of steps that may use a BLAST database concurrently")
+@click.option("-x", "--retries", default=1, show_default=True, help="number of times a failed step is retried")
+@click.option("-d", "--retry_delay", default=30, show_default=True, help="seconds to wait before retrying a failed step")
+@click.option("-l", "--log_dir", default="", help="directory of per step logs, defaults to <make_file>.logs")
+@click.option(
+    "-e",
+    "--backend",
+    default="local",
+    type=click.Choice(["local", "slurm"]),
+    show_default=True,
+    help="local runs commands directly with srun prefixes removed, slurm keeps the srun prefixes",
+)
+@click.option("--srun", default="srun", show_default=True, help="srun binary used by the slurm backend")
+@click.option("-r", "--resume", is_flag=True, help="treat existing targets as complete regardless of modification times")
+def main(make_file, cpus, memory, blastdb_slots, retries, retry_delay, log_dir, backend, srun, resume):
+    """
+    Executes the rules of a generated make file concurrently.
+
+    Each rule is scheduled as soon as its dependencies are complete and enough
+    tokens are free.  The tokens a rule needs are read from its srun invocations,
+    including those after ;, && or || as in sentinel mode:
+    --mincpus for CPUs, --mem for memory and a BLASTDB export for a BLAST
+    database slot.  Independent rules carry on when a rule fails, failed rules
+    are retried and a summary of failures is printed at the end.
+
+    Without --resume a rule runs when its target is missing or older than one of
+    its dependencies, as with make.
+
+    e.g. run_pipeline.py illu1_deploy_and_qc.mk -c 64 -m 256 -b 2
+    """
+    if log_dir == "":
+        log_dir = f"{make_file}.logs"
+
+    print("\t{0:<20} :   {1:<10}".format("make file", make_file))
+    print("\t{0:<20} :   {1:<10}".format("cpus", cpus))
+    print("\t{0:<20} :   {1:<10}".format("memory", memory))
+    print("\t{0:<20} :   {1:<10}".format("blastdb slots", blastdb_slots))
+    print("\t{0:<20} :   {1:<10}".format("retries", retries))
+    print("\t{0:<20} :   {1:<10}".format("log dir", log_dir))
+    print("\t{0:<20} :   {1:<10}".format("backend", backend))
+    print("\t{0:<20} :   {1}".format("resume", resume))
+
+    os.makedirs(log_dir, exist_ok=True)
+
+    steps = read_make_file(make_file)
+    pools = ResourcePools(cpus, memory, blastdb_slots)
+    backend = LocalBackend() if backend == "local" else SlurmBackend(srun)
+    executor = Executor(steps, pools, backend, log_dir, retries, retry_delay, resume)
+    ok = asyncio.run(executor.run())
+    executor.print_summary()
+    if not ok:
+        exit(1)
+
+
+def read_make_file(make_file):
+    """
+    Reads the rules of a make file written by PipelineGenerator.write, rules may be
+    written as "tgt : deps" or "tgt: deps".
+    """
+    steps = []
+    with open(make_file, "r") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith("\t"):
+                if len(steps) != 0:
+                    steps[-1].cmds.append(line[1:].replace("$$", "$"))
+                continue
+            m = RULE.match(line)
+            if m is not None:
+                tgt, deps = m.group(1), m.group(2)
+                if tgt in ("all", "clean") or tgt.startswith("."):
+                    steps.append(Step(tgt, [], skip=True))
+                else:
+                    steps.append(Step(tgt, deps.split()))
+    return [step for step in steps if not step.skip]
+
+
+# a rule line, variable assignments such as SHELL:=/bin/bash are not rules
+RULE = re.compile(r"^([^\s:#=][^:=]*?)\s*:(?!=)(.*)$")
+
+
+class Step(object):
+
+    # an srun invocation at the start of a command or after ;, &&, ||, | or (, as in
+    # "cd dir; srun ..." and the "check ... || (srun ...)" commands of sentinel mode
+    SRUN = re.compile(r"(^\s*|[;&|(]\s*)srun((?:\s+(?:--mincpus|-c|--cpus-per-task|--mem)\s+\S+|\s+--\S+=\S+)*)\s+")
+
+    def __init__(self, tgt, deps, skip=False):
+        self.tgt = tgt
+        self.deps = deps
+        self.skip = skip
+        self.cmds = []
+        self.status = "pending"
+        self.attempts = 0
+        self.returncode = 0
+        self.log_file = ""
+        self.elapsed = 0.0
+
+    @property
+    def name(self):
+        return os.path.basename(self.tgt)
+
+    @property
+    def log_name(self):
+        """
+        Log file name unique to the target, targets of different samples often share a base name.
+        The target path is kept readable and a hash of it makes sanitised paths distinct.
+        """
+        path = os.path.abspath(self.tgt)
+        rel_path = os.path.relpath(path)
+        if not rel_path.startswith(".."):
+            path = rel_path
+        digest = hashlib.md5(self.tgt.encode()).hexdigest()[:8]
+        return f"{re.sub(r'[^A-Za-z0-9._-]+', '_', path.strip('/'))}.{digest}.log"
+
+    def resources(self):
+        """
+        Returns the CPUs, memory in GB and BLAST database slots requested by the srun invocations of the rule.
+        """
+        cpus, memory, blastdb = 1, 0, 0
+        for m in (m for cmd in self.cmds for m in Step.SRUN.finditer(cmd)):
+            options = m.group(2)
+            c = re.search(r"(?:--mincpus|-c|--cpus-per-task)[\s=](\d+)", options)
+            if c is not None:
+                cpus = max(cpus, int(c.group(1)))
+            g = re.search(r"--mem[\s=](\d+)([KMGT]?)", options)
+            if g is not None:
+                scale = {"K": 1 / 1024**2, "M": 1 / 1024, "G": 1, "T": 1024, "": 1 / 1024}[g.group(2)]
+                memory = max(memory, int(g.group(1)) * scale)
+            if "BLASTDB=" in options:
+                blastdb = 1
+        return cpus, memory, blastdb
+
+    def is_up_to_date(self, resume):
+        if not os.path.exists(self.tgt):
+            return False
+        if resume:
+            return True
+        mtime = os.path.getmtime(self.tgt)
+        for dep in self.deps:
+            if os.path.exists(dep) and os.path.getmtime(dep) > mtime:
+                return False
+        return True
+
+
+class ResourcePools(object):
+    """
+    Token pools for CPUs, memory and BLAST database slots, requests larger than a pool are capped at its size.
+    """
+
+    def __init__(self, cpus, memory, blastdb_slots):
+        self.capacity = {"cpus": cpus, "memory": memory, "blastdb": blastdb_slots}
+        self.free = dict(self.capacity)
+        self.condition = asyncio.Condition()
+
+    def cap(self, request):
+        return {
+            pool: (min(amount, self.capacity[pool]) if self.capacity[pool] > 0 else 0)
+            for pool, amount in request.items()
+        }
+
+    async def acquire(self, request):
+        request = self.cap(request)
+        async with self.condition:
+            await self.condition.wait_for(lambda: all(self.free[pool] >= amount for pool, amount in request.items()))
+            for pool, amount in request.items():
+                self.free[pool] -= amount
+        return request
+
+    async def release(self, request):
+        async with self.condition:
+            for pool, amount in request.items():
+                self.free[pool] += amount
+            self.condition.notify_all()
+
+
+class LocalBackend(object):
+    """
+    Runs commands with bash on this machine, srun invocations are removed and their exports applied.
+    """
+
+    def prepare(self, cmd):
+        env = dict(os.environ)
+        for m in Step.SRUN.finditer(cmd):
+            e = re.search(r"--export=(\S+)", m.group(2))
+            if e is not None:
+                for assignment in e.group(1).split(","):
+                    if "=" in assignment:
+                        key, value = assignment.split("=", 1)
+                        env[key] = value
+        cmd = Step.SRUN.sub(lambda m: m.group(1), cmd)
+        return cmd, env
+
+
+class SlurmBackend(object):
+    """
+    Runs commands as written, srun invocations are dispatched to the given srun binary.
+    """
+
+    def __init__(self, srun):
+        self.srun = srun
+
+    def prepare(self, cmd):
+        cmd = Step.SRUN.sub(lambda m: f"{m.group(1)}{shlex.quote(self.srun)}{m.group(0)[len(m.group(1)) + 4:]}", cmd)
+        return cmd, dict(os.environ)
+
+
+class Executor(object):
+
+    def __init__(self, steps, pools, backend, log_dir, retries, retry_delay, resume):
+        self.steps = steps
+        self.by_tgt = {step.tgt: step for step in steps}
+        self.pools = pools
+        self.backend = backend
+        self.log_dir = log_dir
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.resume = resume
+        self.done = {}
+        self.start_time = time.time()
+
+    def progress(self, msg):
+        counts = {}
+        for step in self.steps:
+            counts[step.status] = counts.get(step.status, 0) + 1
+        finished = counts.get("done", 0) + counts.get("up_to_date", 0)
+        elapsed = time.time() - self.start_time
+        print(
+            f"[{elapsed:8.0f}s] {finished}/{len(self.steps)} done, {counts.get('running', 0)} running, "
+            f"{counts.get('failed', 0)} failed : {msg}",
+            flush=True,
+        )
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.done = {step.tgt: loop.create_future() for step in self.steps}
+        await asyncio.gather(*[self.run_step(step) for step in self.steps])
+        return all(step.status in ("done", "up_to_date") for step in self.steps)
+
+    async def run_step(self, step):
+        ok = True
+        for dep in step.deps:
+            if dep in self.done:
+                ok = await self.done[dep] and ok
+            elif not os.path.exists(dep):
+                print(f"{step.tgt} depends on {dep} which does not exist and has no rule")
+                ok = False
+
+        if not ok:
+            step.status = "dependency_failed"
+        elif all(self.by_tgt[dep].status == "up_to_date" for dep in step.deps if dep in self.by_tgt) and step.is_up_to_date(
+            self.resume
+        ):
+            step.status = "up_to_date"
+        else:
+            cpus, memory, blastdb = step.resources()
+            tokens = await self.pools.acquire({"cpus": cpus, "memory": memory, "blastdb": blastdb})
+            try:
+                await self.execute(step, tokens)
+            finally:
+                await self.pools.release(tokens)
+
+        self.done[step.tgt].set_result(step.status in ("done", "up_to_date"))
+
+    async def execute(self, step, tokens):
+        step.log_file = os.path.join(self.log_dir, step.log_name)
+        start = time.time()
+        while True:
+            step.attempts += 1
+            step.status = "running"
+            self.progress(f"started {step.name} ({tokens['cpus']} cpus) attempt {step.attempts}")
+            step.returncode = 0
+            with open(step.log_file, "a") as log:
+                for cmd in step.cmds:
+                    cmd, env = self.backend.prepare(cmd)
+                    log.write(f"$ {cmd}\n")
+                    log.flush()
+                    proc = await asyncio.create_subprocess_exec(
+                        "/bin/bash", "-c", cmd, stdout=log, stderr=log, env=env
+                    )
+                    step.returncode = await proc.wait()
+                    if step.returncode != 0:
+                        break
+            if step.returncode == 0:
+                step.status = "done"
+                step.elapsed = time.time() - start
+                self.progress(f"finished {step.name} in {step.elapsed:.0f}s")
+                return
+            #same as .DELETE_ON_ERROR
+            if os.path.exists(step.tgt):
+                os.remove(step.tgt)
+            step.status = "failed"
+            step.elapsed = time.time() - start
+            self.progress(f"{step.name} failed with exit code {step.returncode}, see {step.log_file}")
+            if step.attempts > self.retries:
+                return
+            await asyncio.sleep(self.retry_delay)
+
+    def print_summary(self):
+        failed = [step for step in self.steps if step.status == "failed"]
+        blocked = [step for step in self.steps if step.status == "dependency_failed"]
+        done = [step for step in self.steps if step.status == "done"]
+        up_to_date = [step for step in self.steps if step.status == "up_to_date"]
+        print(f"steps run            : {len(done)}")
+        print(f"steps up to date     : {len(up_to_date)}")
+        print(f"steps failed         : {len(failed)}")
+        print(f"steps not run        : {len(blocked)}")
+        for step in failed:
+            print(f"\nfailed: {step.tgt}")
+            print(f"\texit code {step.returncode} after {step.attempts} attempts, log {step.log_file}")
+            with open(step.log_file, "r") as f:
+                for line in f.readlines()[-5:]:
+                    print(f"\t{line.rstrip()}")
+        if len(blocked) != 0:
+            print("\nnot run because a dependency failed:")
+            for step in blocked:
+                print(f"\t{step.tgt}")
+
+
+if __name__ == "__main__":
+    main()  # type: ignore
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2025 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import gzip
+import click
+import numpy as np
+
+# 2 bit codes of bases, 4 for any other character
+BASE_CODES = np.full(256, 4, dtype=np.uint64)
+for i, base in enumerate("ACGT"):
+    BASE_CODES[ord(base)] = i
+    BASE_CODES[ord(base.lower())] = i
+
+# sequences are sketched in batches of about this many bases
+BATCH_SIZE = 1 << 22
+
+
+@click.group()
+def main():
+    """
+    Screens reads against a panel of references with FracMinHash sketches.
+
+    The canonical k-mers of each reference whose hash falls below 2^64/scaled form its sketch, a
+    fixed fraction of its k-mers.  The sketches of a panel are built once, reads of a sample are
+    sketched from a subsample with the same hash and the containment of each reference in the
+    sample, the fraction of its sketch seen in the reads, estimates how much of it is present.
+    References are ranked by a greedy cover of the sample sketch so that near identical
+    references are not all selected, and the selected references are written out as a FASTA
+    file for alignment.  Screening fails when no reference shares a hash with the reads.
+
+    e.g. screen_references.py sketch -o panel.sketch.npz NZ_CP043884.1.fasta NZ_CP043885.1.fasta
+         screen_references.py screen -x panel.sketch.npz -o 1_sample -f 1_sample.screened.fasta 1_sample_R1.fastq.gz 1_sample_R2.fastq.gz
+    """
+    pass
+
+
+@main.command("sketch")
+@click.argument("reference_fasta_files", nargs=-1, required=True)
+@click.option("-o", "--output_sketch_file", required=True, help="output sketch file (.npz)")
+@click.option("-k", "--kmer_size", default=21, show_default=True, type=click.IntRange(8, 31), help="k-mer size")
+@click.option("-s", "--scaled", default=100, show_default=True, help="1 in scaled k-mers are kept")
+@click.option("-g", "--group_by", default="record", type=click.Choice(["record", "file"]), show_default=True, help="a reference is a FASTA record or a FASTA file")
+def sketch(reference_fasta_files, output_sketch_file, kmer_size, scaled, group_by):
+    """
+    Sketches a panel of references, files may be given as name=path to name the reference of a file.
+    """
+    print("\t{0:<20} :   {1:<10}".format("output sketch file", output_sketch_file))
+    print("\t{0:<20} :   {1:<10}".format("kmer size", kmer_size))
+    print("\t{0:<20} :   {1:<10}".format("scaled", scaled))
+    print("\t{0:<20} :   {1:<10}".format("group by", group_by))
+
+    panel = Panel(kmer_size, scaled)
+    for reference in reference_fasta_files:
+        name, path = reference.split("=", 1) if "=" in reference else (os.path.basename(reference), reference)
+        path = os.path.abspath(path)
+        if group_by == "file":
+            seqs = [seq for id, seq in read_fasta(path)]
+            panel.add(name, path, "*", sum(len(seq) for seq in seqs), sketch_sequences(seqs, kmer_size, scaled))
+        else:
+            for id, seq in read_fasta(path):
+                panel.add(id, path, id, len(seq), sketch_sequences([seq], kmer_size, scaled))
+    panel.save(output_sketch_file)
+    panel.print()
+
+
+@main.command("screen")
+@click.argument("fastq_files", nargs=-1, required=True)
+@click.option("-x", "--sketch_file", required=True, help="panel sketch file")
+@click.option("-o", "--output_prefix", required=True, help="output prefix of <prefix>.screen.txt")
+@click.option("-f", "--selected_fasta_file", default="", help="FASTA file of the selected references")
+@click.option("-n", "--max_bases", default=200000000, show_default=True, help="bases of reads sketched, from the start of each FASTQ file in turn")
+@click.option("-t", "--top", default=5, show_default=True, help="maximum number of references selected")
+@click.option("-c", "--min_containment", default=0.1, show_default=True, help="minimum containment of a selected reference")
+def screen(fastq_files, sketch_file, output_prefix, selected_fasta_file, max_bases, top, min_containment):
+    """
+    Ranks the references of a panel by their containment in a subsample of reads.
+    """
+    print("\t{0:<20} :   {1:<10}".format("sketch file", sketch_file))
+    print("\t{0:<20} :   {1:<10}".format("output prefix", output_prefix))
+    print("\t{0:<20} :   {1:<10}".format("selected FASTA file", selected_fasta_file))
+    print("\t{0:<20} :   {1:<10}".format("max bases", max_bases))
+    print("\t{0:<20} :   {1:<10}".format("top", top))
+    print("\t{0:<20} :   {1:<10}".format("min containment", min_containment))
+
+    panel = Panel.load(sketch_file)
+    sample_hashes, sample_counts, no_bases = sketch_reads(fastq_files, panel.kmer_size, panel.scaled, max_bases)
+    print(f"sketched {no_bases} bases into {len(sample_hashes)} hashes")
+
+    results = panel.screen(sample_hashes, sample_counts)
+    selected = [r for r in results if r.rank > 0 and r.containment >= min_containment][:top]
+    if len(selected) == 0 and len(results) > 0 and results[0].rank > 0:
+        print(f"no reference with containment of at least {min_containment}, selecting the best ranked")
+        selected = results[:1]
+    for r in selected:
+        r.selected = True
+
+    with open(f"{output_prefix}.screen.txt", "w") as out:
+        out.write("#rank\treference\tlength\tsketch\tshared\tcontainment\tunique_containment\tani\tmedian_abundance\tselected\n")
+        for r in results:
+            out.write(
+                f"{r.rank if r.rank > 0 else '.'}\t{r.name}\t{r.length}\t{r.size}\t{r.shared}\t{r.containment:.4f}\t"
+                f"{r.unique_containment:.4f}\t{r.ani:.4f}\t{r.abundance:g}\t{int(r.selected)}\n"
+            )
+    for r in selected:
+        print(f"selected {r.name}: containment {r.containment:.4f}, ani {r.ani:.4f}, abundance {r.abundance:g}")
+
+    if len(selected) == 0:
+        # a sample sharing no hashes with the panel is not aligned to an arbitrary reference
+        print("no reference detected")
+        if selected_fasta_file != "" and os.path.exists(selected_fasta_file):
+            os.remove(selected_fasta_file)
+        exit(1)
+
+    if selected_fasta_file != "":
+        write_references(selected_fasta_file, selected)
+
+
+class Panel(object):
+    """
+    Sketches of a reference panel, hashes of all references are held in one array with offsets.
+    """
+    def __init__(self, kmer_size, scaled):
+        self.kmer_size = kmer_size
+        self.scaled = scaled
+        self.names = []
+        self.paths = []
+        self.records = []
+        self.lengths = []
+        self.sketches = []
+
+    def add(self, name, path, record, length, hashes):
+        self.names.append(name)
+        self.paths.append(path)
+        self.records.append(record)
+        self.lengths.append(length)
+        self.sketches.append(hashes)
+
+    def save(self, sketch_file):
+        offsets = np.cumsum([0] + [len(h) for h in self.sketches])
+        # write through a file object so that the name is kept as given
+        with open(sketch_file, "wb") as file:
+            np.savez_compressed(
+                file,
+                kmer_size=self.kmer_size,
+                scaled=self.scaled,
+                names=np.array(self.names),
+                paths=np.array(self.paths),
+                records=np.array(self.records),
+                lengths=np.array(self.lengths, dtype=np.int64),
+                offsets=offsets,
+                hashes=np.concatenate(self.sketches) if len(self.sketches) > 0 else np.zeros(0, dtype=np.uint64),
+            )
+
+    @classmethod
+    def load(cls, sketch_file):
+        data = np.load(sketch_file)
+        panel = cls(int(data["kmer_size"]), int(data["scaled"]))
+        offsets = data["offsets"]
+        hashes = data["hashes"]
+        for i, name in enumerate(data["names"]):
+            panel.add(str(name), str(data["paths"][i]), str(data["records"][i]), int(data["lengths"][i]), hashes[offsets[i]:offsets[i + 1]])
+        return panel
+
+    def screen(self, sample_hashes, sample_counts):
+        """
+        Returns the references ordered by a greedy cover of the sample sketch, each step takes the
+        reference sharing the most hashes not yet covered, then the references left uncovered by
+        containment.
+        """
+        results = []
+        shared_masks = []
+        for i, hashes in enumerate(self.sketches):
+            shared = np.isin(hashes, sample_hashes, assume_unique=True)
+            counts = sample_counts[np.searchsorted(sample_hashes, hashes[shared])] if shared.any() else np.zeros(0)
+            results.append(ScreenResult(self.names[i], self.paths[i], self.records[i], self.lengths[i], len(hashes), int(shared.sum()), counts, self.kmer_size))
+            shared_masks.append(hashes[shared])
+
+        covered = np.zeros(0, dtype=np.uint64)
+        remaining = set(range(len(results)))
+        rank = 0
+        while len(remaining) > 0:
+            unique = {i: int((~np.isin(shared_masks[i], covered, assume_unique=True)).sum()) for i in remaining}
+            best = max(remaining, key=lambda i: (unique[i], results[i].containment))
+            if unique[best] == 0:
+                break
+            rank += 1
+            results[best].rank = rank
+            results[best].unique_containment = unique[best] / max(results[best].size, 1)
+            covered = np.union1d(covered, shared_masks[best])
+            remaining.remove(best)
+        return sorted(results, key=lambda r: (r.rank == 0, r.rank, -r.containment))
+
+    def print(self):
+        print(f"references : {len(self.names)}")
+        print(f"hashes     : {sum(len(h) for h in self.sketches)}")
+
+
+class ScreenResult(object):
+    def __init__(self, name, path, record, length, size, shared, counts, kmer_size):
+        self.name = name
+        self.path = path
+        self.record = record
+        self.length = length
+        self.size = size
+        self.shared = shared
+        self.containment = shared / size if size > 0 else 0.0
+        self.unique_containment = 0.0
+        # containment of k-mers estimates identity as the probability that k bases all match
+        self.ani = self.containment ** (1 / kmer_size) if self.containment > 0 else 0.0
+        self.abundance = float(np.median(counts)) if len(counts) > 0 else 0.0
+        self.rank = 0
+        self.selected = False
+
+    def print(self):
+        print(f"name        : {self.name}")
+        print(f"containment : {self.containment}")
+        print(f"abundance   : {self.abundance}")
+        print(f"rank        : {self.rank}")
+
+
+def sketch_sequences(seqs, kmer_size, scaled):
+    """
+    Returns the sorted unique sketch hashes of sequences.
+    """
+    hashes = [batch_hashes(batch, kmer_size, scaled) for batch in batches(seqs)]
+    return np.unique(np.concatenate(hashes)) if len(hashes) > 0 else np.zeros(0, dtype=np.uint64)
+
+
+def sketch_reads(fastq_files, kmer_size, scaled, max_bases):
+    """
+    Sketches reads from the start of each FASTQ file until max_bases are read over all files,
+    returns the sorted unique hashes, their counts and the number of bases read.
+    """
+    per_file = max_bases // len(fastq_files)
+    hashes = []
+    no_bases = 0
+    for fastq_file in fastq_files:
+        for batch in batches(read_fastq_sequences(fastq_file, per_file)):
+            no_bases += len(batch) - batch.count("N")
+            hashes.append(batch_hashes(batch, kmer_size, scaled))
+    if len(hashes) == 0:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64), 0
+    sample_hashes, sample_counts = np.unique(np.concatenate(hashes), return_counts=True)
+    return sample_hashes, sample_counts, no_bases
+
+
+def batches(seqs):
+    """
+    Joins sequences into batches separated by N so that no k-mer spans two sequences.
+    """
+    batch = []
+    size = 0
+    for seq in seqs:
+        batch.append(seq)
+        size += len(seq) + 1
+        if size >= BATCH_SIZE:
+            yield "N".join(batch)
+            batch = []
+            size = 0
+    if len(batch) > 0:
+        yield "N".join(batch)
+
+
+def batch_hashes(seq, kmer_size, scaled):
+    """
+    Returns the hashes below 2^64/scaled of the canonical k-mers of a sequence, k-mers with
+    bases other than ACGT are skipped.
+    """
+    n = len(seq) - kmer_size + 1
+    if n <= 0:
+        return np.zeros(0, dtype=np.uint64)
+    codes = BASE_CODES[np.frombuffer(seq.encode(), dtype=np.uint8)]
+    invalid = np.concatenate(([0], np.cumsum(codes > 3)))
+    valid = invalid[kmer_size:] - invalid[:n] == 0
+    codes = np.minimum(codes, 3)
+    forward = np.zeros(n, dtype=np.uint64)
+    reverse = np.zeros(n, dtype=np.uint64)
+    for j in range(kmer_size):
+        window = codes[j:j + n]
+        forward = (forward << np.uint64(2)) | window
+        reverse |= (np.uint64(3) - window) << np.uint64(2 * j)
+    hashes = mix64(np.minimum(forward, reverse)[valid])
+    return hashes[hashes <= np.uint64((2 ** 64 - 1) // scaled)]
+
+
+def mix64(x):
+    """
+    splitmix64 finaliser, a bijection of 64 bit integers with well mixed bits.
+    """
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def open_file(file_name):
+    if file_name.endswith(".gz"):
+        return gzip.open(file_name, "rt")
+    return open(file_name, "r")
+
+
+def read_fasta(fasta_file):
+    """
+    Yields the id and sequence of each record of a FASTA file.
+    """
+    with open_file(fasta_file) as file:
+        id = None
+        seqs = []
+        for line in file:
+            if line.startswith(">"):
+                if id is not None:
+                    yield id, "".join(seqs)
+                id = line[1:].split()[0] if len(line) > 2 else ""
+                seqs = []
+            else:
+                seqs.append(line.strip())
+        if id is not None:
+            yield id, "".join(seqs)
+
+
+def read_fastq_sequences(fastq_file, max_bases):
+    """
+    Yields read sequences from the start of a FASTQ file until max_bases are read.
+    """
+    no_bases = 0
+    with open_file(fastq_file) as file:
+        for i, line in enumerate(file):
+            if i % 4 == 1:
+                seq = line.rstrip()
+                yield seq
+                no_bases += len(seq)
+                if no_bases >= max_bases:
+                    return
+
+
+def write_references(fasta_file, selected):
+    """
+    Writes the sequences of the selected references, records are read from their FASTA files.
+    """
+    wanted = {}
+    for r in selected:
+        wanted.setdefault(r.path, set()).add(r.record)
+    with open(fasta_file, "w") as out:
+        for path, records in wanted.items():
+            with open_file(path) as file:
+                keep = False
+                for line in file:
+                    if line.startswith(">"):
+                        keep = "*" in records or line[1:].split()[0] in records
+                    if keep:
+                        out.write(line)
+
+
+if __name__ == "__main__":
+    main()  # type: ignore
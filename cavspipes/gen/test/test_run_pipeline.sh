@@ -0,0 +1,65 @@
+#!/bin/bash
+
+# Runs run_pipeline.py on a sentinel mode make file in a temporary directory and
+# checks that srun invocations after || and ; are scheduled with their CPUs and
+# removed by the local backend, and that "tgt:" rules are read as well as "tgt : ".
+#
+# e.g. test/test_run_pipeline.sh
+
+set -u
+test_dir=$(cd "$(dirname "$0")" && pwd)
+run_pipeline="$test_dir/../run_pipeline.py"
+tmp_dir=$(mktemp -d)
+trap 'rm -rf "$tmp_dir"' EXIT
+cd "$tmp_dir"
+
+# stands in for pipeline_sentinel.py, check fails so that every step runs
+cat > sentinel <<'SENTINEL'
+#!/bin/bash
+if [ "$1" == "check" ]; then exit 1; fi
+touch "$2"
+SENTINEL
+chmod +x sentinel
+mkdir -p work
+
+cat > test.mk <<'MAKEFILE'
+SHELL:=/bin/bash
+.DELETE_ON_ERROR:
+
+all : a.OK b.OK c.OK
+
+a.OK : 
+	./sentinel check a.OK  -c 1 || (srun --mincpus 4 echo a > a.txt)
+	./sentinel record a.OK  -c 1
+
+b.OK: a.OK
+	cd work; srun --mincpus 2 echo b > b.txt
+	touch b.OK
+
+c.OK : b.OK
+	./sentinel check c.OK b.OK -c 1 || (cat a.txt work/b.txt > c.txt)
+	./sentinel record c.OK b.OK -c 1
+
+MAKEFILE
+
+failures=0
+
+check() {
+    if ! eval "$2"; then
+        echo "FAILED: $1"
+        failures=$((failures + 1))
+    fi
+}
+
+python3 "$run_pipeline" -c 8 -x 0 test.mk > run.log 2>&1
+check "pipeline succeeds" "[ $? -eq 0 ]"
+check "tgt: rule is read" "grep -q 'started b.OK' run.log"
+check "srun after || is scheduled with its CPUs" "grep -q 'started a.OK (4 cpus)' run.log"
+check "srun after ; is scheduled with its CPUs" "grep -q 'started b.OK (2 cpus)' run.log"
+check "srun is removed by the local backend" "[ \"\$(cat c.txt)\" == \"\$(printf 'a\nb')\" ]"
+check "all targets are made" "[ -f a.OK -a -f b.OK -a -f c.OK ]"
+
+if [ $failures -eq 0 ]; then
+    echo "all tests passed"
+fi
+exit $failures
@@ -22,6 +22,8 @@ import sys
 import os
 import click
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from shutil import copy2
 
 @click.command()
@@ -84,6 +86,7 @@ from shutil import copy2
     default="",
     help="Illumina read 2 fastq files",
 )
+@click.option("-t", "--threads", default=4, show_default=True, help="number of threads shared by concurrent steps")
 def main(
     input_ont_fastq_files,
     input_ilm_read1_fastq_files,
@@ -93,6 +96,7 @@ def main(
     sample_id,
     output_dir,
     reference_fasta_file,
+    threads,
 ):
     """
     Aligns all fastq files to a reference sequence file and generates a consensus sequence.
@@ -110,6 +114,7 @@ def main(
     print("\t{0:<20} :   {1:<10}".format("output directory", output_dir))
     print("\t{0:<20} :   {1:<10}".format("reference fasta file", reference_fasta_file))
     print("\t{0:<20} :   {1}".format("in situ ref db", in_situ_ref))
+    print("\t{0:<20} :   {1}".format("threads", threads))
     if illumina:
         print("\tIllumina reads")
         print("\t{0:<20} :   {1:<10}".format("fastq1", input_ilm_read1_fastq_files))
@@ -123,7 +128,7 @@ def main(
     version = "1.1.1"
 
     # initialize
-    mpm = MiniPipeManager(f"{output_dir}/align_and_consense.log")
+    mpm = MiniPipeManager(f"{output_dir}/align_and_consense.log", threads)
 
     # programs
     minimap2 = "/usr/local/minimap2-2.24/minimap2"
@@ -173,12 +178,12 @@ def main(
             cmd = f"zcat {' '.join(read1_files)} | gzip > {output_read1_fastq_file}"
             tgt = f"{output_read1_fastq_file}.OK"
             desc = f"Combining read 1 fastq files"
-            mpm.run(cmd, tgt, desc)
+            mpm.add(cmd, tgt, desc)
         else:
             cmd = f"cp {read1_files[0]} {fastq_dir}/ilm.r1.fastq.gz"
             tgt = f"{output_read1_fastq_file}.OK"
             desc = f"Copying read 1 fastq file"
-            mpm.run(cmd, tgt, desc)
+            mpm.add(cmd, tgt, desc)
 
         read2_files = input_ilm_read2_fastq_files.split(",")
         output_read2_fastq_file = os.path.join(fastq_dir, "ilm.r2.fastq.gz")
@@ -187,19 +192,19 @@ def main(
             cmd = f"zcat {' '.join(read2_files)} | gzip > {output_read2_fastq_file}"
             tgt = f"{output_read2_fastq_file}.OK"
             desc = f"Combining read 2 fastq files"
-            mpm.run(cmd, tgt, desc)
+            mpm.add(cmd, tgt, desc)
         else:
             cmd = f"cp {read2_files[0]} {fastq_dir}/ilm.r2.fastq.gz"
             tgt = f"{output_read2_fastq_file}.OK"
             desc = f"Copying read 2 fastq file"
-            mpm.run(cmd, tgt, desc)
+            mpm.add(cmd, tgt, desc)
 
         #  construct reference
         log = os.path.join(ref_dir, f"{reference_fasta_file}.bwa_index.log")
         cmd = f"{bwa} index -a bwtsw {reference_fasta_file} 2> {log}"
         tgt = f"{reference_fasta_file}.bwa_index.OK"
         desc = f"Construct bwa reference"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc)
 
         #  align
         output_bam_file = os.path.join(bam_dir, "ilm.bam")
@@ -207,14 +212,14 @@ def main(
         cmd = f"{bwa} mem -t 2 -M {reference_fasta_file} {output_read1_fastq_file} {output_read2_fastq_file} 2> {log}| {samtools} view -hF4 | {samtools} sort -o {output_bam_file}"
         tgt = f"{output_bam_file}.OK"
         desc = f"Align to reference with bwa mem"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{output_read1_fastq_file}.OK", f"{output_read2_fastq_file}.OK", f"{reference_fasta_file}.bwa_index.OK"], 2)
 
         #  index
         input_bam_file = os.path.join(bam_dir, "ilm.bam")
         cmd = f"{samtools} index {input_bam_file}"
         tgt = f"{input_bam_file}.bai.OK"
         desc = f"Index bam file"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{output_bam_file}.OK"])
 
         #  coverage
         input_bam_file = os.path.join(bam_dir, "ilm.bam")
@@ -222,7 +227,7 @@ def main(
         cmd = f"{samtools} coverage {input_bam_file} > {output_stats_file}"
         tgt = f"{output_stats_file}.OK"
         desc = f"Illumina coverage statistics"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{input_bam_file}.bai.OK"])
 
         #  consensus
         input_bam_file = os.path.join(bam_dir, "ilm.bam")
@@ -230,7 +235,7 @@ def main(
         cmd = f"{samtools} consensus {input_bam_file} > {output_fasta_file}"
         tgt = f"{output_fasta_file}.OK"
         desc = f"Illumina consensus"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{input_bam_file}.bai.OK"])
 
     # process nanopore reads
     if nanopore:
@@ -243,19 +248,19 @@ def main(
             cmd = f"zcat {' '.join(fastq_files)} | gzip > {output_fastq_file}"
             tgt = f"{output_fastq_file}.OK"
             desc = f"Combining nanopore fastq files"
-            mpm.run(cmd, tgt, desc)
+            mpm.add(cmd, tgt, desc)
         else:
             cmd = f"cp {fastq_files[0]} {fastq_dir}/ont.fastq.gz"
             tgt = f"{output_fastq_file}.OK"
             desc = f"Copying nanopore fastq file"
-            mpm.run(cmd, tgt, desc)
+            mpm.add(cmd, tgt, desc)
 
         #  construct reference
         log = os.path.join(ref_dir, f"{reference_fasta_file}.minimap2_index.log")
         cmd = f"{minimap2} -d {reference_fasta_file}.mmi {reference_fasta_file} 2> {log}"
         tgt = f"{reference_fasta_file}.minimap2_index.OK"
         desc = f"Construct minimap2 reference"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc)
 
         #  align
         minimap2_ref_mmi_file = f"{reference_fasta_file}.mmi"
@@ -265,14 +270,14 @@ def main(
         cmd = f"{minimap2} -ax map-ont {minimap2_ref_mmi_file} {input_fastq_file} 2> {minimap2_log_file}  | {samtools} view -hF4 | {samtools} sort -o {output_bam_file}"
         tgt = f"{output_bam_file}.OK"
         desc = f"Align to reference with minimap2"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{output_fastq_file}.OK", f"{reference_fasta_file}.minimap2_index.OK"])
 
         #  index
         input_bam_file = os.path.join(bam_dir, "ont.bam")
         cmd = f"{samtools} index {input_bam_file}"
         tgt = f"{input_bam_file}.bai.OK"
         desc = f"Index bam file"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{output_bam_file}.OK"])
 
         #  coverage
         input_bam_file = os.path.join(bam_dir, "ont.bam")
@@ -280,7 +285,7 @@ def main(
         cmd = f"{samtools} coverage {input_bam_file} > {output_stats_file}"
         tgt = f"{output_stats_file}.OK"
         desc = f"Nanopore coverage statistics"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{input_bam_file}.bai.OK"])
 
         #  consensus
         input_bam_file = os.path.join(bam_dir, "ont.bam")
@@ -289,7 +294,7 @@ def main(
         cmd = f"{medaka} consensus {input_bam_file} {output_hdf_file} --model {ont_model} 2> {log}"
         tgt = f"{output_hdf_file}.OK"
         desc = f"Oxford Nanopore consensus contigs"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{input_bam_file}.bai.OK"])
 
         #  stitch
         input_hdf_file = os.path.join(bam_dir, "ont.hdf")
@@ -298,7 +303,7 @@ def main(
         cmd = f"{medaka} stitch --fill_char N {input_hdf_file} {reference_fasta_file} {output_fasta_file} 2> {log}"
         tgt = f"{output_fasta_file}.OK"
         desc = f"Oxford Nanopore consensus assembly/scaffold"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{input_hdf_file}.OK"])
 
     # combine illumina and nanopore reads
     if illumina and nanopore:
@@ -313,14 +318,14 @@ def main(
         )
         tgt = f"{output_bam_file}.OK"
         desc = f"Merge Illumina and Nanopore alignments"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{input_bam_file1}.bai.OK", f"{input_bam_file2}.bai.OK"])
 
         # index bam
         input_bam_file = os.path.join(bam_dir, "ilm_ont.bam")
         cmd = f"{samtools} index {input_bam_file}"
         tgt = f"{output_bam_file}.bai.OK"
         desc = f"Index merged alignments"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{output_bam_file}.OK"])
 
         # coverage
         input_bam_file = os.path.join(bam_dir, "ilm_ont.bam")
@@ -328,7 +333,7 @@ def main(
         cmd = f"{samtools} coverage {input_bam_file} > {output_stats_file}"
         tgt = f"{output_stats_file}.OK"
         desc = f"Compute coverage of merged alignments"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{input_bam_file}.bai.OK"])
 
         # consensus
         input_bam_file = os.path.join(bam_dir, "ilm_ont.bam")
@@ -336,7 +341,7 @@ def main(
         cmd = f"{samtools} consensus {input_bam_file} > {output_fasta_file}"
         tgt = f"{output_fasta_file}.OK"
         desc = f"Illumina and Nanopore consensus"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{input_bam_file}.bai.OK"])
 
     # copy out consensus
     input_fasta_file = ""
@@ -351,7 +356,10 @@ def main(
     cmd = f"{seqkit} replace  -p '^.+$' -r {sample_id} {input_fasta_file} -o {output_fasta_file}"
     tgt = f"{output_fasta_file}.OK"
     desc = f"Final consensus"
-    mpm.run(cmd, tgt, desc)
+    mpm.add(cmd, tgt, desc, [f"{input_fasta_file}.OK"])
+
+    # run steps, the Illumina and Nanopore branches proceed concurrently
+    mpm.execute()
 
     # write log file
     mpm.print_log()
@@ -362,28 +370,77 @@ def main(
     subprocess.run(f'echo {" ".join(sys.argv)} > {trace_dir}/cmd.txt', shell=True, check=True)
 
 class MiniPipeManager(object):
-    def __init__(self, log_file):
+    def __init__(self, log_file, threads=1):
         self.log_file = log_file
         self.log_msg = []
+        self.threads = threads
+        self.steps = []
+        self.lock = threading.Lock()
 
     def run(self, cmd, tgt, desc):
+        if not self.run_step(cmd, tgt, desc):
+            exit(1)
+
+    def add(self, cmd, tgt, desc, deps=[], cpu=1):
+        """
+        Queues a step that is run by execute once the targets it depends on are done.
+        """
+        self.steps.append((cmd, tgt, desc, deps, min(cpu, self.threads)))
+
+    def execute(self):
+        """
+        Runs the queued steps concurrently, each as soon as the steps it depends on
+        are done and enough threads are free.  No new steps are started once a step fails.
+        """
+        pending = self.steps
+        self.steps = []
+        queued = {step[1] for step in pending}
+        done = set()
+        running = {}
+        free = self.threads
+        failed = False
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            while True:
+                if not failed:
+                    for step in list(pending):
+                        cmd, tgt, desc, deps, cpu = step
+                        if cpu <= free and all(dep in done for dep in deps if dep in queued):
+                            pending.remove(step)
+                            free -= cpu
+                            running[executor.submit(self.run_step, cmd, tgt, desc)] = step
+                if len(running) == 0:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    cmd, tgt, desc, deps, cpu = running.pop(future)
+                    free += cpu
+                    if future.result():
+                        done.add(tgt)
+                    else:
+                        failed = True
+        if failed or len(pending) != 0:
+            exit(1)
+
+    def run_step(self, cmd, tgt, desc):
         try:
             if os.path.exists(tgt):
                 self.log(f"{desc} -  already executed")
                 self.log(cmd)
-                return
+                return True
             else:
                 self.log(f"{desc}")
                 self.log(cmd)
                 subprocess.run(cmd, shell=True, check=True)
                 subprocess.run(f"touch {tgt}", shell=True, check=True)
+                return True
         except subprocess.CalledProcessError as e:
-            self.log(f" - failed")
-            exit(1)
+            self.log(f"{desc} - failed")
+            return False
 
     def log(self, msg):
-        print(msg)
-        self.log_msg.append(msg)
+        with self.lock:
+            print(msg, flush=True)
+            self.log_msg.append(msg)
 
     def print_log(self):
         self.log(f"\nlogs written to {self.log_file}")
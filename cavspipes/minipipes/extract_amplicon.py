@@ -26,6 +26,9 @@ import re
 from shutil import copy2
 
 
+# IUPAC complement in a single translate instead of chained replaces
+COMPLEMENT = str.maketrans("ACGTMRWSYKVHDBN", "TGCAKYWSRMBDHVN")
+
 @click.command()
 @click.option(
     "-o",
@@ -207,26 +210,7 @@ def main(output_dir, primer_fasta_file, reference_fasta_file):
     mpm.print_log()
 
 def reverse_complement(seq):
-    return (
-        seq[::-1]
-        .upper()
-        .replace("A", "t")
-        .replace("T", "a")
-        .replace("G", "c")
-        .replace("C", "g")
-        .replace("M", "k")
-        .replace("R", "y")
-        .replace("W", "w")
-        .replace("S", "s")
-        .replace("Y", "r")
-        .replace("K", "m")
-        .replace("V", "b")
-        .replace("H", "d")
-        .replace("D", "h")
-        .replace("B", "v")
-        .replace("N", "n")
-        .upper()
-    )
+    return seq.upper().translate(COMPLEMENT)[::-1]
 
 # Aligned_sequences: 2
 # 1: primer2_reverse
@@ -20,6 +20,7 @@
 
 import os
 import click
+import hashlib
 import re
 import sys
 from shutil import copy2
@@ -53,6 +54,11 @@ from datetime import datetime
 #dna_r10.4.1_e8.2_400bps_sup@v5.0.0
 @click.option("-y", "--basecall_model", default="dna_r10.4.1_e8.2_400bps_hac@v5.0.0", show_default=True)
 @click.option("-s", "--sample_file", required=True, help="sample file")
+@click.option(
+    "--sentinel",
+    is_flag=True,
+    help="record content hashes in .OK files and skip steps whose command and inputs are unchanged",
+)
 def main(
     make_file,
     run_id,
@@ -64,10 +70,14 @@ def main(
     kit,
     basecall_model,
     sample_file,
+    sentinel,
 ):
     """
     Moves ONT fastq files to a destination and performs QC
 
+    Samples with virus "auto" are screened against sketches of all virus genomes and aligned
+    to the viruses found, samples with no virus found are not aligned.
+
     e.g. generate_var_ont_deploy_and_qc_pipeline -r ont44 -i raw -s ont44.sa
     """
     log_dir = f"{working_dir}/log"
@@ -81,6 +91,7 @@ def main(
     print("\t{0:<20} :   {1:<10}".format("run_dir", run_id))
     print("\t{0:<20} :   {1:<10}".format("nanopore_dir", nanopore_dir))
     print("\t{0:<20} :   {1:<10}".format("working_dir", working_dir))
+    print("\t{0:<20} :   {1:<10}".format("sentinel", sentinel))
     print("\t{0:<20} :   {1:<10}".format("minumum qscore", qscore))
     print("\t{0:<20} :   {1:<10}".format("minumum length", len))
     print("\t{0:<20} :   {1:<10}".format("memory", memory))
@@ -123,6 +134,7 @@ def main(
     minimap2 = "/usr/local/minimap2-2.24/minimap2"
     samtools = "/usr/local/samtools-1.17/bin/samtools"
     plot_bamstats = "/usr/local/samtools-1.17/bin/plot-bamstats"
+    screen_references = "/usr/local/cavspipes-1.2.1/screen_references.py"
 
     virus_genomes = {
         "ASFV":"/db/ref/FR682468.2.fasta",
@@ -187,7 +199,18 @@ def main(
         print(f"{error.filename} cannot be created")
 
     # initialize
-    pg = PipelineGenerator(make_file)
+    pipeline_sentinel = "/usr/local/cavspipes-1.2.1/pipeline_sentinel.py"
+    pg = PipelineGenerator(make_file, pipeline_sentinel if sentinel else "", working_dir)
+
+    # sketch virus genomes once for the samples to be screened, k-mers are shortened for ONT errors
+    virus_sketch_file = f"{aux_dir}/virus_genomes.sketch.npz"
+    if any(sample.virus == "auto" for sample in run.samples):
+        virus_fasta_files = " ".join(f"{virus}={fasta_file}" for virus, fasta_file in virus_genomes.items())
+        log = f"{log_dir}/virus_genomes.sketch.log"
+        dep = ""
+        tgt = f"{log_dir}/virus_genomes.sketch.OK"
+        cmd = f"{screen_references} sketch -g file -k 19 -s 50 -o {virus_sketch_file} {virus_fasta_files} > {log}"
+        pg.add(tgt, dep, cmd)
 
     # base call
     # dorado duplex dna_r10.4.1_e8.2_400bps_sup@v4.2.0  pod5s/ > calls.bam
@@ -293,15 +316,26 @@ def main(
             # align to reference genome
             ###########################
             align_dir = f"{analysis_dir}/{sample.idx}_{sample.id}/align_result"
-            ref_fasta_file_base_name = os.path.basename(virus_genomes[sample.virus])
-            reference_fasta_file = virus_genomes[sample.virus]
-
-            #copy reference
-            dep = ""
-            src_fasta_file = f"{virus_genomes[sample.virus]}"
-            tgt = f"{log_dir}/{sample.idx}_{sample.id}.align.ref.OK"
-            cmd = f"cp {src_fasta_file} {align_dir}"
-            pg.add(tgt, dep, cmd)
+            input_fastq_file = f"{dest_dir}/{run.idx}_{sample.idx}_{sample.id}.fastq.gz"
+
+            if sample.virus == "auto":
+                #screen reads against virus genomes, fails and so stops alignment when no virus is found
+                ref_fasta_file_base_name = "screened_reference.fasta"
+                output_prefix = f"{align_dir}/{sample.idx}_{sample.id}"
+                log = f"{log_dir}/{sample.idx}_{sample.id}.align.ref.screen.log"
+                dep = f"{log_dir}/virus_genomes.sketch.OK {log_dir}/{run.idx}_{sample.idx}_{sample.id}.fastq.gz.OK"
+                tgt = f"{log_dir}/{sample.idx}_{sample.id}.align.ref.OK"
+                cmd = f"{screen_references} screen -x {virus_sketch_file} -t 3 -c 0.1 -o {output_prefix} -f {align_dir}/{ref_fasta_file_base_name} {input_fastq_file} > {log}"
+                pg.add(tgt, dep, cmd)
+            else:
+                ref_fasta_file_base_name = os.path.basename(virus_genomes[sample.virus])
+
+                #copy reference
+                dep = ""
+                src_fasta_file = f"{virus_genomes[sample.virus]}"
+                tgt = f"{log_dir}/{sample.idx}_{sample.id}.align.ref.OK"
+                cmd = f"cp {src_fasta_file} {align_dir}"
+                pg.add(tgt, dep, cmd)
 
             # construct reference
             reference_fasta_file = f"{align_dir}/{ref_fasta_file_base_name}"
@@ -312,7 +346,6 @@ def main(
             pg.add(tgt, dep, cmd)
 
             # align
-            input_fastq_file = f"{dest_dir}/{run.idx}_{sample.idx}_{sample.id}.fastq.gz"
             output_bam_file = f"{align_dir}/{sample.idx}_{sample.id}.bam"
             log = f"{log_dir}/{sample.idx}_{sample.id}.align.log"
             sort_log = f"{log_dir}/{sample.idx}_{sample.id}.align.sort.log"
@@ -440,8 +473,10 @@ def main(
     copy2(sample_file, trace_dir)
 
 class PipelineGenerator(object):
-    def __init__(self, make_file):
+    def __init__(self, make_file, sentinel="", root=""):
         self.make_file = make_file
+        self.sentinel = sentinel
+        self.root = root
         self.tgts = []
         self.deps = []
         self.cmds = []
@@ -471,8 +506,15 @@ class PipelineGenerator(object):
 
             for i in range(len(self.tgts)):
                 f.write(f"{self.tgts[i]} : {self.deps[i]}\n")
-                f.write(f"\t{self.cmds[i]}\n")
-                f.write(f"\ttouch {self.tgts[i]}\n\n")
+                if self.sentinel == "":
+                    f.write(f"\t{self.cmds[i]}\n")
+                    f.write(f"\ttouch {self.tgts[i]}\n\n")
+                else:
+                    #skip the command when it and the contents of its inputs are unchanged
+                    command_hash = hashlib.sha256(self.cmds[i].replace(self.root, "").encode()).hexdigest()
+                    sentinel = f"{self.sentinel} {{0}} {self.tgts[i]} {self.deps[i]} -r {self.root} -c {command_hash}"
+                    f.write(f"\t{sentinel.format('check')} || ({self.cmds[i]})\n")
+                    f.write(f"\t{sentinel.format('record')}\n\n")
 
             if self.clean_cmd != "":
                 f.write(f"clean : \n")
@@ -20,15 +20,17 @@
 
 import os
 import click
-from shutil import copy2, which
 import openpyxl
 from openpyxl.workbook.views import BookView
-from openpyxl.worksheet.table import Table, TableStyleInfo
-from openpyxl import load_workbook
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+from openpyxl.utils import get_column_letter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import heapq
-import subprocess
 import re
+import warnings
 from pathlib import Path
+from seqio import read_fastx
 
 @click.command()
 @click.option(
@@ -52,7 +54,14 @@ from pathlib import Path
     default="",
     help="suffix for identification result directory",
 )
-def main(input_dir, sample_file, output_xlsx, suffix):
+@click.option(
+    "-t",
+    "--threads",
+    default=os.cpu_count(),
+    show_default=True,
+    help="number of processes for parsing sample results",
+)
+def main(input_dir, sample_file, output_xlsx, suffix, threads):
     """
     Aggregate results from identification of barcodes.
 
@@ -82,12 +91,28 @@ def main(input_dir, sample_file, output_xlsx, suffix):
                         Sample(index, sample_id, barcode, int(min_len), int(max_len))
                               )
 
-    no_samples = len(samples)
+    # aggregate files
+    summary_sheet = Sheet("summary")
+    histogram_sheet = Sheet("read_lengths")
+    with ProcessPoolExecutor(max_workers=threads) as executor:
+        for sample_id, rows, histogram_rows in executor.map(partial(parse_sample, input_dir, suffix), samples):
+            # sample line, table of contigs and a blank line
+            sample_row = len(summary_sheet.rows) + 1
+            for row in rows:
+                summary_sheet.add(row)
+            summary_sheet.add_table(sample_id, f"A{sample_row+1}:K{sample_row+len(rows)-1}", rows[1])
+            summary_sheet.add([])
+
+            # read length histogram from the prefilter, if the run was prefiltered
+            if len(histogram_rows) > 2:
+                sample_row = len(histogram_sheet.rows) + 1
+                for row in histogram_rows:
+                    histogram_sheet.add(row)
+                histogram_sheet.add_table(f"{sample_id}_lengths", f"A{sample_row+1}:E{sample_row+len(histogram_rows)-1}", histogram_rows[1])
+                histogram_sheet.add([])
 
     # write out xlsx
-    wb = openpyxl.Workbook()
-    del wb["Sheet"]
-    summary_ws = wb.create_sheet("summary")
+    wb = openpyxl.Workbook(write_only=True)
 
     #set opening window size
     view = [BookView(xWindow=8000, yWindow=4000, windowWidth=25000, windowHeight=20000)]
@@ -96,78 +121,112 @@ def main(input_dir, sample_file, output_xlsx, suffix):
     #table settings
     style = TableStyleInfo(name="TableStyleLight11", showFirstColumn=False,
                         showLastColumn=False, showRowStripes=True, showColumnStripes=True)
-    summary_ws.sheet_view.zoomScale = 200
 
-    # aggregate files
-    for sample in samples:
-        sample.collect_info(input_dir, suffix)
-        #sample.print_contigs()
-
-    # print to excel
-    sample_row = 1
-    for sample in samples:
-        summary_ws.cell(sample_row, column=1).value = sample.id
-        summary_ws.cell(sample_row, column=2).value = f"{sample.no_reads_in_length_range}/{sample.total_reads} ({sample.no_reads_in_length_range/sample.total_reads*100:.2f}%)"
-        #headers
-        summary_ws.cell(sample_row+1, column=1).value = "consensus contig"
-        summary_ws.cell(sample_row+1, column=2).value = "#supporting reads"
-        summary_ws.cell(sample_row+1, column=3).value = "Best match Species"
-        summary_ws.cell(sample_row+1, column=4).value = "Best match accession"
-        summary_ws.cell(sample_row+1, column=5).value = "Score"
-        summary_ws.cell(sample_row+1, column=6).value = "Query Length"
-        summary_ws.cell(sample_row+1, column=7).value = "Subject Length"
-        summary_ws.cell(sample_row+1, column=8).value = "Overlap Length"
-        summary_ws.cell(sample_row+1, column=9).value = "Query Cover"
-        summary_ws.cell(sample_row+1, column=10).value = "Percentage Identity"
-        summary_ws.cell(sample_row+1, column=11).value = "Rest of the hits"
-        i = 2
-        if len(sample.contigs) != 0:
-            for contig in sample.contigs.values():
-                summary_ws.cell(sample_row+i, column=1).value = contig.name
-                summary_ws.cell(sample_row+i, column=2).value = contig.no_reads
-                if len(contig.sorted_alignments) > 0:
-                    alignment = heapq.heappop(contig.sorted_alignments)
-                    summary_ws.cell(sample_row+i, column=3).value = alignment.sscinames
-                    summary_ws.cell(sample_row+i, column=4).value = alignment.sacc
-                    summary_ws.cell(sample_row+i, column=5).value = alignment.score
-                    summary_ws.cell(sample_row+i, column=6).value = alignment.qlen
-                    summary_ws.cell(sample_row+i, column=7).value = alignment.slen
-                    summary_ws.cell(sample_row+i, column=8).value = alignment.length
-                    summary_ws.cell(sample_row+i, column=9).value = f"{100.0*alignment.length/alignment.qlen:.2f}"
-                    summary_ws.cell(sample_row+i, column=10).value = f"{alignment.pident:.2f}"
-                    collated_hits = []
-                    while len(contig.sorted_alignments) > 0:
-                        alignment = heapq.heappop(contig.sorted_alignments)
-                        collated_hits.append(f"{alignment.sscinames} ({alignment.score})")
-                    summary_ws.cell(sample_row+i, column=11).value = f"{";".join(collated_hits)}"
-                    i += 1
-                else:
-                    summary_ws.cell(sample_row+i, column=3).value = "No BLAST hits"
-                    summary_ws.cell(sample_row+i, column=6).value = contig.length                   
-                    i += 1    
-        else:
-            summary_ws.cell(sample_row+i, column=1).value = "No contigs assembled"
-            i += 1
-
-        tab = Table(displayName=f"{sample.id}", ref=f"A{sample_row+1}:K{sample_row+i-1}")
-        tab.tableStyleInfo = style
-        summary_ws.add_table(tab)
-
-        #update rows
-        sample_row += i + 1
-
-    for ws in wb.worksheets:
-        dims = {}
-        for row in ws.rows:
-            for cell in row:
-                if cell.value:
-                    dims[cell.column_letter] = max((dims.get(cell.column_letter, 0), len(str(cell.value))))
-        for col, value in dims.items():
-            ws.column_dimensions[col].width = value
+    summary_sheet.write(wb, style)
+    if len(histogram_sheet.rows) > 0:
+        histogram_sheet.write(wb, style)
 
     wb.save(output_xlsx)
     wb.close()
 
+
+def parse_sample(input_dir, suffix, sample):
+    """
+    Collects the identification results of a sample into its rows in the summary sheet.
+    """
+    sample.collect_info(input_dir, suffix)
+    #sample.print_contigs()
+
+    rows = []
+    rows.append([sample.id, f"{sample.no_reads_in_length_range}/{sample.total_reads} ({sample.no_reads_in_length_range/sample.total_reads*100:.2f}%)"])
+    #headers
+    rows.append(["consensus contig",
+                 "#supporting reads",
+                 "Best match Species",
+                 "Best match accession",
+                 "Score",
+                 "Query Length",
+                 "Subject Length",
+                 "Overlap Length",
+                 "Query Cover",
+                 "Percentage Identity",
+                 "Rest of the hits"])
+    if len(sample.contigs) != 0:
+        for contig in sample.contigs.values():
+            if len(contig.sorted_alignments) > 0:
+                alignment = heapq.heappop(contig.sorted_alignments)
+                row = [contig.name,
+                       contig.no_reads,
+                       alignment.sscinames,
+                       alignment.sacc,
+                       alignment.score,
+                       alignment.qlen,
+                       alignment.slen,
+                       alignment.length,
+                       f"{100.0*alignment.length/alignment.qlen:.2f}",
+                       f"{alignment.pident:.2f}"]
+                collated_hits = []
+                while len(contig.sorted_alignments) > 0:
+                    alignment = heapq.heappop(contig.sorted_alignments)
+                    collated_hits.append(f"{alignment.sscinames} ({alignment.score})")
+                row.append(";".join(collated_hits))
+                rows.append(row)
+            else:
+                rows.append([contig.name, contig.no_reads, "No BLAST hits", None, None, contig.length])
+    else:
+        rows.append(["No contigs assembled"])
+
+    histogram_rows = [[sample.id, f"{sample.prefilter_kept_reads}/{sample.prefilter_total_reads} reads kept for clustering"],
+                      ["bin start", "bin end", "reads", "passed filters", "in amplicon window"]]
+    histogram_rows.extend(sample.read_length_histogram)
+
+    return sample.id, rows, histogram_rows
+
+
+def read_fasta_lengths(fasta_file):
+    """
+    Returns the sequence lengths of a FASTA file, equivalent to the first 2 columns of seqtk comp.
+    """
+    return {record.name: len(record.seq) for record in read_fastx(fasta_file)}
+
+
+class Sheet(object):
+    """
+    Rows and tables of a worksheet held until written, column widths are tracked as rows are added
+    so that the worksheet can be streamed in write only mode.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.rows = []
+        self.tables = []
+        self.widths = {}
+
+    def add(self, row):
+        self.rows.append(row)
+        for col, value in enumerate(row, 1):
+            if value:
+                self.widths[col] = max(self.widths.get(col, 0), len(str(value)))
+
+    def add_table(self, name, ref, header):
+        self.tables.append((name, ref, header))
+
+    def write(self, wb, style):
+        ws = wb.create_sheet(self.name)
+        ws.sheet_view.zoomScale = 200
+        for col, value in self.widths.items():
+            ws.column_dimensions[get_column_letter(col)].width = value
+        for name, ref, header in self.tables:
+            tab = Table(displayName=name, ref=ref)
+            tab.tableStyleInfo = style
+            # table columns are not inferred from the cells in write only mode
+            tab.tableColumns = [TableColumn(id=i, name=str(value)) for i, value in enumerate(header, 1)]
+            with warnings.catch_warnings():
+                # reminder to add the columns, which are added above
+                warnings.filterwarnings("ignore", "In write-only mode you must add table columns manually")
+                ws.add_table(tab)
+        for row in self.rows:
+            ws.append(row)
+
 class Sample(object):
     def __init__(self, idx, id, barcode, min_len, max_len):
         self.idx = idx
@@ -178,15 +237,23 @@ class Sample(object):
         self.max_len = max_len
         self.total_reads = 0
         self.no_reads_in_length_range = 0
+        self.prefilter_total_reads = 0
+        self.prefilter_kept_reads = 0
+        self.read_length_histogram = []
         self.contigs = {}
 
     def collect_info(self, input_dir, suffix):
         nanoplot_txt_file = f"{input_dir}/analysis/{self.idx}_{self.id}/nanoplot_result/{self.padded_idx}_{self.id}.txt"
+        # read statistics written by demux_to_fastq.py in the NanoStats layout are used when present
+        read_stats_txt_file = f"{input_dir}/analysis/{self.idx}_{self.id}/nanoplot_result/{self.padded_idx}_{self.id}.read_stats.txt"
+        if os.path.exists(read_stats_txt_file):
+            nanoplot_txt_file = read_stats_txt_file
         identification_result_dir = f"{input_dir}/analysis/{self.idx}_{self.id}/identification_result{suffix}"
         ampliconsorter_csv_file = f"{identification_result_dir}/amplicon_sorter/results.csv"
         #consensus_fasta_file = f"{identification_result_dir}/amplicon_sorter/{self.idx}_{self.id}_consensussequences.fasta"
         consensus_fasta_file = f"{identification_result_dir}/amplicon_sorter/consensusfile.fasta"
         blast_txt_file = f"{identification_result_dir}/blast/{self.padded_idx}_{self.id}.txt"
+        histogram_txt_file = f"{input_dir}/analysis/{self.idx}_{self.id}/read_prefilter/{self.padded_idx}_{self.id}.read_length_histogram.txt"
 
         print(f"processing {nanoplot_txt_file}")
         print(f"processing {ampliconsorter_csv_file}")
@@ -198,6 +265,18 @@ class Sample(object):
                 if line.startswith("Number of reads:"):
                     self.total_reads = int(float(line.split()[-1].replace(',', '')))
                     break
+        if os.path.exists(histogram_txt_file):
+            print(f"processing {histogram_txt_file}")
+            with open(histogram_txt_file, "r") as file:
+                for line in file:
+                    fields = line.rstrip().split("\t")
+                    if fields[0] == "#total_reads":
+                        self.prefilter_total_reads = int(fields[1])
+                    elif fields[0] == "#window":
+                        self.prefilter_kept_reads += int(fields[3])
+                    elif not line.startswith("#"):
+                        self.read_length_histogram.append([int(x) for x in fields])
+
         try:
             with open(ampliconsorter_csv_file, "r") as file:
                 for line in file:
@@ -217,14 +296,11 @@ class Sample(object):
         if not path.exists():
             return
 
-        cmd = f"seqtk comp {consensus_fasta_file} | cut -f1,2"
-        result = subprocess.run(cmd, shell=True, check=True, capture_output=True, text=True)      
-        
-        if result.stdout != "":
-            lines = result.stdout.strip()
-            for line in lines.split("\n"):
-                #print(line)
-                contig_name, length = line.removeprefix("consensus_").split("\t")
+        lengths = read_fasta_lengths(consensus_fasta_file)
+
+        if len(lengths) != 0:
+            for name, length in lengths.items():
+                contig_name = name.removeprefix("consensus_")
                 contig_name = re.sub(r"\(\d+\)$", "", contig_name)
                 if contig_name in self.contigs:
                     self.contigs[contig_name].length = int(length)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2025 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import math
+import click
+from concurrent.futures import ProcessPoolExecutor
+from seqio import read_bam, write_fastx, BgzfWriter
+
+# error probability of each phred+33 quality character
+ERROR_PROBS = [10 ** (-(i - 33) / 10) if i >= 33 else 1.0 for i in range(256)]
+
+# read quality cutoffs reported as NanoPlot does
+QUALITY_CUTOFFS = [5, 7, 10, 12, 15]
+
+
+@click.command()
+@click.option("-i", "--demux_dir", required=True, help="dorado demux output directory")
+@click.option("-s", "--sample_file", required=True, help="sample file")
+@click.option("-o", "--dest_dir", required=True, help="destination run directory")
+@click.option("-r", "--run_idx", required=True, help="run index used to name the FASTQ files")
+@click.option("-a", "--acquisition_run_id", required=True, help="acquisition run ID in the demultiplexed BAM file names")
+@click.option("-k", "--kit", default="SQK-NBD114-96", show_default=True, help="Kit ID")
+@click.option("-t", "--threads", default=os.cpu_count(), show_default=True, help="number of threads")
+def main(demux_dir, sample_file, dest_dir, run_idx, acquisition_run_id, kit, threads):
+    """
+    Converts demultiplexed nanopore BAM files to bgzipped FASTQ files, computing read statistics on the same pass.
+
+    Barcodes are converted in parallel, each with threads for BGZF decompression and compression,
+    the statistics are written as NanoStats for the QC and aggregation steps.
+
+    e.g. demux_to_fastq.py -i demux -s pore16.sa -o pore16 -r 16 -a 1a2b3c4d
+    """
+    print("\t{0:<20} :   {1:<10}".format("demux dir", demux_dir))
+    print("\t{0:<20} :   {1:<10}".format("sample file", sample_file))
+    print("\t{0:<20} :   {1:<10}".format("dest dir", dest_dir))
+    print("\t{0:<20} :   {1:<10}".format("run index", run_idx))
+    print("\t{0:<20} :   {1:<10}".format("acquisition run id", acquisition_run_id))
+    print("\t{0:<20} :   {1:<10}".format("kit", kit))
+    print("\t{0:<20} :   {1:<10}".format("threads", threads))
+
+    jobs = []
+    with open(sample_file, "r") as file:
+        index = 0
+        for line in file:
+            if not line.startswith("#"):
+                index += 1
+                sample_id, barcode, min_len, max_len = line.rstrip().split("\t")
+                input_bam_file = f"{demux_dir}/{acquisition_run_id}_{kit}_{barcode}.bam"
+                if barcode == "unclassified":
+                    input_bam_file = f"{demux_dir}/{acquisition_run_id}_unclassified.bam"
+                output_fastq_file = f"{dest_dir}/{run_idx}_{index}_{sample_id}.fastq.gz"
+                stats_dir = f"{dest_dir}/analysis/{index}_{sample_id}/nanoplot_result"
+                stats_file = f"{stats_dir}/{index:02}_{sample_id}.read_stats.txt"
+                os.makedirs(stats_dir, exist_ok=True)
+                jobs.append((input_bam_file, output_fastq_file, stats_file))
+
+    # barcodes are spread over processes, the remaining threads compress within each barcode
+    workers = max(1, min(threads, len(jobs)))
+    barcode_threads = max(1, threads // workers)
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(convert, *job, barcode_threads) for job in jobs]
+        for job, future in zip(jobs, futures):
+            try:
+                stats = future.result()
+                print(f"{job[1]}: {stats.reads} reads, {stats.bases} bases, N50 {stats.n50()}")
+            except (OSError, ValueError, EOFError) as e:
+                print(f"{job[0]}: failed - {e}")
+                failed += 1
+
+    if failed > 0:
+        exit(1)
+
+
+def convert(input_bam_file, output_fastq_file, stats_file, threads):
+    """
+    Writes the primary reads of a BAM file as BGZF FASTQ as samtools bam2fq -T "*" and their statistics.
+    """
+    stats = ReadStats()
+    # write to a temporary file so that an interrupted conversion is never mistaken for a complete one
+    tmp_fastq_file = f"{output_fastq_file}.tmp"
+    with BgzfWriter(tmp_fastq_file, threads) as out:
+        if os.path.exists(input_bam_file):
+            for record in read_bam(input_bam_file, threads):
+                if record.flag & 0x900:
+                    continue
+                stats.add(record.qual)
+                write_fastx(out, record.to_sequence_record())
+        else:
+            print(f"{input_bam_file} not found, writing an empty FASTQ file")
+    os.replace(tmp_fastq_file, output_fastq_file)
+    stats.write(stats_file)
+    return stats
+
+
+class ReadStats(object):
+    def __init__(self):
+        self.reads = 0
+        self.bases = 0
+        self.lengths = []
+        self.qualities = []
+
+    def add(self, qual):
+        length = len(qual)
+        self.reads += 1
+        self.bases += length
+        self.lengths.append(length)
+        if length > 0:
+            # mean quality is taken over error probabilities
+            mean_error = sum(map(ERROR_PROBS.__getitem__, qual.encode())) / length
+            self.qualities.append(-10 * math.log10(mean_error))
+        else:
+            self.qualities.append(0.0)
+
+    def n50(self):
+        half = self.bases / 2
+        total = 0
+        for length in sorted(self.lengths, reverse=True):
+            total += length
+            if total >= half:
+                return length
+        return 0
+
+    def write(self, stats_file):
+        """
+        Writes statistics in the layout of NanoPlot's NanoStats.txt.
+        """
+        lengths = sorted(self.lengths)
+        qualities = sorted(self.qualities)
+        with open(stats_file, "w") as out:
+            out.write("General summary:\n")
+            out.write(f"Mean read length:                {self.bases / max(self.reads, 1):,.1f}\n")
+            out.write(f"Mean read quality:               {sum(qualities) / max(self.reads, 1):,.1f}\n")
+            out.write(f"Median read length:              {median(lengths):,.1f}\n")
+            out.write(f"Median read quality:             {median(qualities):,.1f}\n")
+            out.write(f"Number of reads:                 {self.reads:,.1f}\n")
+            out.write(f"Read length N50:                 {self.n50():,.1f}\n")
+            out.write(f"STDEV read length:               {stdev(lengths):,.1f}\n")
+            out.write(f"Total bases:                     {self.bases:,.1f}\n")
+            out.write("Number, percentage and megabases of reads above quality cutoffs\n")
+            for cutoff in QUALITY_CUTOFFS:
+                reads = 0
+                bases = 0
+                for length, quality in zip(self.lengths, self.qualities):
+                    if quality > cutoff:
+                        reads += 1
+                        bases += length
+                out.write(f">Q{cutoff}:\t{reads} ({reads / max(self.reads, 1) * 100:.1f}%) {bases / 1e6:.1f}Mb\n")
+
+    def print(self):
+        print(f"reads           : {self.reads}")
+        print(f"bases           : {self.bases}")
+        print(f"N50             : {self.n50()}")
+
+
+def median(values):
+    n = len(values)
+    if n == 0:
+        return 0.0
+    return values[n // 2] if n % 2 else (values[n // 2 - 1] + values[n // 2]) / 2
+
+
+def stdev(values):
+    n = len(values)
+    if n < 2:
+        return 0.0
+    mean = sum(values) / n
+    return math.sqrt(sum((x - mean) ** 2 for x in values) / (n - 1))
+
+
+if __name__ == "__main__":
+    main() # type: ignore
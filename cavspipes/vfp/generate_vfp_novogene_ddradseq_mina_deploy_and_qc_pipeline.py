@@ -20,6 +20,7 @@
 
 import os
 import click
+import hashlib
 import sys
 import re
 import sys
@@ -45,7 +46,12 @@ from datetime import datetime
 )
 @click.option("-s", "--sample_file", required=True, help="sample file")
 @click.option("-g", "--genome_fasta_file", required=True, help="genome fasta file")
-def main(make_file, run_id, novogene_illumina_dir, working_dir, sample_file, genome_fasta_file):
+@click.option(
+    "--sentinel",
+    is_flag=True,
+    help="record content hashes in .OK files and skip steps whose command and inputs are unchanged",
+)
+def main(make_file, run_id, novogene_illumina_dir, working_dir, sample_file, genome_fasta_file, sentinel):
     """
     Moves Novogene Illumina fastq files to a destination and performs QC
 
@@ -64,6 +70,7 @@ def main(make_file, run_id, novogene_illumina_dir, working_dir, sample_file, gen
     print("\t{0:<21} :   {1:<10}".format("run_dir", run_id))
     print("\t{0:<21} :   {1:<10}".format("novogene_illumina_dir", novogene_illumina_dir))
     print("\t{0:<21} :   {1:<10}".format("working_dir", working_dir))
+    print("\t{0:<21} :   {1:<10}".format("sentinel", sentinel))
     print("\t{0:<21} :   {1:<10}".format("sample_file", sample_file))
     print("\t{0:<21} :   {1:<10}".format("genome_fasta_file", genome_fasta_file))
     print("\t{0:<21} :   {1:<10}".format("dest_dir", dest_dir))
@@ -112,7 +119,8 @@ def main(make_file, run_id, novogene_illumina_dir, working_dir, sample_file, gen
     extract_general_stats = "/home/atks/programs/cavspipes/vfp/extract_general_stats.py"
 
     # initialize
-    pg = PipelineGenerator(make_file)
+    pipeline_sentinel = "/usr/local/cavspipes-1.2.1/pipeline_sentinel.py"
+    pg = PipelineGenerator(make_file, pipeline_sentinel if sentinel else "", working_dir)
 
     #trim and demultiplex
     for sample in run.novogene_samples:
@@ -321,8 +329,10 @@ def main(make_file, run_id, novogene_illumina_dir, working_dir, sample_file, gen
     copy2(sample_file, trace_dir)
 
 class PipelineGenerator(object):
-    def __init__(self, make_file):
+    def __init__(self, make_file, sentinel="", root=""):
         self.make_file = make_file
+        self.sentinel = sentinel
+        self.root = root
         self.tgts = []
         self.deps = []
         self.cmds = []
@@ -352,8 +362,15 @@ class PipelineGenerator(object):
 
             for i in range(len(self.tgts)):
                 f.write(f"{self.tgts[i]} : {self.deps[i]}\n")
-                f.write(f"\t{self.cmds[i]}\n")
-                f.write(f"\ttouch {self.tgts[i]}\n\n")
+                if self.sentinel == "":
+                    f.write(f"\t{self.cmds[i]}\n")
+                    f.write(f"\ttouch {self.tgts[i]}\n\n")
+                else:
+                    #skip the command when it and the contents of its inputs are unchanged
+                    command_hash = hashlib.sha256(self.cmds[i].replace(self.root, "").encode()).hexdigest()
+                    sentinel = f"{self.sentinel} {{0}} {self.tgts[i]} {self.deps[i]} -r {self.root} -c {command_hash}"
+                    f.write(f"\t{sentinel.format('check')} || ({self.cmds[i]})\n")
+                    f.write(f"\t{sentinel.format('record')}\n\n")
 
             if self.clean_cmd != "":
                 f.write(f"clean : \n")
@@ -20,6 +20,7 @@
 
 import os
 import click
+import hashlib
 import re
 import sys
 from shutil import copy2
@@ -51,10 +52,19 @@ from datetime import datetime
 @click.option(
     "--as_maxr", help="Amplicon Sorter Sample size for clustering", required=False, default=100000
 )
+@click.option(
+    "--max_prefilter_reads", help="Maximum reads per amplicon window passed to Amplicon Sorter", required=False, default=1000000
+)
 @click.option("-x", "--memory", help="Memory for fastqc", required=False, default=10000)
 @click.option("-y", "--model", help="Model for Dorado calling", required=False, default="dna_r10.4.1_e8.2_400bps_hac@v5.0.0")
 @click.option("-k", "--kit", default="SQK-NBD114-96", show_default=True, help="Kit ID")
 @click.option("-s", "--sample_file", required=True, help="sample file")
+@click.option("-t", "--threads", default=16, show_default=True, help="threads for converting demultiplexed reads")
+@click.option(
+    "--sentinel",
+    is_flag=True,
+    help="record content hashes in .OK files and skip steps whose command and inputs are unchanged",
+)
 def main(
     make_file,
     run_id,
@@ -63,10 +73,13 @@ def main(
     qscore,
     len,
     as_maxr,
+    max_prefilter_reads,
     memory,
     model,
     kit,
     sample_file,
+    threads,
+    sentinel,
 ):
     """
     Moves Oxford Nanopore Technology fastq files to a destination and performs QC
@@ -82,13 +95,16 @@ def main(
     print("\t{0:<22} :   {1:<10}".format("run_dir", run_id))
     print("\t{0:<22} :   {1:<10}".format("nanopore_dir", nanopore_dir))
     print("\t{0:<22} :   {1:<10}".format("working_dir", working_dir))
+    print("\t{0:<22} :   {1:<10}".format("sentinel", sentinel))
     print("\t{0:<22} :   {1:<10}".format("minumum qscore", qscore))
     print("\t{0:<22} :   {1:<10}".format("minumum length", len))
     print("\t{0:<22} :   {1:<10}".format("clustering sample size", as_maxr))
+    print("\t{0:<22} :   {1:<10}".format("max prefilter reads", max_prefilter_reads))
     print("\t{0:<22} :   {1:<10}".format("memory", memory))
     print("\t{0:<22} :   {1:<10}".format("model", model))
     print("\t{0:<22} :   {1:<10}".format("kit", kit))
     print("\t{0:<22} :   {1:<10}".format("sample_file", sample_file))
+    print("\t{0:<22} :   {1:<10}".format("threads", threads))
     print("\t{0:<22} :   {1:<10}".format("dest_dir", dest_dir))
 
     # version
@@ -103,7 +119,6 @@ def main(
     dorado_basecall_model = f"/usr/local/dorado-0.9.1/models/{model}"
     samtools = "/usr/local/samtools-1.17/bin/samtools"
     fastqc = f"/usr/local/FastQC-0.12.1/fastqc --adapters /usr/local/FastQC-0.12.1/Configuration/adapter_list.nanopore.txt --memory {memory}"
-    multiqc = "docker run  -u \"root:root\" -t -v  `pwd`:`pwd` -w `pwd` multiqc/multiqc multiqc "
     nanoplot = f"docker run -u \"$$(id -u):$$(id -g)\" -t -v  `pwd`:`pwd` -w `pwd` staphb/nanoplot:1.42.0 NanoPlot "
     ft = "/usr/local/cavstools-0.0.1/ft"
     amplicon_sorter = "/usr/local/amplicon_sorter-2025-05-28/bin/python3 /usr/local/amplicon_sorter-2025-05-28/amplicon_sorter.py"
@@ -111,6 +126,9 @@ def main(
     blastdb_nt = "/db/blast/nt/nt"
     blastdb_tx = "/db/blast/nt"
     aggregate_identification_results = f"{os.path.dirname(__file__)}/aggregate_identification_results.py"
+    prefilter_amplicon_reads = f"{os.path.dirname(__file__)}/prefilter_amplicon_reads.py"
+    demux_to_fastq = f"{os.path.dirname(__file__)}/demux_to_fastq.py"
+    compile_qc_report = "/usr/local/cavspipes-1.2.1/compile_qc_report.py"
 
     run = Run(run_id)
     with open(sample_file, "r") as file:
@@ -155,11 +173,13 @@ def main(
             os.makedirs(sample_dir, exist_ok=True)
             os.makedirs(f"{sample_dir}/fastqc_result", exist_ok=True)
             os.makedirs(f"{sample_dir}/nanoplot_result", exist_ok=True)
+            os.makedirs(f"{sample_dir}/read_prefilter", exist_ok=True)
     except OSError as error:
         print(f"{error.filename} cannot be created")
 
     # initialize
-    pg = PipelineGenerator(make_file)
+    pipeline_sentinel = "/usr/local/cavspipes-1.2.1/pipeline_sentinel.py"
+    pg = PipelineGenerator(make_file, pipeline_sentinel if sentinel else "", working_dir)
 
     # base call
     # dorado duplex dna_r10.4.1_e8.2_400bps_sup@v4.2.0  pod5s/ > calls.bam
@@ -202,24 +222,40 @@ def main(
         cmd = f'{dorado} demux --output-dir {output_dir} --kit-name {kit} {input_bam_file} > {log} 2> {err}'
         pg.add(tgt, dep, cmd)
 
-        fastqc_multiqc_dep = ""
-        nanoplot_multiqc_dep = ""
+        fastqc_qc_report_dep = ""
+        nanoplot_qc_report_dep = ""
+        sample_qc_report_dep = ""
         identification_aggregate_dep = ""
 
+        # convert all barcodes to bgzipped FASTQ in parallel, read statistics are computed on the same pass
+        # equivalent to samtools bam2fq -T "*" <acquisition_run_id>_SQK-NBD114-24_barcode01.bam | gzip per barcode
+        input_dir = f"{working_dir}/demux"
+        log = f"{log_dir}/demux_to_fastq.log"
+        err = f"{log_dir}/demux_to_fastq.err"
+        tgt = f"{log_dir}/demux_to_fastq.OK"
+        dep = f"{log_dir}/demux.OK"
+        cmd = f"{demux_to_fastq} -i {input_dir} -s {sample_file} -o {dest_dir} -r {run.idx} -a {acquisition_run_id} -k {kit} -t {threads} > {log} 2> {err}"
+        pg.add_srun(tgt, dep, cmd, threads)
+
         for sample in run.samples:
-            # samtools bam2fq <acquisition_run_id>_SQK-NBD114-24_barcode01.bam  -T "*"
-            input_bam_file = f"{working_dir}/demux/{acquisition_run_id}_{kit}_{sample.barcode}.bam"
-            if sample.barcode=="unclassified":
-                input_bam_file = f"{working_dir}/demux/{acquisition_run_id}_unclassified.bam"
             output_fastq_file = f"{dest_dir}/{run.idx}_{sample.idx}_{sample.id}.fastq.gz"
-            log = f"{log_dir}/{run.idx}_{sample.idx}_{sample.id}.fastq.gz.log.OK"
             tgt = f"{log_dir}/{run.idx}_{sample.idx}_{sample.id}.fastq.gz.OK"
-            dep = f"{log_dir}/demux.OK"
-            cmd = f"{samtools} bam2fq -T \"*\" {input_bam_file} 2> {log} | gzip > {output_fastq_file} "
+            dep = f"{log_dir}/demux_to_fastq.OK"
+            cmd = f"test -f {output_fastq_file}"
             pg.add(tgt, dep, cmd)
 
             if sample.is_dna_barcode:
-                
+
+                # prefilter reads by amplicon size window and mean Q-score, capping the reads clustered
+                input_fastq_file = f"{dest_dir}/{run.idx}_{sample.idx}_{sample.id}.fastq.gz"
+                output_fastq_file = f"{analysis_dir}/{sample.idx}_{sample.id}/read_prefilter/{sample.padded_idx}_{sample.id}.fastq.gz"
+                window = f"{sample.min_len}-{sample.max_len}" if int(sample.min_len) > 0 or int(sample.max_len) > 0 else ""
+                log = f"{log_dir}/{sample.idx}_{sample.id}.read_prefilter.log"
+                tgt = f"{log_dir}/{sample.idx}_{sample.id}.read_prefilter.OK"
+                dep = f"{log_dir}/{run.idx}_{sample.idx}_{sample.id}.fastq.gz.OK"
+                cmd = f"{prefilter_amplicon_reads} -i {input_fastq_file} -o {output_fastq_file} -w \"{window}\" -l {len} -q {qscore} -n {max_prefilter_reads} > {log}"
+                pg.add(tgt, dep, cmd)
+
                 for as_maxr in [100000, 500000, 1000000]:
                 
                     suffix = ""
@@ -231,11 +267,11 @@ def main(
                         suffix = "1M"                        
 
                     # amplicon sorter
-                    input_fastq_file = f"{dest_dir}/{run.idx}_{sample.idx}_{sample.id}.fastq.gz"
+                    input_fastq_file = f"{analysis_dir}/{sample.idx}_{sample.id}/read_prefilter/{sample.padded_idx}_{sample.id}.fastq.gz"
                     output_dir = f"{analysis_dir}/{sample.idx}_{sample.id}/identification_result_{suffix}/amplicon_sorter"
                     log = f"{log_dir}/{sample.idx}_{sample.id}.amplicon_sorter_{suffix}.log"
                     tgt = f"{log_dir}/{sample.idx}_{sample.id}.amplicon_sorter_{suffix}.OK"
-                    dep = f"{log_dir}/{run.idx}_{sample.idx}_{sample.id}.fastq.gz.OK"
+                    dep = f"{log_dir}/{sample.idx}_{sample.id}.read_prefilter.OK"
                     #cmd = f"{amplicon_sorter} -i {input_fastq_file} -min {sample.min_len} -max {sample.max_len} -maxr {as_maxr} -ra -o {output_dir} > {log}"
                     cmd = f"rm -fr {output_dir}; {amplicon_sorter} -i {input_fastq_file} -min {sample.min_len} -max {sample.max_len} -maxr {as_maxr} -o {output_dir} > {log}"
                     pg.add_srun(tgt, dep, cmd, 15)
@@ -277,7 +313,7 @@ def main(
             err = f"{log_dir}/{sample.padded_idx}_{sample.id}.fastqc.err"
             dep = f"{log_dir}/{sample.padded_idx}_{sample.id}.fastq.gz.OK"
             tgt = f"{log_dir}/{sample.padded_idx}_{sample.id}.fastqc.OK"
-            fastqc_multiqc_dep += f" {tgt}"
+            fastqc_qc_report_dep += f" {tgt}"
             cmd = f"{fastqc} {input_file} -o {output_dir} > {log} 2> {err}"
             pg.add(tgt, dep, cmd)
 
@@ -304,29 +340,27 @@ def main(
             txt_file = f"{analysis_dir}/{sample.idx}_{sample.id}/nanoplot_result/{sample.padded_idx}_{sample.id}_NanoStats_post_filtering.txt"
             dep = f"{log_dir}/{sample.idx}_{sample.id}.nanoplot.run.renamed.OK"
             tgt = f"{log_dir}/{sample.idx}_{sample.id}.nanoplot.OK"
-            nanoplot_multiqc_dep += f" {tgt}"
+            nanoplot_qc_report_dep += f" {tgt}"
             identification_aggregate_dep += f" {tgt}"
             cmd = f"rm -f {txt_file}"
             pg.add(tgt, dep, cmd)
 
-        # plot fastqc multiqc results
-        analysis = "fastqc"
-        output_dir = f"{analysis_dir}/all/{analysis}"
-        log = f"{log_dir}/{analysis}.multiqc_report.log"
-        err = f"{log_dir}/{analysis}.multiqc_report.err"
-        dep = fastqc_multiqc_dep
-        tgt = f"{log_dir}/{analysis}.multiqc_report.OK"
-        cmd = f"cd {analysis_dir}; {multiqc} . -f -m fastqc -o {output_dir} -n {analysis} --no-ansi > {log} 2> {err}"
-        pg.add(tgt, dep, cmd)
+            # update the run level QC report as soon as the fastqc and nanoplot results of the sample are in
+            log = f"{log_dir}/{sample.idx}_{sample.id}.qc_report.log"
+            err = f"{log_dir}/{sample.idx}_{sample.id}.qc_report.err"
+            dep = f"{log_dir}/{sample.padded_idx}_{sample.id}.fastqc.OK {log_dir}/{sample.idx}_{sample.id}.nanoplot.OK"
+            tgt = f"{log_dir}/{sample.idx}_{sample.id}.qc_report.OK"
+            cmd = f"{compile_qc_report} -i {analysis_dir} -o {analysis_dir}/all/qc -n {run_id} > {log} 2> {err}"
+            sample_qc_report_dep += f" {tgt}"
+            pg.add(tgt, dep, cmd)
 
-        # plot nanoplot multiqc results
-        analysis = "nanoplot"
-        output_dir = f"{analysis_dir}/all/{analysis}"
-        log = f"{log_dir}/{analysis}.multiqc_report.log"
-        err = f"{log_dir}/{analysis}.multiqc_report.err"
-        dep = nanoplot_multiqc_dep
-        tgt = f"{log_dir}/{analysis}.multiqc_report.OK"
-        cmd = f"cd {analysis_dir}; {multiqc} . -f -m nanostat -o {output_dir} -n {analysis} --no-ansi > {log} 2> {err}"
+        # compile the final run level QC report from fastqc and nanoplot results
+        analysis = "qc"
+        log = f"{log_dir}/{analysis}.qc_report.log"
+        err = f"{log_dir}/{analysis}.qc_report.err"
+        dep = f"{fastqc_qc_report_dep} {nanoplot_qc_report_dep} {sample_qc_report_dep}"
+        tgt = f"{log_dir}/{analysis}.qc_report.OK"
+        cmd = f"{compile_qc_report} -i {analysis_dir} -o {analysis_dir}/all/{analysis} -n {run_id} > {log} 2> {err}"
         pg.add(tgt, dep, cmd)
 
         # aggregate identification results in excel
@@ -387,28 +421,27 @@ def main(
         cmd = f"mv {src_txt_file} {dst_txt_file}"
         pg.add(tgt, dep, cmd)
 
-        # plot fastqc multiqc results
-        analysis = "fastqc"
-        output_dir = f"{analysis_dir}/all/{analysis}"
-        log = f"{log_dir}/{analysis}.multiqc_report.log"
-        err = f"{log_dir}/{analysis}.multiqc_report.err"
-        dep = f"{log_dir}/{sample.padded_idx}_{sample.id}.fastqc.OK"
-        tgt = f"{log_dir}/{analysis}.multiqc_report.OK"
-        cmd = f"cd {analysis_dir}; {multiqc} . -f -m fastqc -o {output_dir} -n {analysis} --no-ansi > {log} 2> {err}"
-        pg.add(tgt, dep, cmd)
-
-        # plot nanoplot multiqc results
-        analysis = "nanoplot"
-        output_dir = f"{analysis_dir}/all/{analysis}"
-        log = f"{log_dir}/{analysis}.multiqc_report.log"
-        err = f"{log_dir}/{analysis}.multiqc_report.err"
-        dep = f"{log_dir}/{sample.idx}_{sample.id}.nanoplot.run.OK"
-        tgt = f"{log_dir}/{analysis}.multiqc_report.OK"
-        cmd = f"cd {analysis_dir}; {multiqc} . -f -m nanostat -o {output_dir} -n {analysis} --no-ansi > {log} 2> {err}"
+        # compile run level QC report from fastqc and nanoplot results
+        analysis = "qc"
+        log = f"{log_dir}/{analysis}.qc_report.log"
+        err = f"{log_dir}/{analysis}.qc_report.err"
+        dep = f"{log_dir}/{sample.padded_idx}_{sample.id}.fastqc.OK {log_dir}/{sample.idx}_{sample.id}.nanoplot.run.renamed.OK"
+        tgt = f"{log_dir}/{analysis}.qc_report.OK"
+        cmd = f"{compile_qc_report} -i {analysis_dir} -o {analysis_dir}/all/{analysis} -n {run_id} > {log} 2> {err}"
         pg.add(tgt, dep, cmd)
 
         if sample.is_dna_barcode:
-            
+
+            # prefilter reads by amplicon size window and mean Q-score, capping the reads clustered
+            input_fastq_file = f"{dest_dir}/{run.idx}_{sample.idx}_{sample.id}.fastq.gz"
+            output_fastq_file = f"{analysis_dir}/{sample.idx}_{sample.id}/read_prefilter/{sample.padded_idx}_{sample.id}.fastq.gz"
+            window = f"{sample.min_len}-{sample.max_len}" if int(sample.min_len) > 0 or int(sample.max_len) > 0 else ""
+            log = f"{log_dir}/{sample.idx}_{sample.id}.read_prefilter.log"
+            tgt = f"{log_dir}/{sample.idx}_{sample.id}.read_prefilter.OK"
+            dep = f"{log_dir}/{run.idx}_{sample.idx}_{sample.id}.fastq.gz.OK"
+            cmd = f"{prefilter_amplicon_reads} -i {input_fastq_file} -o {output_fastq_file} -w \"{window}\" -l {len} -q {qscore} -n {max_prefilter_reads} > {log}"
+            pg.add(tgt, dep, cmd)
+
             for as_maxr in [100000, 500000, 1000000]:
                 
                     suffix = ""
@@ -420,11 +453,11 @@ def main(
                         suffix = "1M"                        
 
                     # amplicon sorter
-                    input_fastq_file = f"{dest_dir}/{run.idx}_{sample.idx}_{sample.id}.fastq.gz"
+                    input_fastq_file = f"{analysis_dir}/{sample.idx}_{sample.id}/read_prefilter/{sample.padded_idx}_{sample.id}.fastq.gz"
                     output_dir = f"{analysis_dir}/{sample.idx}_{sample.id}/identification_result_{suffix}/amplicon_sorter"
                     log = f"{log_dir}/{sample.idx}_{sample.id}.amplicon_sorter_{suffix}.log"
                     tgt = f"{log_dir}/{sample.idx}_{sample.id}.amplicon_sorter_{suffix}.OK"
-                    dep = f"{log_dir}/{run.idx}_{sample.idx}_{sample.id}.fastq.gz.OK"
+                    dep = f"{log_dir}/{sample.idx}_{sample.id}.read_prefilter.OK"
                     cmd = f"rm -fr {output_dir}; {amplicon_sorter} -i {input_fastq_file} -min {sample.min_len} -max {sample.max_len} -maxr {as_maxr} -o {output_dir} > {log}"
                     pg.add_srun(tgt, dep, cmd, 15)
 
@@ -496,8 +529,10 @@ def main(
     copy2(sample_file, trace_dir)
 
 class PipelineGenerator(object):
-    def __init__(self, make_file):
+    def __init__(self, make_file, sentinel="", root=""):
         self.make_file = make_file
+        self.sentinel = sentinel
+        self.root = root
         self.tgts = []
         self.deps = []
         self.cmds = []
@@ -532,8 +567,15 @@ class PipelineGenerator(object):
 
             for i in range(len(self.tgts)):
                 f.write(f"{self.tgts[i]} : {self.deps[i]}\n")
-                f.write(f"\t{self.cmds[i]}\n")
-                f.write(f"\ttouch {self.tgts[i]}\n\n")
+                if self.sentinel == "":
+                    f.write(f"\t{self.cmds[i]}\n")
+                    f.write(f"\ttouch {self.tgts[i]}\n\n")
+                else:
+                    #skip the command when it and the contents of its inputs are unchanged
+                    command_hash = hashlib.sha256(self.cmds[i].replace(self.root, "").encode()).hexdigest()
+                    sentinel = f"{self.sentinel} {{0}} {self.tgts[i]} {self.deps[i]} -r {self.root} -c {command_hash}"
+                    f.write(f"\t{sentinel.format('check')} || ({self.cmds[i]})\n")
+                    f.write(f"\t{sentinel.format('record')}\n\n")
 
             if self.clean_cmd != "":
                 f.write(f"clean : \n")
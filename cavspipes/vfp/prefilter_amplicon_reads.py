@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2025 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import math
+import click
+import random
+from seqio import read_fastx, write_fastx, open_file
+
+# error probability of each phred+33 quality character
+ERROR_PROBS = [10 ** (-(i - 33) / 10) if i >= 33 else 1.0 for i in range(256)]
+
+
+@click.command()
+@click.option("-i", "--input_fastq_file", required=True, help="input FASTQ file")
+@click.option("-o", "--output_fastq_file", required=True, help="output FASTQ file of retained reads")
+@click.option(
+    "-w",
+    "--windows",
+    default="",
+    show_default=True,
+    help="amplicon size windows, comma separated min-max, e.g. 300-700,1200-1600, empty for all lengths",
+)
+@click.option("-l", "--min_len", default=20, show_default=True, help="minimum read length")
+@click.option("-q", "--min_qscore", default=7.0, show_default=True, help="minimum mean read Q-score")
+@click.option("-n", "--max_reads", default=0, show_default=True, help="maximum reads kept per window, 0 for no cap")
+@click.option("-s", "--seed", default=42, show_default=True, help="seed for reservoir sampling")
+@click.option("-b", "--bin_width", default=50, show_default=True, help="read length histogram bin width")
+@click.option("-h", "--histogram_file", default="", help="read length histogram file, defaults to <output>.read_length_histogram.txt")
+def main(
+    input_fastq_file,
+    output_fastq_file,
+    windows,
+    min_len,
+    min_qscore,
+    max_reads,
+    seed,
+    bin_width,
+    histogram_file,
+):
+    """
+    Prefilters nanopore amplicon reads by length window and mean Q-score before clustering.
+
+    Length and mean Q are computed in a first pass, the indices of reads in each window are
+    reservoir sampled down to max_reads so that clustering time is bounded regardless of flowcell
+    yield, and the kept reads are written in a second pass so that no reads are held in memory.
+
+    e.g. prefilter_amplicon_reads.py -i barcode01.fastq.gz -o barcode01.filtered.fastq.gz -w 600-800 -n 100000
+    """
+    if histogram_file == "":
+        histogram_file = f"{output_fastq_file.removesuffix('.gz').removesuffix('.fastq')}.read_length_histogram.txt"
+
+    print("\t{0:<20} :   {1:<10}".format("input FASTQ file", input_fastq_file))
+    print("\t{0:<20} :   {1:<10}".format("output FASTQ file", output_fastq_file))
+    print("\t{0:<20} :   {1:<10}".format("windows", windows if windows else "all"))
+    print("\t{0:<20} :   {1:<10}".format("minimum length", min_len))
+    print("\t{0:<20} :   {1:<10}".format("minimum Q-score", min_qscore))
+    print("\t{0:<20} :   {1:<10}".format("max reads", max_reads))
+    print("\t{0:<20} :   {1:<10}".format("seed", seed))
+    print("\t{0:<20} :   {1:<10}".format("histogram file", histogram_file))
+
+    windows = [Window(window) for window in windows.split(",") if window] or [Window(f"{min_len}-")]
+    rng = random.Random(seed)
+    histogram = {}
+    total_reads = 0
+    passed_reads = 0
+
+    for record in read_fastx(input_fastq_file):
+        length = len(record.seq)
+        qscore = mean_qscore(record.qual) if record.qual is not None else math.inf
+        passed = length >= min_len and qscore >= min_qscore
+
+        bin = histogram.setdefault(length // bin_width, [0, 0, 0])
+        bin[0] += 1
+        total_reads += 1
+        if not passed:
+            continue
+        bin[1] += 1
+        passed_reads += 1
+
+        # a read is assigned to the first window containing it
+        for window in windows:
+            if window.contains(length):
+                bin[2] += 1
+                window.offer(total_reads, max_reads, rng)
+                break
+
+    # write retained reads in input order
+    kept = sorted(index for window in windows for index in window.reservoir)
+    with open_file(output_fastq_file, "w") as out:
+        i = 0
+        for index, record in enumerate(read_fastx(input_fastq_file), 1):
+            if i == len(kept):
+                break
+            if index == kept[i]:
+                write_fastx(out, record)
+                i += 1
+
+    with open(histogram_file, "w") as out:
+        out.write(f"#total_reads\t{total_reads}\n")
+        out.write(f"#passed_reads\t{passed_reads}\n")
+        for window in windows:
+            out.write(f"#window\t{window.name}\t{window.seen}\t{len(window.reservoir)}\n")
+        out.write(f"#bin_start\tbin_end\treads\tpassed\tin_window\n")
+        for bin_index in sorted(histogram):
+            reads, passed, in_window = histogram[bin_index]
+            out.write(f"{bin_index*bin_width}\t{(bin_index+1)*bin_width-1}\t{reads}\t{passed}\t{in_window}\n")
+
+    print(f"{total_reads} reads, {passed_reads} passed length and Q-score filters, {len(kept)} kept")
+    for window in windows:
+        print(f"window {window.name}: {window.seen} reads, {len(window.reservoir)} kept")
+
+
+def mean_qscore(qual):
+    """
+    Mean Q-score of a read computed from the mean error probability as dorado and NanoPlot report it.
+    """
+    if not qual:
+        return 0.0
+    mean_error = sum(map(ERROR_PROBS.__getitem__, qual.encode())) / len(qual)
+    return -10 * math.log10(mean_error)
+
+
+class Window(object):
+    def __init__(self, window):
+        min_len, _, max_len = window.partition("-")
+        self.min_len = int(min_len) if min_len else 0
+        self.max_len = int(max_len) if max_len else 0
+        self.name = window
+        self.seen = 0
+        self.reservoir = []
+
+    def contains(self, length):
+        return length >= self.min_len and (self.max_len == 0 or length <= self.max_len)
+
+    def offer(self, index, max_reads, rng):
+        """
+        Algorithm R reservoir sampling of read indices, each read in the window is retained with equal probability.
+        """
+        self.seen += 1
+        if max_reads == 0 or len(self.reservoir) < max_reads:
+            self.reservoir.append(index)
+        else:
+            j = rng.randrange(self.seen)
+            if j < max_reads:
+                self.reservoir[j] = index
+
+    def print(self):
+        print(f"window      : {self.name}")
+        print(f"seen        : {self.seen}")
+        print(f"kept        : {len(self.reservoir)}")
+
+
+if __name__ == "__main__":
+    main() # type: ignore
@@ -23,6 +23,7 @@ import os
 import click
 import subprocess
 from shutil import copy2
+from seqio import subset_fastx
 
 @click.command()
 @click.option(
@@ -87,7 +88,6 @@ def main(
     mpm = MiniPipeManager(f"{output_dir}/search_mitoseq.log")
 
     # programs
-    seqtk = "/usr/local/seqtk-1.4/seqtk"
     blastn = "/usr/local/ncbi-blast-2.16.0+/bin/blastn"
 
     # make directories
@@ -134,10 +134,9 @@ def main(
     #extract candidate seq
     input_fasta_file = contigs_fasta_file
     output_fasta_file = os.path.join(output_dir, f"candidate_mitoseq.fasta")
-    cmd = f"{seqtk} subseq {input_fasta_file} {id_txt_file} > {output_fasta_file}"
     tgt = f"{output_fasta_file}.OK"
     desc = f"extract candidate sequences"
-    mpm.run(cmd, tgt, desc)
+    mpm.run_func(lambda: subset_fastx(input_fasta_file, candidate_seq_ids, output_fasta_file), tgt, desc)
 
     #blast candidate sequences
     input_fasta_file = os.path.join(output_dir, f"candidate_mitoseq.fasta")
@@ -181,6 +180,18 @@ class MiniPipeManager(object):
             self.log(f" - failed")
             exit(1)
 
+    def run_func(self, func, tgt, desc):
+        if os.path.exists(tgt):
+            self.log(f"{desc} -  already executed")
+            return
+        self.log(f"{desc}")
+        try:
+            func()
+        except (OSError, ValueError) as e:
+            self.log(f" - failed: {e}")
+            exit(1)
+        open(tgt, "w").close()
+
     def log(self, msg):
         print(msg)
         self.log_msg.append(msg)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2025 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import click
+import random
+import struct
+import uuid
+from seqio import BgzfWriter
+
+BASE_CODES = {base: code for code, base in enumerate("=ACMGRSVTWYHKDBN")}
+
+
+@click.command()
+@click.option("-o", "--output_dir", default="demux", show_default=True, help="output directory of demultiplexed BAM files")
+@click.option("-a", "--acquisition_run_id", default="sim0000", show_default=True, help="acquisition run ID used in file names")
+@click.option("-k", "--kit", default="SQK-NBD114-96", show_default=True, help="kit ID used in file names")
+@click.option("-b", "--barcodes", default=4, show_default=True, help="number of barcodes")
+@click.option("-n", "--reads", default=10000, show_default=True, help="reads per barcode")
+@click.option("-l", "--amplicon_len", default=700, show_default=True, help="mean amplicon length")
+@click.option("-s", "--seed", default=42, show_default=True, help="random seed")
+@click.option("--sample_file", default="", help="also write a sample file for the barcodes")
+def main(output_dir, acquisition_run_id, kit, barcodes, reads, amplicon_len, seed, sample_file):
+    """
+    Simulates dorado demux output, unaligned BAM files of amplicon reads per barcode and unclassified reads,
+    for testing the demultiplex and convert stage.
+
+    e.g. simulate_unaligned_bam.py -o demux -b 24 -n 10000 --sample_file sim.sa
+    """
+    print("\t{0:<20} :   {1:<10}".format("output dir", output_dir))
+    print("\t{0:<20} :   {1:<10}".format("acquisition run id", acquisition_run_id))
+    print("\t{0:<20} :   {1:<10}".format("kit", kit))
+    print("\t{0:<20} :   {1:<10}".format("barcodes", barcodes))
+    print("\t{0:<20} :   {1:<10}".format("reads per barcode", reads))
+    print("\t{0:<20} :   {1:<10}".format("amplicon length", amplicon_len))
+    print("\t{0:<20} :   {1:<10}".format("seed", seed))
+
+    os.makedirs(output_dir, exist_ok=True)
+    rng = random.Random(seed)
+    rg = f"{acquisition_run_id}_dna_r10.4.1_e8.2_400bps_hac@v5.0.0"
+
+    names = [f"barcode{i:02}" for i in range(1, barcodes + 1)] + ["unclassified"]
+    for barcode in names:
+        if barcode == "unclassified":
+            bam_file = f"{output_dir}/{acquisition_run_id}_unclassified.bam"
+        else:
+            bam_file = f"{output_dir}/{acquisition_run_id}_{kit}_{barcode}.bam"
+        amplicon = "".join(rng.choice("ACGT") for i in range(amplicon_len))
+        with BgzfWriter(bam_file) as out:
+            write_header(out, rg)
+            for i in range(reads):
+                # mostly amplicon reads of variable quality, with short and long off target reads
+                r = rng.random()
+                if r < 0.8:
+                    seq = amplicon[rng.randrange(20):amplicon_len - rng.randrange(20)]
+                else:
+                    seq = "".join(rng.choice("ACGT") for i in range(int(rng.expovariate(1 / 300)) + 1))
+                mean_q = rng.uniform(4, 25)
+                qual = [max(1, min(50, int(rng.gauss(mean_q, 4)))) for i in range(len(seq))]
+                tags = [("qs", "f", mean_q), ("RG", "Z", rg), ("dx", "i", 0)]
+                if barcode != "unclassified":
+                    tags.append(("BC", "Z", f"{kit}_{barcode}"))
+                write_record(out, str(uuid.UUID(int=rng.getrandbits(128))), 4, seq, qual, tags)
+        print(f"{bam_file}: {reads} reads")
+
+    if sample_file != "":
+        with open(sample_file, "w") as out:
+            out.write("#sample_id\tbarcode\tmin_len\tmax_len\n")
+            for barcode in names:
+                if barcode == "unclassified":
+                    out.write(f"unclassified\tunclassified\tn/a\tn/a\n")
+                else:
+                    out.write(f"sim_{barcode}\t{barcode}\t{amplicon_len-100}\t{amplicon_len+100}\n")
+
+
+def write_header(out, rg):
+    text = f"@HD\tVN:1.6\tSO:unknown\n@RG\tID:{rg}\tPL:ONT\n".encode()
+    out.write(b"BAM\1" + struct.pack("<i", len(text)) + text + struct.pack("<i", 0))
+
+
+def write_record(out, name, flag, seq, qual, tags):
+    """
+    Writes an unaligned BAM record, see section 4.2 of the SAM specification.
+    """
+    name = name.encode() + b"\0"
+    codes = [BASE_CODES[base] for base in seq] + [0]
+    packed = bytes((codes[i] << 4) | codes[i + 1] for i in range(0, len(seq), 2))
+    aux = b""
+    for tag, type, value in tags:
+        if type == "Z":
+            aux += tag.encode() + b"Z" + value.encode() + b"\0"
+        elif type == "f":
+            aux += tag.encode() + b"f" + struct.pack("<f", value)
+        else:
+            aux += tag.encode() + b"i" + struct.pack("<i", value)
+    core = struct.pack("<iiBBHHHiiii", -1, -1, len(name), 0, 4680, 0, flag, len(seq), -1, -1, 0)
+    record = core + name + packed + bytes(qual) + aux
+    out.write(struct.pack("<i", len(record)) + record)
+
+
+if __name__ == "__main__":
+    main() # type: ignore
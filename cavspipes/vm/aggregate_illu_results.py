@@ -20,12 +20,14 @@
 
 import os
 import click
-from shutil import copy2, which
 import openpyxl
 from openpyxl.workbook.views import BookView
-from openpyxl.worksheet.table import Table, TableStyleInfo
-from openpyxl import load_workbook
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+from openpyxl.utils import get_column_letter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import heapq
+import warnings
 
 @click.command()
 @click.option(
@@ -43,7 +45,14 @@ import heapq
     required=True,
     help="output xlsx file",
 )
-def main(input_dir, sample_file, output_xlsx):
+@click.option(
+    "-t",
+    "--threads",
+    default=os.cpu_count(),
+    show_default=True,
+    help="number of processes for parsing sample results",
+)
+def main(input_dir, sample_file, output_xlsx, threads):
     """
     Aggregate results from:
         a. kraken2 results
@@ -72,14 +81,43 @@ def main(input_dir, sample_file, output_xlsx):
                         Sample(index, sample_id, fastq1, fastq2)
                     )
 
-    no_samples = len(samples)
+    #setup headers
+    final_sheet = Sheet("final", ["sample",
+                                  "blast species",
+                                  "blast species (%)",
+                                  "kraken2 species",
+                                  "kraken2 species (%)"])
+    blast_sheet = Sheet("blast", ["sample",
+                                  "annotated contig count",
+                                  "annotation count (up to 10 unique sequences per contig)",
+                                  "species 1",
+                                  "species 1 (%)",
+                                  "species 2",
+                                  "species 2 (%)",
+                                  "species 3",
+                                  "species 3 (%)",
+                                  "other species (%)",
+                                  "other species"])
+    kraken2_sheet = Sheet("kraken2", ["sample",
+                                      "species level read count",
+                                      "species 1",
+                                      "species 1 (%)",
+                                      "species 2",
+                                      "species 2 (%)",
+                                      "species 3",
+                                      "species 3 (%)",
+                                      "other species (%)",
+                                      "other species"])
+
+    # aggregate files
+    with ProcessPoolExecutor(max_workers=threads) as executor:
+        for sample, (final_row, blast_row, kraken2_row) in zip(samples, executor.map(partial(parse_sample, input_dir), samples)):
+            final_sheet.add(final_row, sample.idx + 1)
+            blast_sheet.add(blast_row, sample.idx + 1)
+            kraken2_sheet.add(kraken2_row, sample.idx + 1)
 
     # write out xlsx
-    wb = openpyxl.Workbook()
-    del wb["Sheet"]
-    final_ws = wb.create_sheet("final")
-    blast_ws = wb.create_sheet("blast")
-    kraken2_ws = wb.create_sheet("kraken2")
+    wb = openpyxl.Workbook(write_only=True)
 
     #set opening window size
     view = [BookView(xWindow=8000, yWindow=4000, windowWidth=25000, windowHeight=20000)]
@@ -89,176 +127,162 @@ def main(input_dir, sample_file, output_xlsx):
     style = TableStyleInfo(name="TableStyleLight11", showFirstColumn=False,
                         showLastColumn=False, showRowStripes=True, showColumnStripes=True)
 
-    tab = Table(displayName="final", ref=f"A1:E{no_samples+1}")
-    tab.tableStyleInfo = style
-    final_ws.add_table(tab)
-    final_ws.sheet_view.zoomScale = 200
-
-    tab = Table(displayName="blast", ref=f"A1:K{no_samples+1}")
-    tab.tableStyleInfo = style
-    blast_ws.add_table(tab)
-    blast_ws.sheet_view.zoomScale = 200
-
-    tab = Table(displayName="kraken2", ref=f"A1:J{no_samples+1}")
-    tab.tableStyleInfo = style
-    kraken2_ws.add_table(tab)
-    kraken2_ws.sheet_view.zoomScale = 200
-
-    #setup headers
-    final_ws.cell(1, column=1).value = "sample"
-    final_ws.cell(1, column=2).value = "blast species"
-    final_ws.cell(1, column=3).value = "blast species (%)"
-    final_ws.cell(1, column=4).value = "kraken2 species"
-    final_ws.cell(1, column=5).value = "kraken2 species (%)"
-
-    blast_ws.cell(1, column=1).value = "sample"
-    blast_ws.cell(1, column=2).value = "annotated contig count"
-    blast_ws.cell(1, column=3).value = "annotation count (up to 10 unique sequences per contig)"
-    blast_ws.cell(1, column=4).value = "species 1"
-    blast_ws.cell(1, column=5).value = "species 1 (%)"
-    blast_ws.cell(1, column=6).value = "species 2"
-    blast_ws.cell(1, column=7).value = "species 2 (%)"
-    blast_ws.cell(1, column=8).value = "species 3"
-    blast_ws.cell(1, column=9).value = "species 3 (%)"
-    blast_ws.cell(1, column=10).value = "other species (%)"
-    blast_ws.cell(1, column=11).value = "other species"
-
-    kraken2_ws.cell(1, column=1).value = "sample"
-    kraken2_ws.cell(1, column=2).value = "species level read count"
-    kraken2_ws.cell(1, column=3).value = "species 1"
-    kraken2_ws.cell(1, column=4).value = "species 1 (%)"
-    kraken2_ws.cell(1, column=5).value = "species 2"
-    kraken2_ws.cell(1, column=6).value = "species 2 (%)"
-    kraken2_ws.cell(1, column=7).value = "species 3"
-    kraken2_ws.cell(1, column=8).value = "species 3 (%)"
-    kraken2_ws.cell(1, column=9).value = "other species (%)"
-    kraken2_ws.cell(1, column=10).value = "other species"
-
-    # aggregate files
-    for sample in samples:
-
-        #blast results
-        blast_txt_file = f"{input_dir}/analysis/{sample.idx}_{sample.id}/blast_result/{sample.padded_idx}_{sample.id}.txt"
-
-        try:
-            with open(blast_txt_file, "r") as file:
-                #print(blast_txt_file)
-                unique_contigs = {}
-                species_count = {}
-
-                for line in file:
-                    results = line.rstrip("\n").split("\t")
-                    contig = results[0]
-                    #staxid = results[8]
-                    ssciname = results[9]
-                    #scomname = results[10]
-                    #sskingdom = results[11]
-
-                    unique_contigs[contig] = 1
-
-                    if ssciname in species_count:
-                        species_count[ssciname] += 1
-                    else:
-                        species_count[ssciname] = 1
-
-                species_heap = []
-                for name in species_count:
-                    heapq.heappush(species_heap, Species(species_count[name], name))
-
-                no_annotated_contigs = len(unique_contigs)
-
-                # get top 3 species
-                total_species_annotation_count = 0.0
-                other_species = []
-                for i, species in enumerate(species_heap):
-                    total_species_annotation_count += species.no_reads
-                    if i>2:
-                        other_species.append(species.name)
-
-                blast_ws.cell(row=sample.idx+1, column=1).value = f"{sample.idx}_{sample.id}"
-                blast_ws.cell(row=sample.idx+1, column=2).value = no_annotated_contigs
-                blast_ws.cell(row=sample.idx+1, column=3).value = total_species_annotation_count
-
-                top_species = heapq.nlargest(3, species_heap)
-                top_species_annotation_count = 0.0
-                for i, species in enumerate(top_species):
-                    blast_ws.cell(row=sample.idx+1, column=2*i+4).value = species.name
-                    blast_ws.cell(row=sample.idx+1, column=2*i+5).value = f"{species.no_reads/total_species_annotation_count*100:.2f}"
-                    top_species_annotation_count += species.no_reads
-                    if i == 0:
-                        final_ws.cell(row=sample.idx+1, column=2).value = species.name
-                        final_ws.cell(row=sample.idx+1, column=3).value = f"{species.no_reads/total_species_annotation_count*100:.2f}"
-
-                # get rest of species
-                blast_ws.cell(row=sample.idx+1, column=10).value = f"{(total_species_annotation_count-top_species_annotation_count)/total_species_annotation_count*100:.2f}"
-                blast_ws.cell(row=sample.idx+1, column=11).value = ":".join(other_species)
-                final_ws.cell(row=sample.idx+1, column=1).value = f"{sample.idx}_{sample.id}"
-
-        except FileNotFoundError as e:
-            #print(f"File does not exist: {e.filename}")
-            blast_ws.cell(row=sample.idx+1, column=1).value = f"{sample.idx}_{sample.id}"
-            for i in range(2,12):
-                blast_ws.cell(row=sample.idx+1, column=i).value = "n/a"
-            final_ws.cell(row=sample.idx+1, column=1).value = f"{sample.idx}_{sample.id}"
-            final_ws.cell(row=sample.idx+1, column=2).value = "n/a"
-            final_ws.cell(row=sample.idx+1, column=3).value = "n/a"
-
-
-        #kraken2 results
-        kraken2_txt_file = f"{input_dir}/analysis/{sample.idx}_{sample.id}/kraken2_result/{sample.padded_idx}_{sample.id}.txt"
-        try:
-            with open(kraken2_txt_file, "r") as file:
-                #print(kraken2_txt_file)
-                species_heap = []
-                for line in file:
-                    percentage_reads, no_reads_clade, no_assigned_reads, tax_level, tax_id, nomenclature =  line.strip().split("\t", maxsplit=5)
-                    if tax_level == "S":
-                        heapq.heappush(species_heap, Species(int(no_reads_clade), nomenclature))
-
-                # get top 3 species
-                total_species_read_count = 0.0
-                other_species = []
-                for i, species in enumerate(species_heap):
-                    total_species_read_count += species.no_reads
-                    if i>2:
-                        other_species.append(species.name)
-
-                kraken2_ws.cell(row=sample.idx+1, column=1).value = f"{sample.idx}_{sample.id}"
-                kraken2_ws.cell(row=sample.idx+1, column=2).value = total_species_read_count
-
-                top_species = heapq.nlargest(3, species_heap)
-                top_species_read_count = 0.0
-                for i, species in enumerate(top_species):
-                    kraken2_ws.cell(row=sample.idx+1, column=2*i+3).value = species.name
-                    kraken2_ws.cell(row=sample.idx+1, column=2*i+4).value = f"{species.no_reads/total_species_read_count*100:.2f}"
-                    top_species_read_count += species.no_reads
-                    if i == 0:
-                        final_ws.cell(row=sample.idx+1, column=4).value = species.name
-                        final_ws.cell(row=sample.idx+1, column=5).value = f"{species.no_reads/total_species_read_count*100:.2f}"
-
-                # get rest of species
-                kraken2_ws.cell(row=sample.idx+1, column=9).value = f"{(total_species_read_count-top_species_read_count)/total_species_read_count*100:.2f}"
-                kraken2_ws.cell(row=sample.idx+1, column=10).value = ":".join(other_species)
-
-        except OSError as e:
-            print(f"Error: {kraken2_txt_file} : {e}")
-            pass
-
-    for ws in wb.worksheets:
-        dims = {}
-        for row in ws.rows:
-            for cell in row:
-                if cell.value:
-                    dims[cell.column_letter] = max((dims.get(cell.column_letter, 0), len(str(cell.value))))
-        for col, value in dims.items():
-            print(f"{col} {value}")
-            ws.column_dimensions[col].width = value
-        print(f"==============")
+    for sheet in [final_sheet, blast_sheet, kraken2_sheet]:
+        sheet.write(wb, style)
 
     wb.save(output_xlsx)
     wb.close()
 
 
+def parse_sample(input_dir, sample):
+    """
+    Parses the blast and kraken2 results of a sample into its final, blast and kraken2 rows.
+    """
+    sample_name = f"{sample.idx}_{sample.id}"
+    final_row = [sample_name, None, None, None, None]
+    blast_row = [sample_name] + [None] * 10
+    kraken2_row = []
+
+    #blast results
+    blast_txt_file = f"{input_dir}/analysis/{sample.idx}_{sample.id}/blast_result/{sample.padded_idx}_{sample.id}.txt"
+
+    try:
+        with open(blast_txt_file, "r") as file:
+            #print(blast_txt_file)
+            unique_contigs = {}
+            species_count = {}
+
+            for line in file:
+                results = line.rstrip("\n").split("\t")
+                contig = results[0]
+                #staxid = results[8]
+                ssciname = results[9]
+                #scomname = results[10]
+                #sskingdom = results[11]
+
+                unique_contigs[contig] = 1
+
+                if ssciname in species_count:
+                    species_count[ssciname] += 1
+                else:
+                    species_count[ssciname] = 1
+
+            species_heap = []
+            for name in species_count:
+                heapq.heappush(species_heap, Species(species_count[name], name))
+
+            no_annotated_contigs = len(unique_contigs)
+
+            # get top 3 species
+            total_species_annotation_count = 0.0
+            other_species = []
+            for i, species in enumerate(species_heap):
+                total_species_annotation_count += species.no_reads
+                if i>2:
+                    other_species.append(species.name)
+
+            blast_row[1] = no_annotated_contigs
+            blast_row[2] = total_species_annotation_count
+
+            top_species = heapq.nlargest(3, species_heap)
+            top_species_annotation_count = 0.0
+            for i, species in enumerate(top_species):
+                blast_row[2*i+3] = species.name
+                blast_row[2*i+4] = f"{species.no_reads/total_species_annotation_count*100:.2f}"
+                top_species_annotation_count += species.no_reads
+                if i == 0:
+                    final_row[1] = species.name
+                    final_row[2] = f"{species.no_reads/total_species_annotation_count*100:.2f}"
+
+            # get rest of species
+            blast_row[9] = f"{(total_species_annotation_count-top_species_annotation_count)/total_species_annotation_count*100:.2f}"
+            blast_row[10] = ":".join(other_species)
+
+    except FileNotFoundError as e:
+        #print(f"File does not exist: {e.filename}")
+        blast_row = [sample_name] + ["n/a"] * 10
+        final_row[1] = "n/a"
+        final_row[2] = "n/a"
+
+    #kraken2 results
+    kraken2_txt_file = f"{input_dir}/analysis/{sample.idx}_{sample.id}/kraken2_result/{sample.padded_idx}_{sample.id}.txt"
+    try:
+        with open(kraken2_txt_file, "r") as file:
+            #print(kraken2_txt_file)
+            species_heap = []
+            for line in file:
+                percentage_reads, no_reads_clade, no_assigned_reads, tax_level, tax_id, nomenclature =  line.strip().split("\t", maxsplit=5)
+                if tax_level == "S":
+                    heapq.heappush(species_heap, Species(int(no_reads_clade), nomenclature))
+
+            # get top 3 species
+            total_species_read_count = 0.0
+            other_species = []
+            for i, species in enumerate(species_heap):
+                total_species_read_count += species.no_reads
+                if i>2:
+                    other_species.append(species.name)
+
+            kraken2_row = [sample_name, total_species_read_count] + [None] * 8
+
+            top_species = heapq.nlargest(3, species_heap)
+            top_species_read_count = 0.0
+            for i, species in enumerate(top_species):
+                kraken2_row[2*i+2] = species.name
+                kraken2_row[2*i+3] = f"{species.no_reads/total_species_read_count*100:.2f}"
+                top_species_read_count += species.no_reads
+                if i == 0:
+                    final_row[3] = species.name
+                    final_row[4] = f"{species.no_reads/total_species_read_count*100:.2f}"
+
+            # get rest of species
+            kraken2_row[8] = f"{(total_species_read_count-top_species_read_count)/total_species_read_count*100:.2f}"
+            kraken2_row[9] = ":".join(other_species)
+
+    except OSError as e:
+        print(f"Error: {kraken2_txt_file} : {e}")
+        pass
+
+    return final_row, blast_row, kraken2_row
+
+
+class Sheet(object):
+    """
+    Rows of a worksheet held until written, column widths are tracked as rows are added
+    so that the worksheet can be streamed in write only mode.
+    """
+    def __init__(self, name, header):
+        self.name = name
+        self.rows = []
+        self.widths = {}
+        self.add(header)
+
+    def add(self, row, row_no=None):
+        # a row is placed at row_no when given, leaving blank rows for samples without one
+        while row_no is not None and len(self.rows) < row_no - 1:
+            self.rows.append([])
+        self.rows.append(row)
+        for col, value in enumerate(row, 1):
+            if value:
+                self.widths[col] = max(self.widths.get(col, 0), len(str(value)))
+
+    def write(self, wb, style):
+        ws = wb.create_sheet(self.name)
+        ws.sheet_view.zoomScale = 200
+        for col, value in self.widths.items():
+            ws.column_dimensions[get_column_letter(col)].width = value
+        tab = Table(displayName=self.name, ref=f"A1:{get_column_letter(len(self.rows[0]))}{len(self.rows)}")
+        tab.tableStyleInfo = style
+        # table columns are not inferred from the cells in write only mode
+        tab.tableColumns = [TableColumn(id=i, name=str(value)) for i, value in enumerate(self.rows[0], 1)]
+        with warnings.catch_warnings():
+            # reminder to add the columns, which are added above
+            warnings.filterwarnings("ignore", "In write-only mode you must add table columns manually")
+            ws.add_table(tab)
+        for row in self.rows:
+            ws.append(row)
+
+
 class Sample(object):
     def __init__(self, idx, id, fastq1, fastq2):
         self.idx = idx
@@ -20,11 +20,13 @@
 
 import os
 import click
-from shutil import copy2, which
 import openpyxl
 from openpyxl.workbook.views import BookView
-from openpyxl.worksheet.table import Table, TableStyleInfo
-from openpyxl import load_workbook
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+from openpyxl.utils import get_column_letter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import warnings
 
 @click.command()
 @click.option(
@@ -42,7 +44,14 @@ from openpyxl import load_workbook
     required=True,
     help="output xlsx file",
 )
-def main(input_dir, sample_file, output_xlsx):
+@click.option(
+    "-t",
+    "--threads",
+    default=os.cpu_count(),
+    show_default=True,
+    help="number of processes for parsing sample results",
+)
+def main(input_dir, sample_file, output_xlsx, threads):
     """
     Aggregate results from:
         a. seroseq2 v1.3.1
@@ -71,16 +80,59 @@ def main(input_dir, sample_file, output_xlsx):
                     Sample(index, sample_id, fastq1, fastq2, contigs_fasta)
                 )
 
-    no_samples = len(samples)
+    #setup headers
+    final_sheet = Sheet("final", ["sample",
+                                  "sequence type (mlst)",
+                                  "antigen profile (sistr)",
+                                  "serogroup (sistr)",
+                                  "serovar (sistr)",
+                                  "species (seqsero2)",
+                                  "note (seqsero2)"])
+    sistr_sheet = Sheet("sistr", ["sample",
+                                  "o antigen",
+                                  "h1 antigen",
+                                  "h2 antigen",
+                                  "serogroup",
+                                  "serovar (consensus)",
+                                  "serovar (antigen)",
+                                  "serovar (cgmlst)"])
+    mlst_sheet = Sheet("mlst", ["sample",
+                                "mlst scheme",
+                                "sequence type",
+                                "aroC",
+                                "dnaN",
+                                "hemD",
+                                "hisD",
+                                "purE",
+                                "sucA",
+                                "thrA"])
+    cgmlst_sheet = Sheet("cgmlst", ["sample",
+                                    "sequence type",
+                                    "distance",
+                                    "found loci",
+                                    "genome match",
+                                    "matching alleles",
+                                    "subspecies",
+                                    "serovar"])
+    seqsero2_sheet = Sheet("seqsero2", ["sample",
+                                        "o antigen",
+                                        "h1 antigen",
+                                        "h2 antigen",
+                                        "identity",
+                                        "antigenic profile",
+                                        "serotype",
+                                        "serotype contamination",
+                                        "note"])
+    sheets = [final_sheet, sistr_sheet, mlst_sheet, cgmlst_sheet, seqsero2_sheet]
+
+    # aggregate files
+    with ProcessPoolExecutor(max_workers=threads) as executor:
+        for sample, rows in zip(samples, executor.map(partial(parse_sample, input_dir), samples)):
+            for sheet, row in zip(sheets, rows):
+                sheet.add(row, sample.idx + 1)
 
     # write out xlsx
-    wb = openpyxl.Workbook()
-    del wb["Sheet"]
-    final_ws = wb.create_sheet("final")
-    sistr_ws = wb.create_sheet("sistr")
-    mlst_ws = wb.create_sheet("mlst")
-    cgmlst_ws = wb.create_sheet("cgmlst")
-    seqsero2_ws = wb.create_sheet("seqsero2")
+    wb = openpyxl.Workbook(write_only=True)
 
     #set opening window size
     view = [BookView(xWindow=8000, yWindow=4000, windowWidth=25000, windowHeight=20000)]
@@ -90,202 +142,129 @@ def main(input_dir, sample_file, output_xlsx):
     style = TableStyleInfo(name="TableStyleLight11", showFirstColumn=False,
                         showLastColumn=False, showRowStripes=True, showColumnStripes=True)
 
-    tab = Table(displayName="final", ref=f"A1:G{no_samples+1}")
-    tab.tableStyleInfo = style
-    final_ws.add_table(tab)
-    final_ws.sheet_view.zoomScale = 200
+    for sheet in sheets:
+        sheet.write(wb, style)
 
-    tab = Table(displayName="sistr", ref=f"A1:H{no_samples+1}")
-    tab.tableStyleInfo = style
-    sistr_ws.add_table(tab)
-    sistr_ws.sheet_view.zoomScale = 200
+    wb.save(output_xlsx)
+    wb.close()
 
-    tab = Table(displayName="mlst", ref=f"A1:J{no_samples+1}")
-    tab.tableStyleInfo = style
-    mlst_ws.add_table(tab)
-    mlst_ws.sheet_view.zoomScale = 200
 
-    tab = Table(displayName="cgmlst", ref=f"A1:H{no_samples+1}")
-    tab.tableStyleInfo = style
-    cgmlst_ws.add_table(tab)
-    cgmlst_ws.sheet_view.zoomScale = 200
+def parse_sample(input_dir, sample):
+    """
+    Parses the sistr, mlst and seqsero2 results of a sample into its
+    final, sistr, mlst, cgmlst and seqsero2 rows.
+    """
+    #sistr results
+    with open(f"{input_dir}/{sample.id}/sistr/sistr.tab", "r") as file:
+        sample_results = ""
+        for line in file:
+            sample_results = line.rstrip("\n")
+
+        results = sample_results.split("\t")
+        cgmlst_ST = results[1]
+        cgmlst_distance = results[2]
+        cgmlst_found_loci = results[3]
+        cgmlst_genome_match = results[4]
+        cgmlst_matching_alleles = results[5]
+        cgmlst_subspecies = results[6]
+        fasta_filepath = results[7]
+        genome = results[8]
+        h1 = results[9]
+        h2 = results[10]
+        o_antigen = results[11]
+        serogroup = results[12]
+        serovar = results[13]
+        serovar_antigen = results[14]
+        serovar_cgmlst = results[15]
+
+        sistr_row = [sample.id, o_antigen, h1, h2, serogroup, serovar, serovar_antigen, serovar_cgmlst]
+        cgmlst_row = [sample.id, cgmlst_ST, cgmlst_distance, cgmlst_found_loci, cgmlst_genome_match,
+                      cgmlst_matching_alleles, cgmlst_subspecies, serovar_cgmlst]
+        sistr_antigen_profile = f"{o_antigen}:{h1}:{h2}"
+
+    #mlst results
+    with open(f"{input_dir}/{sample.id}/mlst/results.txt", "r") as file:
+        sample_results = ""
+        for line in file:
+            sample_results = line.rstrip("\n")
+
+        results = sample_results.split("\t")
+        fasta_file = results[0]
+        mlst_scheme = results[1]
+        sequence_type = results[2]
+        locus1_allele = results[3]
+        locus2_allele = results[4]
+        locus3_allele = results[5]
+        locus4_allele = results[6]
+        locus5_allele = results[7]
+        locus6_allele = results[8]
+        locus7_allele = results[9]
+
+        mlst_row = [sample.id, mlst_scheme, sequence_type, locus1_allele, locus2_allele, locus3_allele,
+                    locus4_allele, locus5_allele, locus6_allele, locus7_allele]
+
+    #seqsero2 results
+    with open(f"{input_dir}/{sample.id}/seqsero2/SeqSero_result.tsv", "r") as file:
+        sample_results = ""
+        for line in file:
+            sample_results = line.rstrip("\n")
 
-    tab = Table(displayName="seqsero2", ref=f"A1:I{no_samples+1}")
-    tab.tableStyleInfo = style
-    seqsero2_ws.add_table(tab)
-    seqsero2_ws.sheet_view.zoomScale = 200
+        results = sample_results.split("\t")
+        sample_name = results[0]
+        output_dir = results[1]
+        input_files = results[2]
+        o_antigen = results[3]
+        h1_antigen = results[4]
+        h2_antigen = results[5]
+        identity = results[6]
+        antigenic_profile = results[7]
+        serotype = results[8]
+        serotype_contamination = results[9]
+        note = results[10]
 
-    #setup headers
-    final_ws.cell(1, column=1).value = "sample"
-    final_ws.cell(1, column=2).value = "sequence type (mlst)"
-    final_ws.cell(1, column=3).value = "antigen profile (sistr)"
-    final_ws.cell(1, column=4).value = "serogroup (sistr)"
-    final_ws.cell(1, column=5).value = "serovar (sistr)"
-    final_ws.cell(1, column=6).value = "species (seqsero2)"
-    final_ws.cell(1, column=7).value = "note (seqsero2)"
-
-    sistr_ws.cell(1, column=1).value = "sample"
-    sistr_ws.cell(1, column=2).value = "o antigen"
-    sistr_ws.cell(1, column=3).value = "h1 antigen"
-    sistr_ws.cell(1, column=4).value = "h2 antigen"
-    sistr_ws.cell(1, column=5).value = "serogroup"
-    sistr_ws.cell(1, column=6).value = "serovar (consensus)"
-    sistr_ws.cell(1, column=7).value = "serovar (antigen)"
-    sistr_ws.cell(1, column=8).value = "serovar (cgmlst)"
-
-    cgmlst_ws.cell(1, column=1).value = "sample"
-    cgmlst_ws.cell(1, column=2).value = "sequence type"
-    cgmlst_ws.cell(1, column=3).value = "distance"
-    cgmlst_ws.cell(1, column=4).value = "found loci"
-    cgmlst_ws.cell(1, column=5).value = "genome match"
-    cgmlst_ws.cell(1, column=6).value = "matching alleles"
-    cgmlst_ws.cell(1, column=7).value = "subspecies"
-    cgmlst_ws.cell(1, column=8).value = "serovar"
-
-    mlst_ws.cell(row=1, column=1).value = "sample"
-    mlst_ws.cell(row=1, column=2).value = "mlst scheme"
-    mlst_ws.cell(row=1, column=3).value = "sequence type"
-    mlst_ws.cell(row=1, column=4).value = "aroC"
-    mlst_ws.cell(row=1, column=5).value = "dnaN"
-    mlst_ws.cell(row=1, column=6).value = "hemD"
-    mlst_ws.cell(row=1, column=7).value = "hisD"
-    mlst_ws.cell(row=1, column=8).value = "purE"
-    mlst_ws.cell(row=1, column=9).value = "sucA"
-    mlst_ws.cell(row=1, column=10).value = "thrA"
-
-    seqsero2_ws.cell(1, column=1).value = "sample"
-    seqsero2_ws.cell(1, column=2).value = "o antigen"
-    seqsero2_ws.cell(1, column=3).value = "h1 antigen"
-    seqsero2_ws.cell(1, column=4).value = "h2 antigen"
-    seqsero2_ws.cell(1, column=5).value = "identity"
-    seqsero2_ws.cell(1, column=6).value = "antigenic profile"
-    seqsero2_ws.cell(1, column=7).value = "serotype"
-    seqsero2_ws.cell(1, column=8).value = "serotype contamination"
-    seqsero2_ws.cell(1, column=9).value = "note"
+        seqsero2_row = [sample.id, o_antigen, h1_antigen, h2_antigen, identity, antigenic_profile,
+                        serotype, serotype_contamination, note]
 
-    # aggregate files
-    for sample in samples:
-        #sistr results
-        with open(f"{input_dir}/{sample.id}/sistr/sistr.tab", "r") as file:
-            sample_results = ""
-            for line in file:
-                sample_results = line.rstrip("\n")
-
-            results = sample_results.split("\t")
-            cgmlst_ST = results[1]
-            cgmlst_distance = results[2]
-            cgmlst_found_loci = results[3]
-            cgmlst_genome_match = results[4]
-            cgmlst_matching_alleles = results[5]
-            cgmlst_subspecies = results[6]
-            fasta_filepath = results[7]
-            genome = results[8]
-            h1 = results[9]
-            h2 = results[10]
-            o_antigen = results[11]
-            serogroup = results[12]
-            serovar = results[13]
-            serovar_antigen = results[14]
-            serovar_cgmlst = results[15]
-
-            sistr_ws.cell(row=sample.idx+1, column=1).value = sample.id
-            sistr_ws.cell(row=sample.idx+1, column=2).value = o_antigen
-            sistr_ws.cell(row=sample.idx+1, column=3).value = h1
-            sistr_ws.cell(row=sample.idx+1, column=4).value = h2
-            sistr_ws.cell(row=sample.idx+1, column=5).value = serogroup
-            sistr_ws.cell(row=sample.idx+1, column=6).value = serovar
-            sistr_ws.cell(row=sample.idx+1, column=7).value = serovar_antigen
-            sistr_ws.cell(row=sample.idx+1, column=8).value = serovar_cgmlst
-
-            cgmlst_ws.cell(row=sample.idx+1, column=1).value = sample.id
-            cgmlst_ws.cell(row=sample.idx+1, column=2).value = cgmlst_ST
-            cgmlst_ws.cell(row=sample.idx+1, column=3).value = cgmlst_distance
-            cgmlst_ws.cell(row=sample.idx+1, column=4).value = cgmlst_found_loci
-            cgmlst_ws.cell(row=sample.idx+1, column=5).value = cgmlst_genome_match
-            cgmlst_ws.cell(row=sample.idx+1, column=6).value = cgmlst_matching_alleles
-            cgmlst_ws.cell(row=sample.idx+1, column=7).value = cgmlst_subspecies
-            cgmlst_ws.cell(row=sample.idx+1, column=8).value = serovar_cgmlst
-
-            final_ws.cell(row=sample.idx+1, column=1).value = sample.id
-            final_ws.cell(row=sample.idx+1, column=3).value = f"{o_antigen}:{h1}:{h2}"
-            final_ws.cell(row=sample.idx+1, column=4).value = serogroup
-            final_ws.cell(row=sample.idx+1, column=5).value = serovar
-
-
-        #mlst results
-        with open(f"{input_dir}/{sample.id}/mlst/results.txt", "r") as file:
-            sample_results = ""
-            for line in file:
-                sample_results = line.rstrip("\n")
-
-            results = sample_results.split("\t")
-            fasta_file = results[0]
-            mlst_scheme = results[1]
-            sequence_type = results[2]
-            locus1_allele = results[3]
-            locus2_allele = results[4]
-            locus3_allele = results[5]
-            locus4_allele = results[6]
-            locus5_allele = results[7]
-            locus6_allele = results[8]
-            locus7_allele = results[9]
-
-            mlst_ws.cell(row=sample.idx+1, column=1).value = sample.id
-            mlst_ws.cell(row=sample.idx+1, column=2).value = mlst_scheme
-            mlst_ws.cell(row=sample.idx+1, column=3).value = sequence_type
-            mlst_ws.cell(row=sample.idx+1, column=4).value = locus1_allele
-            mlst_ws.cell(row=sample.idx+1, column=5).value = locus2_allele
-            mlst_ws.cell(row=sample.idx+1, column=6).value = locus3_allele
-            mlst_ws.cell(row=sample.idx+1, column=7).value = locus4_allele
-            mlst_ws.cell(row=sample.idx+1, column=8).value = locus5_allele
-            mlst_ws.cell(row=sample.idx+1, column=9).value = locus6_allele
-            mlst_ws.cell(row=sample.idx+1, column=10).value = locus7_allele
-
-            final_ws.cell(row=sample.idx+1, column=2).value = sequence_type
-
-        #seqsero2 results
-        with open(f"{input_dir}/{sample.id}/seqsero2/SeqSero_result.tsv", "r") as file:
-            sample_results = ""
-            for line in file:
-                sample_results = line.rstrip("\n")
-
-            results = sample_results.split("\t")
-            sample_name = results[0]
-            output_dir = results[1]
-            input_files = results[2]
-            o_antigen = results[3]
-            h1_antigen = results[4]
-            h2_antigen = results[5]
-            identity = results[6]
-            antigenic_profile = results[7]
-            serotype = results[8]
-            serotype_contamination = results[9]
-            note = results[10]
-
-            seqsero2_ws.cell(row=sample.idx+1, column=1).value = sample.id
-            seqsero2_ws.cell(row=sample.idx+1, column=2).value = o_antigen
-            seqsero2_ws.cell(row=sample.idx+1, column=3).value = h1_antigen
-            seqsero2_ws.cell(row=sample.idx+1, column=4).value = h2_antigen
-            seqsero2_ws.cell(row=sample.idx+1, column=5).value = identity
-            seqsero2_ws.cell(row=sample.idx+1, column=6).value = antigenic_profile
-            seqsero2_ws.cell(row=sample.idx+1, column=7).value = serotype
-            seqsero2_ws.cell(row=sample.idx+1, column=8).value = serotype_contamination
-            seqsero2_ws.cell(row=sample.idx+1, column=9).value = note
-
-            final_ws.cell(row=sample.idx+1, column=6).value = identity
-            final_ws.cell(row=sample.idx+1, column=7).value = note
-
-    for ws in wb.worksheets:
-        dims = {}
-        for row in ws.rows:
-            for cell in row:
-                if cell.value:
-                    dims[cell.column_letter] = max((dims.get(cell.column_letter, 0), len(str(cell.value))))
-        for col, value in dims.items():
-            ws.column_dimensions[col].width = value + 2
+    final_row = [sample.id, sequence_type, sistr_antigen_profile, serogroup, serovar, identity, note]
 
-    wb.save(output_xlsx)
-    wb.close()
+    return final_row, sistr_row, mlst_row, cgmlst_row, seqsero2_row
+
+
+class Sheet(object):
+    """
+    Rows of a worksheet held until written, column widths are tracked as rows are added
+    so that the worksheet can be streamed in write only mode.
+    """
+    def __init__(self, name, header):
+        self.name = name
+        self.rows = []
+        self.widths = {}
+        self.add(header)
+
+    def add(self, row, row_no=None):
+        # a row is placed at row_no when given, leaving blank rows for samples without one
+        while row_no is not None and len(self.rows) < row_no - 1:
+            self.rows.append([])
+        self.rows.append(row)
+        for col, value in enumerate(row, 1):
+            if value:
+                self.widths[col] = max(self.widths.get(col, 0), len(str(value)))
+
+    def write(self, wb, style):
+        ws = wb.create_sheet(self.name)
+        ws.sheet_view.zoomScale = 200
+        for col, value in self.widths.items():
+            ws.column_dimensions[get_column_letter(col)].width = value + 2
+        tab = Table(displayName=self.name, ref=f"A1:{get_column_letter(len(self.rows[0]))}{len(self.rows)}")
+        tab.tableStyleInfo = style
+        # table columns are not inferred from the cells in write only mode
+        tab.tableColumns = [TableColumn(id=i, name=str(value)) for i, value in enumerate(self.rows[0], 1)]
+        with warnings.catch_warnings():
+            # reminder to add the columns, which are added above
+            warnings.filterwarnings("ignore", "In write-only mode you must add table columns manually")
+            ws.add_table(tab)
+        for row in self.rows:
+            ws.append(row)
 
 
 class Sample(object):
@@ -20,6 +20,7 @@
 
 import os
 import click
+import hashlib
 import sys
 import re
 import sys
@@ -44,7 +45,12 @@ from datetime import datetime
     help="working directory",
 )
 @click.option("-s", "--sample_file", required=True, help="sample file")
-def main(make_file, run_id, illumina_dir, working_dir, sample_file):
+@click.option(
+    "--sentinel",
+    is_flag=True,
+    help="record content hashes in .OK files and skip steps whose command and inputs are unchanged",
+)
+def main(make_file, run_id, illumina_dir, working_dir, sample_file, sentinel):
     """
     Moves Illumina fastq files to a destination and performs QC
 
@@ -65,6 +71,7 @@ def main(make_file, run_id, illumina_dir, working_dir, sample_file):
     print("\t{0:<20} :   {1:<10}".format("run_dir", run_id))
     print("\t{0:<20} :   {1:<10}".format("illumina_dir", illumina_dir))
     print("\t{0:<20} :   {1:<10}".format("working_dir", working_dir))
+    print("\t{0:<20} :   {1:<10}".format("sentinel", sentinel))
     print("\t{0:<20} :   {1:<10}".format("sample_file", sample_file))
     print("\t{0:<20} :   {1:<10}".format("dest_dir", dest_dir))
     print("\t{0:<20} :   {1:<10}".format("fastq_path", fastq_dir))
@@ -115,7 +122,6 @@ def main(make_file, run_id, illumina_dir, working_dir, sample_file):
     #kraken2_std_db = "/usr/local/ref/kraken2/20210908_standard"
     kraken2_std_db = "/db/kraken2/k2_standard_20220607"
     kt_import_taxonomy = "/usr/local/Krona-2.8.1/bin/ktImportTaxonomy"
-    multiqc = "docker run  -u \"root:root\" -t -v  `pwd`:`pwd` -w `pwd` multiqc/multiqc multiqc "
     spades = "docker run  -u \"root:root\" -t -v  `pwd`:`pwd` -w `pwd` staphb/spades:3.15.4 spades.py "
     bwa = "/usr/local/bwa-0.7.17/bwa"
     samtools = "/usr/local/samtools-1.17/bin/samtools"
@@ -124,16 +130,19 @@ def main(make_file, run_id, illumina_dir, working_dir, sample_file):
     blastdb_prok_nt = "/db/blast/prokaryote"
     blastn = "/usr/local/ncbi-blast-2.16.0+/bin/blastn"
     aggregate_illu_results = "/usr/local/cavspipes-1.2.1/aggregate_illu_results.py"
+    compile_qc_report = "/usr/local/cavspipes-1.2.1/compile_qc_report.py"
 
     # initialize
-    pg = PipelineGenerator(make_file)
+    pipeline_sentinel = "/usr/local/cavspipes-1.2.1/pipeline_sentinel.py"
+    pg = PipelineGenerator(make_file, pipeline_sentinel if sentinel else "", working_dir)
 
     # analyze
-    fastqc_multiqc_dep = ""
+    fastqc_qc_report_dep = ""
     blast_aggregate_dep = ""
-    kraken2_multiqc_dep = ""
-    samtools_multiqc_dep = ""
-    quast_multiqc_dep = ""
+    kraken2_qc_report_dep = ""
+    samtools_qc_report_dep = ""
+    quast_qc_report_dep = ""
+    sample_qc_report_dep = ""
 
     for sample in run.samples:
 
@@ -180,7 +189,7 @@ def main(make_file, run_id, illumina_dir, working_dir, sample_file):
         dep = f"{log_dir}/{sample.padded_idx}_{sample.id}_R1.fastq.gz.OK"
         cmd = f"{fastqc} {input_fastq_file} -o {fastqc_dir} > {log} 2> {err}"
         pg.add(tgt, dep, cmd)
-        fastqc_multiqc_dep += f" {tgt}"
+        fastqc_qc_report_dep += f" {tgt}"
 
         input_fastq_file = f"{fastqc_dir}/{sample.padded_idx}_{sample.id}_R2.fastq.gz"
         log = f"{log_dir}/{sample.idx}_{sample.id}_fastqc2.log"
@@ -189,7 +198,7 @@ def main(make_file, run_id, illumina_dir, working_dir, sample_file):
         dep = f"{log_dir}/{sample.padded_idx}_{sample.id}_R2.fastq.gz.OK"
         cmd = f"{fastqc} {input_fastq_file} -o {fastqc_dir} > {log} 2> {err}"
         pg.add(tgt, dep, cmd)
-        fastqc_multiqc_dep += f" {tgt}"
+        fastqc_qc_report_dep += f" {tgt}"
 
         # kraken2
         input_fastq_file1 = f"{sample.fastq1}"
@@ -200,7 +209,7 @@ def main(make_file, run_id, illumina_dir, working_dir, sample_file):
         err = f"{output_dir}/run.log"
         dep = f"{log_dir}/{run.idx}_{sample.idx}_{sample.id}_R1.fastq.gz.OK {log_dir}/{run.idx}_{sample.idx}_{sample.id}_R2.fastq.gz.OK"
         tgt = f"{log_dir}/{sample.idx}_{sample.id}.kraken2.OK"
-        kraken2_multiqc_dep += f" {tgt}"
+        kraken2_qc_report_dep += f" {tgt}"
         cmd = f"{kraken2} --db {kraken2_std_db} --threads 15 --paired {input_fastq_file1} {input_fastq_file2} --use-names --report {report_file} > {log} 2> {err}"
         pg.add_srun(tgt, dep, cmd, 20)
 
@@ -290,7 +299,7 @@ def main(make_file, run_id, illumina_dir, working_dir, sample_file):
         dep = f"{log_dir}/{sample.idx}_{sample.id}.bam.bai.OK"
         tgt = f"{log_dir}/{sample.idx}_{sample.id}.coverage.stats.OK"
         cmd = f"{samtools} coverage {input_bam_file} > {output_stats_file}"
-        samtools_multiqc_dep += f" {tgt}"
+        samtools_qc_report_dep += f" {tgt}"
         pg.add(tgt, dep, cmd)
 
         # stats
@@ -298,7 +307,7 @@ def main(make_file, run_id, illumina_dir, working_dir, sample_file):
         dep = f"{log_dir}/{sample.idx}_{sample.id}.bam.bai.OK"
         tgt = f"{log_dir}/{sample.idx}_{sample.id}.stats.OK"
         cmd = f"{samtools} stats {input_bam_file} > {output_stats_file}"
-        samtools_multiqc_dep += f" {tgt}"
+        samtools_qc_report_dep += f" {tgt}"
         pg.add(tgt, dep, cmd)
 
         # flag stats
@@ -306,7 +315,7 @@ def main(make_file, run_id, illumina_dir, working_dir, sample_file):
         dep = f"{log_dir}/{sample.idx}_{sample.id}.bam.bai.OK"
         tgt = f"{log_dir}/{sample.idx}_{sample.id}.flag.stats.OK"
         cmd = f"{samtools} flagstat {input_bam_file} > {output_stats_file}"
-        samtools_multiqc_dep += f" {tgt}"
+        samtools_qc_report_dep += f" {tgt}"
         pg.add(tgt, dep, cmd)
 
         #  idx stats
@@ -314,7 +323,7 @@ def main(make_file, run_id, illumina_dir, working_dir, sample_file):
         dep = f"{log_dir}/{sample.idx}_{sample.id}.bam.bai.OK"
         tgt = f"{log_dir}/{sample.idx}_{sample.id}.idx.stats.OK"
         cmd = f"{samtools} idxstats {input_bam_file} > {output_stats_file}"
-        samtools_multiqc_dep += f" {tgt}"
+        samtools_qc_report_dep += f" {tgt}"
         pg.add(tgt, dep, cmd)
 
         # plot samtools stats
@@ -333,53 +342,35 @@ def main(make_file, run_id, illumina_dir, working_dir, sample_file):
         dep = f"{log_dir}/{sample.idx}_{sample.id}.bam.bai.OK"
         tgt = f"{log_dir}/{sample.idx}_{sample.id}.plot_quast.OK"
         cmd = f"{quast} {input_contigs_fasta_file} --bam {input_bam_file} -o {output_quast_dir} > {log}"
-        quast_multiqc_dep += f" {tgt}"
+        quast_qc_report_dep += f" {tgt}"
         pg.add(tgt, dep, cmd)
 
-    # plot fastqc multiqc results
-    analysis = "fastqc"
-    output_dir = f"{analysis_dir}/all/{analysis}"
-    log = f"{log_dir}/{analysis}.multiqc_report.log"
-    err = f"{log_dir}/{analysis}.multiqc_report.err"
-    dep = fastqc_multiqc_dep
-    tgt = f"{log_dir}/{analysis}.multiqc_report.OK"
-    cmd = f"cd {analysis_dir}; {multiqc} . -m fastqc -f -o {output_dir} -n {analysis} --no-ansi > {log} 2> {err}"
-    pg.add(tgt, dep, cmd)
-
-    # plot kraken2 multiqc results
-    analysis = "kraken2"
-    output_dir = f"{analysis_dir}/all/{analysis}"
-    log = f"{log_dir}/{analysis}.multiqc_report.log"
-    err = f"{log_dir}/{analysis}.multiqc_report.err"
-    dep = kraken2_multiqc_dep
-    tgt = f"{log_dir}/{analysis}.multiqc_report.OK"
-    cmd = f"cd {analysis_dir}; {multiqc} . -m kraken -f -o {output_dir} -n {analysis} --no-ansi > {log} 2> {err}"
-    pg.add(tgt, dep, cmd)
-
-    # plot samtools
-    analysis = "samtools"
-    output_dir = f"{analysis_dir}/all/{analysis}"
-    log = f"{log_dir}/{analysis}.multiqc_report.log"
-    err = f"{log_dir}/{analysis}.multiqc_report.err"
-    dep = samtools_multiqc_dep
-    tgt = f"{log_dir}/{analysis}.multiqc_report.OK"
-    cmd = f"cd {analysis_dir}; {multiqc} . -m samtools -f -o {output_dir} -n {analysis} --no-ansi > {log} 2> {err}"
-    pg.add(tgt, dep, cmd)
+        # update the run level QC report as soon as the QC results of the sample are in
+        log = f"{log_dir}/{sample.idx}_{sample.id}.qc_report.log"
+        err = f"{log_dir}/{sample.idx}_{sample.id}.qc_report.err"
+        dep = f"{log_dir}/{sample.padded_idx}_{sample.id}_fastqc1.OK {log_dir}/{sample.padded_idx}_{sample.id}_fastqc2.OK"
+        dep += f" {log_dir}/{sample.idx}_{sample.id}.kraken2.OK"
+        dep += f" {log_dir}/{sample.idx}_{sample.id}.coverage.stats.OK {log_dir}/{sample.idx}_{sample.id}.stats.OK"
+        dep += f" {log_dir}/{sample.idx}_{sample.id}.flag.stats.OK {log_dir}/{sample.idx}_{sample.id}.idx.stats.OK"
+        dep += f" {log_dir}/{sample.idx}_{sample.id}.plot_quast.OK"
+        tgt = f"{log_dir}/{sample.idx}_{sample.id}.qc_report.OK"
+        cmd = f"{compile_qc_report} -i {analysis_dir} -o {analysis_dir}/all/qc -n {run_id} > {log} 2> {err}"
+        sample_qc_report_dep += f" {tgt}"
+        pg.add(tgt, dep, cmd)
 
-    # plot quast
-    analysis = "quast"
-    output_dir = f"{analysis_dir}/all/{analysis}"
-    log = f"{log_dir}/{analysis}.multiqc_report.log"
-    err = f"{log_dir}/{analysis}.multiqc_report.err"
-    dep = quast_multiqc_dep
-    tgt = f"{log_dir}/{analysis}.multiqc_report.OK"
-    cmd = f"cd {analysis_dir}; {multiqc} . -m quast -f -o {output_dir} -n {analysis} --no-ansi > {log} 2> {err}"
+    # compile the final run level QC report from fastqc, kraken2, samtools and quast results
+    analysis = "qc"
+    log = f"{log_dir}/{analysis}.qc_report.log"
+    err = f"{log_dir}/{analysis}.qc_report.err"
+    dep = f"{fastqc_qc_report_dep} {kraken2_qc_report_dep} {samtools_qc_report_dep} {quast_qc_report_dep} {sample_qc_report_dep}"
+    tgt = f"{log_dir}/{analysis}.qc_report.OK"
+    cmd = f"{compile_qc_report} -i {analysis_dir} -o {analysis_dir}/all/{analysis} -n {run_id} > {log} 2> {err}"
     pg.add(tgt, dep, cmd)
 
     # aggregate blast and kraken2 results in excel
     analysis = "blast_kraken2"
     output_xlsx_file = f"{analysis_dir}/all/{analysis}/summary.xlsx"
-    dep = f"{blast_aggregate_dep} {kraken2_multiqc_dep}"
+    dep = f"{blast_aggregate_dep} {kraken2_qc_report_dep}"
     tgt = f"{log_dir}/{analysis}.aggregate_report.OK"
     cmd = f"{aggregate_illu_results} -i {dest_dir} -s {sample_file} -o {output_xlsx_file}"
     pg.add(tgt, dep, cmd)
@@ -394,8 +385,10 @@ def main(make_file, run_id, illumina_dir, working_dir, sample_file):
     copy2(sample_file, trace_dir)
 
 class PipelineGenerator(object):
-    def __init__(self, make_file):
+    def __init__(self, make_file, sentinel="", root=""):
         self.make_file = make_file
+        self.sentinel = sentinel
+        self.root = root
         self.tgts = []
         self.deps = []
         self.cmds = []
@@ -430,8 +423,15 @@ class PipelineGenerator(object):
 
             for i in range(len(self.tgts)):
                 f.write(f"{self.tgts[i]} : {self.deps[i]}\n")
-                f.write(f"\t{self.cmds[i]}\n")
-                f.write(f"\ttouch {self.tgts[i]}\n\n")
+                if self.sentinel == "":
+                    f.write(f"\t{self.cmds[i]}\n")
+                    f.write(f"\ttouch {self.tgts[i]}\n\n")
+                else:
+                    #skip the command when it and the contents of its inputs are unchanged
+                    command_hash = hashlib.sha256(self.cmds[i].replace(self.root, "").encode()).hexdigest()
+                    sentinel = f"{self.sentinel} {{0}} {self.tgts[i]} {self.deps[i]} -r {self.root} -c {command_hash}"
+                    f.write(f"\t{sentinel.format('check')} || ({self.cmds[i]})\n")
+                    f.write(f"\t{sentinel.format('record')}\n\n")
 
             if self.clean_cmd != "":
                 f.write(f"clean : \n")
@@ -20,6 +20,7 @@
 
 import os
 import click
+import hashlib
 import sys
 import re
 import sys
@@ -44,7 +45,12 @@ from datetime import datetime
     help="working directory",
 )
 @click.option("-s", "--sample_file", required=True, help="sample file")
-def main(make_file, run_id, novogene_illumina_dir, working_dir, sample_file):
+@click.option(
+    "--sentinel",
+    is_flag=True,
+    help="record content hashes in .OK files and skip steps whose command and inputs are unchanged",
+)
+def main(make_file, run_id, novogene_illumina_dir, working_dir, sample_file, sentinel):
     """
     Moves Novogene Illumina fastq files to a destination and performs QC
 
@@ -65,6 +71,7 @@ def main(make_file, run_id, novogene_illumina_dir, working_dir, sample_file):
     print("\t{0:<21} :   {1:<10}".format("run_dir", run_id))
     print("\t{0:<21} :   {1:<10}".format("novogene_illumina_dir", novogene_illumina_dir))
     print("\t{0:<21} :   {1:<10}".format("working_dir", working_dir))
+    print("\t{0:<21} :   {1:<10}".format("sentinel", sentinel))
     print("\t{0:<21} :   {1:<10}".format("sample_file", sample_file))
     print("\t{0:<21} :   {1:<10}".format("dest_dir", dest_dir))
     print("\t{0:<21} :   {1:<10}".format("fastq_path", fastq_dir))
@@ -149,7 +156,8 @@ def main(make_file, run_id, novogene_illumina_dir, working_dir, sample_file):
     quast = "docker run -t -v  `pwd`:`pwd` -w `pwd` fischuu/quast quast.py"
 
     # initialize
-    pg = PipelineGenerator(make_file)
+    pipeline_sentinel = "/usr/local/cavspipes-1.2.1/pipeline_sentinel.py"
+    pg = PipelineGenerator(make_file, pipeline_sentinel if sentinel else "", working_dir)
 
     # analyze
     fastqc_multiqc_dep = ""
@@ -447,8 +455,10 @@ def main(make_file, run_id, novogene_illumina_dir, working_dir, sample_file):
     copy2(sample_file, trace_dir)
 
 class PipelineGenerator(object):
-    def __init__(self, make_file):
+    def __init__(self, make_file, sentinel="", root=""):
         self.make_file = make_file
+        self.sentinel = sentinel
+        self.root = root
         self.tgts = []
         self.deps = []
         self.cmds = []
@@ -478,8 +488,15 @@ class PipelineGenerator(object):
 
             for i in range(len(self.tgts)):
                 f.write(f"{self.tgts[i]} : {self.deps[i]}\n")
-                f.write(f"\t{self.cmds[i]}\n")
-                f.write(f"\ttouch {self.tgts[i]}\n\n")
+                if self.sentinel == "":
+                    f.write(f"\t{self.cmds[i]}\n")
+                    f.write(f"\ttouch {self.tgts[i]}\n\n")
+                else:
+                    #skip the command when it and the contents of its inputs are unchanged
+                    command_hash = hashlib.sha256(self.cmds[i].replace(self.root, "").encode()).hexdigest()
+                    sentinel = f"{self.sentinel} {{0}} {self.tgts[i]} {self.deps[i]} -r {self.root} -c {command_hash}"
+                    f.write(f"\t{sentinel.format('check')} || ({self.cmds[i]})\n")
+                    f.write(f"\t{sentinel.format('record')}\n\n")
 
             if self.clean_cmd != "":
                 f.write(f"clean : \n")
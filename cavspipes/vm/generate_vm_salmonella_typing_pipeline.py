@@ -20,6 +20,7 @@
 
 import os
 import click
+import hashlib
 from shutil import copy2, which
 
 @click.command()
@@ -38,7 +39,12 @@ from shutil import copy2, which
     help="working directory",
 )
 @click.option("-s", "--sample_file", required=True, help="sample file")
-def main(make_file, output_dir, sample_file):
+@click.option(
+    "--sentinel",
+    is_flag=True,
+    help="record content hashes in .OK files and skip steps whose command and inputs are unchanged",
+)
+def main(make_file, output_dir, sample_file, sentinel):
     """
     Analyse run raw reads and assembled contigs on
         a. seroseq2 v1.3.1
@@ -53,6 +59,7 @@ def main(make_file, output_dir, sample_file):
 
     print("\t{0:<20} :   {1:<10}".format("make_file", make_file))
     print("\t{0:<20} :   {1:<10}".format("output_dir", output_dir))
+    print("\t{0:<20} :   {1:<10}".format("sentinel", sentinel))
     print("\t{0:<20} :   {1:<10}".format("sample_file", sample_file))
 
     # read sample file
@@ -102,7 +109,8 @@ def main(make_file, output_dir, sample_file):
     print("")
 
     # initialize
-    pg = PipelineGenerator(make_file)
+    pipeline_sentinel = "/usr/local/cavspipes-1.2.1/pipeline_sentinel.py"
+    pg = PipelineGenerator(make_file, pipeline_sentinel if sentinel else "", output_dir)
 
     analyse_ok_files = ""
 
@@ -161,8 +169,10 @@ def main(make_file, output_dir, sample_file):
     copy2(sample_file, trace_dir)
 
 class PipelineGenerator(object):
-    def __init__(self, make_file):
+    def __init__(self, make_file, sentinel="", root=""):
         self.make_file = make_file
+        self.sentinel = sentinel
+        self.root = root
         self.tgts = []
         self.deps = []
         self.cmds = []
@@ -193,8 +203,15 @@ class PipelineGenerator(object):
 
             for i in range(len(self.tgts)):
                 f.write(f"{self.tgts[i]} : {self.deps[i]}\n")
-                f.write(f"\t{self.cmds[i]}\n")
-                f.write(f"\ttouch {self.tgts[i]}\n\n")
+                if self.sentinel == "":
+                    f.write(f"\t{self.cmds[i]}\n")
+                    f.write(f"\ttouch {self.tgts[i]}\n\n")
+                else:
+                    #skip the command when it and the contents of its inputs are unchanged
+                    command_hash = hashlib.sha256(self.cmds[i].replace(self.root, "").encode()).hexdigest()
+                    sentinel = f"{self.sentinel} {{0}} {self.tgts[i]} {self.deps[i]} -r {self.root} -c {command_hash}"
+                    f.write(f"\t{sentinel.format('check')} || ({self.cmds[i]})\n")
+                    f.write(f"\t{sentinel.format('record')}\n\n")
 
             if self.clean_cmd != "":
                 f.write(f"clean : \n")
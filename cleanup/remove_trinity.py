@@ -19,8 +19,6 @@
 # THE SOFTWARE.
 
 import os
-from os.path import exists
-import subprocess
 import argparse
 import textwrap
 import re
@@ -29,6 +27,7 @@ import filecmp
 from pathlib import Path
 from shutil import copy2
 from shutil import rmtree
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 
 def main():
@@ -40,6 +39,9 @@ def main():
             """\
            usage: remove_trinity <dir>
 
+           The scan is recorded in a journal so that an interrupted run
+           can be restarted and will continue from where it stopped.
+
            """
         ),
     )
@@ -52,6 +54,28 @@ def main():
         required=False,
         help="Level of action, 0 for dry run, 1 for copy, 2 for copy and delete",
     )
+    parser.add_argument(
+        "-t",
+        "--threads",
+        default=8,
+        type=int,
+        required=False,
+        help="Number of threads used for scanning and deleting directories",
+    )
+    parser.add_argument(
+        "-j",
+        "--journal",
+        default="remove_trinity.journal.txt",
+        required=False,
+        help="Journal of discovered read_partitions, sizes and actions taken",
+    )
+    parser.add_argument(
+        "-r",
+        "--report",
+        default="remove_trinity.report.txt",
+        required=False,
+        help="Report of the size and action for each read_partitions directory",
+    )
     args = parser.parse_args()
 
     for arg in vars(args):
@@ -59,37 +83,19 @@ def main():
 
     level = args.level
 
-    no_read_partitions = 0
-    if not exists("read_partitions_path.txt"):
+    journal = Journal(args.journal)
+
+    if not journal.discovered:
         # scan all directories
         print("Searching for read_partitions")
-        print(f'find {args.dir} -type d -name "read_partitions"')
-        dirs = subprocess.run(
-            f'find {args.dir} -type d -name "read_partitions"',
-            text=True,
-            shell=True,
-            capture_output=True,
-        )
-        print(dirs.stdout)
-        no_read_partitions = 0
-        f = open("read_partitions_path.txt", "w")
-        dir_list = dirs.stdout.split("\n")
-        for i, path in enumerate(dir_list):
-            if i < len(dir_list) - 1:
-                f.write(f"{path}\n")
-            else:
-                f.write(path)
-            no_read_partitions += 1
-        f.close()
+        for path in find_read_partitions(args.dir, args.threads):
+            journal.record("found", path)
+        journal.record("discovered", args.dir)
     else:
-        no_read_partitions = subprocess.run(
-            f"wc -l read_partitions_path.txt",
-            text=True,
-            shell=True,
-            capture_output=True,
-        ).stdout
+        print(f"Resuming from {args.journal}")
 
-    print(f"Found {no_read_partitions} read partitions")
+    dir_list = journal.paths
+    print(f"Found {len(dir_list)} read partitions")
 
     no_dirs = 0
     no_dirs_with_fasta = 0
@@ -101,61 +107,45 @@ def main():
     no_fasta_files_same = 0
     no_dirs_deleted = 0
 
-    file = open("read_partitions_path.txt")
-    for line in file:
-        if line.endswith("read_partitions\n"):
-            dir_path = Path(line.rstrip()[:-15:])
-            print(dir_path)
-        else:
-            print(f"UNEXPECTED DIR ENCOUNTERED : {line}")
-            break
+    # scan and act on each read_partitions directory
+    partitions = []
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        futures = set()
+        for path in dir_list:
+            futures.add(
+                executor.submit(process_read_partitions, path, level, journal.state(path))
+            )
+            if len(futures) >= 4 * args.threads:
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    partitions.append(log_read_partitions(journal, future.result()))
+        for future in futures:
+            partitions.append(log_read_partitions(journal, future.result()))
 
-        # look for contig file
-        fasta_file = None
-        for file in os.listdir(dir_path):
-            if re.search("\.fasta$", file) is not None:
-                # print('\t' + file)
-                fasta_file = file
-
-        # move fasta file up one directory
-        file_has_been_copied = False
-        no_fasta_file = False
-        if fasta_file is not None:
-            no_dirs_with_fasta += 1
-            parent_dir_path = dir_path.parent.absolute()
-            fasta_size = os.stat(f"{dir_path}/{fasta_file}").st_size
-            total_fasta_size += fasta_size
-
-            src_file_path = dir_path.joinpath(fasta_file)
-            dst_file_path = parent_dir_path.joinpath(fasta_file)
-            dst_dir_path = parent_dir_path
-            if os.path.exists(dst_file_path):
+    journal.close()
+
+    with open(args.report, "w") as report:
+        report.write("#path\tdir_size\tfasta_file\tfasta_size\taction\n")
+        for p in sorted(partitions, key=lambda p: p.path):
+            no_dirs += 1
+            if p.fasta_file is not None:
+                no_dirs_with_fasta += 1
+                total_fasta_size += p.fasta_size
+            else:
+                no_dirs_without_fasta += 1
+            if p.fasta_exists:
                 total_fasta_files_exist += 1
-                if filecmp.cmp(src_file_path, dst_file_path):
+                if p.fasta_same:
                     no_fasta_files_same += 1
-                    file_has_been_copied = True
-            else:
-                if level == 1:
-                    print(f"copy {src_file_path} to {dst_dir_path}")
-                    copy2(src_file_path, dst_dir_path)
-                    file_has_been_copied = True
-
+            elif p.fasta_file is not None:
                 total_fasta_files_copied += 1
-        else:
-            print(f"NO FASTA: {dir_path}")
-            no_fasta_file = True
-            no_dirs_without_fasta += 1
-
-        total_dir_size += get_dir_size(dir_path)
-
-        try:
-            if level == 2:
-                if file_has_been_copied or no_fasta_file:
-                    print(f"delete {dir_path}")
-                    rmtree(dir_path)
-                    no_dirs_deleted += 1
-        except OSError as ex:
-            print(ex)
+            if p.action == "deleted":
+                no_dirs_deleted += 1
+            total_dir_size += p.dir_size
+            fasta_file = p.fasta_file if p.fasta_file is not None else "-"
+            report.write(
+                f"{p.path}\t{p.dir_size}\t{fasta_file}\t{p.fasta_size}\t{p.action}\n"
+            )
 
     total_fasta_size /= 1000000000
     total_dir_size /= 1000000000
@@ -172,22 +162,190 @@ def main():
     print(f"total fasta exist:  {total_fasta_files_exist}")
     print(f"   #no_same:        {no_fasta_files_same}")
     print(f"no dir deleted:     {no_dirs_deleted}")
+    print(f"report:             {args.report}")
+
+
+def find_read_partitions(dir, threads):
+    """
+    Walks dir with a pool of threads and returns all read_partitions directories.
+    read_partitions directories are not descended into.
+    """
+    read_partitions = []
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = {executor.submit(list_subdirs, dir)}
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                for path in future.result():
+                    if os.path.basename(path) == "read_partitions":
+                        print(path)
+                        read_partitions.append(path)
+                    else:
+                        futures.add(executor.submit(list_subdirs, path))
+    return sorted(read_partitions)
 
-    # for line in dirs.stdout.splitlines():
-    #     print(line)
+
+def list_subdirs(path):
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+    except OSError as ex:
+        print(ex)
+    return subdirs
+
+
+def process_read_partitions(path, level, state):
+    """
+    Sizes the trinity directory holding a read_partitions directory, copies its assembled
+    fasta file up one directory and deletes the trinity directory.
+    state is the last journal entry for this directory, if any.
+    """
+    p = ReadPartitions(path)
+    dir_path = Path(path).parent
+
+    if state is not None:
+        p.dir_size = state.dir_size
+        p.fasta_size = state.fasta_size
+        p.fasta_file = state.fasta_file
+        p.action = state.action
+        if state.action == "deleted":
+            return p
+
+    # look for contig file
+    if state is None:
+        for file in os.listdir(dir_path):
+            if re.search(r"\.fasta$", file) is not None:
+                p.fasta_file = file
+        if p.fasta_file is not None:
+            p.fasta_size = os.stat(dir_path.joinpath(p.fasta_file)).st_size
+        p.dir_size = get_dir_size(dir_path)
+        p.action = "sized"
+
+    # move fasta file up one directory
+    file_has_been_copied = False
+    if p.fasta_file is not None:
+        src_file_path = dir_path.joinpath(p.fasta_file)
+        dst_dir_path = dir_path.parent.absolute()
+        dst_file_path = dst_dir_path.joinpath(p.fasta_file)
+        if os.path.exists(dst_file_path):
+            p.fasta_exists = True
+            if filecmp.cmp(src_file_path, dst_file_path):
+                p.fasta_same = True
+                file_has_been_copied = True
+        elif level >= 1:
+            print(f"copy {src_file_path} to {dst_dir_path}")
+            copy2(src_file_path, dst_dir_path)
+            file_has_been_copied = True
+            p.action = "copied"
+        elif level == 0:
+            p.action = "would_copy"
+    else:
+        print(f"NO FASTA: {dir_path}")
+
+    if file_has_been_copied or p.fasta_file is None:
+        if level == 2:
+            try:
+                print(f"delete {dir_path}")
+                rmtree(dir_path)
+                p.action = "deleted"
+            except OSError as ex:
+                print(ex)
+        elif level == 0:
+            p.action = "would_delete"
+
+    return p
+
+
+def log_read_partitions(journal, p):
+    journal.record(p.action, p.path, p.dir_size, p.fasta_file, p.fasta_size)
+    return p
 
 
 def get_dir_size(path="."):
     total = 0
-    with os.scandir(path) as it:
-        for entry in it:
-            if entry.is_file():
-                total += entry.stat().st_size
-            elif entry.is_dir():
-                total += get_dir_size(entry.path)
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+                    elif entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+        except OSError as ex:
+            print(ex)
     return total
 
 
+class ReadPartitions(object):
+    def __init__(self, path):
+        self.path = path
+        self.dir_size = 0
+        self.fasta_file = None
+        self.fasta_size = 0
+        self.fasta_exists = False
+        self.fasta_same = False
+        self.action = "sized"
+
+
+class Journal(object):
+    """
+    Append only tab separated journal of read_partitions directories.
+
+    found       path
+    discovered  root
+    <action>    path  dir_size  fasta_file  fasta_size
+
+    where action is one of sized, copied, deleted, would_copy and would_delete.
+    The last action entry of a path is its current state, deleted paths are skipped.
+    """
+
+    def __init__(self, file):
+        self.paths = []
+        self.states = {}
+        self.discovered = False
+        if os.path.exists(file):
+            with open(file, "r") as f:
+                for line in f:
+                    fields = line.rstrip("\n").split("\t")
+                    if len(fields) < 2:
+                        # partially written line from an interrupted run
+                        continue
+                    if fields[0] == "found":
+                        self.paths.append(fields[1])
+                    elif fields[0] == "discovered":
+                        self.discovered = True
+                    elif len(fields) == 5:
+                        p = ReadPartitions(fields[1])
+                        p.action = fields[0]
+                        p.dir_size = int(fields[2])
+                        p.fasta_file = None if fields[3] == "-" else fields[3]
+                        p.fasta_size = int(fields[4])
+                        self.states[p.path] = p
+            if not self.discovered:
+                self.paths = []
+        self.file = open(file, "a" if self.discovered else "w")
+
+    def state(self, path):
+        return self.states.get(path)
+
+    def record(self, action, path, dir_size=None, fasta_file=None, fasta_size=None):
+        if action == "found":
+            self.paths.append(path)
+        if dir_size is None:
+            self.file.write(f"{action}\t{path}\n")
+        else:
+            fasta_file = fasta_file if fasta_file is not None else "-"
+            self.file.write(f"{action}\t{path}\t{dir_size}\t{fasta_file}\t{fasta_size}\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
 class CAVSParser(argparse.ArgumentParser):
     def error(self, message):
         sys.stderr.write("error: %s\n" % message)
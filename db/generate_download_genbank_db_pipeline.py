@@ -43,11 +43,30 @@ import sys
     show_default=True,
     help="output directory, database files will be downloaded to <out_dir>/<db_release>/<db>",
 )
-def main(make_file, database, output_directory):
+@click.option(
+    "-r",
+    "--mirror_directory",
+    default="/usr/local/ref/mirror",
+    show_default=True,
+    help="mirror directory, release files are kept in <mirror_dir>/genbank_<db> between updates",
+)
+@click.option(
+    "-c",
+    "--checksum_file",
+    required=True,
+    help="md5sum style checksum file of the division files of the release, a local file or a URL, see below",
+)
+def main(make_file, database, output_directory, mirror_directory, checksum_file):
     """
     Download genbank database
 
-    e.g.  generate_download_genbank_db_pipeline -d vrl -m download_gb.mk -o /home/atks/downloads
+    e.g.  generate_download_genbank_db_pipeline -d vrl -m download_gb.mk -o /home/atks/downloads -c gb265.md5
+
+    NCBI does not publish checksums of the division files in the genbank directory, so the
+    checksum file is supplied for each release.  It is the md5sum output of the division files,
+    e.g. md5sum gbvrl*.seq.gz > gb265.md5, computed on a copy of the release that passed gzip -t,
+    or a URL to the checksums published by the provider of the copy.  mirror_db.py fails any
+    new or changed division file that is not in it.
 
     \b
     database bct|con|env|est|gss|htc|htg
@@ -57,6 +76,8 @@ def main(make_file, database, output_directory):
     print("\t{0:<20} :   {1:<10}".format("make_file", make_file))
     print("\t{0:<20} :   {1:<10}".format("database", database))
     print("\t{0:<20} :   {1:<10}".format("output_directory", output_directory))
+    print("\t{0:<20} :   {1:<10}".format("mirror_directory", mirror_directory))
+    print("\t{0:<20} :   {1:<10}".format("checksum_file", checksum_file))
 
     for database in database.split(","):
         if database not in [
@@ -116,6 +137,8 @@ def main(make_file, database, output_directory):
     output_dir = f"{output_directory}/{release_number}/{database}"
     print(f"\nDatabase will be downloaded to {output_dir}")
     output_dir = f"{output_directory}/{release_number}/{database}"
+    database_mirror_dir = f"{mirror_directory}/genbank_{database}"
+    print(f"Files will be mirrored in {database_mirror_dir}")
 
     try:
         os.makedirs(output_dir, exist_ok=True)
@@ -149,37 +172,39 @@ def main(make_file, database, output_directory):
     concat_fasta_file_list = ""
     concat_fasta_file_OK_list = ""
 
+    # mirror the division files, only new or changed files are downloaded and
+    # the files of the release are published as a dated snapshot at <mirror>/current
+    # files are verified against the md5 checksums of the checksum file
+    mirror_db = "/usr/local/cavspipes-1.2.1/mirror_db.py"
+    log = f"{output_dir}/mirror.log"
+    err = f"{output_dir}/mirror.err"
+    tgt = f"{output_dir}/mirror.OK"
+    dep = ""
+    cmd = f'{mirror_db} sync -u https://ftp.ncbi.nlm.nih.gov/genbank/ -p "^gb{database}[0-9]+\\.seq\\.gz$$" -c {checksum_file} -d {database_mirror_dir} -l {release_number} -j 8 > {log} 2> {err}'
+    pg.add(tgt, dep, cmd)
+
     for file_name in files:
         file_core = file_name.split(".")[0]
 
-        # download
-        output_genbank_file = f"{output_dir}/{file_name}"
-        log = f"{output_genbank_file}.log"
-        err = f"{output_genbank_file}.err"
-        dep = ""
-        tgt = f"{output_genbank_file}.OK"
-        cmd = f"wget -c https://ftp.ncbi.nlm.nih.gov/genbank/{file_name} -P {output_dir} > {log} 2> {err}"
-        pg.add(tgt, dep, cmd)
-
         # convert to fasta
         gb2fasta = "/usr/local/cavstools-0.0.1/gb2fasta"
-        input_genbank_file = f"{output_dir}/{file_name}"
+        input_genbank_file = f"{database_mirror_dir}/current/{file_name}"
         output_fasta_file = f"{output_dir}/{file_core}.fasta.gz"
         log = f"{output_fasta_file}.err"
         err = f"{output_fasta_file}.err"
-        dep = f"{input_genbank_file}.OK"
+        dep = f"{output_dir}/mirror.OK"
         tgt = f"{output_fasta_file}.OK"
         cmd = f"{gb2fasta} {input_genbank_file} -o {output_fasta_file} > {log} 2> {err}"
         concat_fasta_file_list += f" {output_fasta_file}"
         concat_fasta_file_OK_list += f" {output_fasta_file}.OK"
         pg.add(tgt, dep, cmd)
 
-    # combine into one file
+    # combine into one file, concatenated gzip members form a valid gzip file so no recompression is needed
     output_fasta_file = f"{output_dir}/genbank.{release_number}.{database}.fasta.gz"
     err = f"{output_fasta_file}.err"
     tgt = f"{output_fasta_file}.OK"
     dep = concat_fasta_file_OK_list
-    cmd = f"zcat {concat_fasta_file_list} | gzip > {output_fasta_file} 2> {err}"
+    cmd = f"cat {concat_fasta_file_list} > {output_fasta_file} 2> {err}"
     pg.add(tgt, dep, cmd)
 
     # get headers
@@ -192,8 +217,8 @@ def main(make_file, database, output_directory):
     cmd = f'zcat {input_fasta_file} | grep -P "^>" > {output_text_file} 2> {err}'
     pg.add(tgt, dep, cmd)
 
-    # clean files
-    cmd = f"rm -fr {output_dir}/gbvrl*.gz  {output_dir}/*.OK {output_dir}/*.err {output_dir}/*.log"
+    # clean files, the mirrored files are kept for the next incremental update
+    cmd = f"rm -fr {output_dir}/gb{database}*.fasta.gz  {output_dir}/*.OK {output_dir}/*.err {output_dir}/*.log"
     pg.add_clean(cmd)
 
     # write make file
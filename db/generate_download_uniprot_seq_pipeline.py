@@ -40,14 +40,25 @@ import sys
     show_default=True,
     help="output directory",
 )
-def main(make_file, output_dir):
+@click.option(
+    "-r",
+    "--mirror_directory",
+    default="/usr/local/ref/mirror",
+    show_default=True,
+    help="mirror directory, release files are kept in <mirror_dir>/uniref90 between updates",
+)
+def main(make_file, output_dir, mirror_directory):
     """
-    Download genbank sequences
+    Download UniRef90 sequences
 
-    e.g.  generate_download_genbank_seq_pipeline -s id.txt -m download_gb_seq.mk -o /home/atks/downloads
+    The release is mirrored with mirror_db.py and verified against the md5 checksums of the
+    RELEASE.metalink file of the UniRef90 directory.
+
+    e.g.  generate_download_uniprot_seq_pipeline -m download_uniprot_sequences.mk -o /home/atks/downloads
     """
     print("\t{0:<20} :   {1:<10}".format("make file", make_file))
     print("\t{0:<20} :   {1:<10}".format("output dir", output_dir))
+    print("\t{0:<20} :   {1:<10}".format("mirror directory", mirror_directory))
 
     release_notes = subprocess.run(
         [
@@ -75,16 +86,23 @@ def main(make_file, output_dir):
     print("Generating pipeline")
     pg = PipelineGenerator(make_file)
 
-    # download
-    input_fasta_file = (
-        "https://ftp.uniprot.org/pub/databases/uniprot/uniref/uniref90/uniref90.fasta"
-    )
-    output_uniprot_file = f"uniref90.{release_number}.fasta.gz"
-    log = f"{output_uniprot_file}.log"
-    err = f"{output_uniprot_file}.err"
+    # mirror the release, the fasta file is only downloaded when it has changed and
+    # is published as a dated snapshot at <mirror>/current
+    mirror_db = "/usr/local/cavspipes-1.2.1/mirror_db.py"
+    uniref_mirror_dir = f"{mirror_directory}/uniref90"
+    log = f"{output_dir}/uniref90.{release_number}.mirror.log"
+    err = f"{output_dir}/uniref90.{release_number}.mirror.err"
+    tgt = f"{output_dir}/uniref90.{release_number}.mirror.OK"
     dep = ""
+    cmd = f'{mirror_db} sync -u https://ftp.uniprot.org/pub/databases/uniprot/uniref/uniref90/ -p "^uniref90\\.fasta\\.gz$$" -c RELEASE.metalink -d {uniref_mirror_dir} -l {release_number} -j 1 > {log} 2> {err}'
+    pg.add(tgt, dep, cmd)
+
+    # link the release into the output directory, copying when the mirror is on another file system
+    input_fasta_file = f"{uniref_mirror_dir}/current/uniref90.fasta.gz"
+    output_uniprot_file = f"{output_dir}/uniref90.{release_number}.fasta.gz"
+    dep = f"{output_dir}/uniref90.{release_number}.mirror.OK"
     tgt = f"{output_uniprot_file}.OK"
-    cmd = f"wget -c {input_fasta_file} -P {output_dir} -O {output_uniprot_file} > {log} 2> {err}"
+    cmd = f"ln -f {input_fasta_file} {output_uniprot_file} 2> /dev/null || cp {input_fasta_file} {output_uniprot_file}"
     pg.add(tgt, dep, cmd)
 
     # clean files
@@ -22,18 +22,41 @@ import os.path
 import sys
 import click
 import re
+from genbank_index import GenBankIndex, parse_genbank_file
 
 
 @click.command()
 @click.argument("genbank_file", nargs=1)
 @click.option("-o", "--bed_file", required=False, default="", help="output bed file")
-def main(genbank_file, bed_file):
+@click.option(
+    "-d",
+    "--db_file",
+    required=False,
+    default="",
+    help="genbank_index.py database, the genbank file is indexed if it is not already",
+)
+def main(genbank_file, bed_file, db_file):
     """
     Extracts genes from a genbank file
 
     e.g. genbank2genebed.py ref.genbank -o out.bed
+         genbank2genebed.py ref.genbank -d genbank.db -o out.bed
     """
 
+    if db_file != "":
+        path = os.path.abspath(genbank_file)
+        stat = os.stat(path)
+        db = GenBankIndex(db_file)
+        if not db.is_indexed(path, stat.st_size, stat.st_mtime):
+            db.add_file(path, stat.st_size, stat.st_mtime, parse_genbank_file(path))
+        ofile = sys.stdout if bed_file == "" else open(bed_file, "w")
+        for accession, beg, end, gene in db.genes(path=path):
+            ofile.write(f"{accession}\t{beg}\t{end}\t{gene}\n")
+        if ofile is not sys.stdout:
+            ofile.close()
+        db.close()
+        return
+
     with open(genbank_file) as ifile:
         if bed_file == "":
             ofile = sys.stdout
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2026 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import sys
+import re
+import gzip
+import click
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+
+@click.group()
+def main():
+    """
+    Indexes GenBank flat files into a SQLite database so that metadata, gene intervals
+    and sequences can be queried without re-parsing the flat files.
+
+    e.g. genbank_index.py build genbank.db lsdv/*.genbank
+         genbank_index.py country_year genbank.db
+         genbank_index.py bed genbank.db AF325528.1 -o AF325528.1.bed
+         genbank_index.py fasta genbank.db -o lsdv.fasta
+    """
+    pass
+
+
+@main.command("build")
+@click.argument("db_file", nargs=1)
+@click.argument("inputs", nargs=-1, required=True)
+@click.option("-t", "--threads", default=os.cpu_count(), show_default=True, help="number of processes")
+def build(db_file, inputs, threads):
+    """
+    Adds GenBank files, or directories of GenBank files, to the index.
+    Files that are unchanged since they were last indexed are skipped and
+    indexed files that no longer exist are removed from the index.
+    """
+    genbank_files = []
+    for input in inputs:
+        if os.path.isdir(input):
+            for dirpath, dirnames, filenames in os.walk(input):
+                for filename in sorted(filenames):
+                    if re.search(r"\.(genbank|gb|gbk|gbff|seq)(\.gz)?$", filename):
+                        genbank_files.append(os.path.join(dirpath, filename))
+        else:
+            genbank_files.append(input)
+
+    db = GenBankIndex(db_file)
+    no_pruned = db.prune()
+
+    files = []
+    for genbank_file in genbank_files:
+        path = os.path.abspath(genbank_file)
+        stat = os.stat(path)
+        if not db.is_indexed(path, stat.st_size, stat.st_mtime):
+            files.append((path, stat.st_size, stat.st_mtime))
+
+    print(f"no genbank files     : {len(genbank_files)}")
+    print(f"no files to index    : {len(files)}")
+    print(f"no files pruned      : {no_pruned}")
+
+    no_records = 0
+    with ProcessPoolExecutor(max_workers=threads) as executor:
+        for (path, size, mtime), records in zip(
+            files, executor.map(parse_genbank_file, [file[0] for file in files], chunksize=16)
+        ):
+            db.add_file(path, size, mtime, records)
+            no_records += len(records)
+
+    duplicates = db.duplicates()
+    db.close()
+    print(f"no records indexed   : {no_records}")
+    print(f"no duplicate records : {len(duplicates)}")
+    for accession, paths in duplicates:
+        print(f"warning: {accession} is in {len(paths)} files: {', '.join(paths)}", file=sys.stderr)
+
+
+@main.command("country_year")
+@click.argument("db_file", nargs=1)
+@click.argument("accessions", nargs=-1)
+@click.option(
+    "-d",
+    "--detailed",
+    is_flag=True,
+    default=False,
+    help="output file, accession, length, country, year, host and definition",
+)
+@click.option("-l", "--min_length", default=0, show_default=True, help="minimum sequence length")
+def country_year(db_file, accessions, detailed, min_length):
+    """
+    Extracts country and submission year of indexed records.
+
+    e.g. genbank_index.py country_year genbank.db
+    """
+    db = GenBankIndex(db_file)
+    n = 0
+    n_country_annotated = 0
+    n_date_annotated = 0
+    for record in db.records(accessions):
+        n += 1
+        country = "no country" if record["country"] is None else record["country"]
+        year = "no year" if record["submission_year"] is None else record["submission_year"]
+        host = "unknown" if record["host"] is None else record["host"]
+        if record["country"] is not None:
+            n_country_annotated += 1
+        if record["submission_year"] is not None:
+            n_date_annotated += 1
+        if record["length"] < min_length:
+            continue
+        if detailed:
+            print(f"{record['path']}\t{record['accession']}\t{record['length']}\t{country}\t{year}\t{host}\t{record['definition']}")
+        else:
+            print(f"{record['accession']}\t{country}\t{year}\t>{record['accession']} {record['definition']}")
+    db.close()
+
+    print(f"no records           : {n}")
+    print(f"no country annotated : {n_country_annotated}")
+    print(f"no date annotated    : {n_date_annotated}")
+
+
+@main.command("bed")
+@click.argument("db_file", nargs=1)
+@click.argument("accessions", nargs=-1)
+@click.option("-o", "--bed_file", required=False, default="", help="output bed file")
+def bed(db_file, accessions, bed_file):
+    """
+    Extracts gene intervals of indexed records.
+    An accession indexed from more than one file has the genes of each copy extracted.
+
+    e.g. genbank_index.py bed genbank.db AF325528.1 -o out.bed
+    """
+    db = GenBankIndex(db_file)
+    ofile = sys.stdout if bed_file == "" else open(bed_file, "w")
+    for accession, beg, end, gene in db.genes(accessions):
+        ofile.write(f"{accession}\t{beg}\t{end}\t{gene}\n")
+    if ofile is not sys.stdout:
+        ofile.close()
+    db.close()
+
+
+@main.command("fasta")
+@click.argument("db_file", nargs=1)
+@click.argument("accessions", nargs=-1)
+@click.option("-o", "--fasta_file", required=True, help="output FASTA file")
+def fasta(db_file, accessions, fasta_file):
+    """
+    Extracts sequences of indexed records from their GenBank files.
+    Sequences are written in file and record order.
+
+    e.g. genbank_index.py fasta genbank.db -o out.fasta
+    """
+    db = GenBankIndex(db_file)
+    records_by_path = {}
+    for record in db.records(accessions):
+        records_by_path.setdefault(record["path"], []).append(record)
+    fopen = gzip.open if fasta_file.endswith("gz") else open
+    with fopen(fasta_file, "wt") as fa:
+        for path in sorted(records_by_path):
+            for record, seq in read_sequences(path, records_by_path[path]):
+                fa.write(f">{record['accession']} {record['definition']}\n{seq}\n")
+    db.close()
+
+
+def read_sequences(path, records):
+    """
+    Reads the ORIGIN sections of records of a file from their byte offsets.
+    The file is streamed once, records are read in offset order so that seeks in
+    a gzipped file only ever move forward.
+    """
+    gopen = gzip.open if path.endswith("gz") else open
+    with gopen(path, "rb") as file:
+        for record in sorted(records, key=lambda record: record["seq_offset"]):
+            file.seek(record["seq_offset"])
+            origin = file.read(record["seq_end"] - record["seq_offset"]).decode()
+            yield record, re.sub(r"[\d\s]", "", origin).upper()
+
+
+def parse_genbank_file(path):
+    """
+    Parses all records in a GenBank file.
+    Returns a list of records, each a dict of its metadata, genes and sequence offsets.
+    """
+    records = []
+    record = None
+    gene = None
+    section = ""
+    qualifier = ""
+    value = None
+    offset = 0
+    gopen = gzip.open if path.endswith("gz") else open
+    with gopen(path, "rb") as file:
+        for raw_line in file:
+            line_offset = offset
+            offset += len(raw_line)
+            line = raw_line.decode("latin-1").rstrip("\r\n")
+
+            if line.startswith("LOCUS"):
+                record = new_record(path)
+                m = re.match(r"LOCUS\s+(\S+)\s+(\d+) (bp|aa)", line)
+                if m:
+                    record["accession"] = m.group(1)
+                    record["length"] = int(m.group(2))
+                section = "LOCUS"
+                continue
+            if record is None:
+                continue
+
+            if line.startswith("//"):
+                if section == "ORIGIN":
+                    record["seq_end"] = line_offset
+                record["definition"] = record["definition"].rstrip(".")
+                records.append(record)
+                record = None
+                gene = None
+                continue
+
+            if section == "ORIGIN":
+                continue
+
+            if line[:1] != " ":
+                section = line.split(" ", 1)[0]
+                qualifier = ""
+                value = None
+                if section == "DEFINITION":
+                    record["definition"] = line[12:].strip()
+                elif section == "VERSION":
+                    record["accession"] = line[12:].split()[0]
+                elif section == "ORIGIN":
+                    record["seq_offset"] = offset
+                continue
+
+            if section == "DEFINITION" and line.startswith("            "):
+                record["definition"] += " " + line.strip()
+            elif section == "REFERENCE":
+                m = re.match(r"  JOURNAL   Submitted \((\d+-\w+-(\d+))\)", line)
+                if m:
+                    record["submission_date"] = m.group(1)
+                    record["submission_year"] = m.group(2)
+            elif section == "FEATURES":
+                if line[5:6] != " ":
+                    # new feature
+                    gene = None
+                    qualifier = ""
+                    value = None
+                    key, location = line[5:21].strip(), line[21:].strip()
+                    if key == "gene":
+                        m = re.match(r"[^\d]*(\d+)\.\.>?(\d+)", location)
+                        if m:
+                            strand = "-" if location.startswith("complement") else "+"
+                            gene = [int(m.group(1)) - 1, int(m.group(2)), None, strand]
+                            record["genes"].append(gene)
+                else:
+                    if value is not None:
+                        # continuation of a quoted qualifier value
+                        value += " " + line.strip()
+                    else:
+                        m = re.match(r"\s+/(\w+)(?:=(.*))?$", line)
+                        if not m:
+                            continue
+                        qualifier = m.group(1)
+                        value = "" if m.group(2) is None else m.group(2)
+                    if value.startswith('"') and (len(value) == 1 or not value.endswith('"')):
+                        continue
+                    value = value.strip('"')
+                    if qualifier in ("country", "geo_loc_name") and record["country"] is None:
+                        record["country"] = value
+                    elif qualifier in ("collection_date", "host", "organism") and record[qualifier] is None:
+                        record[qualifier] = value
+                    elif gene is not None and qualifier == "gene":
+                        gene[2] = value
+                    elif gene is not None and qualifier == "locus_tag" and gene[2] is None:
+                        gene[2] = value
+                    value = None
+
+    for record in records:
+        record["genes"] = [g for g in record["genes"] if g[2] is not None]
+
+    return records
+
+
+def new_record(path):
+    return {
+        "accession": "",
+        "path": path,
+        "definition": "",
+        "length": 0,
+        "organism": None,
+        "country": None,
+        "host": None,
+        "collection_date": None,
+        "submission_date": None,
+        "submission_year": None,
+        "seq_offset": 0,
+        "seq_end": 0,
+        "genes": [],
+    }
+
+
+class GenBankIndex(object):
+    """
+    SQLite index of GenBank records.
+    Records are keyed on accession and file so that an accession present in more
+    than one file is kept once per file rather than replaced by the last file indexed.
+    """
+
+    schema_version = 1
+
+    fields = [
+        "accession",
+        "path",
+        "definition",
+        "length",
+        "organism",
+        "country",
+        "host",
+        "collection_date",
+        "submission_date",
+        "submission_year",
+        "seq_offset",
+        "seq_end",
+    ]
+
+    def __init__(self, db_file):
+        self.conn = sqlite3.connect(db_file)
+        self.conn.row_factory = sqlite3.Row
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < self.schema_version:
+            # indexes from older versions are keyed on accession alone, rebuild them
+            self.conn.executescript(
+                """
+                DROP TABLE IF EXISTS files;
+                DROP TABLE IF EXISTS records;
+                DROP TABLE IF EXISTS genes;
+                """
+            )
+            self.conn.execute(f"PRAGMA user_version = {self.schema_version}")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime REAL
+            );
+            CREATE TABLE IF NOT EXISTS records (
+                accession TEXT,
+                path TEXT,
+                definition TEXT,
+                length INTEGER,
+                organism TEXT,
+                country TEXT,
+                host TEXT,
+                collection_date TEXT,
+                submission_date TEXT,
+                submission_year TEXT,
+                seq_offset INTEGER,
+                seq_end INTEGER,
+                PRIMARY KEY (accession, path)
+            );
+            CREATE TABLE IF NOT EXISTS genes (
+                accession TEXT,
+                path TEXT,
+                beg INTEGER,
+                end INTEGER,
+                gene TEXT,
+                strand TEXT
+            );
+            CREATE INDEX IF NOT EXISTS records_path ON records(path);
+            CREATE INDEX IF NOT EXISTS genes_accession ON genes(accession);
+            CREATE INDEX IF NOT EXISTS genes_path ON genes(path);
+            """
+        )
+
+    def is_indexed(self, path, size, mtime):
+        row = self.conn.execute("SELECT size, mtime FROM files WHERE path = ?", (path,)).fetchone()
+        return row is not None and row["size"] == size and row["mtime"] == mtime
+
+    def add_file(self, path, size, mtime, records):
+        with self.conn:
+            self.conn.execute("DELETE FROM genes WHERE path = ?", (path,))
+            self.conn.execute("DELETE FROM records WHERE path = ?", (path,))
+            for record in records:
+                self.conn.execute(
+                    f"INSERT OR REPLACE INTO records ({','.join(self.fields)}) VALUES ({','.join('?' * len(self.fields))})",
+                    [record[field] for field in self.fields],
+                )
+                self.conn.executemany(
+                    "INSERT INTO genes (accession, path, beg, end, gene, strand) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(record["accession"], path, *gene) for gene in record["genes"]],
+                )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime) VALUES (?, ?, ?)",
+                (path, size, mtime),
+            )
+
+    def prune(self):
+        """
+        Removes indexed files that no longer exist and their records and genes.
+        Returns the number of files removed.
+        """
+        paths = [row["path"] for row in self.conn.execute("SELECT path FROM files")]
+        missing = [path for path in paths if not os.path.exists(path)]
+        with self.conn:
+            for path in missing:
+                self.conn.execute("DELETE FROM genes WHERE path = ?", (path,))
+                self.conn.execute("DELETE FROM records WHERE path = ?", (path,))
+                self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+        return len(missing)
+
+    def duplicates(self):
+        """
+        Returns the accessions indexed from more than one file with their files.
+        """
+        rows = self.conn.execute(
+            "SELECT accession, group_concat(path, char(9)) AS paths FROM records "
+            "GROUP BY accession HAVING count(*) > 1 ORDER BY accession"
+        )
+        return [(row["accession"], sorted(row["paths"].split("\t"))) for row in rows]
+
+    def records(self, accessions=()):
+        if len(accessions) == 0:
+            return self.conn.execute("SELECT * FROM records ORDER BY path, seq_offset")
+        return [
+            row
+            for accession in accessions
+            for row in self.conn.execute("SELECT * FROM records WHERE accession = ? ORDER BY path", (accession,))
+        ]
+
+    def genes(self, accessions=(), path=None):
+        if len(accessions) == 0:
+            return self.conn.execute(
+                "SELECT genes.accession, beg, end, gene FROM genes JOIN records USING (accession, path) "
+                + ("" if path is None else "WHERE path = ? ")
+                + "ORDER BY records.path, records.seq_offset, genes.rowid",
+                () if path is None else (path,),
+            )
+        return [
+            row
+            for accession in accessions
+            for row in self.conn.execute(
+                "SELECT accession, beg, end, gene FROM genes WHERE accession = ? ORDER BY path, rowid", (accession,)
+            )
+        ]
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    main()  # type: ignore
@@ -23,7 +23,10 @@ import os
 import click
 import subprocess
 import re
+import hashlib
+import numpy as np
 from shutil import copy2
+from concurrent.futures import ThreadPoolExecutor
 
 
 @click.command()
@@ -68,10 +71,43 @@ from shutil import copy2
     default="genus_species",
     help="for RAXML file naming",
 )
-def main(working_dir, fasta_file, ref_fasta_file, ref_msa_file, sample_file, prefix):
+@click.option("-e", "--model", default="GTR+G", show_default=True, help="RAxML-NG substitution model")
+@click.option("-b", "--bs_trees", default=100, show_default=True, help="number of bootstrap replicates")
+@click.option("-n", "--shard_size", default=10, show_default=True, help="number of bootstrap replicates in each shard")
+@click.option("-j", "--jobs", default=4, show_default=True, help="number of shards run concurrently")
+@click.option("-t", "--threads", default=2, show_default=True, help="number of RAxML-NG threads of each job")
+@click.option("-x", "--seed", default=1, show_default=True, help="random seed, shard i is seeded with seed+i")
+@click.option("-S", "--srun", is_flag=True, default=False, help="run shards with srun so that they spread over nodes")
+@click.option("-c", "--cache_dir", default="", help="cache of alignments, trees and bootstrap shards, defaults to <working_dir>/cache")
+@click.option("-i", "--incremental", is_flag=True, default=False, help="add new sequences to a cached alignment and tree")
+@click.option("-a", "--max_added", default=10, show_default=True, help="maximum number of sequences added incrementally")
+def main(
+    working_dir,
+    fasta_file,
+    ref_fasta_file,
+    ref_msa_file,
+    sample_file,
+    prefix,
+    model,
+    bs_trees,
+    shard_size,
+    jobs,
+    threads,
+    seed,
+    srun,
+    cache_dir,
+    incremental,
+    max_added,
+):
     """
     Generates a phylogenetic tree from a panel of sequences and reference sequences
 
+    Bootstrap replicates are split into independently seeded shards that are run concurrently and
+    merged before the consensus.  Alignments, maximum likelihood trees and shards are cached by the
+    content hash of their inputs so a rerun only computes what changed.  In incremental mode a few
+    new sequences are added to a cached alignment with mafft --add --keeplength, and the cached
+    tree, with each new sequence grafted next to its closest sequence, starts the tree search.
+
      #combines both fasta files, multiple align, build tree \n
          make_phylogenetic_tree.py -f lsdv.fasta -r lsdv_ref.fasta
 
@@ -83,6 +119,9 @@ def main(working_dir, fasta_file, ref_fasta_file, ref_msa_file, sample_file, pre
 
      #build tree from the multiple sequence alignment \n
          make_phylogenetic_tree.py -m lsdv_ref.msa
+
+     #add a few isolates to the alignment and tree of a previous run sharing the cache \n
+         make_phylogenetic_tree.py -f lsdv_new.fasta -r lsdv_ref.fasta -c lsdv_cache -i
     """
 
     #make sure at least one of the two files is provided
@@ -110,14 +149,19 @@ def main(working_dir, fasta_file, ref_fasta_file, ref_msa_file, sample_file, pre
     if working_dir != "":
         output_dir = os.path.abspath(working_dir)
         trace_dir = f"{output_dir}/trace"
+    if cache_dir == "":
+        cache_dir = f"{output_dir}/cache"
+    cache_dir = os.path.abspath(cache_dir)
     try:
         os.makedirs(output_dir, exist_ok=True)
         os.makedirs(trace_dir, exist_ok=True)
+        for dir in ["msa", "tree", "bootstrap"]:
+            os.makedirs(f"{cache_dir}/{dir}", exist_ok=True)
     except OSError as error:
         print(f"{error.filename} cannot be created")
 
     # version
-    version = "1.0.0"
+    version = "1.1.0"
 
     # initialize
     mpm = MiniPipeManager(f"{output_dir}/make_phylogenetic_tree.log")
@@ -138,6 +182,7 @@ def main(working_dir, fasta_file, ref_fasta_file, ref_msa_file, sample_file, pre
     log_text = ""
 
     # if fasta_file not empty, compare sequences to reference
+    # the combined FASTA file is always regenerated as the cache keys are derived from it
     desc = (
         f"Generating combined FASTA file with clean IDs for multiple sequence alignment"
     )
@@ -149,44 +194,114 @@ def main(working_dir, fasta_file, ref_fasta_file, ref_msa_file, sample_file, pre
         desc = f"Generating FASTA file with clean IDs from reference multiple sequence alignment only for multiple sequence alignment"
     combined_fasta_file = f"{output_dir}/combined.fasta"
     cmd = fr'cat {fasta_file} {ref_fasta_file} | {seqkit} replace -p "[\s;:,\(\)\']" -r "_"  > {combined_fasta_file}'
-    tgt = f"{combined_fasta_file}.OK"
-    mpm.run(cmd, tgt, desc)
+    mpm.run(cmd, "", desc)
+
+    # the alignment is keyed by its inputs, the tree and shards by the alignment
+    output_msa_file = f"{output_dir}/{prefix}.msa"
+    start_tree_file = ""
+    previous = None
+    if incremental:
+        if multiple_align == "all":
+            previous = find_cached_alignment(cache_dir, combined_fasta_file, model, max_added)
+            if previous is None:
+                mpm.log(f"No cached alignment with at most {max_added} sequences fewer, aligning all sequences")
+        else:
+            mpm.log("Incremental mode needs sequences in FASTA files only, aligning as usual")
+
+    if previous is not None:
+        # add the new sequences to the cached alignment keeping its columns
+        cached_msa_file, cached_tree_file, added = previous
+        mpm.log(f"Adding {len(added)} sequences to {cached_msa_file}")
+        added_fasta_file = f"{output_dir}/added.fasta"
+        write_fasta(added_fasta_file, [(name, seq) for name, seq in read_fasta(combined_fasta_file) if name in added])
+        msa_key = hash_strings([hash_file(cached_msa_file), hash_file(added_fasta_file), "add_keeplength"])
+        msa_file = f"{cache_dir}/msa/{msa_key}.msa"
+        log = f"{output_dir}/msa.log"
+        cmd = f"{mafft} --add {added_fasta_file} --keeplength {cached_msa_file} > {msa_file}.tmp 2>{log} && mv {msa_file}.tmp {msa_file}"
+        tgt = f"{msa_file}.OK"
+        desc = f"Incremental multiple sequence alignment"
+        mpm.run(cmd, tgt, desc)
 
-    if multiple_align == "all":
+        # graft the new sequences onto the cached tree as the starting tree of the search
+        start_tree_file = f"{cache_dir}/tree/{hash_strings([msa_key, hash_file(cached_tree_file)])}.start.tree"
+        if not os.path.exists(start_tree_file):
+            with open(cached_tree_file, "r") as file:
+                tree = file.read().strip()
+            with open(start_tree_file, "w") as file:
+                file.write(graft_sequences(tree, read_fasta(msa_file), added) + "\n")
+    elif multiple_align == "all":
         # perform multiple sequence alignment
         input_fasta_file = f"{output_dir}/combined.fasta"
-        output_msa_file = f"{output_dir}/{prefix}.msa"
+        msa_key = hash_strings([hash_file(input_fasta_file), "all"])
+        msa_file = f"{cache_dir}/msa/{msa_key}.msa"
         log = f"{output_dir}/msa.log"
-        cmd = f"{mafft} --thread -1 {input_fasta_file} > {output_msa_file} 2>{log}"
-        tgt = f"{output_msa_file}.OK"
+        cmd = f"{mafft} --thread -1 {input_fasta_file} > {msa_file}.tmp 2>{log} && mv {msa_file}.tmp {msa_file}"
+        tgt = f"{msa_file}.OK"
         desc = f"Multiple sequence alignment"
         mpm.run(cmd, tgt, desc)
     elif multiple_align == "add":
         # perform add on to multiple sequence alignment
         input_fasta_file = f"{combined_fasta_file}"
-        output_msa_file = f"{output_dir}/{prefix}.msa"
+        msa_key = hash_strings([hash_file(input_fasta_file), hash_file(ref_msa_file), "add"])
+        msa_file = f"{cache_dir}/msa/{msa_key}.msa"
         log = f"{output_dir}/msa.log"
-        cmd = f"{mafft} --add {input_fasta_file} {ref_msa_file} > {output_msa_file} 2>{log}"
-        tgt = f"{output_msa_file}.OK"
+        cmd = f"{mafft} --add {input_fasta_file} {ref_msa_file} > {msa_file}.tmp 2>{log} && mv {msa_file}.tmp {msa_file}"
+        tgt = f"{msa_file}.OK"
         desc = f"Additive multiple sequence alignment"
         mpm.run(cmd, tgt, desc)
     else:
-        pass
-
-    # construct phylogenetic tree with bootstrap
-    input_msa_file = f"{output_dir}/{prefix}.msa"
-    log = f"{output_dir}/construct_trees.log"
-    cmd = f"cd {output_dir}; {raxml} --threads 10 --msa {input_msa_file} --model GTR+G --redo --prefix {prefix} --bootstrap > {log}"
-    tgt = f"{output_dir}/construct_trees.OK"
-    desc = f"Constructing phylogenetic tree"
+        msa_key = hash_strings([hash_file(ref_msa_file), "none"])
+        msa_file = f"{cache_dir}/msa/{msa_key}.msa"
+        if not os.path.exists(msa_file):
+            copy2(ref_msa_file, msa_file)
+    copy2(msa_file, output_msa_file)
+
+    # construct maximum likelihood tree
+    tree_key = hash_strings([hash_file(msa_file), model, str(seed), hash_file(start_tree_file) if start_tree_file != "" else ""])
+    tree_prefix = f"{cache_dir}/tree/{tree_key}"
+    log = f"{output_dir}/construct_ml_tree.log"
+    start_tree = f"--tree {start_tree_file}" if start_tree_file != "" else ""
+    cmd = f"{raxml} --search --threads {threads} --msa {msa_file} --model {model} --seed {seed} {start_tree} --redo --prefix {tree_prefix} > {log}"
+    tgt = f"{tree_prefix}.OK"
+    desc = f"Constructing maximum likelihood tree"
     mpm.run(cmd, tgt, desc)
+    copy2(f"{tree_prefix}.raxml.bestTree", f"{output_dir}/{prefix}.raxml.bestTree")
+    index_alignment(cache_dir, msa_file, model, f"{tree_prefix}.raxml.bestTree", combined_fasta_file if multiple_align == "all" else msa_file)
+
+    # construct bootstrap trees in shards, shards are keyed by the alignment, model, seed and size
+    # so that a rerun with more replicates only computes the new shards
+    msa_hash = hash_file(msa_file)
+    shards = []
+    for i, start in enumerate(range(0, bs_trees, shard_size)):
+        no_trees = min(shard_size, bs_trees - start)
+        shard_key = hash_strings([msa_hash, model, str(seed + i), str(no_trees)])
+        shard_prefix = f"{cache_dir}/bootstrap/{shard_key}"
+        log = f"{shard_prefix}.log"
+        cmd = f"{raxml} --bootstrap --threads {threads} --msa {msa_file} --model {model} --seed {seed + i} --bs-trees {no_trees} --redo --prefix {shard_prefix} > {log}"
+        if srun:
+            cmd = f"srun --mincpus {threads} {cmd}"
+        shards.append((cmd, f"{shard_prefix}.OK", f"{shard_prefix}.raxml.bootstraps"))
+    desc = f"Constructing {bs_trees} bootstrap trees in {len(shards)} shards"
+    mpm.run_parallel([shard[0] for shard in shards], [shard[1] for shard in shards], desc, jobs)
+
+    # merge shards in seed order
+    bootstrap_trees_file = f"{output_dir}/{prefix}.raxml.bootstraps"
+    with open(bootstrap_trees_file, "w") as out:
+        for cmd, tgt, shard_trees_file in shards:
+            with open(shard_trees_file, "r") as file:
+                out.write(file.read())
 
     # construct consensus tree
     log = f"{output_dir}/consensus_tree.log"
     cmd = f"cd {output_dir}; {raxml} --consense MRE --tree {prefix}.raxml.bootstraps --redo --prefix {prefix} > {log}"
-    tgt = f"{output_dir}/consensus_tree.OK"
     desc = f"Constructing consensus tree"
-    mpm.run(cmd, tgt, desc)
+    mpm.run(cmd, "", desc)
+
+    # map bootstrap support onto the maximum likelihood tree
+    log = f"{output_dir}/support_tree.log"
+    cmd = f"cd {output_dir}; {raxml} --support --tree {prefix}.raxml.bestTree --bs-trees {prefix}.raxml.bootstraps --redo --prefix {prefix} > {log}"
+    desc = f"Mapping bootstrap support onto maximum likelihood tree"
+    mpm.run(cmd, "", desc)
 
     if sample_file is not None:
         #prepare renaming file
@@ -211,18 +326,24 @@ def main(working_dir, fasta_file, ref_fasta_file, ref_msa_file, sample_file, pre
         output_tree_file = f"{output_dir}/{prefix}.raxml.bootstraps.renamed.tree"
         log = f"{output_dir}/rename_bootstrap_trees.log"
         cmd = f"{gotree} rename -i {input_tree_file} -o {output_tree_file} -m {rename_file} > {log}"
-        tgt = f"{output_dir}/rename_bootstrap_trees.OK"
         desc = f"Renaming bootstrap trees"
-        mpm.run(cmd, tgt, desc)
+        mpm.run(cmd, "", desc)
 
         # rename consensus tree
         input_tree_file = f"{output_dir}/{prefix}.raxml.consensusTreeMRE"
         output_tree_file = f"{output_dir}/{prefix}.raxml.consensus.renamed.tree"
         log = f"{output_dir}/rename_consensus_tree.log"
         cmd = f"{gotree} rename -i {input_tree_file} -o {output_tree_file} -m {rename_file} > {log}"
-        tgt = f"{output_dir}/rename_consensus_tree.OK"
         desc = f"Renaming consensus tree"
-        mpm.run(cmd, tgt, desc)
+        mpm.run(cmd, "", desc)
+
+        # rename support tree
+        input_tree_file = f"{output_dir}/{prefix}.raxml.support"
+        output_tree_file = f"{output_dir}/{prefix}.raxml.support.renamed.tree"
+        log = f"{output_dir}/rename_support_tree.log"
+        cmd = f"{gotree} rename -i {input_tree_file} -o {output_tree_file} -m {rename_file} > {log}"
+        desc = f"Renaming support tree"
+        mpm.run(cmd, "", desc)
 
     # copy files to trace
     copy2(__file__, trace_dir)
@@ -230,14 +351,145 @@ def main(working_dir, fasta_file, ref_fasta_file, ref_msa_file, sample_file, pre
     # write log file
     mpm.print_log()
 
+
+def hash_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_strings(strings):
+    return hashlib.sha256("\t".join(strings).encode()).hexdigest()[:20]
+
+
+def read_fasta(fasta_file):
+    """
+    Returns the (name, sequence) pairs of a FASTA file.
+    """
+    records = []
+    name = None
+    seqs = []
+    with open(fasta_file, "r") as file:
+        for line in file:
+            if line.startswith(">"):
+                if name is not None:
+                    records.append((name, "".join(seqs)))
+                name = line[1:].strip().split()[0]
+                seqs = []
+            else:
+                seqs.append(line.strip())
+    if name is not None:
+        records.append((name, "".join(seqs)))
+    return records
+
+
+def write_fasta(fasta_file, records):
+    with open(fasta_file, "w") as file:
+        for name, seq in records:
+            file.write(f">{name}\n{seq}\n")
+
+
+def sequence_digests(records):
+    """
+    Digests of the ungapped sequences so that aligned and unaligned sequences compare equal.
+    """
+    return {name: hashlib.sha256(seq.replace("-", "").upper().encode()).hexdigest()[:20] for name, seq in records}
+
+
+def index_alignment(cache_dir, msa_file, model, tree_file, fasta_file):
+    """
+    Records an alignment and its maximum likelihood tree for incremental runs, the sequences are
+    taken from the FASTA file aligned as mafft --keeplength may trim added sequences.
+    """
+    index_file = f"{cache_dir}/index.txt"
+    entry = f"{msa_file}\t{model}\t{tree_file}\n"
+    if os.path.exists(index_file):
+        with open(index_file, "r") as file:
+            if entry in file.readlines():
+                return
+    sequences_file = f"{msa_file}.sequences.txt"
+    with open(sequences_file, "w") as file:
+        for name, digest in sequence_digests(read_fasta(fasta_file)).items():
+            file.write(f"{name}\t{digest}\n")
+    with open(index_file, "a") as file:
+        file.write(entry)
+
+
+def find_cached_alignment(cache_dir, fasta_file, model, max_added):
+    """
+    Finds the cached alignment and tree of the same model with the most sequences such that its
+    sequences are all unchanged in the FASTA file and at most max_added sequences are new.
+    Returns the alignment file, tree file and the names of the new sequences, or None.
+    """
+    index_file = f"{cache_dir}/index.txt"
+    if not os.path.exists(index_file):
+        return None
+    digests = sequence_digests(read_fasta(fasta_file))
+    best = None
+    with open(index_file, "r") as file:
+        for line in file:
+            msa_file, msa_model, tree_file = line.rstrip("\n").split("\t")
+            if msa_model != model or not os.path.exists(msa_file) or not os.path.exists(tree_file):
+                continue
+            cached = {}
+            with open(f"{msa_file}.sequences.txt", "r") as sequences:
+                for entry in sequences:
+                    name, digest = entry.rstrip("\n").split("\t")
+                    cached[name] = digest
+            if any(digests.get(name) != digest for name, digest in cached.items()):
+                continue
+            added = [name for name in digests if name not in cached]
+            if 0 < len(added) <= max_added and (best is None or len(cached) > best[3]):
+                best = (msa_file, tree_file, added, len(cached))
+    return best[:3] if best is not None else None
+
+
+def graft_sequences(tree, msa_records, added):
+    """
+    Grafts each added sequence onto a Newick tree as the sister of its closest sequence by p-distance
+    over the sites aligned in both, sequences added earlier can be the closest.
+    """
+    names = [name for name, seq in msa_records]
+    seqs = np.array([np.frombuffer(seq.upper().encode(), dtype=np.uint8) for name, seq in msa_records])
+    gap = ord("-")
+    in_tree = np.array([name not in added for name in names])
+    for name in added:
+        i = names.index(name)
+        aligned = (seqs != gap) & (seqs[i] != gap)
+        differences = ((seqs != seqs[i]) & aligned).sum(axis=1)
+        distances = differences / np.maximum(aligned.sum(axis=1), 1)
+        distances[~in_tree] = np.inf
+        j = int(np.argmin(distances))
+        tree = graft_sequence(tree, names[j], name, float(distances[j]))
+        in_tree[i] = True
+    return tree
+
+
+def graft_sequence(tree, sister, name, length):
+    """
+    Replaces the leaf sister:b of a Newick tree with (sister:0,name:length):b.
+    """
+    pattern = re.compile(rf"(?<=[(,]){re.escape(sister)}(:[^,():;\[]+)?(?=[,):;\[])")
+    match = pattern.search(tree)
+    if match is None:
+        raise ValueError(f"{sister} is not a leaf of the tree")
+    branch = match.group(1) if match.group(1) is not None else ""
+    return f"{tree[:match.start()]}({sister}:0,{name}:{length:.6f}){branch}{tree[match.end():]}"
+
+
 class MiniPipeManager(object):
     def __init__(self, log_file):
         self.log_file = log_file
         self.log_msg = []
 
     def run(self, cmd, tgt, desc):
+        """
+        Runs a command unless its target exists, commands without a target are always run.
+        """
         try:
-            if os.path.exists(tgt):
+            if tgt != "" and os.path.exists(tgt):
                 self.log(f"{desc} -  already executed")
                 self.log(cmd)
                 return
@@ -245,11 +497,41 @@ class MiniPipeManager(object):
                 self.log(f"{desc}")
                 self.log(cmd)
                 subprocess.run(cmd, shell=True, check=True)
-                subprocess.run(f"touch {tgt}", shell=True, check=True)
+                if tgt != "":
+                    subprocess.run(f"touch {tgt}", shell=True, check=True)
         except subprocess.CalledProcessError as e:
             self.log(f" - failed")
             exit(1)
 
+    def run_parallel(self, cmds, tgts, desc, jobs):
+        """
+        Runs the commands whose targets do not exist, at most jobs at a time.
+        """
+        self.log(f"{desc}")
+        pending = []
+        for cmd, tgt in zip(cmds, tgts):
+            if os.path.exists(tgt):
+                self.log(f"{cmd} -  already executed")
+            else:
+                self.log(cmd)
+                pending.append((cmd, tgt))
+
+        def run(cmd, tgt):
+            subprocess.run(cmd, shell=True, check=True)
+            subprocess.run(f"touch {tgt}", shell=True, check=True)
+
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            futures = [executor.submit(run, cmd, tgt) for cmd, tgt in pending]
+            failed = False
+            for (cmd, tgt), future in zip(pending, futures):
+                try:
+                    future.result()
+                except subprocess.CalledProcessError as e:
+                    self.log(f"{cmd} - failed")
+                    failed = True
+        if failed:
+            exit(1)
+
     def log(self, msg):
         print(msg)
         self.log_msg.append(msg)
@@ -22,6 +22,8 @@ import sys
 import os
 import click
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 
 @click.command()
@@ -61,12 +63,14 @@ import subprocess
     default="",
     help="Illumina read 2 fastq files",
 )
+@click.option("-t", "--threads", default=10, show_default=True, help="number of threads shared by concurrent steps")
 def main(
     input_ilm_read1_fastq_files,
     input_ilm_read2_fastq_files,
     sample_id,
     output_dir,
     reference_fasta_file,
+    threads,
 ):
     """
     Aligns all fastq files to a reference sequence file, perform assembly on reads.  Perform this iteratively.
@@ -79,7 +83,7 @@ def main(
     version = "1.0.0"
 
     # initialize
-    mpm = MiniPipeManager(f"{output_dir}/pull_and_assemble.log")
+    mpm = MiniPipeManager(f"{output_dir}/pull_and_assemble.log", threads)
 
     # programs
     bwa = "/usr/local/bwa-0.7.17/bwa"
@@ -112,7 +116,7 @@ def main(
     cmd = f"zcat {' '.join(read1_files)} | gzip > {output_read1_fastq_file}"
     tgt = f"{output_read1_fastq_file}.OK"
     desc = f"Combining read 1 fastq files"
-    mpm.run(cmd, tgt, desc)
+    mpm.add(cmd, tgt, desc)
 
     #  combine fastq files
     read2_files = " ".join(input_ilm_read2_fastq_files.split(","))
@@ -120,7 +124,7 @@ def main(
     cmd = f"zcat {read2_files} | gzip > {output_read2_fastq_file}"
     tgt = f"{output_read2_fastq_file}.OK"
     desc = f"Combining read 2 fastq files"
-    mpm.run(cmd, tgt, desc)
+    mpm.add(cmd, tgt, desc)
 
     input_fastq_file1 = os.path.join(fastq_dir, "ilm.r1.fastq.gz")
     input_fastq_file2 = os.path.join(fastq_dir, "ilm.r2.fastq.gz")
@@ -144,7 +148,7 @@ def main(
         cmd = f"cp {last_ref_fasta_file} {output_fasta_file}"
         tgt = f"{output_fasta_file}.OK"
         desc = f"Step {iteration}: Copy reference sequence to ref directory"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc)
 
         #  construct reference
         reference_fasta_file = os.path.join(ref_dir, ref_fasta_file_basename)
@@ -152,7 +156,7 @@ def main(
         cmd = f"{bwa} index -a bwtsw {reference_fasta_file} 2> {log}"
         tgt = f"{reference_fasta_file}.bwa_index.OK"
         desc = f"Step {iteration}: Construct bwa reference"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{output_fasta_file}.OK"])
 
         #  align
         output_bam_file = os.path.join(iteration_dir, "ilm.bam")
@@ -160,14 +164,14 @@ def main(
         cmd = f"{bwa} mem -t 2 -M {reference_fasta_file} {input_fastq_file1} {input_fastq_file2} 2> {log}| {samtools} view -hF4 | {samtools} sort -o {output_bam_file}"
         tgt = f"{output_bam_file}.OK"
         desc = f"Step {iteration}: Align to reference with bwa mem"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{input_fastq_file1}.OK", f"{input_fastq_file2}.OK", f"{reference_fasta_file}.bwa_index.OK"], 2)
 
         #  index
         input_bam_file = os.path.join(iteration_dir, "ilm.bam")
         cmd = f"{samtools} index {input_bam_file}"
         tgt = f"{input_bam_file}.bai.OK"
         desc = f"Step {iteration}: Index bam file"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{output_bam_file}.OK"])
 
         #  coverage
         input_bam_file = os.path.join(iteration_dir, "ilm.bam")
@@ -175,7 +179,7 @@ def main(
         cmd = f"{samtools} coverage {input_bam_file} > {output_stats_file}"
         tgt = f"{output_stats_file}.OK"
         desc = f"Step {iteration}: Illumina coverage statistics"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{input_bam_file}.bai.OK"])
 
         #  consensus
         input_bam_file = os.path.join(iteration_dir, "ilm.bam")
@@ -183,7 +187,7 @@ def main(
         cmd = f"{samtools} consensus {input_bam_file} > {output_fasta_file}"
         tgt = f"{output_fasta_file}.OK"
         desc = f"Step {iteration}: Illumina consensus"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{input_bam_file}.bai.OK"])
 
         # extract reads IDs that were aligned
         input_bam_file = os.path.join(iteration_dir, "ilm.bam")
@@ -191,20 +195,20 @@ def main(
         cmd = f"{samtools} view {input_bam_file} | cut -f1 | sort | uniq > {id_text_file}"
         tgt = f"{id_text_file}.OK"
         desc = f"Step {iteration}: Extract Aligned Illumina reads IDs"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{input_bam_file}.OK"])
 
         # extract fastq paired reads
         aligned_fastq_file1 = os.path.join(iteration_dir, "aligned.r1.fastq.gz")
         cmd = f"{seqtk} subseq {input_fastq_file1} {id_text_file} | gzip > {aligned_fastq_file1 } "
         tgt = f"{aligned_fastq_file1}.OK"
         desc = f"Step {iteration}: Extract Read 1"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{id_text_file}.OK"])
 
         aligned_fastq_file2 = os.path.join(iteration_dir, "aligned.r2.fastq.gz")
         tgt = f"{ aligned_fastq_file2}.OK"
         cmd = f"{seqtk} subseq {input_fastq_file2} {id_text_file} | gzip > {aligned_fastq_file2 } "
         desc = f"Step {iteration}: Extract Read 2"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{id_text_file}.OK"])
 
         # assemble
         log = f"{assembly_dir}/assembly.log"
@@ -212,7 +216,10 @@ def main(
         tgt = f"{assembly_dir}/assembly.OK"
         cmd = f"{spades} -1 {aligned_fastq_file1} -2 {aligned_fastq_file2} -o {assembly_dir} --threads 10 --isolate  > {log} 2> {err}"
         desc = f"Step {iteration}: Illumina assembly"
-        mpm.run(cmd, tgt, desc)
+        mpm.add(cmd, tgt, desc, [f"{aligned_fastq_file1}.OK", f"{aligned_fastq_file2}.OK"], 10)
+
+        # run the steps of this iteration
+        mpm.execute()
 
         # update last reference file used
         last_ref_fasta_file = f"{assembly_dir}/contigs.fasta"
@@ -223,28 +230,77 @@ def main(
             improved_assembly = False
 
 class MiniPipeManager(object):
-    def __init__(self, log_file):
+    def __init__(self, log_file, threads=1):
         self.log_file = log_file
         self.log_msg = []
+        self.threads = threads
+        self.steps = []
+        self.lock = threading.Lock()
 
     def run(self, cmd, tgt, desc):
+        if not self.run_step(cmd, tgt, desc):
+            exit(1)
+
+    def add(self, cmd, tgt, desc, deps=[], cpu=1):
+        """
+        Queues a step that is run by execute once the targets it depends on are done.
+        """
+        self.steps.append((cmd, tgt, desc, deps, min(cpu, self.threads)))
+
+    def execute(self):
+        """
+        Runs the queued steps concurrently, each as soon as the steps it depends on
+        are done and enough threads are free.  No new steps are started once a step fails.
+        """
+        pending = self.steps
+        self.steps = []
+        queued = {step[1] for step in pending}
+        done = set()
+        running = {}
+        free = self.threads
+        failed = False
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            while True:
+                if not failed:
+                    for step in list(pending):
+                        cmd, tgt, desc, deps, cpu = step
+                        if cpu <= free and all(dep in done for dep in deps if dep in queued):
+                            pending.remove(step)
+                            free -= cpu
+                            running[executor.submit(self.run_step, cmd, tgt, desc)] = step
+                if len(running) == 0:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    cmd, tgt, desc, deps, cpu = running.pop(future)
+                    free += cpu
+                    if future.result():
+                        done.add(tgt)
+                    else:
+                        failed = True
+        if failed or len(pending) != 0:
+            exit(1)
+
+    def run_step(self, cmd, tgt, desc):
         try:
             if os.path.exists(tgt):
                 self.log(f"{desc} -  already executed")
                 self.log(cmd)
-                return
+                return True
             else:
                 self.log(f"{desc}")
                 self.log(cmd)
                 subprocess.run(cmd, shell=True, check=True)
                 subprocess.run(f"touch {tgt}", shell=True, check=True)
+                return True
         except subprocess.CalledProcessError as e:
-            self.log(f" - failed")
-            exit(1)
+            self.log(f"{desc} - failed")
+            return False
 
     def log(self, msg):
-        print(msg)
-        self.log_msg.append(msg)
+        with self.lock:
+            print(msg, flush=True)
+            self.log_msg.append(msg)
 
     def print_log(self):
         self.log(f"\nlogs written to {self.log_file}")
@@ -33,7 +33,8 @@ def main():
     fastqc = "/usr/local/FastQC-0.11.9/fastqc"
     uniprot_database = home_directory + "/db/viral_proteins/uniref90.fasta.gz"
     # uniprot_database = home_directory + "/out.fa"
-    diamond = "/usr/local/diamond-2.0.11/diamond"
+    diamond_version = "2.0.11"
+    diamond = f"/usr/local/diamond-{diamond_version}/diamond"
     seqtk = "/usr/local/seqtk-1.3/seqtk"
     trinity = "/usr/local/trinityrnaseq-v2.13.1/Trinity"
     refseq = home_directory + "/db/refseq/blastdb/refseq.virus.fasta"
@@ -54,6 +55,27 @@ def main():
         help="Takes in the data that you wish to use to run FastQC on",
         type=str,
     )
+    parser.add_argument(
+        "-t",
+        "--threads",
+        help="Number of threads for DIAMOND and Trinity (default: 16)",
+        default=16,
+        type=int,
+    )
+    parser.add_argument(
+        "-b",
+        "--block_size",
+        help="DIAMOND block size in billions of sequence letters (default: 4.0)",
+        default=4.0,
+        type=float,
+    )
+    parser.add_argument(
+        "-d",
+        "--diamond_db_dir",
+        help="Directory of the shared DIAMOND database (default: ~/db/diamond)",
+        default=home_directory + "/db/diamond",
+        type=str,
+    )
     args = parser.parse_args()
 
     # Reading the file
@@ -78,7 +100,13 @@ def main():
         args.output_directory = user_directory + "/QC_out"
 
     if args.version:
-        print("version 1.0")
+        print("version 1.1")
+
+    # the DIAMOND database is built once per source database and DIAMOND version
+    # and shared between runs
+    os.makedirs(args.diamond_db_dir, exist_ok=True)
+    uniprot_database_name = os.path.basename(uniprot_database).split(".")[0]
+    diamond_db = f"{args.diamond_db_dir}/{uniprot_database_name}.diamond-{diamond_version}"
 
     # Create the directory
     # 'Out' in
@@ -141,16 +169,13 @@ def main():
 
     f.write("all:\t")
 
-    f.write(f"{args.output_directory}/generate_db.OK ")
+    f.write(f"{diamond_db}.OK ")
 
     for key in d1:
         f.write(f"{args.output_directory}/{key}/fastqc1.OK ")
-        f.write(f"{args.output_directory}/{key}/diamond_fastq1.OK ")
-        f.write(f"{args.output_directory}/{key}/subseq1.OK ")
-
         f.write(f"{args.output_directory}/{key}/fastqc2.OK ")
-        f.write(f"{args.output_directory}/{key}/diamond_fastq2.OK ")
-        f.write(f"{args.output_directory}/{key}/subseq2.OK ")
+        f.write(f"{args.output_directory}/{key}/diamond.OK ")
+        f.write(f"{args.output_directory}/{key}/subseq.OK ")
 
         f.write(f"{args.output_directory}/{key}/trinity.OK ")
         f.write(f"{args.output_directory}/{key}/refseqblast.OK ")
@@ -159,121 +184,86 @@ def main():
 
     f.write("\n\n")
 
-    # generates diamond reference database for indexing
-    f.write(f"{args.output_directory}/generate_db.OK:\n")
+    # generates diamond reference database for indexing, rebuilt when the source database is updated
+    f.write(f"{diamond_db}.OK: {uniprot_database}\n")
     f.write(
-        f"\t{diamond} makedb --in {uniprot_database} -d {args.output_directory}/nr > {args.output_directory}/nr.log 2> {args.output_directory}/nr.err\n"
+        f"\t{diamond} makedb --in {uniprot_database} -d {diamond_db} --threads {args.threads} > {diamond_db}.log 2> {diamond_db}.err\n"
     )
-    f.write(f"\ttouch {args.output_directory}/generate_db.OK\n\n")
+    f.write(f"\ttouch {diamond_db}.OK\n\n")
 
     for key in d1:
         sample_object = d1[key]
+        sample_dir = f"{args.output_directory}/{key}"
 
         # run fastqc on fastq1
         #####
-        f.write(f"{args.output_directory}/{key}/fastqc1.OK:\n")
+        f.write(f"{sample_dir}/fastqc1.OK:\n")
         f.write(
-            f"\t{fastqc} -o {args.output_directory}/{key} --extract {sample_object.fastq1} > {args.output_directory}/{key}/fastqc1.log 2> {args.output_directory}/{key}/fastqc1.err\n"
+            f"\t{fastqc} -o {sample_dir} --extract {sample_object.fastq1} > {sample_dir}/fastqc1.log 2> {sample_dir}/fastqc1.err\n"
         )
-        f.write(f"\ttouch {args.output_directory}/{key}/fastqc1.OK\n\n")
-
-        # run diamond on fastq1
-        #####
-        f.write(
-            f"{args.output_directory}/{key}/diamond_fastq1.OK: {args.output_directory}/generate_db.OK\n"
-        )
-        f.write(
-            f"\tzcat {sample_object.fastq1} | seqtk seq -A > {args.output_directory}/{key}/input{key}1.fasta\n"
-        )
-        f.write(
-            f"\twc -l {args.output_directory}/{key}/input{key}2.fasta > count1.txt\n"
-        )
-        f.write(
-            f"\t{diamond} blastx -d {args.output_directory}/nr.dmnd -q {args.output_directory}/{key}/input{key}1.fasta -o {args.output_directory}/{key}/stitle{key}1.m8 -f 6 qseqid stitle 2> {args.output_directory}/{key}/diamond1.log 2> {args.output_directory}/{key}/diamond1.err\n"
-        )
-        f.write(
-            f"\twc -l {args.output_directory}/{key}/stitle{key}1.m8 > {args.output_directory}/{key}/length_{key}1_diamond.txt\n"
-        )
-        f.write(
-            f"\tcat {args.output_directory}/{key}/stitle{key}1.m8 | cut -f2 | sort | uniq -c > {args.output_directory}/{key}/grouped1.txt\n"
-        )
-        f.write(f"\ttouch {args.output_directory}/{key}/diamond_fastq1.OK\n\n")
-
-        # subseq fastq1
-        #####
-        f.write(
-            f"{args.output_directory}/{key}/subseq1.OK: {args.output_directory}/{key}/diamond_fastq1.OK\n"
-        )
-        f.write(
-            f"\t{seqtk} subseq {sample_object.fastq1} {args.output_directory}/{key}/stitle{key}1.m8 > {args.output_directory}/{key}/{key}_1.fq\n"
-        )
-        f.write(f"\ttouch {args.output_directory}/{key}/subseq1.OK\n\n")
+        f.write(f"\ttouch {sample_dir}/fastqc1.OK\n\n")
 
         # run fastqc on fastq2
         #####
-        f.write(f"{args.output_directory}/{key}/fastqc2.OK:\n")
+        f.write(f"{sample_dir}/fastqc2.OK:\n")
         f.write(
-            f"\t{fastqc} -o {args.output_directory}/{key} --extract {sample_object.fastq2} > {args.output_directory}/{key}/fastqc2.log 2> {args.output_directory}/{key}/fastqc2.err\n"
+            f"\t{fastqc} -o {sample_dir} --extract {sample_object.fastq2} > {sample_dir}/fastqc2.log 2> {sample_dir}/fastqc2.err\n"
         )
-        f.write(f"\ttouch {args.output_directory}/{key}/fastqc2.OK\n\n")
+        f.write(f"\ttouch {sample_dir}/fastqc2.OK\n\n")
 
-        # run diamond on fastq2
+        # run diamond on both mates, reads are interleaved and streamed through stdin
         #####
+        f.write(f"{sample_dir}/diamond.OK: {diamond_db}.OK\n")
         f.write(
-            f"{args.output_directory}/{key}/diamond_fastq2.OK: {args.output_directory}/generate_db.OK\n"
-        )
-        f.write(
-            f"\tzcat {sample_object.fastq2} | seqtk seq -A > {args.output_directory}/{key}/input{key}2.fasta\n"
-        )
-        f.write(
-            f"\twc -l {args.output_directory}/{key}/input{key}2.fasta > count2.txt\n"
-        )
-        f.write(
-            f"\t{diamond} blastx -d {args.output_directory}/nr.dmnd -q {args.output_directory}/{key}/input{key}2.fasta -o {args.output_directory}/{key}/stitle{key}2.m8 -f 6 qseqid stitle 2> {args.output_directory}/{key}/diamond2.log 2> {args.output_directory}/{key}/diamond2.err\n"
+            f"\t{seqtk} mergepe {sample_object.fastq1} {sample_object.fastq2} | srun --mincpus {args.threads} {diamond} blastx -d {diamond_db}.dmnd --threads {args.threads} --block-size {args.block_size} -o {sample_dir}/stitle{key}.m8 -f 6 qseqid stitle > {sample_dir}/diamond.log 2> {sample_dir}/diamond.err\n"
         )
         f.write(
-            f"\twc -l {args.output_directory}/{key}/stitle{key}2.m8 > {args.output_directory}/{key}/length_{key}2_diamond.txt\n"
+            f"\twc -l {sample_dir}/stitle{key}.m8 > {sample_dir}/length_{key}_diamond.txt\n"
         )
         f.write(
-            f"\tcat {args.output_directory}/{key}/stitle{key}2.m8 | cut -f2 | sort | uniq -c > {args.output_directory}/{key}/grouped2.txt\n"
+            f"\tcut -f2 {sample_dir}/stitle{key}.m8 | sort | uniq -c > {sample_dir}/grouped.txt\n"
         )
-        f.write(f"\ttouch {args.output_directory}/{key}/diamond_fastq2.OK\n\n")
+        f.write(f"\ttouch {sample_dir}/diamond.OK\n\n")
 
-        # subseq fastq2
+        # extract read pairs with a hit in either mate in one pass over both fastq files
         #####
+        f.write(f"{sample_dir}/subseq.OK: {sample_dir}/diamond.OK\n")
         f.write(
-            f"{args.output_directory}/{key}/subseq2.OK: {args.output_directory}/{key}/diamond_fastq2.OK\n"
+            f"\tcut -f1 {sample_dir}/stitle{key}.m8 | sed 's/\\/[12]$$//' | sort -u | awk '{{print; print $$0\"/1\"; print $$0\"/2\"}}' > {sample_dir}/hit_read_ids.txt\n"
         )
         f.write(
-            f"\t{seqtk} subseq {sample_object.fastq2} {args.output_directory}/{key}/stitle{key}2.m8 > {args.output_directory}/{key}/{key}_2.fq\n"
+            f"\t{seqtk} mergepe {sample_object.fastq1} {sample_object.fastq2} | {seqtk} subseq - {sample_dir}/hit_read_ids.txt > {sample_dir}/{key}_12.fq\n"
         )
-        f.write(f"\ttouch {args.output_directory}/{key}/subseq2.OK\n\n")
+        f.write(f"\t{seqtk} seq -1 {sample_dir}/{key}_12.fq > {sample_dir}/{key}_1.fq\n")
+        f.write(f"\t{seqtk} seq -2 {sample_dir}/{key}_12.fq > {sample_dir}/{key}_2.fq\n")
+        f.write(f"\trm {sample_dir}/{key}_12.fq\n")
+        f.write(f"\ttouch {sample_dir}/subseq.OK\n\n")
 
         # trinity
         #####
         f.write(
-            f"{args.output_directory}/{key}/trinity.OK: {args.output_directory}/{key}/subseq1.OK {args.output_directory}/{key}/subseq2.OK\n"
+            f"{sample_dir}/trinity.OK: {sample_dir}/subseq.OK\n"
         )
         f.write(
-            f"\t{trinity} --seqType fq --left {args.output_directory}/{key}/{key}_1.fq --right {args.output_directory}/{key}/{key}_2.fq --CPU 2 --max_memory 40G --output {args.output_directory}/{key}/trinity_assembly > {args.output_directory}/{key}/trinity_assembly.txt.log 2> {args.output_directory}/{key}/trinity_assembly.txt.err\n"
+            f"\tsrun --mincpus {args.threads} {trinity} --seqType fq --left {sample_dir}/{key}_1.fq --right {sample_dir}/{key}_2.fq --CPU {args.threads} --max_memory 40G --output {sample_dir}/trinity_assembly > {sample_dir}/trinity_assembly.txt.log 2> {sample_dir}/trinity_assembly.txt.err\n"
         )
-        f.write(f"\ttouch {args.output_directory}/{key}/trinity.OK\n\n")
+        f.write(f"\ttouch {sample_dir}/trinity.OK\n\n")
 
         # blastn against refseq
-        # {args.output_directory}/{key}/trinity_assembly
+        # {sample_dir}/trinity_assembly
         #####
         f.write(
-            f"{args.output_directory}/{key}/refseqblast.OK: {args.output_directory}/{key}/trinity.OK\n"
+            f"{sample_dir}/refseqblast.OK: {sample_dir}/trinity.OK\n"
         )
         f.write(
-            f"\tblastn -db {refseq} -query {args.output_directory}/{key}/trinity_assembly.Trinity.fasta  -outfmt "
+            f"\tblastn -db {refseq} -query {sample_dir}/trinity_assembly.Trinity.fasta  -outfmt "
             + '"6 stitle pident"'
-            + f" -out {args.output_directory}/{key}/{key}_blast.psl -max_target_seqs 1 2> {args.output_directory}/{key}/blast_results{key}.txt.log > {args.output_directory}/{key}/blast_results{key}.txt.err\n"
+            + f" -out {sample_dir}/{key}_blast.psl -max_target_seqs 1 2> {sample_dir}/blast_results{key}.txt.log > {sample_dir}/blast_results{key}.txt.err\n"
         )
         f.write(
-            f"\tcut -f1 {args.output_directory}/{key}/{key}_blast.psl | sort | uniq -c > {args.output_directory}/{key}/blast_{key}.txt\n"
+            f"\tcut -f1 {sample_dir}/{key}_blast.psl | sort | uniq -c > {sample_dir}/blast_{key}.txt\n"
         )
-        f.write(f"\ttouch {args.output_directory}/{key}/refseqblast.OK\n\n")
+        f.write(f"\ttouch {sample_dir}/refseqblast.OK\n\n")
 
     # multiqc
     f.write(f"{args.output_directory}/multiqc_output.OK:\n")
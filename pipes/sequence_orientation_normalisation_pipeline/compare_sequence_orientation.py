@@ -24,6 +24,7 @@ import click
 import subprocess
 import re
 from shutil import copy2
+from seqio import read_fastx, write_fastx, reverse_complement_record
 
 @click.command()
 @click.option(
@@ -71,34 +72,27 @@ def main(
 
     # programs
     stretcher = "/usr/local/emboss-6.6.0/bin/stretcher"
-    seqtk = "/usr/local/seqtk-1.4/seqtk"
 
     # initialize
     mpm = MiniPipeManager(f"{output_dir}/compare_sequence_orientation.log")
     mpm.set_ignore_targets(True)
 
-    # read reference sequence
-    seq = ""
-    query_len = 0
-    with open(query_fasta_file, "r") as file:
-        for line in file:
-            if line.startswith(">"):
-                pass
-            else:
-                query_len += len(line.rstrip())
+    # read query sequences once, both orientations are written from memory
+    records = list(read_fastx(query_fasta_file))
+    query_len = sum(len(record.seq) for record in records)
 
     # write out to separate files
     output_fasta_file = f"{output_dir}/query_fwd.fasta"
-    cmd = f"{seqtk} seq -A {query_fasta_file} > {output_fasta_file}"
-    tgt = f"{output_fasta_file}.OK"
-    desc = f"Create forward sequence FASTA file"
-    mpm.run(cmd, tgt, desc)
+    with open(output_fasta_file, "w") as out:
+        for record in records:
+            write_fastx(out, record, fasta=True)
+    mpm.log(f"Create forward sequence FASTA file")
 
     output_fasta_file = f"{output_dir}/query_rev.fasta"
-    cmd = f"{seqtk} seq -Ar {query_fasta_file} > {output_fasta_file}"
-    tgt = f"{output_fasta_file}.OK"
-    desc = f"Create reverse completed sequence FASTA file"
-    mpm.run(cmd, tgt, desc)
+    with open(output_fasta_file, "w") as out:
+        for record in records:
+            write_fastx(out, reverse_complement_record(record), fasta=True)
+    mpm.log(f"Create reverse completed sequence FASTA file")
 
     # invoke needleman-wunsch alignment for each direction
     input_fasta_file = f"{output_dir}/query_fwd.fasta"
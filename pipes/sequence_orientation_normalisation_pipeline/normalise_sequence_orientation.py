@@ -24,6 +24,7 @@ import click
 import subprocess
 import re
 from shutil import copy2
+from seqio import convert_fastx
 
 @click.command()
 @click.option(
@@ -51,34 +52,17 @@ def main(output_fasta_file, sequence_orientation_report_file):
     # version
     version = "1.0.0"
 
-    # programs
-    seqtk = "/usr/local/seqtk-1.4/seqtk"
-
-    # initialize
-    mpm = MiniPipeManager("")
-    mpm.set_ignore_targets(True)
-
     # sequence orientation report file
-    index = 0
+    # sequences are written in process, the first file truncates the output and the rest are appended
+    mode = "w"
     with open(sequence_orientation_report_file, "r") as file:
         for line in file:
             if not line.startswith("#"):
                 file_name, qseq, rseq, qry_len,fwd_align_len, rev_align_len, fwd_score, rev_score, fwd_similarity, rev_similarity, same_orientation = line.rstrip().split("\t")
-                if index == 0:
-                    if same_orientation == "True":
-                        cmd = f"{seqtk} seq -A {file_name} > {output_fasta_file}"
-                        mpm.run_lite(cmd)
-                    else:
-                        cmd = f"{seqtk} seq -Ar {file_name} > {output_fasta_file}"
-                        mpm.run_lite(cmd)
-                else:
-                    if same_orientation == "True":
-                        cmd = f"{seqtk} seq -A {file_name} >> {output_fasta_file}"
-                        mpm.run_lite(cmd)
-                    else:
-                        cmd = f"{seqtk} seq -Ar {file_name} >> {output_fasta_file}"
-                        mpm.run_lite(cmd)
-                index += 1
+                reverse = same_orientation != "True"
+                print(f"{'reverse complement' if reverse else 'copy'} {file_name} to {output_fasta_file}")
+                convert_fastx([file_name], output_fasta_file, reverse=reverse, fasta=True, mode=mode)
+                mode = "a"
 
 class MiniPipeManager(object):
     def __init__(self, log_file):
@@ -0,0 +1,685 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2025 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+In process sequence toolkit covering the seqtk subcommands used by the pipelines.
+
+Imported by scripts deployed alongside it, e.g.
+
+    from seqio import read_fastx, write_fastx, reverse_complement
+
+and also usable from the command line, e.g.
+
+    seqio.py comp contigs.fasta
+    seqio.py subseq contigs.fasta id.txt > subset.fasta
+    seqio.py seq -r query.fasta > query_rev.fasta
+    seqio.py faidx contigs.fasta contig_1:100-200
+    seqio.py bam2fq -t 4 reads.bam reads.fastq.gz
+    seqio.py benchmark contigs.fasta id.txt
+"""
+
+import sys
+import os
+import gzip
+import time
+import click
+import zlib
+import struct
+import subprocess
+import tempfile
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+# IUPAC complement, case preserving, as seqtk seq -r
+COMPLEMENT = str.maketrans(
+    "ACGTUMRWSYKVHDBNacgtumrwsykvhdbn",
+    "TGCAAKYWSRMBDHVNtgcaakywsrmbdhvn",
+)
+
+# bases counted by seqtk comp as ambiguous with 2, 3 and 4 possibilities
+AMBIGUOUS_2 = "MRWSYK"
+AMBIGUOUS_3 = "VHDB"
+AMBIGUOUS_4 = "N"
+
+# BGZF block limits, an uncompressed block is kept below 0xff00 so that even stored data fits a block
+BGZF_BLOCK_SIZE = 0xff00
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+# BAM 4 bit base encoding and phred+33 quality decoding
+BAM_BASES = "=ACMGRSVTWYHKDBN"
+BAM_BASE_PAIRS = [BAM_BASES[i >> 4] + BAM_BASES[i & 15] for i in range(256)]
+BAM_QUALS = bytes(min(i + 33, 126) for i in range(256))
+BAM_CORE = struct.Struct("<iiBBHHHiiii")
+BAM_AUX_SIZES = {"c": ("b", 1), "C": ("B", 1), "s": ("h", 2), "S": ("H", 2), "i": ("i", 4), "I": ("I", 4), "f": ("f", 4)}
+
+
+class SequenceRecord(object):
+    __slots__ = ("name", "comment", "seq", "qual")
+
+    def __init__(self, name, comment, seq, qual=None):
+        self.name = name
+        self.comment = comment
+        self.seq = seq
+        self.qual = qual
+
+    def print(self):
+        print(f"name    : {self.name}")
+        print(f"comment : {self.comment}")
+        print(f"length  : {len(self.seq)}")
+        print(f"fastq   : {self.qual is not None}")
+
+
+def open_file(file_name, mode="r"):
+    """
+    Opens a plain or gzipped text file, - denotes stdin or stdout which are left open on exit.
+    """
+    if file_name == "-":
+        return nullcontext(sys.stdin if "r" in mode else sys.stdout)
+    if file_name.endswith(".gz"):
+        return gzip.open(file_name, mode + "t" if "t" not in mode else mode)
+    return open(file_name, mode)
+
+
+def read_fastx(file_name):
+    """
+    Yields records from a FASTA or FASTQ file, gzipped or not, multi line records are supported.
+    """
+    with open_file(file_name) as file:
+        header = None
+        for line in file:
+            if line[0] in ">@":
+                header = line
+                break
+        while header is not None:
+            fields = header[1:].rstrip().split(None, 1)
+            name = fields[0] if fields else ""
+            comment = fields[1] if len(fields) > 1 else ""
+            is_fastq = header[0] == "@"
+            seqs = []
+            header = None
+            line = None
+            for line in file:
+                if line[0] in ">@+":
+                    break
+                seqs.append(line.rstrip())
+            else:
+                line = None
+            seq = "".join(seqs)
+            if line is None or line[0] != "+" or not is_fastq:
+                yield SequenceRecord(name, comment, seq)
+                header = line
+                continue
+            # quality can start with @ or + so read until as long as the sequence
+            quals = []
+            length = 0
+            for line in file:
+                line = line.rstrip()
+                quals.append(line)
+                length += len(line)
+                if length >= len(seq):
+                    break
+            if length != len(seq):
+                raise ValueError(f"{file_name}: quality and sequence lengths differ for {name}")
+            yield SequenceRecord(name, comment, seq, "".join(quals))
+            for line in file:
+                if line[0] in ">@":
+                    header = line
+                    break
+
+
+def write_fastx(file, record, line_width=0, fasta=False):
+    """
+    Writes a record as FASTQ if it has qualities, otherwise as FASTA wrapped at line_width (0 for a single line).
+    """
+    header = f"{record.name} {record.comment}" if record.comment else record.name
+    if record.qual is not None and not fasta:
+        file.write(f"@{header}\n{record.seq}\n+\n{record.qual}\n")
+    elif line_width > 0:
+        seq = record.seq
+        lines = "\n".join(seq[i:i + line_width] for i in range(0, len(seq), line_width))
+        file.write(f">{header}\n{lines}\n")
+    else:
+        file.write(f">{header}\n{record.seq}\n")
+
+
+def reverse_complement(seq):
+    return seq.translate(COMPLEMENT)[::-1]
+
+
+def reverse_complement_record(record):
+    qual = record.qual[::-1] if record.qual is not None else None
+    return SequenceRecord(record.name, record.comment, reverse_complement(record.seq), qual)
+
+
+def composition(seq):
+    """
+    Returns base composition as seqtk comp: length, A, C, G, T, 2, 3, 4, CpG, tv, ts, CpG-ts.
+
+    Transitions and transversions are counted on the ambiguous bases R, Y (ts) and K, M, S, W (tv)
+    as seqtk does.
+    """
+    seq = seq.upper()
+    a = seq.count("A")
+    c = seq.count("C")
+    g = seq.count("G")
+    t = seq.count("T")
+    n2 = sum(seq.count(b) for b in AMBIGUOUS_2)
+    n3 = sum(seq.count(b) for b in AMBIGUOUS_3)
+    n4 = seq.count(AMBIGUOUS_4)
+    cpg = seq.count("CG")
+    ts = seq.count("R") + seq.count("Y")
+    tv = n2 - ts
+    cpg_ts = seq.count("YG") + seq.count("CR")
+    return [len(seq), a, c, g, t, n2, n3, n4, cpg, tv, ts, cpg_ts]
+
+
+def gc_content(seq):
+    seq = seq.upper()
+    gc = seq.count("G") + seq.count("C")
+    acgt = gc + seq.count("A") + seq.count("T")
+    return gc / acgt if acgt else 0.0
+
+
+def read_ids(id_file):
+    """
+    Reads a set of sequence IDs, one per line, only the first column is used as seqtk subseq.
+    """
+    ids = set()
+    with open_file(id_file) as file:
+        for line in file:
+            fields = line.split()
+            if fields and not fields[0].startswith("#"):
+                ids.add(fields[0])
+    return ids
+
+
+def subset_fastx(input_file, ids, output_file, line_width=0):
+    """
+    Writes the records whose names are in ids in input order, returns the number of records written.
+    """
+    ids = set(ids)
+    n = 0
+    with open_file(output_file, "w") as out:
+        for record in read_fastx(input_file):
+            if record.name in ids:
+                write_fastx(out, record, line_width)
+                n += 1
+    return n
+
+
+def convert_fastx(input_files, output_file, reverse=False, fasta=False, line_width=0, mode="w"):
+    """
+    Copies records from one or more files to output_file as seqtk seq [-A] [-r], returns the number of records written.
+    """
+    n = 0
+    with open_file(output_file, mode) as out:
+        for input_file in input_files:
+            for record in read_fastx(input_file):
+                if reverse:
+                    record = reverse_complement_record(record)
+                write_fastx(out, record, line_width, fasta)
+                n += 1
+    return n
+
+
+class BgzfReader(object):
+    """
+    Reads a BGZF file as a byte stream, blocks are decompressed in batches by a pool of threads
+    as zlib releases the GIL.
+    """
+
+    def __init__(self, file_name, threads=1, batch=64):
+        self.file = open(file_name, "rb")
+        self.file_name = file_name
+        self.executor = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+        self.batch = batch * max(threads, 1)
+        self.buffer = bytearray()
+        self.offset = 0
+        self.eof = False
+
+    def read_blocks(self):
+        blocks = []
+        while len(blocks) < self.batch:
+            header = self.file.read(18)
+            if len(header) == 0:
+                self.eof = True
+                break
+            if len(header) < 18 or header[0] != 31 or header[1] != 139:
+                raise ValueError(f"{self.file_name}: not a BGZF file")
+            xlen = struct.unpack_from("<H", header, 10)[0]
+            extra = header[12:] + self.file.read(xlen - 6)
+            bsize = None
+            i = 0
+            while i < xlen:
+                slen = struct.unpack_from("<H", extra, i + 2)[0]
+                if extra[i] == 66 and extra[i + 1] == 67:
+                    bsize = struct.unpack_from("<H", extra, i + 4)[0]
+                i += 4 + slen
+            if bsize is None:
+                raise ValueError(f"{self.file_name}: BGZF block without a BC field")
+            data = self.file.read(bsize - xlen - 11)
+            blocks.append(data[:-8])
+        return blocks
+
+    def fill(self, n):
+        """
+        Ensures at least n unread bytes are buffered, returns False at end of file.
+        """
+        while len(self.buffer) - self.offset < n and not self.eof:
+            del self.buffer[:self.offset]
+            self.offset = 0
+            blocks = self.read_blocks()
+            if self.executor is not None:
+                self.buffer.extend(b"".join(self.executor.map(decompress_block, blocks)))
+            else:
+                self.buffer.extend(b"".join(map(decompress_block, blocks)))
+        return len(self.buffer) - self.offset >= n
+
+    def read(self, n):
+        if not self.fill(n):
+            raise EOFError(f"{self.file_name}: truncated")
+        data = bytes(self.buffer[self.offset:self.offset + n])
+        self.offset += n
+        return data
+
+    def close(self):
+        self.file.close()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+def decompress_block(data):
+    return zlib.decompress(data, -15)
+
+
+def compress_block(data, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+    header = struct.pack("<BBBBIBBHBBHH", 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, len(cdata) + 25)
+    return header + cdata + struct.pack("<II", zlib.crc32(data), len(data))
+
+
+class BgzfWriter(object):
+    """
+    Writes a BGZF file readable by bgzip, samtools and htslib, blocks are compressed in batches by
+    a pool of threads and written in order.
+    """
+
+    def __init__(self, file_name, threads=1, level=6, batch=16):
+        self.file = open(file_name, "wb")
+        self.executor = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+        self.level = level
+        self.batch_size = BGZF_BLOCK_SIZE * batch * max(threads, 1)
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer.extend(data.encode() if isinstance(data, str) else data)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        blocks = [bytes(self.buffer[i:i + BGZF_BLOCK_SIZE]) for i in range(0, len(self.buffer), BGZF_BLOCK_SIZE)]
+        self.buffer = bytearray()
+        if self.executor is not None:
+            for block in self.executor.map(compress_block, blocks, [self.level] * len(blocks)):
+                self.file.write(block)
+        else:
+            for block in blocks:
+                self.file.write(compress_block(block, self.level))
+
+    def close(self):
+        self.flush()
+        self.file.write(BGZF_EOF)
+        self.file.close()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class BamRecord(object):
+    __slots__ = ("name", "flag", "seq", "qual", "tags")
+
+    def __init__(self, name, flag, seq, qual, tags):
+        self.name = name
+        self.flag = flag
+        self.seq = seq
+        self.qual = qual
+        self.tags = tags
+
+    def to_sequence_record(self):
+        """
+        Converts to a FASTQ record as samtools bam2fq -T "*", reverse strand reads are reverse complemented.
+        """
+        seq = self.seq
+        qual = self.qual
+        if self.flag & 0x10:
+            seq = reverse_complement(seq)
+            qual = qual[::-1]
+        return SequenceRecord(self.name, "\t".join(self.tags), seq, qual)
+
+
+def read_bam(file_name, threads=1):
+    """
+    Yields the records of a BAM file, aux tags are returned as SAM text fields.
+    """
+    bgzf = BgzfReader(file_name, threads)
+    try:
+        if bgzf.read(4) != b"BAM\1":
+            raise ValueError(f"{file_name}: not a BAM file")
+        l_text = struct.unpack("<i", bgzf.read(4))[0]
+        bgzf.read(l_text)
+        n_ref = struct.unpack("<i", bgzf.read(4))[0]
+        for i in range(n_ref):
+            l_name = struct.unpack("<i", bgzf.read(4))[0]
+            bgzf.read(l_name + 4)
+        while bgzf.fill(4):
+            block_size = struct.unpack("<i", bgzf.read(4))[0]
+            yield parse_bam_record(bgzf.read(block_size))
+    finally:
+        bgzf.close()
+
+
+def parse_bam_record(data):
+    ref_id, pos, l_read_name, mapq, bin, n_cigar_op, flag, l_seq, next_ref_id, next_pos, tlen = BAM_CORE.unpack_from(data, 0)
+    i = 32
+    name = data[i:i + l_read_name - 1].decode()
+    i += l_read_name + 4 * n_cigar_op
+    l_packed = (l_seq + 1) // 2
+    seq = "".join(map(BAM_BASE_PAIRS.__getitem__, data[i:i + l_packed]))[:l_seq]
+    i += l_packed
+    raw_qual = data[i:i + l_seq]
+    qual = raw_qual.translate(BAM_QUALS).decode() if l_seq == 0 or raw_qual[0] != 0xff else "!" * l_seq
+    i += l_seq
+    return BamRecord(name, flag, seq, qual, parse_bam_aux(data, i))
+
+
+def parse_bam_aux(data, i):
+    tags = []
+    end = len(data)
+    while i < end:
+        tag = data[i:i + 2].decode()
+        type = chr(data[i + 2])
+        i += 3
+        if type == "A":
+            tags.append(f"{tag}:A:{chr(data[i])}")
+            i += 1
+        elif type in "ZH":
+            j = data.index(0, i)
+            tags.append(f"{tag}:{type}:{data[i:j].decode()}")
+            i = j + 1
+        elif type == "B":
+            subtype = chr(data[i])
+            n = struct.unpack_from("<i", data, i + 1)[0]
+            fmt, size = BAM_AUX_SIZES[subtype]
+            values = struct.unpack_from(f"<{n}{fmt}", data, i + 5)
+            tags.append(f"{tag}:B:{subtype}" + "".join(f",{v:g}" if subtype == "f" else f",{v}" for v in values))
+            i += 5 + n * size
+        else:
+            fmt, size = BAM_AUX_SIZES[type]
+            value = struct.unpack_from(f"<{fmt}", data, i)[0]
+            tags.append(f"{tag}:f:{value:g}" if type == "f" else f"{tag}:i:{value}")
+            i += size
+    return tags
+
+
+class FastaIndex(object):
+    """
+    Random access to an uncompressed FASTA file through a samtools compatible .fai index,
+    the index is built on first use and rebuilt when older than the FASTA file.
+    """
+
+    def __init__(self, fasta_file):
+        if fasta_file.endswith(".gz"):
+            raise ValueError(f"{fasta_file}: random access requires an uncompressed FASTA file")
+        self.fasta_file = fasta_file
+        self.fai_file = f"{fasta_file}.fai"
+        self.entries = {}
+        self.names = []
+        if os.path.exists(self.fai_file) and os.path.getmtime(self.fai_file) >= os.path.getmtime(fasta_file):
+            self.load()
+        else:
+            self.build()
+            self.write()
+        self.file = open(fasta_file, "rb")
+
+    def load(self):
+        with open(self.fai_file, "r") as file:
+            for line in file:
+                name, length, offset, line_bases, line_width = line.rstrip().split("\t")[:5]
+                self.add(name, int(length), int(offset), int(line_bases), int(line_width))
+
+    def build(self):
+        """
+        Builds the index from a single pass over the file in binary mode so that offsets are exact.
+        """
+        name = None
+        with open(self.fasta_file, "rb") as file:
+            offset = 0
+            for line in file:
+                line_len = len(line)
+                if line.startswith(b">"):
+                    if name is not None:
+                        self.add(name, length, seq_offset, line_bases, line_width)
+                    name = line[1:].split()[0].decode()
+                    length = 0
+                    seq_offset = offset + line_len
+                    line_bases = 0
+                    line_width = 0
+                    last_short = False
+                elif name is not None:
+                    bases = len(line.rstrip(b"\r\n"))
+                    if bases == 0:
+                        offset += line_len
+                        continue
+                    if line_bases == 0:
+                        line_bases = bases
+                        line_width = line_len
+                    elif last_short or bases > line_bases:
+                        raise ValueError(f"{self.fasta_file}: different line length in sequence {name}")
+                    last_short = bases < line_bases
+                    length += bases
+                offset += line_len
+            if name is not None:
+                self.add(name, length, seq_offset, line_bases, line_width)
+
+    def add(self, name, length, offset, line_bases, line_width):
+        self.entries[name] = (length, offset, line_bases, line_width)
+        self.names.append(name)
+
+    def write(self):
+        with open(self.fai_file, "w") as out:
+            for name in self.names:
+                length, offset, line_bases, line_width = self.entries[name]
+                out.write(f"{name}\t{length}\t{offset}\t{line_bases}\t{line_width}\n")
+
+    def length(self, name):
+        return self.entries[name][0]
+
+    def fetch(self, name, beg=1, end=None):
+        """
+        Returns the 1 based inclusive interval [beg, end] of a sequence.
+        """
+        length, offset, line_bases, line_width = self.entries[name]
+        end = length if end is None else min(end, length)
+        beg = max(beg, 1)
+        if beg > end or line_bases == 0:
+            return ""
+        start = offset + (beg - 1) // line_bases * line_width + (beg - 1) % line_bases
+        stop = offset + (end - 1) // line_bases * line_width + (end - 1) % line_bases + 1
+        self.file.seek(start)
+        return self.file.read(stop - start).decode().replace("\n", "").replace("\r", "")
+
+    def close(self):
+        self.file.close()
+
+
+def parse_region(region):
+    """
+    Parses a samtools style region, chr, chr:beg or chr:beg-end.
+    """
+    name, _, interval = region.rpartition(":")
+    if not name or not interval.replace(",", "").replace("-", "").isdigit():
+        return region, 1, None
+    beg, _, end = interval.replace(",", "").partition("-")
+    return name, int(beg), int(end) if end else None
+
+
+@click.group()
+def cli():
+    """
+    In process replacements for seqtk comp, subseq and seq with a samtools compatible FASTA index.
+    """
+    pass
+
+
+@cli.command()
+@click.argument("input_file")
+def comp(input_file):
+    """
+    Base composition of each sequence, output columns as seqtk comp.
+    """
+    for record in read_fastx(input_file):
+        print("\t".join([record.name] + [str(x) for x in composition(record.seq)]))
+
+
+@cli.command()
+@click.argument("input_file")
+@click.argument("id_file")
+@click.option("-l", "--line_width", default=0, show_default=True, help="FASTA line width, 0 for a single line")
+def subseq(input_file, id_file, line_width):
+    """
+    Extracts the sequences listed in an ID file.
+    """
+    subset_fastx(input_file, read_ids(id_file), "-", line_width)
+
+
+@cli.command()
+@click.argument("input_file")
+@click.option("-A", "--fasta", is_flag=True, default=False, help="force FASTA output")
+@click.option("-r", "--reverse", is_flag=True, default=False, help="reverse complement")
+@click.option("-l", "--line_width", default=0, show_default=True, help="FASTA line width, 0 for a single line")
+def seq(input_file, fasta, reverse, line_width):
+    """
+    Converts and reverse complements sequences.
+    """
+    convert_fastx([input_file], "-", reverse, fasta, line_width)
+
+
+@cli.command()
+@click.argument("bam_file")
+@click.argument("output_file")
+@click.option("-t", "--threads", default=1, show_default=True, help="BGZF decompression and compression threads")
+def bam2fq(bam_file, output_file, threads):
+    """
+    Converts an unaligned BAM file to FASTQ with all tags as samtools bam2fq -T "*", .gz output is BGZF compressed.
+    """
+    out = BgzfWriter(output_file, threads) if output_file.endswith(".gz") else open_file(output_file, "w")
+    with out:
+        for record in read_bam(bam_file, threads):
+            if not record.flag & 0x900:
+                write_fastx(out, record.to_sequence_record())
+
+
+@cli.command()
+@click.argument("fasta_file")
+@click.argument("regions", nargs=-1)
+def faidx(fasta_file, regions):
+    """
+    Indexes a FASTA file and extracts regions.
+    """
+    index = FastaIndex(fasta_file)
+    for region in regions:
+        name, beg, end = parse_region(region)
+        write_fastx(sys.stdout, SequenceRecord(region, "", index.fetch(name, beg, end)), 60)
+    index.close()
+
+
+@cli.command()
+@click.argument("input_file")
+@click.argument("id_file")
+@click.option("-s", "--seqtk", default="/usr/local/seqtk-1.4/seqtk", show_default=True, help="seqtk binary")
+@click.option("-n", "--repeats", default=3, show_default=True, help="number of timed repeats")
+@click.option("-p", "--launches", default=1000, show_default=True, help="number of records processed one at a time")
+def benchmark(input_file, id_file, seqtk, repeats, launches):
+    """
+    Times the in process calls against the equivalent seqtk processes, over the whole
+    input and over the first records processed one at a time as the pipelines did per contig.
+    """
+    print("\t{0:<20} :   {1:<10}".format("input file", input_file))
+    print("\t{0:<20} :   {1:<10}".format("id file", id_file))
+    print("\t{0:<20} :   {1:<10}".format("seqtk", seqtk))
+    print("\t{0:<20} :   {1:<10}".format("repeats", repeats))
+    print("\t{0:<20} :   {1:<10}".format("launches", launches))
+
+    ids = read_ids(id_file)
+    null = os.devnull
+    tasks = [
+        ("comp", lambda: [composition(r.seq) for r in read_fastx(input_file)], f"{seqtk} comp {input_file} > {null}"),
+        ("subseq", lambda: subset_fastx(input_file, ids, null), f"{seqtk} subseq {input_file} {id_file} > {null}"),
+        ("seq -A", lambda: convert_fastx([input_file], null, fasta=True), f"{seqtk} seq -A {input_file} > {null}"),
+        ("seq -Ar", lambda: convert_fastx([input_file], null, True, True), f"{seqtk} seq -Ar {input_file} > {null}"),
+    ]
+
+    has_seqtk = os.path.exists(seqtk)
+    if not has_seqtk:
+        print(f"{seqtk} not found, timing in process calls only")
+
+    print(f"#task\tseqio_s\tseqtk_s")
+    for name, func, cmd in tasks:
+        seqio_time = best_of(repeats, func)
+        if has_seqtk:
+            seqtk_time = best_of(repeats, lambda: subprocess.run(cmd, shell=True, check=True))
+            print(f"{name}\t{seqio_time:.4f}\t{seqtk_time:.4f}")
+        else:
+            print(f"{name}\t{seqio_time:.4f}\tNA")
+
+    # one record per file and one seqtk process per record, as the per contig invocations were
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files = []
+        for record in read_fastx(input_file):
+            if len(files) == launches:
+                break
+            files.append(f"{tmp_dir}/{len(files)}.fa")
+            with open(files[-1], "w") as out:
+                write_fastx(out, record)
+        seqio_time = best_of(1, lambda: [composition(r.seq) for file in files for r in read_fastx(file)])
+        if has_seqtk:
+            seqtk_time = best_of(1, lambda: [subprocess.run([seqtk, "comp", file], stdout=subprocess.DEVNULL, check=True) for file in files])
+            print(f"comp x {len(files)} records\t{seqio_time:.4f}\t{seqtk_time:.4f}")
+        else:
+            print(f"comp x {len(files)} records\t{seqio_time:.4f}\tNA")
+
+
+def best_of(repeats, func):
+    best = float("inf")
+    for i in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    cli() # type: ignore
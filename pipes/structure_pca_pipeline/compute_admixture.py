@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2026 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import click
+import numpy as np
+
+EPSILON = 1e-6
+
+
+@click.command()
+@click.argument("tg_file")
+@click.option("-o", "--output_dir", required=True, help="output directory, results are written to K{k}_R{rep}_f")
+@click.option("-k", "--ks", default="2-4", show_default=True, help="range of K to run, e.g. 2-10")
+@click.option("-r", "--no_replicates", default=3, show_default=True, help="number of random restarts per K")
+@click.option("-c", "--cv_folds", default=5, show_default=True, help="number of cross-validation folds, 0 to skip")
+@click.option("-i", "--max_iterations", default=1000, show_default=True, help="maximum number of accelerated EM iterations")
+@click.option("-e", "--tolerance", default=1e-4, show_default=True, help="stop when the log likelihood improves by less than this")
+@click.option("-s", "--seed", default=3323, show_default=True, help="random seed")
+def main(tg_file, output_dir, ks, no_replicates, cv_folds, max_iterations, tolerance, seed):
+    """
+    Maximum likelihood admixture proportions of genotypes in tg format.
+
+    Ancestry proportions Q and population allele frequencies P are fitted by EM
+    accelerated with SQUAREM, from several random restarts per K.  Each restart is
+    written as a STRUCTURE style K{k}_R{rep}_f file so that structure_to_clumpp_distruct.py,
+    structure_gis_to_sa.py and structure_pca_to_sa.py can be used unchanged.  The
+    cross-validation error of the best restart at each K is reported, the K with the
+    lowest error is usually the one to take forward to STRUCTURE.
+
+    Outputs
+        <output_dir>/K{k}_R{rep}_f         ancestry proportions in STRUCTURE layout
+        <output_dir>/admixture_cv.txt      log likelihood and cross-validation error of each run
+
+    e.g. compute_admixture.py pangolin.tg -o admixture -k 2-10
+    """
+    print("\t{0:<20} :   {1:<10}".format("tg file", tg_file))
+    print("\t{0:<20} :   {1:<10}".format("output dir", output_dir))
+    print("\t{0:<20} :   {1:<10}".format("K", ks))
+    print("\t{0:<20} :   {1:<10}".format("no replicates", no_replicates))
+    print("\t{0:<20} :   {1:<10}".format("cv folds", cv_folds))
+    print("\t{0:<20} :   {1:<10}".format("max iterations", max_iterations))
+    print("\t{0:<20} :   {1:<10}".format("tolerance", tolerance))
+    print("\t{0:<20} :   {1:<10}".format("seed", seed))
+
+    if "-" in ks:
+        start, end = ks.split("-")
+        ks = list(range(int(start), int(end) + 1))
+    else:
+        ks = [int(k) for k in ks.split(",")]
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    snps, samples, G = read_tg(tg_file)
+    print(f"no snps              : {len(snps)}")
+    print(f"no samples           : {len(samples)}")
+
+    O = G >= 0
+    G = np.where(O, G, 0).astype(np.float64)
+    O = O.astype(np.float64)
+    observed = O.sum(axis=1)
+    ac = (G * O).sum(axis=1)
+    polymorphic = (ac > 0) & (ac < 2 * observed)
+    G = G[polymorphic]
+    O = O[polymorphic]
+    print(f"no polymorphic snps  : {G.shape[0]}")
+
+    with open(f"{output_dir}/admixture_cv.txt", "w") as f:
+        f.write("#K\trep\tlog_likelihood\titerations\tcv_error\tbest\n")
+        for k in ks:
+            fits = []
+            for rep in range(1, no_replicates + 1):
+                rng = np.random.default_rng([seed, k, rep])
+                Q, P = initialise(G.shape[0], G.shape[1], k, rng)
+                Q, P, log_likelihood, iterations = fit(G, O, Q, P, max_iterations, tolerance)
+                print(f"K{k}_R{rep}               : log likelihood {log_likelihood:.2f} in {iterations} iterations")
+                write_structure_file(f"{output_dir}/K{k}_R{rep}_f", samples, O, Q, log_likelihood, k)
+                fits.append((log_likelihood, iterations, Q, P))
+
+            best = max(range(len(fits)), key=lambda i: fits[i][0])
+            cv_error = float("nan")
+            if cv_folds > 0:
+                cv_error = cross_validate(
+                    G, O, fits[best][2], fits[best][3], cv_folds, max_iterations, tolerance, np.random.default_rng([seed, k])
+                )
+                print(f"K{k} cv error          : {cv_error:.6f}")
+
+            for i, (log_likelihood, iterations, Q, P) in enumerate(fits):
+                error = f"{cv_error:.6f}" if i == best else "NA"
+                f.write(f"{k}\t{i+1}\t{log_likelihood:.4f}\t{iterations}\t{error}\t{int(i == best)}\n")
+
+
+def read_tg(tg_file):
+    """
+    Reads a tg file of SNPs by samples with genotypes coded as 0, 1, 2 and -1 for missing.
+    """
+    snps = []
+    genotypes = []
+    with open(tg_file, "r") as f:
+        samples = f.readline().rstrip("\n").split("\t")[1:]
+        for line in f:
+            snp, *g = line.rstrip("\n").split("\t")
+            snps.append(snp)
+            genotypes.append(g)
+    return snps, samples, np.array(genotypes, dtype=np.int8).reshape(len(snps), len(samples))
+
+
+def initialise(no_snps, no_samples, k, rng):
+    Q = rng.dirichlet(np.ones(k), size=no_samples)
+    P = rng.uniform(0.05, 0.95, size=(no_snps, k))
+    return Q, P
+
+
+def log_likelihood(G, O, Q, P):
+    H = np.clip(P @ Q.T, EPSILON, 1 - EPSILON)
+    return float(np.sum(O * (G * np.log(H) + (2 - G) * np.log(1 - H))))
+
+
+def em(G, O, Q, P):
+    """
+    One EM update of Q and P, G holds alternate allele counts and O marks observed genotypes.
+    Both updates are computed from the current Q and P.
+    """
+    H = np.clip(P @ Q.T, EPSILON, 1 - EPSILON)
+    A = O * G / H
+    B = O * (2 - G) / (1 - H)
+    alt = P * (A @ Q)
+    ref = (1 - P) * (B @ Q)
+    Q = Q * (A.T @ P + B.T @ (1 - P)) / np.maximum(2 * O.sum(axis=0), EPSILON)[:, None]
+    P = alt / np.maximum(alt + ref, EPSILON)
+    return project(Q, P)
+
+
+def project(Q, P):
+    Q = np.clip(Q, EPSILON, 1 - EPSILON)
+    Q /= Q.sum(axis=1, keepdims=True)
+    P = np.clip(P, EPSILON, 1 - EPSILON)
+    return Q, P
+
+
+def fit(G, O, Q, P, max_iterations, tolerance):
+    """
+    EM accelerated by SQUAREM, falls back to the plain EM step whenever the
+    extrapolated step lowers the likelihood.
+    """
+    current = log_likelihood(G, O, Q, P)
+    iteration = 0
+    for iteration in range(1, max_iterations + 1):
+        Q1, P1 = em(G, O, Q, P)
+        Q2, P2 = em(G, O, Q1, P1)
+        rQ, rP = Q1 - Q, P1 - P
+        vQ, vP = Q2 - Q1 - rQ, P2 - P1 - rP
+        r = np.sqrt(np.sum(rQ**2) + np.sum(rP**2))
+        v = np.sqrt(np.sum(vQ**2) + np.sum(vP**2))
+        alpha = min(-r / v, -1.0) if v > 0 else -1.0
+        Qn, Pn = project(Q - 2 * alpha * rQ + alpha**2 * vQ, P - 2 * alpha * rP + alpha**2 * vP)
+        Qn, Pn = em(G, O, Qn, Pn)
+        extrapolated = log_likelihood(G, O, Qn, Pn)
+        if extrapolated < current:
+            Qn, Pn = Q2, P2
+            extrapolated = log_likelihood(G, O, Qn, Pn)
+        Q, P = Qn, Pn
+        improvement = extrapolated - current
+        current = extrapolated
+        if improvement < tolerance:
+            break
+
+    return Q, P, current, iteration
+
+
+def cross_validate(G, O, Q, P, no_folds, max_iterations, tolerance, rng):
+    """
+    Masks each fold of observed genotypes in turn, refits from the full estimate
+    and returns the mean binomial deviance of the held out genotypes.
+    """
+    rows, cols = np.nonzero(O)
+    folds = rng.integers(0, no_folds, size=len(rows))
+    deviance = 0.0
+    for fold in range(no_folds):
+        held_out = folds == fold
+        O_train = O.copy()
+        O_train[rows[held_out], cols[held_out]] = 0
+        Q_fold, P_fold, _, _ = fit(G, O_train, Q.copy(), P.copy(), max_iterations, tolerance)
+        h = np.clip(np.sum(P_fold[rows[held_out]] * Q_fold[cols[held_out]], axis=1), EPSILON, 1 - EPSILON)
+        g = G[rows[held_out], cols[held_out]]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            alt = np.where(g > 0, g * np.log(g / (2 * h)), 0)
+            ref = np.where(g < 2, (2 - g) * np.log((2 - g) / (2 - 2 * h)), 0)
+        deviance += np.sum(2 * (alt + ref))
+    return deviance / len(rows)
+
+
+def write_structure_file(file, samples, O, Q, log_likelihood, k):
+    missing = 100 * (1 - O.mean(axis=0))
+    with open(file, "w") as f:
+        f.write("Admixture proportions estimated by compute_admixture.py\n\n")
+        f.write("Run parameters:\n")
+        f.write(f"   {len(samples)} individuals\n")
+        f.write(f"   {O.shape[0]} loci\n")
+        f.write(f"   {k} populations assumed\n\n")
+        f.write(f"Estimated Ln Prob of Data   = {log_likelihood:.1f}\n\n")
+        f.write("Inferred ancestry of individuals:\n")
+        f.write("        Label (%Miss) :  Inferred clusters\n")
+        for i, sample in enumerate(samples):
+            line = f"{i+1:4d} {sample:>10}   ({missing[i]:.0f})   : "
+            line += "".join(f" {q:.3f}" for q in Q[i])
+            f.write(line + "\n")
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    main() # type: ignore
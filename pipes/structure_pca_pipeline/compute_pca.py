@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2026 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import click
+import numpy as np
+
+
+@click.command()
+@click.argument("tg_file")
+@click.option("-o", "--output_prefix", required=True, help="output prefix")
+@click.option("-k", "--no_pcs", default=20, show_default=True, help="number of principal components")
+@click.option(
+    "-a",
+    "--axes_file",
+    default="",
+    help="project samples onto the axes of a previous run instead of computing new ones",
+)
+@click.option("-p", "--oversample", default=20, show_default=True, help="oversampling for randomized SVD")
+@click.option("-q", "--power_iterations", default=7, show_default=True, help="power iterations for randomized SVD")
+@click.option("-s", "--seed", default=3323, show_default=True, help="random seed")
+def main(tg_file, output_prefix, no_pcs, axes_file, oversample, power_iterations, seed):
+    """
+    Principal component analysis of genotypes in tg format.
+
+    Genotypes are standardised by allele frequency with missing genotypes set to 0
+    and the top PCs are obtained by a truncated randomized SVD.
+    When projecting onto the axes of a previous run, the samples must be genotyped
+    at every SNP of the axes, matched on chrom:pos:ref:alt.
+
+    Outputs
+        <output_prefix>.pca          sample-id and PCs of each sample
+        <output_prefix>.eigenvalues  eigenvalues and variance explained
+        <output_prefix>.axes         allele frequencies and loadings of each SNP for projection
+
+    e.g. compute_pca.py pangolin.tg -o pangolin
+         compute_pca.py new_samples.tg -a pangolin.axes -o new_samples
+    """
+    print("\t{0:<20} :   {1:<10}".format("tg file", tg_file))
+    print("\t{0:<20} :   {1:<10}".format("output prefix", output_prefix))
+    print("\t{0:<20} :   {1:<10}".format("no pcs", no_pcs))
+    print("\t{0:<20} :   {1:<10}".format("axes file", axes_file))
+
+    snps, samples, G = read_tg(tg_file)
+    print(f"no snps              : {len(snps)}")
+    print(f"no samples           : {len(samples)}")
+
+    if axes_file != "":
+        axes = Axes.read(axes_file)
+        try:
+            rows = match_snps(snps, axes.snps)
+        except ValueError as e:
+            print(f"error: {e}")
+            exit(1)
+        print(f"no snps not in axes  : {len(snps) - len(rows)}")
+        X = standardise(G[rows], axes.p)
+        pcs = X.T @ axes.loadings / axes.singular_values
+        write_pca(f"{output_prefix}.pca", samples, pcs)
+        return
+
+    p = allele_frequencies(G)
+    polymorphic = (p > 0) & (p < 1)
+    snps = [snp for snp, keep in zip(snps, polymorphic) if keep]
+    G = G[polymorphic]
+    p = p[polymorphic]
+    print(f"no polymorphic snps  : {len(snps)}")
+
+    X = standardise(G, p).T
+    no_pcs = min(no_pcs, *X.shape)
+    U, s, Vt = randomized_svd(X, no_pcs, oversample, power_iterations, np.random.default_rng(seed))
+
+    eigenvalues = s**2 / X.shape[1]
+    variance_explained = s**2 / np.sum(X**2)
+
+    write_pca(f"{output_prefix}.pca", samples, U)
+    with open(f"{output_prefix}.eigenvalues", "w") as f:
+        f.write("pc\teigenvalue\tvariance_explained\tcumulative_variance_explained\n")
+        cumulative = 0
+        for i in range(no_pcs):
+            cumulative += variance_explained[i]
+            f.write(f"PC{i+1}\t{eigenvalues[i]:.6f}\t{variance_explained[i]:.6f}\t{cumulative:.6f}\n")
+    Axes(snps, p, s, Vt.T).write(f"{output_prefix}.axes")
+
+    for i in range(min(no_pcs, 5)):
+        print(f"PC{i+1}                  : {variance_explained[i]*100:.2f}%")
+
+
+def read_tg(tg_file):
+    """
+    Reads a tg file of SNPs by samples with genotypes coded as 0, 1, 2 and -1 for missing.
+    """
+    snps = []
+    genotypes = []
+    with open(tg_file, "r") as f:
+        samples = f.readline().rstrip("\n").split("\t")[1:]
+        for line in f:
+            snp, *g = line.rstrip("\n").split("\t")
+            snps.append(snp)
+            genotypes.append(g)
+    return snps, samples, np.array(genotypes, dtype=np.int8).reshape(len(snps), len(samples))
+
+
+def match_snps(snps, axes_snps):
+    """
+    Returns the row of each SNP of the axes in snps.
+    SNPs are matched on their chrom:pos:ref:alt ids, duplicated ids or SNPs of the
+    axes that are absent from snps raise a ValueError as the projection would not
+    line up with the loadings.
+    """
+    idx = {snp: i for i, snp in enumerate(snps)}
+    if len(idx) != len(snps):
+        raise ValueError(f"{len(snps) - len(idx)} duplicate snp ids, regenerate the tg file with vcf_to_tg.py")
+    if len(set(axes_snps)) != len(axes_snps):
+        raise ValueError(f"{len(axes_snps) - len(set(axes_snps))} duplicate snp ids in the axes, rerun the PCA on a tg file from vcf_to_tg.py")
+    missing = [snp for snp in axes_snps if snp not in idx]
+    if len(missing) > 0:
+        raise ValueError(f"{len(missing)} snps of the axes are not genotyped, e.g. {missing[0]}")
+    return [idx[snp] for snp in axes_snps]
+
+
+def allele_frequencies(G):
+    observed = G >= 0
+    n = observed.sum(axis=1)
+    ac = np.where(observed, G, 0).sum(axis=1)
+    return np.divide(ac, 2 * n, out=np.zeros(len(n)), where=n > 0)
+
+
+def standardise(G, p):
+    """
+    Centres and scales genotypes by allele frequency, missing genotypes are set to 0.
+    """
+    p = p[:, None]
+    scale = np.sqrt(2 * p * (1 - p))
+    X = np.divide(G - 2 * p, scale, out=np.zeros(G.shape), where=scale > 0)
+    X[G < 0] = 0
+    return X
+
+
+def randomized_svd(X, k, oversample, power_iterations, rng):
+    """
+    Truncated SVD of X by randomized range finding with power iterations.
+    Signs are fixed so that the largest sample coordinate of each PC is positive.
+    """
+    l = min(k + oversample, *X.shape)
+    Q, _ = np.linalg.qr(X @ rng.standard_normal((X.shape[1], l)))
+    for i in range(power_iterations):
+        Q, _ = np.linalg.qr(X.T @ Q)
+        Q, _ = np.linalg.qr(X @ Q)
+    Ub, s, Vt = np.linalg.svd(Q.T @ X, full_matrices=False)
+    U = Q @ Ub[:, :k]
+    s = s[:k]
+    Vt = Vt[:k]
+    signs = np.sign(U[np.argmax(np.abs(U), axis=0), np.arange(k)])
+    signs[signs == 0] = 1
+    return U * signs, s, Vt * signs[:, None]
+
+
+def write_pca(pca_file, samples, pcs):
+    with open(pca_file, "w") as f:
+        f.write("sample-id")
+        for i in range(pcs.shape[1]):
+            f.write(f"\tPC{i+1}")
+        f.write("\n")
+        for sample, row in zip(samples, pcs):
+            f.write(sample)
+            for pc in row:
+                f.write(f"\t{pc:.6f}")
+            f.write("\n")
+
+
+class Axes(object):
+    """
+    Allele frequencies, singular values and loadings of a PCA for projecting new samples.
+    """
+
+    def __init__(self, snps, p, singular_values, loadings):
+        self.snps = snps
+        self.p = p
+        self.singular_values = singular_values
+        self.loadings = loadings
+
+    def write(self, axes_file):
+        with open(axes_file, "w") as f:
+            f.write("#singular-values\t\t" + "\t".join(f"{s:.10g}" for s in self.singular_values) + "\n")
+            f.write("snp-id\tp")
+            for i in range(len(self.singular_values)):
+                f.write(f"\tPC{i+1}")
+            f.write("\n")
+            for snp, p, row in zip(self.snps, self.p, self.loadings):
+                f.write(f"{snp}\t{p:.10g}\t" + "\t".join(f"{v:.10g}" for v in row) + "\n")
+
+    @staticmethod
+    def read(axes_file):
+        snps = []
+        rows = []
+        with open(axes_file, "r") as f:
+            singular_values = np.array(f.readline().rstrip("\n").split("\t")[2:], dtype=float)
+            f.readline()
+            for line in f:
+                snp, *row = line.rstrip("\n").split("\t")
+                snps.append(snp)
+                rows.append(row)
+        rows = np.array(rows, dtype=float).reshape(len(snps), len(singular_values) + 1)
+        return Axes(snps, rows[:, 0], singular_values, rows[:, 1:])
+
+
+if __name__ == "__main__":
+    main() # type: ignore
@@ -20,7 +20,6 @@
 
 import os
 import click
-import random
 
 @click.command()
 @click.option(
@@ -40,7 +39,8 @@ import random
 @click.option("-s", "--sample_file", required=True, help="sample file")
 @click.option("-i", "--input_vcf_file", required=True, help="VCF file")
 @click.option("-d", "--dataset", required=True, help="dataset name")
-def main(make_file, working_dir, sample_file, input_vcf_file, dataset):
+@click.option("-t", "--threads", default=9, show_default=True, help="number of concurrent structure runs")
+def main(make_file, working_dir, sample_file, input_vcf_file, dataset, threads):
     """
     Population structure of Pangolins
 
@@ -51,6 +51,7 @@ def main(make_file, working_dir, sample_file, input_vcf_file, dataset):
     print("\t{0:<20} :   {1:<10}".format("sample file", sample_file))
     print("\t{0:<20} :   {1:<10}".format("input VCF file", input_vcf_file))
     print("\t{0:<20} :   {1:<10}".format("dataset", dataset))
+    print("\t{0:<20} :   {1:<10}".format("threads", threads))
 
     # initialize
     pg = PipelineGenerator(make_file)
@@ -59,6 +60,7 @@ def main(make_file, working_dir, sample_file, input_vcf_file, dataset):
     working_dir = os.path.join(os.path.abspath(working_dir), dataset)
     structure_dir = f"{working_dir}/structure"
     pca_dir = f"{working_dir}/pca"
+    admixture_dir = f"{working_dir}/admixture"
     log_dir = f"{working_dir}/log"
     try:
         os.makedirs(log_dir, exist_ok=True)
@@ -67,6 +69,7 @@ def main(make_file, working_dir, sample_file, input_vcf_file, dataset):
         os.makedirs(f"{structure_dir}/gisplots", exist_ok=True)
         os.makedirs(pca_dir, exist_ok=True)
         os.makedirs(f"{pca_dir}/gisplots", exist_ok=True)
+        os.makedirs(admixture_dir, exist_ok=True)
     except OSError as error:
         print(f"{error.filename} cannot be created")
 
@@ -74,12 +77,14 @@ def main(make_file, working_dir, sample_file, input_vcf_file, dataset):
     # programs
     ##########
     structure = "/usr/local/structure-2.3.4/structure"
-    fpca = "/usr/local/fratools-1.0/fpca"
     distruct = "/usr/local/distruct-1.1/distruct"
 
     script_dir = os.path.dirname(__file__)
     vcf_to_structure = f"{script_dir}/vcf_to_structure.py"
     vcf_to_tg = f"{script_dir}/vcf_to_tg.py"
+    compute_pca = f"{script_dir}/compute_pca.py"
+    compute_admixture = f"{script_dir}/compute_admixture.py"
+    run_structure = f"{script_dir}/run_structure.py"
     structure_to_clumpp_distruct = f"{script_dir}/structure_to_clumpp_distruct.py"
     structure_gis_to_sa = f"{script_dir}/structure_gis_to_sa.py"
     structure_pca_to_sa = f"{script_dir}/structure_pca_to_sa.py"
@@ -97,46 +102,43 @@ def main(make_file, working_dir, sample_file, input_vcf_file, dataset):
     cmd = f"{vcf_to_structure} {input_vcf_file} -o {output_dir} -d {dataset} > {log}"
     pg.add(tgt, dep, cmd)
 
-    #run structure
-    random.seed(3323)
+    #run structure for all K and replicates in parallel
+    input_structure_file = f"{structure_dir}/{dataset}.structure"
+    mainparams = f"{structure_dir}/mainparams"
+    extraparams = f"{structure_dir}/extraparams"
+    log = f"{structure_dir}/structure_runs.log"
+    tgt = f"{structure_dir}/structure_runs.OK"
+    dep = f"{structure_dir}/structure_files.OK"
+    cmd = f"{run_structure} -i {input_structure_file} -o {structure_dir} -m {mainparams} -e {extraparams} -k 2-4 -r 3 -t {threads} -s 3323 --structure {structure} > {log}"
+    pg.add(tgt, dep, cmd)
+
+    #align cluster labels across replicates and K and prepare distruct files
+    input_structure_results_files = ""
+    log = f"{structure_dir}/distruct_files.log"
+    tgt = f"{structure_dir}/distruct_files.OK"
+    dep = f"{structure_dir}/structure_runs.OK"
     for k in range(2, 5):
-        for rep in range(1, 4):
-            seed = int(1000*random.random())
-            input_structure_file = f"{structure_dir}/{dataset}.structure"
-            output_structure_results_file = f"{structure_dir}/K{k}_R{rep}"
-            mainparams = f"{structure_dir}/mainparams"
-            extraparams = f"{structure_dir}/extraparams"
-            log = f"{structure_dir}/K{k}_R{rep}.log"
-            tgt = f"{structure_dir}/K{k}_R{rep}.OK"
-            dep = f"{structure_dir}/structure_files.OK"
-            cmd = f"{structure} -i {input_structure_file} -o {output_structure_results_file} -m {mainparams} -e {extraparams} -K {k} -D {seed} > {log}"
-            pg.add(tgt, dep,  cmd)
-
-        #prepare distruct files
-        input_structure_results_files = ""
-        log = f"{structure_dir}/K{k}.distruct.log"
-        tgt = f"{structure_dir}/K{k}.distruct.OK"
-        dep = ""
         for rep in range(1, 4):
             input_structure_results_files += f"{structure_dir}/K{k}_R{rep}_f "
-            dep += f"{structure_dir}/K{k}_R{rep}.OK "
-        cmd = f"{structure_to_clumpp_distruct} {input_structure_results_files} > {log}"
-        pg.add(tgt, dep, cmd)
+    cmd = f"{structure_to_clumpp_distruct} {input_structure_results_files} -s {structure_dir}/structure_summary.txt > {log}"
+    pg.add(tgt, dep, cmd)
 
+    # replicates that did not complete have no results, their steps do nothing
+    for k in range(2, 5):
         #run distruct
         for rep in range(1, 4):
             input_drawparam = f"K{k}_R{rep}.drawparams"
             log = f"{structure_dir}/K{k}_R{rep}.distruct.log"
             tgt = f"{structure_dir}/K{k}_R{rep}.distruct.OK"
-            dep = f"{structure_dir}/K{k}.distruct.OK "
-            cmd = f"cd {structure_dir}; {distruct} -d {input_drawparam} > {log}; set $? 0"
+            dep = f"{structure_dir}/distruct_files.OK "
+            cmd = f"cd {structure_dir}; [ ! -f {input_drawparam} ] || {distruct} -d {input_drawparam} > {log}; set $? 0"
             pg.add(tgt, dep, cmd)
 
             input_ps_file = f"{structure_dir}/K{k}_R{rep}.ps"
             output_pdf_file = f"{structure_dir}/barplots/K{k}_R{rep}.pdf"
             tgt = f"{structure_dir}/K{k}_R{rep}.pdf.ok"
             dep = f"{structure_dir}/K{k}_R{rep}.distruct.OK "
-            cmd = f"ps2pdf {input_ps_file} {output_pdf_file}"
+            cmd = f"[ ! -f {input_ps_file} ] || ps2pdf {input_ps_file} {output_pdf_file}"
             pg.add(tgt, dep, cmd)
 
             #generate sample files for plotting GIS scatterplots
@@ -144,8 +146,8 @@ def main(make_file, working_dir, sample_file, input_vcf_file, dataset):
             output_sa_file = f"{structure_dir}/K{k}_R{rep}.sa"
             log = f"{structure_dir}/K{k}_R{rep}.sa.log"
             tgt = f"{structure_dir}/K{k}_R{rep}.sa.OK"
-            dep = f"{structure_dir}/K{k}_R{rep}.OK "
-            cmd = f"{structure_gis_to_sa} -g {sample_file} -s {input_structure_file} -o {output_sa_file} > {log}"
+            dep = f"{structure_dir}/structure_runs.OK"
+            cmd = f"[ ! -f {input_structure_file} ] || {structure_gis_to_sa} -g {sample_file} -s {input_structure_file} -o {output_sa_file} > {log}"
             pg.add(tgt, dep, cmd)
 
             #plot geospatial plot with structure pie charts
@@ -155,7 +157,7 @@ def main(make_file, working_dir, sample_file, input_vcf_file, dataset):
             log = f"{structure_dir}/K{k}_R{rep}_gis.log"
             tgt = f"{structure_dir}/K{k}_R{rep}_gis.pdf.OK"
             dep = f"{structure_dir}/K{k}_R{rep}.sa.OK"
-            cmd = f"{plot_gis_structure} {input_sa_file} -o {output_r_file} -z {output_pdf_file} > {log}"
+            cmd = f"[ ! -f {input_sa_file} ] || {plot_gis_structure} {input_sa_file} -o {output_r_file} -z {output_pdf_file} > {log}"
             pg.add(tgt, dep, cmd)
 
     ####
@@ -175,10 +177,10 @@ def main(make_file, working_dir, sample_file, input_vcf_file, dataset):
     err = f"{pca_dir}/pca.err"
     tgt = f"{pca_dir}/pca.OK"
     dep = f"{input_tg_file}.OK"
-    cmd = f"cd {pca_dir}; {fpca} -i {input_tg_file} > {log} 2> {err}"
+    cmd = f"{compute_pca} {input_tg_file} -o {pca_dir}/{dataset} -k 20 > {log} 2> {err}"
     pg.add(tgt, dep, cmd)
 
-    #generate sample files for plotting PCA - Structure scatterplots
+    #generate sample files for plotting PCA - Structure scatterplots, skipped for replicates that did not complete
     for k in range(2, 5):
         for rep in range(1, 4):
             input_pca_file = f"{pca_dir}/{dataset}.pca"
@@ -186,8 +188,8 @@ def main(make_file, working_dir, sample_file, input_vcf_file, dataset):
             output_sa_file = f"{pca_dir}/K{k}_R{rep}.sa"
             log = f"{output_sa_file}.log"
             tgt = f"{output_sa_file}.OK"
-            dep = f"{pca_dir}/pca.OK {structure_dir}/K{k}_R{rep}.OK"
-            cmd = f"{structure_pca_to_sa} -s {input_structure_file} -p {input_pca_file} -o {output_sa_file} > {log}"
+            dep = f"{pca_dir}/pca.OK {structure_dir}/structure_runs.OK"
+            cmd = f"[ ! -f {input_structure_file} ] || {structure_pca_to_sa} -s {input_structure_file} -p {input_pca_file} -o {output_sa_file} > {log}"
             pg.add(tgt, dep, cmd)
 
             #plot PCA with structure pie charts
@@ -197,11 +199,33 @@ def main(make_file, working_dir, sample_file, input_vcf_file, dataset):
             log = f"{pca_dir}/K{k}_R{rep}_gis.log"
             tgt = f"{pca_dir}/K{k}_R{rep}.pdf.OK"
             dep = f"{input_sa_file}.OK"
-            cmd = f"{plot_pca_structure} {input_sa_file} -o {pca_dir}/K{k}_R{rep}.r -z {output_pdf_file} > {log}"
+            cmd = f"[ ! -f {input_sa_file} ] || {plot_pca_structure} {input_sa_file} -o {pca_dir}/K{k}_R{rep}.r -z {output_pdf_file} > {log}"
             pg.add(tgt, dep, cmd)
 
+    ##########
+    #admixture
+    ##########
+    #exploratory K sweep with the maximum likelihood estimator
+    input_tg_file = f"{pca_dir}/{dataset}.tg"
+    log = f"{admixture_dir}/admixture.log"
+    tgt = f"{admixture_dir}/admixture.OK"
+    dep = f"{input_tg_file}.OK"
+    cmd = f"{compute_admixture} {input_tg_file} -o {admixture_dir} -k 2-10 -r 3 > {log}"
+    pg.add(tgt, dep, cmd)
+
+    #align cluster labels across restarts and K
+    input_admixture_results_files = ""
+    for k in range(2, 11):
+        for rep in range(1, 4):
+            input_admixture_results_files += f"{admixture_dir}/K{k}_R{rep}_f "
+    log = f"{admixture_dir}/distruct_files.log"
+    tgt = f"{admixture_dir}/distruct_files.OK"
+    dep = f"{admixture_dir}/admixture.OK"
+    cmd = f"{structure_to_clumpp_distruct} {input_admixture_results_files} -s {admixture_dir}/admixture_summary.txt > {log}"
+    pg.add(tgt, dep, cmd)
+
     # clean
-    pg.add_clean(f"rm -fr {log_dir} {structure_dir} {pca_dir}")
+    pg.add_clean(f"rm -fr {log_dir} {structure_dir} {pca_dir} {admixture_dir}")
 
     # write make file
     print("Writing pipeline")
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2026 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import re
+import time
+import math
+import random
+import subprocess
+import click
+from concurrent.futures import ThreadPoolExecutor
+
+
+@click.command()
+@click.option("-i", "--input_structure_file", required=True, help="structure input file")
+@click.option("-o", "--output_dir", required=True, help="output directory, results are written to K{k}_R{rep}_f")
+@click.option("-m", "--mainparams_file", required=True, help="mainparams file")
+@click.option("-e", "--extraparams_file", required=True, help="extraparams file")
+@click.option("-k", "--ks", default="2-4", show_default=True, help="range of K to run, e.g. 2-6")
+@click.option("-r", "--no_replicates", default=3, show_default=True, help="number of replicates per K")
+@click.option("-t", "--threads", default=8, show_default=True, help="number of concurrent structure runs")
+@click.option("-s", "--seed", default=3323, show_default=True, help="base seed, each run derives its seed from this, K and the replicate")
+@click.option("-w", "--window", default=20, show_default=True, help="number of trace updates compared when checking for convergence")
+@click.option("-d", "--max_drop", default=1000.0, show_default=True, help="stop a run whose Ln Like falls this far below its post burn-in mean")
+@click.option("-x", "--retries", default=1, show_default=True, help="number of times a stopped run is restarted with a new seed")
+@click.option("--structure", default="/usr/local/structure-2.3.4/structure", show_default=True, help="structure binary")
+@click.option("--strict", is_flag=True, default=False, help="exit with an error when any run did not complete")
+def main(
+    input_structure_file,
+    output_dir,
+    mainparams_file,
+    extraparams_file,
+    ks,
+    no_replicates,
+    threads,
+    seed,
+    window,
+    max_drop,
+    retries,
+    structure,
+    strict,
+):
+    """
+    Run structure for all K and replicates across a pool of workers.
+
+    Every run gets its own working directory (structure writes seed.txt into the
+    current directory) and a seed derived from the base seed, K and replicate so
+    reruns are reproducible.  The screen trace of each run is followed while it
+    runs: the burn-in is flagged once Ln Like plateaus, runs whose Ln Like is still
+    drifting after burn-in are reported as not converged and runs whose Ln Like
+    collapses or becomes non finite are stopped and restarted with a new seed.
+
+    A summary is written to structure_runs.txt in the output directory.  Runs that
+    did not complete are reported there and the runner only fails when every
+    replicate of a K did not complete, or with --strict when any run did not.
+
+    e.g. run_structure.py -i pangolin.structure -o structure -m structure/mainparams -e structure/extraparams -k 2-4 -r 3 -t 9
+    """
+    print("\t{0:<20} :   {1:<10}".format("input structure file", input_structure_file))
+    print("\t{0:<20} :   {1:<10}".format("output dir", output_dir))
+    print("\t{0:<20} :   {1:<10}".format("mainparams file", mainparams_file))
+    print("\t{0:<20} :   {1:<10}".format("extraparams file", extraparams_file))
+    print("\t{0:<20} :   {1:<10}".format("K", ks))
+    print("\t{0:<20} :   {1:<10}".format("no replicates", no_replicates))
+    print("\t{0:<20} :   {1:<10}".format("threads", threads))
+    print("\t{0:<20} :   {1:<10}".format("seed", seed))
+    print("\t{0:<20} :   {1:<10}".format("window", window))
+    print("\t{0:<20} :   {1:<10}".format("max drop", max_drop))
+    print("\t{0:<20} :   {1:<10}".format("retries", retries))
+    print("\t{0:<20} :   {1:<10}".format("structure", structure))
+    print("\t{0:<20} :   {1:<10}".format("strict", strict))
+
+    if "-" in ks:
+        start, end = ks.split("-")
+        ks = list(range(int(start), int(end) + 1))
+    else:
+        ks = [int(k) for k in ks.split(",")]
+
+    input_structure_file = os.path.abspath(input_structure_file)
+    output_dir = os.path.abspath(output_dir)
+    mainparams_file = os.path.abspath(mainparams_file)
+    extraparams_file = os.path.abspath(extraparams_file)
+    # runs execute in their own directories, a binary given as a path rather than found on PATH is made absolute
+    if os.sep in structure:
+        structure = os.path.abspath(structure)
+
+    runs = []
+    for k in ks:
+        for rep in range(1, no_replicates + 1):
+            runs.append(
+                StructureRun(
+                    structure,
+                    input_structure_file,
+                    mainparams_file,
+                    extraparams_file,
+                    output_dir,
+                    k,
+                    rep,
+                    derive_seed(seed, k, rep, 0),
+                )
+            )
+
+    #longest runs first so that the pool drains evenly
+    runs.sort(key=lambda run: (-run.k, run.rep))
+
+    def execute(run):
+        attempt = 0
+        while True:
+            run.run(window, max_drop)
+            print(f"K{run.k}_R{run.rep}\tseed {run.seed}\t{run.status}\t{run.elapsed:.0f}s")
+            if run.status not in ("diverged", "failed") or attempt == retries:
+                return run
+            attempt += 1
+            run.seed = derive_seed(seed, run.k, run.rep, attempt)
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        runs = list(executor.map(execute, runs))
+
+    runs.sort(key=lambda run: (run.k, run.rep))
+    summary_file = f"{output_dir}/structure_runs.txt"
+    with open(summary_file, "w") as f:
+        f.write("#K\trep\tseed\tstatus\tburnin_plateau\tmean_ln_like\tsd_ln_like\tln_prob\telapsed\n")
+        for run in runs:
+            f.write(run.summary() + "\n")
+
+    failed = [run for run in runs if run.status in ("diverged", "failed")]
+    for run in failed:
+        print(f"warning: K{run.k}_R{run.rep} {run.status}, see {run.log_file}")
+    failed_ks = [k for k in ks if all(run.status in ("diverged", "failed") for run in runs if run.k == k)]
+    if len(failed_ks) != 0:
+        print(f"no run completed for K {','.join(str(k) for k in failed_ks)}, see {summary_file}")
+        exit(1)
+    if len(failed) != 0:
+        print(f"{len(failed)} runs did not complete, see {summary_file}")
+        if strict:
+            exit(1)
+
+
+def derive_seed(seed, k, rep, attempt):
+    return random.Random(f"{seed}:{k}:{rep}:{attempt}").randint(1, 2**31 - 1)
+
+
+class StructureRun(object):
+
+    TRACE = re.compile(r"^\s*(\d+):\s")
+    LN_PROB = re.compile(r"Estimated Ln Prob of Data\s+=\s+(\S+)")
+
+    def __init__(self, structure, input_file, mainparams_file, extraparams_file, output_dir, k, rep, seed):
+        self.structure = structure
+        self.input_file = input_file
+        self.mainparams_file = mainparams_file
+        self.extraparams_file = extraparams_file
+        self.output_dir = output_dir
+        self.k = k
+        self.rep = rep
+        self.seed = seed
+        self.run_dir = f"{output_dir}/K{k}_R{rep}.run"
+        self.output_file = f"{output_dir}/K{k}_R{rep}"
+        self.log_file = f"{output_dir}/K{k}_R{rep}.log"
+        self.status = "pending"
+        self.burnin_plateau = -1
+        self.burnin_trace = []
+        self.trace = []
+        self.ln_prob = float("nan")
+        self.elapsed = 0.0
+
+    def run(self, window, max_drop):
+        os.makedirs(self.run_dir, exist_ok=True)
+        self.status = "running"
+        self.burnin_plateau = -1
+        self.burnin_trace = []
+        self.trace = []
+        self.ln_prob = float("nan")
+        start = time.time()
+
+        cmd = [
+            self.structure,
+            "-i",
+            self.input_file,
+            "-o",
+            self.output_file,
+            "-m",
+            self.mainparams_file,
+            "-e",
+            self.extraparams_file,
+            "-K",
+            str(self.k),
+            "-D",
+            str(self.seed),
+        ]
+        in_burnin = True
+        with open(self.log_file, "w") as log:
+            log.write(" ".join(cmd) + "\n")
+            try:
+                proc = subprocess.Popen(
+                    cmd, cwd=self.run_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1
+                )
+            except OSError as error:
+                log.write(f"cannot run structure: {error}\n")
+                self.status = "failed"
+                self.elapsed = time.time() - start
+                return
+            for line in proc.stdout:
+                log.write(line)
+                if line.startswith("BURNIN completed"):
+                    in_burnin = False
+                    continue
+                m = StructureRun.TRACE.match(line)
+                if m is None:
+                    continue
+                tokens = line.split()
+                try:
+                    ln_like = float(tokens[-2])
+                except (ValueError, IndexError):
+                    continue
+                step = int(m.group(1))
+                if in_burnin:
+                    self.burnin_trace.append(ln_like)
+                    if self.burnin_plateau == -1 and plateaued(self.burnin_trace, window):
+                        self.burnin_plateau = step
+                else:
+                    self.trace.append(ln_like)
+                if diverged(self.burnin_trace if in_burnin else self.trace, window, max_drop, in_burnin):
+                    log.write(f"stopping run, Ln Like diverged at rep {step}\n")
+                    proc.kill()
+                    proc.wait()
+                    self.status = "diverged"
+                    self.elapsed = time.time() - start
+                    return
+            proc.wait()
+
+        self.elapsed = time.time() - start
+        if proc.returncode != 0 or not os.path.exists(f"{self.output_file}_f"):
+            self.status = "failed"
+            return
+
+        with open(f"{self.output_file}_f") as f:
+            for line in f:
+                m = StructureRun.LN_PROB.match(line)
+                if m is not None:
+                    self.ln_prob = float(m.group(1))
+                    break
+
+        self.status = "converged" if plateaued(self.trace, window) else "not_converged"
+
+    def summary(self):
+        mean, sd = mean_sd(self.trace)
+        return f"{self.k}\t{self.rep}\t{self.seed}\t{self.status}\t{self.burnin_plateau}\t{mean:.2f}\t{sd:.2f}\t{self.ln_prob:.2f}\t{self.elapsed:.0f}"
+
+
+def mean_sd(values):
+    if len(values) < 2:
+        return float("nan"), float("nan")
+    mean = sum(values) / len(values)
+    sd = math.sqrt(sum((x - mean) ** 2 for x in values) / (len(values) - 1))
+    return mean, sd
+
+
+def plateaued(trace, window):
+    """
+    Ln Like has plateaued when the means of the last two windows differ by less
+    than three standard errors of their difference.
+    """
+    if len(trace) < 2 * window:
+        return False
+    previous_mean, previous_sd = mean_sd(trace[-2 * window : -window])
+    mean, sd = mean_sd(trace[-window:])
+    return abs(mean - previous_mean) <= 3 * math.sqrt((previous_sd**2 + sd**2) / window)
+
+
+def diverged(trace, window, max_drop, in_burnin):
+    """
+    Ln Like has diverged when it is not finite or, after burn-in, when the last
+    window has fallen more than max_drop below the mean of the trace before it.
+    """
+    if len(trace) == 0:
+        return False
+    if not math.isfinite(trace[-1]):
+        return True
+    if in_burnin or len(trace) < 2 * window:
+        return False
+    earlier_mean, _ = mean_sd(trace[:-window])
+    mean, _ = mean_sd(trace[-window:])
+    return earlier_mean - mean > max_drop
+
+
+if __name__ == "__main__":
+    main() # type: ignore
@@ -19,77 +19,330 @@
 # THE SOFTWARE.
 
 import os
-import click
 import re
+import click
+import numpy as np
+
+#distruct colour names, the i-th aligned cluster is always drawn in the i-th colour
+COLOURS = [
+    "orange",
+    "blue",
+    "yellow",
+    "pink",
+    "green",
+    "purple",
+    "red",
+    "light_green",
+    "dark_blue",
+    "light_purple",
+    "light_yellow",
+    "brown",
+    "light_blue",
+    "olive_green",
+    "peach",
+    "sea_blue",
+    "yellow_green",
+    "blue_purple",
+    "gray",
+    "dark_green",
+]
+
 
 @click.command()
-@click.argument("structure_files", nargs=-1)
-def main(structure_files):
+@click.argument("structure_files", nargs=-1, required=True)
+@click.option(
+    "-s",
+    "--summary_file",
+    default="",
+    help="summary of alignment, replicate similarity and Evanno delta K, defaults to structure_summary.txt in the directory of the first structure file",
+)
+def main(structure_files, summary_file):
     """
-    Convert structure output files to clump and distruct input files.
+    Align cluster labels of STRUCTURE runs across replicates and K and write distruct input files.
 
-    e.g. structure_to_clump_distruct.py
+    All K{k}_R{rep}_f files of a run are loaded together, files of runs that did not
+    complete are missing and skipped.  The replicate with the highest
+    Ln Prob of Data at each K is aligned to the reference of the previous K and the other
+    replicates are aligned to it by optimal assignment on the squared distance between
+    cluster membership columns.  Individuals are ordered identically within each K.
+
+    e.g. structure_to_clumpp_distruct.py K2_R1_f K2_R2_f K3_R1_f K3_R2_f
     """
-    print("\t{0:<20} :   {1:<10}".format("structure files", ",".join(structure_files)))
+    if summary_file == "":
+        summary_file = f"{os.path.dirname(os.path.abspath(structure_files[0]))}/structure_summary.txt"
 
-    K = 0
-    reps = []
+    print("\t{0:<20} :   {1:<10}".format("structure files", ",".join(structure_files)))
+    print("\t{0:<20} :   {1:<10}".format("summary file", summary_file))
 
+    runs_by_k = {}
     for file in structure_files:
         file = os.path.abspath(file)
+        if not os.path.exists(file):
+            print(f"skipping {file}, run did not complete")
+            continue
         print(f"processing {file}")
+        run = StructureRun.read(file)
+        print(f"\tno_individuals: {run.n}")
+        print(f"\tk: {run.k}")
+        print(f"\tln_prob: {run.ln_prob}")
+        runs_by_k.setdefault(run.k, []).append(run)
+
+    ks = sorted(runs_by_k.keys())
+    ids = runs_by_k[ks[0]][0].ids
+    for k in ks:
+        for run in runs_by_k[k]:
+            if run.ids != ids:
+                print(f"individuals in {run.file} differ from {runs_by_k[ks[0]][0].file}")
+                exit(1)
+
+    #align labels, the reference at each K is carried over from the previous K
+    previous_reference = None
+    for k in ks:
+        runs = runs_by_k[k]
+        reference = max(runs, key=lambda run: run.ln_prob)
+        if previous_reference is None:
+            reference.permute(list(range(k)))
+        else:
+            reference.permute(align(previous_reference.q, reference.q))
+        for run in runs:
+            if run is not reference:
+                run.permute(align(reference.q, run.q))
+        previous_reference = reference
+
+    print("writing out distruct files")
+    for k in ks:
+        runs = runs_by_k[k]
+        order = individual_order(np.mean([run.q for run in runs], axis=0))
+        perm_file = f"{os.path.dirname(runs[0].file)}/K{k}.perm"
+        with open(perm_file, "w") as f:
+            for i in range(k):
+                f.write(f"{i+1} {COLOURS[i % len(COLOURS)]}\n")
+        for run in runs:
+            run.write_distruct_files(order, os.path.basename(perm_file))
+
+    write_summary(summary_file, ks, runs_by_k)
+
+
+def assign(cost):
+    """
+    Hungarian algorithm, returns the column assigned to each row of a square cost matrix.
+    """
+    n = len(cost)
+    u = [0.0] * (n + 1)
+    v = [0.0] * (n + 1)
+    p = [0] * (n + 1)
+    way = [0] * (n + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [float("inf")] * (n + 1)
+        used = [False] * (n + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            delta = float("inf")
+            j1 = 0
+            for j in range(1, n + 1):
+                if not used[j]:
+                    cur = cost[i0 - 1][j - 1] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(n + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while True:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+            if j0 == 0:
+                break
+
+    assignment = [0] * n
+    for j in range(1, n + 1):
+        assignment[p[j] - 1] = j - 1
+    return assignment
+
+
+def align(reference_q, q):
+    """
+    Returns the permutation of the columns of q that best matches reference_q.
+
+    The reference may have fewer clusters than q, in which case it is padded with
+    empty clusters and the unmatched clusters of q are placed last.
+    """
+    k = q.shape[1]
+    reference_q = np.pad(reference_q, ((0, 0), (0, k - reference_q.shape[1])))
+    cost = ((reference_q[:, :, None] - q[:, None, :]) ** 2).sum(axis=0)
+    return assign(cost.tolist())
+
+
+def individual_order(q):
+    """
+    Groups individuals by their dominant cluster, strongest membership first.
+    """
+    dominant = q.argmax(axis=1)
+    return np.lexsort((-q[np.arange(q.shape[0]), dominant], dominant))
+
+
+def similarity(q1, q2):
+    """
+    CLUMPP G' similarity of two aligned Q matrices, 1 for identical matrices.
+    """
+    return 1 - np.linalg.norm(q1 - q2) / np.sqrt(2 * q1.shape[0])
+
 
-        #read file
+def evanno_delta_k(ks, runs_by_k):
+    """
+    Returns L'(K), |L''(K)| and delta K for each K with neighbouring K run.
+    """
+    mean = {}
+    sd = {}
+    for k in ks:
+        ln_probs = [run.ln_prob for run in runs_by_k[k]]
+        mean[k] = np.mean(ln_probs)
+        sd[k] = np.std(ln_probs, ddof=1) if len(ln_probs) > 1 else float("nan")
+
+    l1 = {}
+    l2 = {}
+    delta_k = {}
+    for k in ks:
+        if k - 1 in mean:
+            l1[k] = mean[k] - mean[k - 1]
+    for k in ks:
+        if k in l1 and k + 1 in l1:
+            l2[k] = abs(l1[k + 1] - l1[k])
+            delta_k[k] = l2[k] / sd[k] if sd[k] > 0 else float("nan")
+
+    return mean, sd, l1, l2, delta_k
+
+
+def write_summary(summary_file, ks, runs_by_k):
+    mean, sd, l1, l2, delta_k = evanno_delta_k(ks, runs_by_k)
+
+    def fmt(values, k):
+        return f"{values[k]:.4f}" if k in values else "NA"
+
+    with open(summary_file, "w") as f:
+        f.write("#K\tno_reps\tmean_ln_prob\tsd_ln_prob\tl1\tl2\tdelta_k\tmean_similarity\tmin_similarity\n")
+        for k in ks:
+            runs = runs_by_k[k]
+            similarities = [
+                similarity(runs[i].q, runs[j].q) for i in range(len(runs)) for j in range(i + 1, len(runs))
+            ]
+            mean_similarity = f"{np.mean(similarities):.4f}" if similarities else "NA"
+            min_similarity = f"{np.min(similarities):.4f}" if similarities else "NA"
+            f.write(
+                f"{k}\t{len(runs)}\t{mean[k]:.4f}\t{sd[k]:.4f}\t{fmt(l1, k)}\t{fmt(l2, k)}\t{fmt(delta_k, k)}\t{mean_similarity}\t{min_similarity}\n"
+            )
+
+        f.write("#file\tK\tln_prob\tpermutation\n")
+        for k in ks:
+            for run in runs_by_k[k]:
+                permutation = ",".join(str(i + 1) for i in run.permutation)
+                f.write(f"{os.path.basename(run.file)}\t{k}\t{run.ln_prob:.4f}\t{permutation}\n")
+
+    delta_k = {k: delta_k[k] for k in delta_k if not np.isnan(delta_k[k])}
+    if delta_k:
+        best_k = max(delta_k, key=lambda k: delta_k[k])
+        print(f"best K by Evanno delta K: {best_k}")
+
+
+class StructureRun(object):
+
+    N_INDIVIDUALS = re.compile(r"\s+(\d+) individuals")
+    K = re.compile(r"\s+(\d+) populations assumed")
+    LN_PROB = re.compile(r"Estimated Ln Prob of Data\s+=\s+(\S+)")
+
+    def __init__(self, file, k, ln_prob, idx, ids, missing, q):
+        self.file = file
+        self.k = k
+        self.n = len(ids)
+        self.ln_prob = ln_prob
+        self.idx = idx
+        self.ids = ids
+        self.missing = missing
+        self.q = q
+        self.permutation = list(range(k))
+
+    @staticmethod
+    def read(file):
+        no_individuals = -1
+        k = 0
+        ln_prob = float("nan")
+        idx = []
+        ids = []
+        missing = []
+        q = []
         with open(file, "r") as f:
-            no_individuals = -1
-            in_individuals_inferred_cluster = False
-            no_individuals_read = 0
-            k = 0
-            reps = []
-            lines = f.readlines()
-            for line in lines:
+            for line in f:
                 if no_individuals == -1:
-                    m = re.match(r"\s+(\d+) individuals", line)
+                    m = StructureRun.N_INDIVIDUALS.match(line)
                     if m is not None:
                         no_individuals = int(m.group(1))
-                        print(f"\tno_individuals: {no_individuals}")
-                        continue
                 elif k == 0:
-                    m = re.match(r"\s+(\d+) populations assumed", line)
+                    m = StructureRun.K.match(line)
                     if m is not None:
                         k = int(m.group(1))
-                        reps.append(StructureRep(file, k))
-                        print(f"\tk: {k}")
-                        continue
-                else:
-                    if no_individuals_read < no_individuals:
-                        if in_individuals_inferred_cluster:
-                            no_individuals_read += 1
-                            line = line.rstrip()
-                            reps[-1].add_individual_record_line(line)
-                            #print(line)
-                        else:
-                            if line.endswith("Inferred clusters\n"):
-                                in_individuals_inferred_cluster = True
-                                #print("\tin cluster")
-                                continue
-                    else:
-                        #print("\tout of cluster")
-                        break
-
-        print("writing out distruct files")
-        #write distruct files
-        for rep in reps:
-            rep.sort_individual_records()
-            indivq_file = rep.file.replace("_f", ".indivq")
-            with open(indivq_file, "w") as f:
-                f.write(rep.print_indiv_str())
-            popq_file = rep.file.replace("_f", ".popq")
-            with open(popq_file, "w") as f:
-                f.write(rep.print_popq_str())
-
-            ps_file = rep.file.replace("_f", ".ps")
-            drawparams = f"""
+                elif line.startswith("Estimated Ln Prob of Data"):
+                    ln_prob = float(StructureRun.LN_PROB.match(line).group(1))
+                elif line.endswith("Inferred clusters\n"):
+                    break
+            for line in f:
+                if len(ids) == no_individuals:
+                    break
+                # 47 BIOS1470    (0)   :  0.493 0.507
+                tokens = line.split()
+                idx.append(int(tokens[0]))
+                ids.append(tokens[1])
+                missing.append(int(tokens[2].strip("()")))
+                q.append([float(x) for x in tokens[4 : 4 + k]])
+
+        return StructureRun(file, k, ln_prob, idx, ids, missing, np.array(q))
+
+    def permute(self, permutation):
+        self.permutation = permutation
+        self.q = self.q[:, permutation]
+
+    def write_distruct_files(self, order, perm_file):
+        indivq_file = self.file.replace("_f", ".indivq")
+        with open(indivq_file, "w") as f:
+            for i in order:
+                line = f"{self.idx[i]:6d}  {self.ids[i]}    ({self.missing[i]})   1 : "
+                line += "".join(f" {x:.3f}" for x in self.q[i])
+                f.write(line + "\n")
+
+        popq_file = self.file.replace("_f", ".popq")
+        with open(popq_file, "w") as f:
+            proportions = self.q.sum(axis=0) / self.q.sum()
+            f.write("1:" + "".join(f" {x:.3f}" for x in proportions) + f" {self.n}\n")
+
+        ps_file = self.file.replace("_f", ".ps")
+        drawparam_file = self.file.replace("_f", ".drawparams")
+        with open(drawparam_file, "w") as f:
+            f.write(
+                drawparams(
+                    os.path.basename(popq_file),
+                    os.path.basename(indivq_file),
+                    perm_file,
+                    os.path.basename(ps_file),
+                    self.k,
+                    self.n,
+                )
+            )
+
+
+def drawparams(popq_file, indivq_file, perm_file, ps_file, k, n):
+    drawparams = f"""
 PARAMETERS FOR THE PROGRAM distruct.  YOU WILL NEED TO SET THESE
 IN ORDER TO RUN THE PROGRAM.
 
@@ -101,16 +354,16 @@ IN ORDER TO RUN THE PROGRAM.
 
 Data settings
 
-#define INFILE_POPQ        {os.path.basename(popq_file)}      // (str) input file of population q's
-#define INFILE_INDIVQ      {os.path.basename(indivq_file)}    // (str) input file of individual q's
+#define INFILE_POPQ        {popq_file}      // (str) input file of population q's
+#define INFILE_INDIVQ      {indivq_file}    // (str) input file of individual q's
 #define INFILE_LABEL_BELOW input.names     // (str) input file of labels for below figure
 #define INFILE_LABEL_ATOP  input.languages // (str) input file of labels for atop figure
-#define INFILE_CLUST_PERM  input.perm     // (str) input file of permutation of clusters to print
-#define OUTFILE            {os.path.basename(ps_file)}       //(str) name of output file
+#define INFILE_CLUST_PERM  {perm_file}     // (str) input file of permutation of clusters to print
+#define OUTFILE            {ps_file}       //(str) name of output file
 
-#define K	{rep.k}    // (int) number of clusters
+#define K	{k}    // (int) number of clusters
 #define NUMPOPS 1    // (int) number of pre-defined populations
-#define NUMINDS {rep.n}  // (int) number of individuals
+#define NUMINDS {n}  // (int) number of individuals
 
 Main usage options
 
@@ -166,107 +419,8 @@ Command line options:
 -c input file (cluster permutation)
 -o output file
 """
-            drawparam_file = rep.file.replace("_f", ".drawparams")
-            with open(drawparam_file, "w") as f:
-                f.write(drawparams)
-
+    return drawparams
 
 
-
-
-
-            #rep.print()
-
-    #output clumpp files
-
-class StructureRep(object):
-
-    def __init__(self, file, k):
-        self.file = file
-        self.k = k
-        self.n = 0
-        self.indiv_records = []
-
-    def add_individual_record_line(self, line):
-        self.indiv_records.append(IndividualInferredClusterRecord(line))
-
-    def sort_individual_records(self):
-        #detect highest cluster representation
-        membership_sums = [0]*self.k
-        for rec in self.indiv_records:
-            for i in range(self.k):
-                membership_sums[i] += rec.cluster_memberships[i]
-
-        self.n = len(self.indiv_records)
-
-        #check highest cluster representation
-        highest_ksum = 0
-        highest_k = 0
-        for i in range(self.k):
-            if membership_sums[i] > highest_ksum:
-                highest_ksum = membership_sums[i]
-                highest_k = i
-
-        self.indiv_records.sort(key=lambda x: x.cluster_memberships[highest_k], reverse=True)
-
-    def print_popq_str(self):
-        total = 0.0
-        membership_proportion = [0.0]*self.k
-        for rec in self.indiv_records:
-            for i in range(self.k):
-                total += rec.cluster_memberships[i]
-                membership_proportion[i] += rec.cluster_memberships[i]
-
-        #normalise
-        for i in range(self.k):
-             membership_proportion[i] = membership_proportion[i]/total
-
-        line = f"1:"
-        for i in range(len(membership_proportion)):
-            line += f" {membership_proportion[i]:.3f}"
-        line += f" {len(self.indiv_records)}\n"
-
-        return line
-
-
-    def print_indiv_str(self):
-        str = ""
-        for rec in self.indiv_records:
-            str += rec.print_to_str() + "\n"
-        return str
-
-    def print(self):
-        print(f"file: {self.file}")
-        print(f"k: {self.k}")
-        for rec in self.indiv_records:
-            print(rec.print_to_str())
-
-class IndividualInferredClusterRecord(object):
-
-    def __init__(self, line):
-        tokens = line.split()
-        self.sample_idx = int(tokens[0])
-        self.sample_id = tokens[1]
-        self.missing = int(tokens[2].strip("()"))
-        self.cluster_memberships = []
-        for i in range(4, len(tokens)):
-            self.cluster_memberships.append(float(tokens[i]))
-            #print(f"adding cluster membership {i-3}")
-        self.line = line
-
-    def print_to_str(self):
-        # 47 BIOS1470    (0)   :  0.493 0.507
-        line = f"{self.sample_idx:6d}  {self.sample_id}    ({self.missing})   1 : "
-        for i in range(len(self.cluster_memberships)):
-            line += f" {self.cluster_memberships[i]:.3f}"
-        return line
-
-    def print(self):
-        print(f"idx: {self.sample_idx}")
-        print(f"id: {self.sample_id}")
-        print(f"missing: {self.missing}")
-        print(f"cluster memberships: {self.cluster_memberships}")
-        print(f"line: {self.line}")
-
 if __name__ == "__main__":
     main() # type: ignore
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2025 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import sys
+import random
+import argparse
+
+"""
+Stands in for structure with the same command line and synthetic screen traces.
+
+K2 plateaus and converges, K3 keeps drifting after burn-in, K4 collapses to a
+non finite Ln Like and K5 collapses for its first replicate only.  seed.txt is written to the current directory as structure does.
+"""
+
+BURNIN = 200
+NUMREPS = 400
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    for option in ["-i", "-o", "-m", "-e"]:
+        parser.add_argument(option, required=True)
+    parser.add_argument("-K", type=int, required=True)
+    parser.add_argument("-D", type=int, required=True)
+    args = parser.parse_args()
+
+    with open("seed.txt", "w") as f:
+        f.write(f"{args.D}\n")
+
+    rng = random.Random(args.D)
+    for step in range(1, BURNIN + NUMREPS + 1):
+        if step == BURNIN + 1:
+            print("BURNIN completed")
+        ln_like = -10000.0 + 5000.0 * min(step, 100) / 100 + rng.gauss(0, 10)
+        if args.K == 3 and step > BURNIN:
+            ln_like += 20.0 * (step - BURNIN)
+        if (args.K == 4 or (args.K == 5 and args.o.endswith("_R1"))) and step > BURNIN + 50:
+            ln_like = float("nan")
+        if step % 5 == 0:
+            print(f"{step:>5}:    0.123   0.456   {ln_like:.1f}   --", flush=True)
+
+    with open(f"{args.o}_f", "w") as f:
+        f.write(f"Estimated Ln Prob of Data   = {-5100.0 - args.K:.1f}\n")
+    print("Final results printed to file")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
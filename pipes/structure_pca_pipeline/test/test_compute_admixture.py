@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2025 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from compute_admixture import EPSILON, initialise, log_likelihood, em, fit, project
+
+"""
+Checks that an EM step of compute_admixture.py updates Q and P from the same current
+estimates, that plain EM iterations never lower the log likelihood on simulated admixed
+genotypes with missing data, and that the accelerated fit ends at least as high as plain EM.
+
+e.g. python3 test/test_compute_admixture.py
+"""
+
+
+def simulate(no_snps, no_samples, k, rng):
+    Q = rng.dirichlet(np.full(k, 0.5), size=no_samples)
+    P = rng.beta(0.5, 0.5, size=(no_snps, k))
+    G = rng.binomial(2, np.clip(P @ Q.T, 0, 1)).astype(np.int8)
+    O = (rng.uniform(size=G.shape) > 0.05).astype(np.int8)
+    return G, O
+
+
+def expected_em(G, O, Q, P):
+    """
+    The EM update written out per sample, SNP and population, every expectation uses the current Q and P.
+    """
+    no_snps, no_samples = G.shape
+    k = Q.shape[1]
+    Q_new = np.zeros_like(Q)
+    alt = np.zeros_like(P)
+    ref = np.zeros_like(P)
+    for j in range(no_snps):
+        for i in range(no_samples):
+            if O[j, i] == 0:
+                continue
+            h = np.clip(np.dot(P[j], Q[i]), EPSILON, 1 - EPSILON)
+            for c in range(k):
+                a = G[j, i] * P[j, c] * Q[i, c] / h
+                b = (2 - G[j, i]) * (1 - P[j, c]) * Q[i, c] / (1 - h)
+                Q_new[i, c] += a + b
+                alt[j, c] += a
+                ref[j, c] += b
+    Q_new /= 2 * O.sum(axis=0)[:, None]
+    return project(Q_new, alt / np.maximum(alt + ref, EPSILON))
+
+
+def main():
+    failures = 0
+
+    rng = np.random.default_rng(1)
+    G, O = simulate(30, 12, 3, rng)
+    Q, P = initialise(G.shape[0], G.shape[1], 3, rng)
+    Q1, P1 = em(G, O, Q, P)
+    Q2, P2 = expected_em(G, O, Q, P)
+    if not (np.allclose(Q1, Q2) and np.allclose(P1, P2)):
+        print("FAILED: EM step does not update Q and P from the same current estimates")
+        failures += 1
+
+    for seed in range(5):
+        rng = np.random.default_rng(seed)
+        for k in (2, 3, 4):
+            G, O = simulate(300, 40, k, rng)
+            Q, P = initialise(G.shape[0], G.shape[1], k, rng)
+            Q0, P0 = Q.copy(), P.copy()
+            previous = log_likelihood(G, O, Q, P)
+            for iteration in range(200):
+                Q, P = em(G, O, Q, P)
+                current = log_likelihood(G, O, Q, P)
+                # allow for rounding and the clipping of Q and P away from 0 and 1
+                if current < previous - 1e-6 * abs(previous):
+                    print(f"FAILED: seed {seed} K{k} EM iteration {iteration+1} lowered the log likelihood from {previous:.6f} to {current:.6f}")
+                    failures += 1
+                    break
+                previous = current
+            _, _, accelerated, _ = fit(G, O, Q0, P0, 200, 1e-4)
+            if accelerated < previous - 1e-3 * abs(previous):
+                print(f"FAILED: seed {seed} K{k} SQUAREM fit {accelerated:.4f} is below plain EM {previous:.4f}")
+                failures += 1
+
+    if failures == 0:
+        print("all tests passed")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2025 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import sys
+import subprocess
+import tempfile
+import numpy as np
+
+"""
+Checks that projecting samples onto the axes of compute_pca.py matches SNPs on
+chrom:pos:ref:alt when the VCF has no IDs, reproduces the PCs of the samples the axes
+were computed from, and fails when the samples are not genotyped at every SNP of the axes.
+
+e.g. python3 test/test_compute_pca.py
+"""
+
+PIPELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def run(script, *args):
+    return subprocess.run(
+        [sys.executable, os.path.join(PIPELINE_DIR, script), *args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+
+
+def write_vcf(vcf_file, G):
+    with open(vcf_file, "w") as f:
+        f.write("##fileformat=VCFv4.2\n")
+        f.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT")
+        for j in range(G.shape[1]):
+            f.write(f"\tS{j+1}")
+        f.write("\n")
+        for i in range(G.shape[0]):
+            f.write(f"chr1\t{100 * (i + 1)}\t.\tA\t{'CGT'[i % 3]}\t.\tPASS\t.\tGT")
+            for g in G[i]:
+                f.write("\t" + ["0/0", "0/1", "1/1"][g])
+            f.write("\n")
+
+
+def read_pca(pca_file):
+    with open(pca_file) as f:
+        f.readline()
+        return np.array([line.rstrip("\n").split("\t")[1:] for line in f], dtype=float)
+
+
+def main():
+    failures = 0
+    rng = np.random.default_rng(3)
+    G = np.concatenate(
+        [rng.binomial(2, p, size=(200, 15)) for p in (rng.beta(0.5, 0.5, size=(200, 1)), rng.beta(0.5, 0.5, size=(200, 1)))],
+        axis=1,
+    )
+
+    with tempfile.TemporaryDirectory() as dir:
+        vcf_file = os.path.join(dir, "ref.vcf")
+        tg_file = os.path.join(dir, "ref.tg")
+        write_vcf(vcf_file, G)
+        run("vcf_to_tg.py", vcf_file, "-o", tg_file)
+        with open(tg_file) as f:
+            f.readline()
+            snps = [line.split("\t", 1)[0] for line in f]
+        if len(set(snps)) != len(snps):
+            print(f"FAILED: vcf_to_tg.py wrote {len(snps) - len(set(snps))} duplicate snp ids")
+            failures += 1
+
+        result = run("compute_pca.py", tg_file, "-o", os.path.join(dir, "ref"), "-k", "4")
+        if result.returncode != 0:
+            print(f"FAILED: compute_pca.py exited with {result.returncode}\n{result.stdout}")
+            return failures + 1
+
+        result = run("compute_pca.py", tg_file, "-a", os.path.join(dir, "ref.axes"), "-o", os.path.join(dir, "projected"))
+        if result.returncode != 0:
+            print(f"FAILED: projection exited with {result.returncode}\n{result.stdout}")
+            failures += 1
+        elif not np.allclose(read_pca(os.path.join(dir, "ref.pca")), read_pca(os.path.join(dir, "projected.pca")), atol=1e-4):
+            print("FAILED: projecting the reference samples does not reproduce their PCs")
+            failures += 1
+
+        # drop a SNP from the query
+        with open(tg_file) as f, open(os.path.join(dir, "missing.tg"), "w") as out:
+            lines = f.readlines()
+            out.writelines(lines[:1] + lines[2:])
+        result = run("compute_pca.py", os.path.join(dir, "missing.tg"), "-a", os.path.join(dir, "ref.axes"), "-o", os.path.join(dir, "missing"))
+        if result.returncode == 0:
+            print("FAILED: projection of samples missing a SNP of the axes succeeded")
+            failures += 1
+
+        # a tg file keyed on missing VCF IDs
+        with open(os.path.join(dir, "dots.tg"), "w") as out:
+            out.write(lines[0])
+            out.writelines("." + line[line.index("\t"):] for line in lines[1:])
+        result = run("compute_pca.py", os.path.join(dir, "dots.tg"), "-a", os.path.join(dir, "ref.axes"), "-o", os.path.join(dir, "dots"))
+        if result.returncode == 0:
+            print("FAILED: projection of a tg file with duplicate snp ids succeeded")
+            failures += 1
+
+    if failures == 0:
+        print("all tests passed")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+#!/bin/bash
+
+# Runs run_structure.py with fake_structure.py in a temporary directory and
+# checks the status of every run, when the runner fails, the isolation of run
+# directories and that a missing binary fails the runs rather than the runner.
+#
+# e.g. test/test_run_structure.sh
+
+set -u
+test_dir=$(cd "$(dirname "$0")" && pwd)
+run_structure="$test_dir/../run_structure.py"
+tmp_dir=$(mktemp -d)
+trap 'rm -rf "$tmp_dir"' EXIT
+cd "$tmp_dir"
+
+cp "$test_dir/fake_structure.py" ./structure
+chmod +x ./structure
+touch input.structure mainparams extraparams
+failures=0
+
+# number of runs of a K, or of any K when empty, with a status in a summary file
+count_runs() {
+    awk -v k="$2" -v status="$3" '!/^#/ && (k == "" || $1 == k) && $4 == status' "$1" | wc -l
+}
+
+check() {
+    if ! eval "$2"; then
+        echo "FAILED: $1"
+        failures=$((failures + 1))
+    fi
+}
+
+# relative binary path, K2 converges, K3 does not converge and K4 diverges
+python3 "$run_structure" -i input.structure -o out -m mainparams -e extraparams -k 2-4 -r 2 -t 6 -w 10 -x 1 --structure ./structure > run.log 2>&1
+check "runner exits with an error when every run of a K diverges" "[ $? -eq 1 ]"
+check "summary has one line per run" "[ $(grep -vc '^#' out/structure_runs.txt) -eq 6 ]"
+check "K2 runs converge" "[ $(count_runs out/structure_runs.txt 2 converged) -eq 2 ]"
+check "K3 runs do not converge" "[ $(count_runs out/structure_runs.txt 3 not_converged) -eq 2 ]"
+check "K4 runs diverge" "[ $(count_runs out/structure_runs.txt 4 diverged) -eq 2 ]"
+check "each run writes seed.txt in its own directory" "[ $(cat out/K*_R*.run/seed.txt | sort -u | wc -l) -eq 6 ]"
+
+# a replicate that diverges is reported without failing the runner unless --strict
+python3 "$run_structure" -i input.structure -o partial -m mainparams -e extraparams -k 2,5 -r 2 -t 4 -w 10 -x 1 --structure ./structure > partial.log 2>&1
+check "runner succeeds when some run of every K completes" "[ $? -eq 0 ]"
+check "diverged replicate is reported" "[ $(count_runs partial/structure_runs.txt 5 diverged) -eq 1 ] && grep -q 'warning: K5_R1 diverged' partial.log"
+python3 "$run_structure" -i input.structure -o strict -m mainparams -e extraparams -k 2,5 -r 2 -t 4 -w 10 -x 1 --structure ./structure --strict > strict.log 2>&1
+check "runner exits with an error for any diverged run with --strict" "[ $? -eq 1 ]"
+
+# a missing binary fails each run without stopping the runner
+python3 "$run_structure" -i input.structure -o missing -m mainparams -e extraparams -k 2-3 -r 1 -t 2 --structure ./no_structure > missing.log 2>&1
+check "runner exits with an error for a missing binary" "[ $? -eq 1 ]"
+check "runner does not raise" "! grep -q Traceback missing.log"
+check "runs with a missing binary fail" "[ $(count_runs missing/structure_runs.txt '' failed) -eq 2 ]"
+
+if [ $failures -eq 0 ]; then
+    echo "all tests passed"
+fi
+exit $failures
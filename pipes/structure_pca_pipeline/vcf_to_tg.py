@@ -27,6 +27,7 @@ import click
 def main(vcf_file, output_tg_file):
     """
     Convert VCF file to tg format.
+    SNPs are identified by chrom:pos:ref:alt as VCF IDs are often missing.
 
     e.g. vcf_to_tg.py
     """
@@ -49,7 +50,7 @@ def main(vcf_file, output_tg_file):
                         tg_file.write(f"snp-id\t{samples}\n")
                 else:
                     chrom, pos, id, ref, alt, qual, filter, info, format, *genotypes = line.rstrip().split("\t")
-                    tg_file.write(f"{id}")
+                    tg_file.write(f"{chrom}:{pos}:{ref}:{alt}")
                     for geno in genotypes:
                         if geno.startswith("./."):
                             tg_file.write("\t-1")
@@ -39,15 +39,19 @@ from datetime import datetime
 @click.option(
     "-w", "--working_dir", default=os.getcwd(), required=True, help="working directory"
 )
-def main(make_file, working_dir, sample_file):
+@click.option("-n", "--no_pairs", default=200000, show_default=True, help="number of read pairs sampled per sample")
+@click.option("-t", "--threads", default=4, show_default=True, help="number of bwa threads per sample")
+def main(make_file, working_dir, sample_file, no_pairs, threads):
     """
-    Aligns reads to reference and estimate insert length
+    Aligns a sample of read pairs to reference and estimate insert length
 
     e.g. generate_analyse_insert_length_pipeline -s ilm38.fastq.txt
     """
     print("\t{0:<20} :   {1:<10}".format("make_file", make_file))
     print("\t{0:<20} :   {1:<10}".format("working_dir", working_dir))
     print("\t{0:<20} :   {1:<10}".format("sample_file", sample_file))
+    print("\t{0:<20} :   {1:<10}".format("no_pairs", no_pairs))
+    print("\t{0:<20} :   {1:<10}".format("threads", threads))
 
     # read sample file
     samples = []
@@ -60,11 +64,9 @@ def main(make_file, working_dir, sample_file):
     # create directories in destination folder directory
     ref_dir = f"{working_dir}/ref"
     log_dir = f"{working_dir}/log"
-    bam_dir = f"{working_dir}/bam"
     stats_dir = f"{working_dir}/stats"
     try:
         os.makedirs(log_dir, exist_ok=True)
-        os.makedirs(bam_dir, exist_ok=True)
         os.makedirs(stats_dir, exist_ok=True)
     except OSError as error:
         print(f"Directory cannot be created")
@@ -81,24 +83,14 @@ def main(make_file, working_dir, sample_file):
     pg.add(tgt, dep, cmd)
 
     for idx, sample in enumerate(samples):
-        # align reads
-        bwa = "/usr/local/bwa-0.7.17/bwa"
-        samtools = "/usr/local/samtools-1.14/samtools"
-        bam_file = f"{bam_dir}/{sample.id}.bam"
-        log = f"{log_dir}/{sample.id}.bam.log"
-        err = f"{log_dir}/{sample.id}.bam.err"
-        tgt = f"{log_dir}/{sample.id}.bam.OK"
+        # profile insert lengths of a reservoir sample of read pairs, no BAM file is written
+        profile_insert_lengths = f"{os.path.dirname(__file__)}/profile_insert_lengths.py"
+        output_prefix = f"{stats_dir}/{sample.id}"
+        log = f"{log_dir}/{sample.id}.insert_lengths.log"
+        err = f"{log_dir}/{sample.id}.insert_lengths.err"
+        tgt = f"{log_dir}/{sample.id}.insert_lengths.OK"
         dep = f"{log_dir}/bam_index.OK"
-        cmd = f"{bwa} mem -M {ref_fasta_file} {sample.fastq1} {sample.fastq2} | {samtools} sort - | {samtools} view - -o {bam_file} > {log} 2> {err}"
-        pg.add(tgt, dep, cmd)
-
-        # get stats
-        stats_file = f"{stats_dir}/{sample.id}.stats.txt"
-        log = f"{log_dir}/{sample.id}.stats.txt.log"
-        err = f"{log_dir}/{sample.id}.stats.txt.err"
-        tgt = f"{log_dir}/{sample.id}.stats.txt.OK"
-        dep = f"{log_dir}/{sample.id}.bam.OK"
-        cmd = f"{samtools} stats {bam_file} > {stats_file}"
+        cmd = f"{profile_insert_lengths} -1 {sample.fastq1} -2 {sample.fastq2} -r {ref_fasta_file} -o {output_prefix} -n {no_pairs} -t {threads} -b {bwa} > {log} 2> {err}"
         pg.add(tgt, dep, cmd)
 
     # write make file
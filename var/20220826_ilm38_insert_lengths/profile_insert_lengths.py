@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2025 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import os
+import gzip
+import math
+import click
+import random
+import threading
+import subprocess
+import numpy as np
+
+# pair orientations as samtools stats, inward, outward and both reads on one strand
+ORIENTATIONS = ["FR", "RF", "TANDEM"]
+
+# CIGAR operations that consume the reference
+REF_CIGAR_OPS = set("MDN=X")
+
+
+@click.command()
+@click.option("-1", "--fastq1", required=True, help="read 1 FASTQ file")
+@click.option("-2", "--fastq2", required=True, help="read 2 FASTQ file")
+@click.option("-r", "--ref_fasta_file", required=True, help="bwa indexed reference FASTA file")
+@click.option("-o", "--output_prefix", required=True, help="output prefix")
+@click.option("-n", "--no_pairs", default=200000, show_default=True, help="number of read pairs sampled")
+@click.option("-m", "--sampling", default="reservoir", type=click.Choice(["first", "reservoir"]), show_default=True, help="first read pairs or a reservoir sample of all read pairs")
+@click.option("-x", "--seed", default=1, show_default=True, help="seed for reservoir sampling")
+@click.option("-l", "--max_insert_length", default=10000, show_default=True, help="insert lengths above this are counted but not binned")
+@click.option("-q", "--min_mapq", default=20, show_default=True, help="minimum mapping quality of both reads")
+@click.option("-t", "--threads", default=os.cpu_count(), show_default=True, help="number of bwa threads")
+@click.option("-b", "--bwa", default="/usr/local/bwa-0.7.17/bwa", show_default=True, help="bwa")
+def main(fastq1, fastq2, ref_fasta_file, output_prefix, no_pairs, sampling, seed, max_insert_length, min_mapq, threads, bwa):
+    """
+    Estimates insert lengths of a paired end library from a sample of read pairs
+
+    The sampled pairs are streamed through bwa mem and the alignments are summarised in memory,
+    no BAM file is written or sorted.  Insert length histograms by orientation, duplicate pairs
+    and an estimated library size are reported together with the estimates on growing prefixes
+    of the sample so that convergence can be checked.
+
+    e.g. profile_insert_lengths.py -1 S1_R1.fastq.gz -2 S1_R2.fastq.gz -r ref/NC_039223.1.fasta -o stats/S1
+    """
+    print("\t{0:<20} :   {1:<10}".format("fastq1", fastq1))
+    print("\t{0:<20} :   {1:<10}".format("fastq2", fastq2))
+    print("\t{0:<20} :   {1:<10}".format("reference", ref_fasta_file))
+    print("\t{0:<20} :   {1:<10}".format("output prefix", output_prefix))
+    print("\t{0:<20} :   {1:<10}".format("no pairs", no_pairs))
+    print("\t{0:<20} :   {1:<10}".format("sampling", sampling))
+    print("\t{0:<20} :   {1:<10}".format("seed", seed))
+    print("\t{0:<20} :   {1:<10}".format("max insert length", max_insert_length))
+    print("\t{0:<20} :   {1:<10}".format("min mapq", min_mapq))
+    print("\t{0:<20} :   {1:<10}".format("threads", threads))
+
+    output_dir = os.path.dirname(output_prefix)
+    if output_dir != "":
+        os.makedirs(output_dir, exist_ok=True)
+
+    if sampling == "first":
+        pairs, total = first_pairs(fastq1, fastq2, no_pairs)
+    else:
+        pairs, total = reservoir_pairs(fastq1, fastq2, no_pairs, seed)
+    print(f"Sampled {len(pairs)} of {total if total >= 0 else 'at least ' + str(len(pairs))} read pairs")
+
+    profile = InsertLengthProfile(max_insert_length, min_mapq)
+    align_pairs(bwa, ref_fasta_file, pairs, threads, profile)
+    profile.print()
+
+    profile.write_histogram(f"{output_prefix}.insert_lengths.txt")
+    profile.write_summary(f"{output_prefix}.insert_length_summary.txt", fastq1, fastq2, sampling, total)
+    profile.write_convergence(f"{output_prefix}.insert_length_convergence.txt")
+
+
+def open_fastq(file_name):
+    if file_name.endswith(".gz"):
+        return gzip.open(file_name, "rt")
+    return open(file_name, "r")
+
+
+def read_fastq_pairs(fastq1, fastq2):
+    """
+    Yields read pairs as tuples of the 4 FASTQ lines of read 1 and read 2.
+    """
+    with open_fastq(fastq1) as file1, open_fastq(fastq2) as file2:
+        while True:
+            record1 = (file1.readline(), file1.readline(), file1.readline(), file1.readline())
+            record2 = (file2.readline(), file2.readline(), file2.readline(), file2.readline())
+            if record1[0] == "" or record2[0] == "":
+                if record1[0] != record2[0]:
+                    raise click.ClickException(f"{fastq1} and {fastq2} have different numbers of reads")
+                return
+            yield record1, record2
+
+
+def first_pairs(fastq1, fastq2, no_pairs):
+    """
+    Reads the first no_pairs read pairs, the total is unknown as the rest of the files are not read.
+    """
+    pairs = []
+    for pair in read_fastq_pairs(fastq1, fastq2):
+        if len(pairs) == no_pairs:
+            return pairs, -1
+        pairs.append(pair)
+    return pairs, len(pairs)
+
+
+def reservoir_pairs(fastq1, fastq2, no_pairs, seed):
+    """
+    Reservoir sample of no_pairs read pairs with Li's algorithm L, pairs between replacements are skipped
+    without drawing random numbers.  The sample is shuffled so that every prefix is a random sample too.
+    """
+    rng = random.Random(seed)
+    pairs = []
+    total = 0
+    w = math.exp(math.log(rng.random()) / no_pairs)
+    next_idx = no_pairs + int(math.log(rng.random()) / math.log(1 - w))
+    for pair in read_fastq_pairs(fastq1, fastq2):
+        if total < no_pairs:
+            pairs.append(pair)
+        elif total == next_idx:
+            pairs[rng.randrange(no_pairs)] = pair
+            w *= math.exp(math.log(rng.random()) / no_pairs)
+            next_idx += 1 + int(math.log(rng.random()) / math.log(1 - w))
+        total += 1
+    rng.shuffle(pairs)
+    return pairs, total
+
+
+def align_pairs(bwa, ref_fasta_file, pairs, threads, profile):
+    """
+    Aligns interleaved read pairs with bwa mem, reads are fed from a thread while the SAM output is parsed.
+    """
+    cmd = [bwa, "mem", "-p", "-t", str(threads), ref_fasta_file, "-"]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1 << 20)
+
+    def feed():
+        try:
+            for idx, (record1, record2) in enumerate(pairs):
+                # reads are renamed by their sample index so that the alignments keep the sample order
+                proc.stdin.write(f"@{idx}\n{record1[1]}+\n{record1[3]}")
+                proc.stdin.write(f"@{idx}\n{record2[1]}+\n{record2[3]}")
+        except BrokenPipeError:
+            pass
+        finally:
+            proc.stdin.close()
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    mates = {}
+    for line in proc.stdout:
+        if line.startswith("@"):
+            continue
+        fields = line.split("\t", 9)
+        flag = int(fields[1])
+        if flag & 0x900:
+            continue
+        idx = int(fields[0])
+        if idx in mates:
+            profile.add(idx, mates.pop(idx), fields)
+        else:
+            mates[idx] = fields
+    feeder.join()
+    if proc.wait() != 0:
+        raise click.ClickException(f"bwa mem failed with exit code {proc.returncode}")
+
+
+def five_prime_end(fields):
+    """
+    Returns the 5' end of an aligned read, the end of the alignment for reverse strand reads.
+    """
+    pos = int(fields[3])
+    if not int(fields[1]) & 0x10:
+        return pos
+    length = 0
+    number = 0
+    for c in fields[5]:
+        if c.isdigit():
+            number = number * 10 + int(c)
+        else:
+            if c in REF_CIGAR_OPS:
+                length += number
+            number = 0
+    return pos + length - 1
+
+
+class InsertLengthProfile(object):
+    """
+    Insert lengths, orientations and duplicate status of aligned read pairs in sample order.
+    """
+    def __init__(self, max_insert_length, min_mapq):
+        self.max_insert_length = max_insert_length
+        self.min_mapq = min_mapq
+        self.no_pairs = 0
+        self.no_mapped = 0
+        self.no_filtered = 0
+        # insert length, orientation index and duplicate status of each counted pair
+        self.lengths = []
+        self.orientations = []
+        self.duplicates = []
+        self.positions = set()
+
+    def add(self, idx, fields1, fields2):
+        self.no_pairs += 1
+        flag1 = int(fields1[1])
+        flag2 = int(fields2[1])
+        if (flag1 | flag2) & 0x4:
+            return
+        self.no_mapped += 1
+        if fields1[2] != fields2[2] or int(fields1[4]) < self.min_mapq or int(fields2[4]) < self.min_mapq:
+            self.no_filtered += 1
+            return
+        end1 = five_prime_end(fields1)
+        end2 = five_prime_end(fields2)
+        reverse1 = bool(flag1 & 0x10)
+        reverse2 = bool(flag2 & 0x10)
+        if reverse1 == reverse2:
+            orientation = 2
+        else:
+            # the forward read points at the reverse read for an inward pair
+            forward_end, reverse_end = (end2, end1) if reverse1 else (end1, end2)
+            orientation = 0 if forward_end <= reverse_end else 1
+        # duplicates share both 5' ends and strands regardless of which read is read 1
+        key = tuple(sorted([(end1, reverse1), (end2, reverse2)])) + (fields1[2],)
+        duplicate = key in self.positions
+        self.positions.add(key)
+        self.lengths.append(abs(int(fields1[8])))
+        self.orientations.append(orientation)
+        self.duplicates.append(duplicate)
+
+    def histogram(self, n=None):
+        """
+        Returns a orientation x insert length histogram of the first n counted pairs and the number of
+        pairs longer than the maximum insert length.
+        """
+        lengths = np.array(self.lengths[:n], dtype=np.int64)
+        orientations = np.array(self.orientations[:n], dtype=np.int64)
+        binned = lengths <= self.max_insert_length
+        counts = np.bincount(
+            orientations[binned] * (self.max_insert_length + 1) + lengths[binned],
+            minlength=len(ORIENTATIONS) * (self.max_insert_length + 1),
+        ).reshape(len(ORIENTATIONS), self.max_insert_length + 1)
+        return counts, int((~binned).sum())
+
+    def estimates(self, n=None):
+        """
+        Estimates of the first n counted pairs, statistics of the dominant orientation are trimmed to
+        the median plus 10 median absolute deviations as Picard CollectInsertSizeMetrics does.
+        """
+        counts, no_long = self.histogram(n)
+        totals = counts.sum(axis=1)
+        no_pairs = int(totals.sum()) + no_long
+        no_duplicates = int(np.sum(self.duplicates[:n]))
+        estimates = {
+            "pairs": no_pairs,
+            "fr_fraction": totals[0] / no_pairs if no_pairs > 0 else math.nan,
+            "rf_fraction": totals[1] / no_pairs if no_pairs > 0 else math.nan,
+            "tandem_fraction": totals[2] / no_pairs if no_pairs > 0 else math.nan,
+            "orientation": ORIENTATIONS[int(np.argmax(totals))],
+            "duplicate_fraction": no_duplicates / no_pairs if no_pairs > 0 else math.nan,
+            "library_size": estimate_library_size(no_pairs, no_pairs - no_duplicates),
+        }
+        estimates.update(histogram_statistics(counts[int(np.argmax(totals))]))
+        return estimates
+
+    def print(self):
+        print(f"pairs aligned        : {self.no_pairs}")
+        print(f"pairs mapped         : {self.no_mapped}")
+        print(f"pairs filtered       : {self.no_filtered}")
+        print(f"pairs counted        : {len(self.lengths)}")
+
+    def write_histogram(self, histogram_file):
+        counts, no_long = self.histogram()
+        last = np.flatnonzero(counts.sum(axis=0))
+        with open(histogram_file, "w") as file:
+            file.write("#insert_length\t" + "\t".join(o.lower() for o in ORIENTATIONS) + "\n")
+            for length in range(last[-1] + 1 if len(last) > 0 else 0):
+                file.write(f"{length}\t" + "\t".join(str(c) for c in counts[:, length]) + "\n")
+            file.write(f">{self.max_insert_length}\t{no_long}\t\t\n")
+
+    def write_summary(self, summary_file, fastq1, fastq2, sampling, total):
+        estimates = self.estimates()
+        with open(summary_file, "w") as file:
+            file.write(f"fastq1\t{fastq1}\n")
+            file.write(f"fastq2\t{fastq2}\n")
+            file.write(f"sampling\t{sampling}\n")
+            file.write(f"total_pairs\t{total if total >= 0 else 'NA'}\n")
+            file.write(f"aligned_pairs\t{self.no_pairs}\n")
+            file.write(f"mapped_pairs\t{self.no_mapped}\n")
+            file.write(f"filtered_pairs\t{self.no_filtered}\n")
+            for key, value in estimates.items():
+                file.write(f"{key}\t{format_value(value)}\n")
+
+    def write_convergence(self, convergence_file):
+        """
+        Writes the estimates on doubling prefixes of the sample and their change from the previous prefix.
+        """
+        n = len(self.lengths)
+        prefixes = []
+        prefix = 1000
+        while prefix < n:
+            prefixes.append(prefix)
+            prefix *= 2
+        prefixes.append(n)
+        columns = ["pairs", "median", "mean", "stdev", "mad", "fr_fraction", "duplicate_fraction", "library_size"]
+        with open(convergence_file, "w") as file:
+            file.write("#" + "\t".join(columns) + "\tmedian_change\tstdev_change\n")
+            previous = None
+            for prefix in prefixes:
+                estimates = self.estimates(prefix)
+                changes = ["NA", "NA"]
+                if previous is not None:
+                    changes = [format_value(relative_change(previous[key], estimates[key])) for key in ("median", "stdev")]
+                file.write("\t".join(format_value(estimates[key]) for key in columns) + "\t" + "\t".join(changes) + "\n")
+                previous = estimates
+
+
+def histogram_statistics(counts):
+    """
+    Median, median absolute deviation, mean and standard deviation of an insert length histogram,
+    the mean and standard deviation are computed within the median plus 10 median absolute deviations.
+    """
+    total = counts.sum()
+    if total == 0:
+        return {"median": math.nan, "mad": math.nan, "mean": math.nan, "stdev": math.nan}
+    lengths = np.arange(len(counts))
+    median = histogram_median(counts)
+    deviations = np.abs(lengths - median)
+    mad = histogram_median(np.bincount(deviations.astype(np.int64), weights=counts))
+    trimmed = counts * (lengths <= median + 10 * mad)
+    n = trimmed.sum()
+    mean = (trimmed * lengths).sum() / n
+    stdev = math.sqrt((trimmed * (lengths - mean) ** 2).sum() / (n - 1)) if n > 1 else math.nan
+    return {"median": median, "mad": mad, "mean": mean, "stdev": stdev}
+
+
+def histogram_median(counts):
+    cumulative = np.cumsum(counts)
+    total = cumulative[-1]
+    lower = int(np.searchsorted(cumulative, (total + 1) // 2))
+    upper = int(np.searchsorted(cumulative, total // 2 + 1))
+    return (lower + upper) / 2
+
+
+def estimate_library_size(no_pairs, no_unique):
+    """
+    Estimates the number of distinct molecules with the Lander Waterman equation as Picard does,
+    solving no_unique / x = 1 - exp(-no_pairs / x) for x by bisection.
+    """
+    if no_unique <= 0 or no_unique >= no_pairs:
+        return math.nan
+
+    def f(x):
+        return no_unique / x - 1 + math.exp(-no_pairs / x)
+
+    lower = 1.0
+    upper = 100.0
+    while f(upper * no_unique) > 0:
+        upper *= 10
+    for i in range(40):
+        mid = (lower + upper) / 2
+        if f(mid * no_unique) > 0:
+            lower = mid
+        else:
+            upper = mid
+    return no_unique * (lower + upper) / 2
+
+
+def relative_change(previous, current):
+    if previous == 0 or math.isnan(previous) or math.isnan(current):
+        return math.nan
+    return (current - previous) / previous
+
+
+def format_value(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, np.integer)):
+        return str(value)
+    if math.isnan(value):
+        return "NA"
+    return f"{value:.4f}"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2025 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import math
+import click
+import numpy as np
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+
+# alignment scores, the score is kept in the high bits and the number of matches in the low bits
+# so that a single integer comparison prefers the best score and then the most matches
+MATCH = 1
+MISMATCH = -1
+GAP = -2
+MATCHES_BITS = 24
+
+ALPHABETS = {"nt": ("ACGT", 2), "aa": ("ACDEFGHIKLMNPQRSTVWY", 5)}
+
+# sequences and k-mer tables of the worker processes
+SEQUENCES = []
+WORKER_OPTIONS = {}
+KMER_CACHE = {}
+
+
+@click.command()
+@click.option("-i", "--input_fasta_file", required=True, help="input FASTA file")
+@click.option("-o", "--output_prefix", required=True, help="output prefix, writes <prefix>.<cutoff>.fasta and <prefix>.<cutoff>.fasta.clstr")
+@click.option("-c", "--cutoffs", required=True, help="comma separated sequence identity thresholds, e.g. 0.80,0.90,0.99")
+@click.option("-a", "--alphabet", default="nt", type=click.Choice(["nt", "aa"]), show_default=True, help="sequence alphabet")
+@click.option("-n", "--word_length", default=0, show_default=True, help="k-mer length of the prefilter, 0 selects 10 for nt and 5 for aa")
+@click.option("-k", "--anchor_length", default=0, show_default=True, help="length of unique anchor k-mers, 0 selects 16 for nt and 6 for aa")
+@click.option("-w", "--band_width", default=16, show_default=True, help="alignment band width around the anchored diagonal")
+@click.option("-g", "--mode", default=0, type=click.IntRange(0, 1), show_default=True, help="as cd-hit -g, 0 joins the first representative above the threshold, 1 the most similar")
+@click.option("-d", "--description_length", default=20, show_default=True, help="as cd-hit -d, description length in the .clstr file, 0 for the name up to the first space")
+@click.option("-t", "--threads", default=os.cpu_count(), show_default=True, help="number of processes")
+def main(
+    input_fasta_file,
+    output_prefix,
+    cutoffs,
+    alphabet,
+    word_length,
+    anchor_length,
+    band_width,
+    mode,
+    description_length,
+    threads,
+):
+    """
+    Clusters sequences at several identity thresholds in one pass, as a sweep of cd-hit runs would.
+
+    Pairwise identities are computed once, pairs are screened by the cd-hit short word filter for the
+    lowest threshold and the rest are aligned over chained unique anchors with banded alignment of the
+    gaps between anchors.  The cd-hit greedy incremental clustering is then replayed over this
+    similarity graph for every threshold.  Identity is the number of identical aligned residues over
+    the length of the shorter sequence as in cd-hit -G 1, only the forward strand is compared.
+
+    e.g. cluster_sequences.py -i lsdv.fasta -o clustered -c 0.80,0.90,0.95,0.99,1.00
+    """
+    letters, bits = ALPHABETS[alphabet]
+    if word_length == 0:
+        word_length = 10 if alphabet == "nt" else 5
+    if anchor_length == 0:
+        anchor_length = 16 if alphabet == "nt" else 6
+    cutoffs = sorted({float(cutoff) for cutoff in cutoffs.split(",")})
+
+    print("\t{0:<20} :   {1:<10}".format("input FASTA file", input_fasta_file))
+    print("\t{0:<20} :   {1:<10}".format("output prefix", output_prefix))
+    print("\t{0:<20} :   {1:<10}".format("cutoffs", ",".join(f"{cutoff:#.6f}" for cutoff in cutoffs)))
+    print("\t{0:<20} :   {1:<10}".format("alphabet", alphabet))
+    print("\t{0:<20} :   {1:<10}".format("word length", word_length))
+    print("\t{0:<20} :   {1:<10}".format("anchor length", anchor_length))
+    print("\t{0:<20} :   {1:<10}".format("band width", band_width))
+    print("\t{0:<20} :   {1:<10}".format("mode", mode))
+    print("\t{0:<20} :   {1:<10}".format("threads", threads))
+
+    if word_length * bits > 62 or anchor_length * bits > 62:
+        print(f"k-mers of {alphabet} sequences are limited to {62 // bits} residues")
+        exit(1)
+
+    sequences = read_fasta(input_fasta_file)
+    print(f"{len(sequences)} sequences read")
+
+    # cd-hit processes sequences from the longest, ties in input order
+    order = sorted(range(len(sequences)), key=lambda i: (-len(sequences[i].seq), i))
+    pairs = [(order[a], order[b]) for a in range(len(order)) for b in range(a + 1, len(order))]
+
+    options = {
+        "letters": letters,
+        "bits": bits,
+        "word_length": word_length,
+        "anchor_length": anchor_length,
+        "band_width": band_width,
+        "min_cutoff": cutoffs[0],
+    }
+    graph = SimilarityGraph(len(sequences))
+    screened = 0
+    chunk_size = max(1, min(256, len(pairs) // (max(threads, 1) * 8) + 1))
+    with ProcessPoolExecutor(
+        max_workers=max(threads, 1),
+        initializer=init_worker,
+        initargs=([sequence.seq for sequence in sequences], options),
+    ) as executor:
+        for i, j, identity in executor.map(compare_pair, pairs, chunksize=chunk_size):
+            if identity is None:
+                screened += 1
+            elif identity >= cutoffs[0]:
+                graph.add(i, j, identity)
+    print(f"{len(pairs)} pairs, {screened} removed by the word filter, {graph.edges} at or above {cutoffs[0]:#.6f}")
+
+    with open(f"{output_prefix}.identities.txt", "w") as out:
+        out.write("#sequence_a\tsequence_b\tidentity\n")
+        for i, j, identity in graph.iter_edges():
+            out.write(f"{sequences[i].name}\t{sequences[j].name}\t{identity:.6f}\n")
+
+    for cutoff in cutoffs:
+        clusters = graph.cluster(order, cutoff, mode)
+        fasta_file = f"{output_prefix}.{cutoff:#.6f}.fasta"
+        write_representatives(fasta_file, sequences, clusters)
+        write_clstr(f"{fasta_file}.clstr", sequences, clusters, alphabet, description_length)
+        print(f"{cutoff:#.6f}: {len(clusters)} clusters")
+
+
+class Sequence(object):
+    def __init__(self, header, seq):
+        self.header = header
+        self.name = header.split()[0] if header else ""
+        self.seq = seq
+
+    def print(self):
+        print(f"name        : {self.name}")
+        print(f"length      : {len(self.seq)}")
+
+
+class SimilarityGraph(object):
+    def __init__(self, n):
+        self.neighbours = [dict() for i in range(n)]
+        self.edges = 0
+
+    def add(self, i, j, identity):
+        self.neighbours[i][j] = identity
+        self.neighbours[j][i] = identity
+        self.edges += 1
+
+    def iter_edges(self):
+        for i, neighbours in enumerate(self.neighbours):
+            for j in sorted(neighbours):
+                if i < j:
+                    yield i, j, neighbours[j]
+
+    def cluster(self, order, cutoff, mode):
+        """
+        cd-hit greedy incremental clustering, each sequence from the longest is compared with the
+        representatives in the order they were created and joins the first, or the most similar,
+        at or above the cutoff, otherwise it becomes a new representative.
+
+        Returns clusters as lists of (sequence index, identity) with the representative first.
+        """
+        clusters = []
+        for i in order:
+            best = None
+            for c, cluster in enumerate(clusters):
+                identity = self.neighbours[i].get(cluster[0][0])
+                if identity is None or identity < cutoff - 1e-12:
+                    continue
+                if best is None or (mode == 1 and identity > best[1]):
+                    best = (c, identity)
+                if mode == 0:
+                    break
+            if best is None:
+                clusters.append([(i, 1.0)])
+            else:
+                clusters[best[0]].append((i, best[1]))
+        return clusters
+
+    def print(self):
+        print(f"sequences   : {len(self.neighbours)}")
+        print(f"edges       : {self.edges}")
+
+
+def read_fasta(fasta_file):
+    sequences = []
+    header = None
+    seq = []
+    with open(fasta_file, "r") as file:
+        for line in file:
+            line = line.rstrip()
+            if line.startswith(">"):
+                if header is not None:
+                    sequences.append(Sequence(header, "".join(seq).upper()))
+                header = line[1:]
+                seq = []
+            elif line:
+                seq.append(line)
+    if header is not None:
+        sequences.append(Sequence(header, "".join(seq).upper()))
+    return sequences
+
+
+def write_representatives(fasta_file, sequences, clusters):
+    """
+    Writes representative sequences in input order as cd-hit does.
+    """
+    representatives = sorted(cluster[0][0] for cluster in clusters)
+    with open(fasta_file, "w") as out:
+        for i in representatives:
+            out.write(f">{sequences[i].header}\n")
+            for start in range(0, len(sequences[i].seq), 60):
+                out.write(f"{sequences[i].seq[start:start+60]}\n")
+
+
+def write_clstr(clstr_file, sequences, clusters, alphabet, description_length):
+    """
+    Writes clusters in the cd-hit .clstr format, members in input order.
+    """
+    unit = alphabet
+    strand = "+/" if alphabet == "nt" else ""
+    with open(clstr_file, "w") as out:
+        for c, cluster in enumerate(clusters):
+            out.write(f">Cluster {c}\n")
+            representative = cluster[0][0]
+            for k, (i, identity) in enumerate(sorted(cluster)):
+                sequence = sequences[i]
+                if description_length == 0:
+                    description = sequence.name
+                else:
+                    description = sequence.header[:description_length]
+                if i == representative:
+                    out.write(f"{k}\t{len(sequence.seq)}{unit}, >{description}... *\n")
+                else:
+                    out.write(f"{k}\t{len(sequence.seq)}{unit}, >{description}... at {strand}{identity*100:.2f}%\n")
+
+
+def init_worker(seqs, options):
+    global SEQUENCES, WORKER_OPTIONS
+    SEQUENCES = seqs
+    WORKER_OPTIONS = options
+    KMER_CACHE.clear()
+
+
+def compare_pair(pair):
+    """
+    Returns (i, j, identity), identity is None when the pair fails the short word filter.
+    """
+    i, j = pair
+    a = SEQUENCES[i]
+    b = SEQUENCES[j]
+    options = WORKER_OPTIONS
+    k = options["word_length"]
+    shorter = min(len(a), len(b))
+    if shorter == 0:
+        return i, j, 0.0
+
+    # cd-hit short word filter, each difference destroys at most k words of the shorter sequence
+    required = shorter - k + 1 - k * math.ceil((1 - options["min_cutoff"]) * shorter)
+    if required > 0:
+        kmers_a, counts_a = kmer_counts(i, k)
+        kmers_b, counts_b = kmer_counts(j, k)
+        common, index_a, index_b = np.intersect1d(kmers_a, kmers_b, assume_unique=True, return_indices=True)
+        if np.minimum(counts_a[index_a], counts_b[index_b]).sum() < required:
+            return i, j, None
+
+    matches = align_matches(i, j, options["anchor_length"], options["band_width"])
+    return i, j, matches / shorter
+
+
+def encode(seq, k):
+    """
+    Returns the k-mer codes of a sequence and their positions, k-mers with other characters are dropped.
+    """
+    letters, bits = WORKER_OPTIONS["letters"], WORKER_OPTIONS["bits"]
+    table = np.full(256, 255, dtype=np.uint8)
+    for code, letter in enumerate(letters):
+        table[ord(letter)] = code
+    codes = table[np.frombuffer(seq.encode(), dtype=np.uint8)]
+    if len(codes) < k:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    windows = np.lib.stride_tricks.sliding_window_view(codes, k)
+    valid = (windows != 255).all(axis=1)
+    weights = np.left_shift(np.int64(1), np.arange(k - 1, -1, -1, dtype=np.int64) * bits)
+    kmers = (windows.astype(np.int64) * weights).sum(axis=1)
+    positions = np.flatnonzero(valid)
+    return kmers[valid], positions
+
+
+def kmer_counts(i, k):
+    key = ("counts", i, k)
+    if key not in KMER_CACHE:
+        kmers, positions = encode(SEQUENCES[i], k)
+        KMER_CACHE[key] = np.unique(kmers, return_counts=True)
+    return KMER_CACHE[key]
+
+
+def unique_kmers(i, k):
+    key = ("unique", i, k)
+    if key not in KMER_CACHE:
+        kmers, positions = encode(SEQUENCES[i], k)
+        values, first, counts = np.unique(kmers, return_index=True, return_counts=True)
+        once = counts == 1
+        KMER_CACHE[key] = (values[once], positions[first[once]])
+    return KMER_CACHE[key]
+
+
+def chain_anchors(i, j, k):
+    """
+    Returns colinear exact matching blocks (a_start, b_start, length) from k-mers unique in both sequences.
+    """
+    kmers_a, positions_a = unique_kmers(i, k)
+    kmers_b, positions_b = unique_kmers(j, k)
+    common, index_a, index_b = np.intersect1d(kmers_a, kmers_b, assume_unique=True, return_indices=True)
+    if len(common) == 0:
+        return []
+    order = np.argsort(positions_a[index_a], kind="stable")
+    anchors_a = positions_a[index_a][order]
+    anchors_b = positions_b[index_b][order]
+
+    # longest increasing chain of b positions, skipped when the anchors are already colinear
+    if len(anchors_b) > 1 and not (np.diff(anchors_b) > 0).all():
+        tails = []
+        tail_index = []
+        previous = [-1] * len(anchors_b)
+        for n, position in enumerate(anchors_b.tolist()):
+            t = bisect_left(tails, position)
+            if t > 0:
+                previous[n] = tail_index[t - 1]
+            if t == len(tails):
+                tails.append(position)
+                tail_index.append(n)
+            else:
+                tails[t] = position
+                tail_index[t] = n
+        chain = []
+        n = tail_index[-1]
+        while n != -1:
+            chain.append(n)
+            n = previous[n]
+        chain.reverse()
+        anchors_a = anchors_a[chain]
+        anchors_b = anchors_b[chain]
+
+    # runs of anchors advancing together on one diagonal form a block
+    breaks = np.flatnonzero((np.diff(anchors_a) != 1) | (np.diff(anchors_b) != 1)) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [len(anchors_a)])) - 1
+    blocks = []
+    end_a = end_b = 0
+    for s, e in zip(starts.tolist(), ends.tolist()):
+        start_a, start_b = int(anchors_a[s]), int(anchors_b[s])
+        length = int(anchors_a[e]) - start_a + k
+        # blocks may overlap the previous one by up to k - 1 residues
+        overlap = max(end_a - start_a, end_b - start_b, 0)
+        start_a += overlap
+        start_b += overlap
+        length -= overlap
+        if length > 0:
+            blocks.append((start_a, start_b, length))
+            end_a, end_b = start_a + length, start_b + length
+    return blocks
+
+
+def align_matches(i, j, k, band_width):
+    """
+    Number of identical aligned residues of sequences i and j, with free end gaps.
+    """
+    a = SEQUENCES[i]
+    b = SEQUENCES[j]
+    blocks = chain_anchors(i, j, k)
+    if len(blocks) == 0:
+        return banded_matches(a, b, band_width, True, True)
+
+    matches = 0
+    start_a, start_b, length = blocks[0]
+    # the leading overhang of the longer prefix is free, only the part that can align is kept
+    span = min(start_a, start_b) + band_width
+    matches += banded_matches(a[max(0, start_a - span):start_a], b[max(0, start_b - span):start_b], band_width, True, False)
+    for n in range(len(blocks)):
+        start_a, start_b, length = blocks[n]
+        matches += length
+        end_a, end_b = start_a + length, start_b + length
+        if n + 1 < len(blocks):
+            next_a, next_b, next_length = blocks[n + 1]
+            matches += banded_matches(a[end_a:next_a], b[end_b:next_b], band_width, False, False)
+    span = min(len(a) - end_a, len(b) - end_b) + band_width
+    matches += banded_matches(a[end_a:end_a + span], b[end_b:end_b + span], band_width, False, True)
+    return matches
+
+
+def banded_matches(x, y, band_width, free_start, free_end):
+    """
+    Banded global alignment of x and y with linear gap scores, returns the matches of the best alignment.
+    Leading or trailing gaps are not scored when free_start or free_end is set.
+    """
+    lx, ly = len(x), len(y)
+    if lx == 0 or ly == 0:
+        return 0
+    if lx == ly and not (free_start or free_end):
+        # a gapped alignment of equal lengths needs two gaps and scores at most (lx - 1) * MATCH + 2 * GAP,
+        # so the ungapped alignment is optimal when its mismatches cost no more than that
+        mismatches = sum(1 for p, q in zip(x, y) if p != q)
+        if mismatches * (MATCH - MISMATCH) <= MATCH - 2 * GAP:
+            return lx - mismatches
+    band = abs(lx - ly) + band_width
+    unit = 1 << MATCHES_BITS
+    match = MATCH * unit + 1
+    mismatch = MISMATCH * unit
+    gap = GAP * unit
+    minus_inf = -(1 << 62)
+
+    # row i covers columns lo..hi around the diagonal from (0, 0) to (lx, ly)
+    def limits(i):
+        centre = i * ly // lx
+        return max(0, centre - band), min(ly, centre + band)
+
+    lo, hi = limits(0)
+    previous = [0 if free_start else gap * j for j in range(lo, hi + 1)]
+    previous_lo = lo
+    best_end = previous[-1] if free_end and hi == ly else minus_inf
+    for i in range(1, lx + 1):
+        lo, hi = limits(i)
+        current = [minus_inf] * (hi - lo + 1)
+        xi = x[i - 1]
+        previous_hi = previous_lo + len(previous) - 1
+        for j in range(lo, hi + 1):
+            if j == 0:
+                current[0] = 0 if free_start else gap * i
+                continue
+            score = minus_inf
+            if previous_lo <= j - 1 <= previous_hi:
+                diagonal = previous[j - 1 - previous_lo]
+                score = diagonal + (match if xi == y[j - 1] else mismatch)
+            if previous_lo <= j <= previous_hi:
+                up = previous[j - previous_lo] + gap
+                if up > score:
+                    score = up
+            if j > lo:
+                left = current[j - 1 - lo] + gap
+                if left > score:
+                    score = left
+            current[j - lo] = score
+        if free_end and hi == ly and current[-1] > best_end:
+            best_end = current[-1]
+        previous = current
+        previous_lo = lo
+
+    if free_end:
+        best = max(best_end, max(previous))
+    else:
+        best = previous[-1] if previous_lo + len(previous) - 1 == ly else minus_inf
+    if best == minus_inf:
+        return 0
+    return best & (unit - 1)
+
+
+if __name__ == "__main__":
+    main() # type: ignore
@@ -38,7 +38,8 @@ from shutil import copy2
     help="working directory",
 )
 @click.option("-r", "--ref_fasta_file", required=True, help="sample file")
-def main(make_file, working_dir, ref_fasta_file):
+@click.option("-t", "--threads", default=16, show_default=True, help="number of threads for clustering")
+def main(make_file, working_dir, ref_fasta_file, threads):
     """
     Cluster reference sequences over a set of thresholds for clustering
 
@@ -47,6 +48,7 @@ def main(make_file, working_dir, ref_fasta_file):
     print("\t{0:<20} :   {1:<10}".format("make_file", make_file))
     print("\t{0:<20} :   {1:<10}".format("working_dir", working_dir))
     print("\t{0:<20} :   {1:<10}".format("ref_fasta_file", ref_fasta_file))
+    print("\t{0:<20} :   {1:<10}".format("threads", threads))
 
     # create directories in destination folder directory
     log_dir = f"{working_dir}/log"
@@ -61,7 +63,7 @@ def main(make_file, working_dir, ref_fasta_file):
     pg = PipelineGenerator(make_file)
 
     #programs
-    cdhit =  "/usr/local/cd-hit-4.8.1/cd-hit"
+    cluster_sequences = f"{os.path.dirname(__file__)}/cluster_sequences.py"
 
     cutoffs = [0.80, 0.85, 0.90, 0.91, 0.92, 0.93, 0.94, 0.95, 0.96, 0.97, 0.98, 0.99]
     for i in range(1,10):
@@ -74,16 +76,14 @@ def main(make_file, working_dir, ref_fasta_file):
         cutoffs.append(0.99999 + i*0.000001)
     cutoffs.append(1.00)
 
-    # cluster sequences
-    for cutoff in cutoffs:
-        #print(f"Clustering at {cutoff:#.6f} cutoff")
-        #cdhit -i nr -o nr100 -c 1.00 -n 5 -M 2000
-        clustered_fasta_file = f"{working_dir}/clustered.{cutoff:#.6f}.fasta"
-        log_file = f"{log_dir}/{cutoff:#.6f}.cutoff.log"
-        dep = ""
-        cmd = f"{cdhit} -i {ref_fasta_file} -o {clustered_fasta_file} -c {cutoff} -T 2 -M 2000 > {log_file}"
-        tgt = f"{clustered_fasta_file}.OK"
-        pg.add_srun(tgt, dep, cmd, 2)
+    # cluster sequences at all cutoffs in one pass, pairwise identities are computed once
+    # and clustered.<cutoff>.fasta and clustered.<cutoff>.fasta.clstr are written for each cutoff
+    cutoff_list = ",".join(f"{cutoff:#.6f}" for cutoff in cutoffs)
+    log_file = f"{log_dir}/clustering.log"
+    dep = ""
+    cmd = f"{cluster_sequences} -i {ref_fasta_file} -o {working_dir}/clustered -c {cutoff_list} -t {threads} > {log_file}"
+    tgt = f"{working_dir}/clustered.OK"
+    pg.add_srun(tgt, dep, cmd, threads)
 
     # write make file
     print("Writing pipeline")
@@ -91,6 +91,7 @@ def main(make_file, working_dir, ref_fasta_file):
 
     # copy files to trace
     copy2(__file__, trace_dir)
+    copy2(cluster_sequences, trace_dir)
     copy2(make_file, trace_dir)
     copy2(ref_fasta_file, trace_dir)
 
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+
+# The MIT License
+# Copyright (c) 2025 Adrian Tan <adrian_tan@nparks.gov.sg>
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import re
+import json
+import click
+import shutil
+import hashlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+NUCMER = "/usr/local/mummer-4.0.0/bin/nucmer"
+DNADIFF = "/usr/local/mummer-4.0.0/bin/dnadiff"
+
+# dnadiff report statistics kept in the comparison table, reported for both the reference and the query
+REPORT_COLUMNS = [
+    ("total_seqs", int),
+    ("aligned_seqs", int),
+    ("unaligned_seqs", int),
+    ("total_bases", int),
+    ("aligned_bases", int),
+    ("unaligned_bases", int),
+    ("aligned_bases_pct", float),
+    ("o2o_alignments", int),
+    ("o2o_total_length", int),
+    ("o2o_avg_length", float),
+    ("o2o_avg_identity", float),
+    ("m2m_alignments", int),
+    ("m2m_total_length", int),
+    ("m2m_avg_length", float),
+    ("m2m_avg_identity", float),
+    ("breakpoints", int),
+    ("relocations", int),
+    ("translocations", int),
+    ("inversions", int),
+    ("insertions", int),
+    ("insertion_sum", int),
+    ("tandem_ins", int),
+    ("tandem_ins_sum", int),
+    ("total_snps", int),
+    ("total_gsnps", int),
+    ("total_indels", int),
+    ("total_gindels", int),
+]
+
+# per contig statistics of the 1-to-1 alignments
+CONTIG_COLUMNS = [
+    ("contig", str),
+    ("length", int),
+    ("alignments", int),
+    ("aligned_bases", int),
+    ("aligned_fraction", float),
+    ("identity", float),
+    ("breakpoints", int),
+    ("snps", int),
+    ("indels", int),
+    ("indel_bases", int),
+]
+
+# matrices of all vs all comparisons, the row assembly against the column assembly
+MATRIX_METRICS = ["aligned_bases_pct", "o2o_avg_identity", "breakpoints", "total_snps", "total_indels"]
+
+# dnadiff report labels, the alignment and SNP blocks repeat labels under a block header
+REPORT_KEYS = {
+    "TotalSeqs": "total_seqs",
+    "AlignedSeqs": "aligned_seqs",
+    "UnalignedSeqs": "unaligned_seqs",
+    "TotalBases": "total_bases",
+    "AlignedBases": "aligned_bases",
+    "UnalignedBases": "unaligned_bases",
+    "Breakpoints": "breakpoints",
+    "Relocations": "relocations",
+    "Translocations": "translocations",
+    "Inversions": "inversions",
+    "Insertions": "insertions",
+    "InsertionSum": "insertion_sum",
+    "InsertionAvg": "insertion_avg",
+    "TandemIns": "tandem_ins",
+    "TandemInsSum": "tandem_ins_sum",
+    "TandemInsAvg": "tandem_ins_avg",
+    "TotalSNPs": "total_snps",
+    "TotalGSNPs": "total_gsnps",
+    "TotalIndels": "total_indels",
+    "TotalGIndels": "total_gindels",
+}
+ALIGNMENT_BLOCKS = {"1-to-1": "o2o", "M-to-M": "m2m"}
+ALIGNMENT_KEYS = {"TotalLength": "total_length", "AvgLength": "avg_length", "AvgIdentity": "avg_identity"}
+
+
+@click.command()
+@click.option("-s", "--sample_file", required=True, help="sample file of sample ID and contigs file name")
+@click.option("-w", "--working_dir", default=os.getcwd(), show_default=True, help="working directory with an assembly directory per mode")
+@click.option("-a", "--assembly_modes", default="isolate,metaviral,meta", show_default=True, help="comma separated SPAdes modes, the assembly directory names")
+@click.option("-r", "--reference_fasta_file", default="", help="reference FASTA file compared against every assembly")
+@click.option("-o", "--output_dir", default="", help="output directory, defaults to <working_dir>/comparisons")
+@click.option("-c", "--cache_dir", default="", help="cache directory, defaults to <output_dir>/cache")
+@click.option("-j", "--jobs", default=os.cpu_count(), show_default=True, help="concurrent comparisons")
+@click.option("-t", "--nucmer_threads", default=1, show_default=True, help="threads per nucmer run")
+def main(sample_file, working_dir, assembly_modes, reference_fasta_file, output_dir, cache_dir, jobs, nucmer_threads):
+    """
+    Compares the assemblies of each sample all vs all across SPAdes modes, and against a reference.
+
+    Each pair is aligned with nucmer and summarised with dnadiff on a worker pool.  The report and the
+    1-to-1 delta are parsed into a comparison table and a per contig table, and matrices of the
+    comparisons are written per sample.  Results are cached by the content hashes of the two assemblies
+    so that adding an assembly only computes its new comparisons.
+
+    \b
+    <output_dir>/comparisons.txt     one row per pair, reference and query statistics
+    <output_dir>/contigs.txt         one row per contig of each pair
+    <output_dir>/matrix.<metric>.txt all vs all matrices per sample
+
+    e.g. compare_assemblies.py -s assemblies.sa -a isolate,careful,meta,metaviral -r asfv.fasta -j 16
+    """
+    if output_dir == "":
+        output_dir = f"{working_dir}/comparisons"
+    if cache_dir == "":
+        cache_dir = f"{output_dir}/cache"
+
+    print("\t{0:<20} :   {1:<10}".format("sample_file", sample_file))
+    print("\t{0:<20} :   {1:<10}".format("working_dir", working_dir))
+    print("\t{0:<20} :   {1:<10}".format("assembly_modes", assembly_modes))
+    print("\t{0:<20} :   {1:<10}".format("reference_fasta_file", reference_fasta_file))
+    print("\t{0:<20} :   {1:<10}".format("output_dir", output_dir))
+    print("\t{0:<20} :   {1:<10}".format("cache_dir", cache_dir))
+    print("\t{0:<20} :   {1:<10}".format("jobs", jobs))
+    print("\t{0:<20} :   {1:<10}".format("nucmer_threads", nucmer_threads))
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    modes = assembly_modes.split(",")
+    samples = []
+    idx = 0
+    with open(sample_file, "r") as file:
+        for line in file:
+            if not line.startswith("#"):
+                idx += 1
+                sample_id, contigs_file = line.rstrip().split("\t")
+                samples.append(Sample(idx, sample_id, contigs_file))
+
+    # assemblies of each sample, the reference first when given
+    comparisons = []
+    assemblies = {}
+    for s in samples:
+        assemblies[s.id] = []
+        if reference_fasta_file != "":
+            assemblies[s.id].append(("reference", reference_fasta_file))
+        for mode in modes:
+            contigs_file = f"{working_dir}/{mode}/{s.contigs_file}"
+            if os.path.exists(contigs_file):
+                assemblies[s.id].append((mode, contigs_file))
+            else:
+                print(f"{s.id}: {contigs_file} not found")
+        for i in range(len(assemblies[s.id])):
+            for j in range(i + 1, len(assemblies[s.id])):
+                ref_name, ref_fasta_file = assemblies[s.id][i]
+                qry_name, qry_fasta_file = assemblies[s.id][j]
+                comparisons.append(Comparison(s.id, ref_name, ref_fasta_file, qry_name, qry_fasta_file))
+
+    hashes = {}
+    for comparison in comparisons:
+        for fasta_file in [comparison.ref_fasta_file, comparison.qry_fasta_file]:
+            if fasta_file not in hashes:
+                hashes[fasta_file] = hash_file(fasta_file)
+        comparison.key = f"{hashes[comparison.ref_fasta_file][:20]}_{hashes[comparison.qry_fasta_file][:20]}_t{nucmer_threads}"
+
+    cached = [c for c in comparisons if os.path.exists(f"{cache_dir}/{c.key}/result.json")]
+    print(f"{len(comparisons)} comparisons, {len(cached)} cached")
+
+    # identical pairs of assemblies are compared once
+    unique = {}
+    for comparison in comparisons:
+        unique.setdefault(comparison.key, comparison)
+
+    failed = 0
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = {key: executor.submit(run_comparison, c, f"{cache_dir}/{key}", nucmer_threads) for key, c in unique.items()}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except (OSError, ValueError, subprocess.CalledProcessError) as e:
+                c = unique[key]
+                print(f"{c.sample_id} {c.ref_name} vs {c.qry_name}: failed - {e}")
+                failed += 1
+    for comparison in comparisons:
+        comparison.result = results.get(comparison.key)
+
+    done = [c for c in comparisons if c.result is not None]
+    write_comparisons(f"{output_dir}/comparisons.txt", done)
+    write_contigs(f"{output_dir}/contigs.txt", done)
+    for metric in MATRIX_METRICS:
+        write_matrix(f"{output_dir}/matrix.{metric}.txt", metric, samples, assemblies, done)
+
+    if failed > 0:
+        exit(1)
+
+
+class Sample(object):
+    def __init__(self, idx, id, contigs_file):
+        self.idx = idx
+        self.id = id
+        self.contigs_file = contigs_file
+
+    def print(self):
+        print(f"idx           : {self.idx}")
+        print(f"id            : {self.id}")
+        print(f"contigs_file  : {self.contigs_file}")
+
+
+class Comparison(object):
+    def __init__(self, sample_id, ref_name, ref_fasta_file, qry_name, qry_fasta_file):
+        self.sample_id = sample_id
+        self.ref_name = ref_name
+        self.ref_fasta_file = ref_fasta_file
+        self.qry_name = qry_name
+        self.qry_fasta_file = qry_fasta_file
+        self.key = ""
+        self.result = None
+
+    def print(self):
+        print(f"sample_id     : {self.sample_id}")
+        print(f"reference     : {self.ref_name} {self.ref_fasta_file}")
+        print(f"query         : {self.qry_name} {self.qry_fasta_file}")
+        print(f"key           : {self.key}")
+
+
+def hash_file(file_name):
+    sha256 = hashlib.sha256()
+    with open(file_name, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def run_comparison(comparison, result_dir, nucmer_threads):
+    """
+    Aligns a pair with nucmer and dnadiff unless its result is cached, returns the parsed result.
+    """
+    result_file = f"{result_dir}/result.json"
+    if os.path.exists(result_file):
+        with open(result_file, "r") as file:
+            return json.load(file)
+
+    # work in a temporary directory so that an interrupted comparison is never cached
+    tmp_dir = f"{result_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    prefix = f"{tmp_dir}/out"
+    with open(f"{tmp_dir}/nucmer.log", "w") as log:
+        subprocess.run(
+            [NUCMER, "-t", str(nucmer_threads), "-p", prefix, comparison.ref_fasta_file, comparison.qry_fasta_file],
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            check=True,
+        )
+    with open(f"{tmp_dir}/dnadiff.log", "w") as log:
+        subprocess.run([DNADIFF, "-d", f"{prefix}.delta", "-p", prefix], stdout=log, stderr=subprocess.STDOUT, check=True)
+
+    result = {
+        "report": parse_dnadiff_report(f"{prefix}.report"),
+        "contigs": summarise_delta(f"{prefix}.1delta"),
+    }
+    with open(f"{tmp_dir}/result.json", "w") as out:
+        json.dump(result, out)
+    shutil.rmtree(result_dir, ignore_errors=True)
+    os.rename(tmp_dir, result_dir)
+    return result
+
+
+def parse_value(value, type):
+    """
+    Parses a report value, counts may carry a percentage, e.g. 48(94.1176%).
+    """
+    m = re.fullmatch(r"([\d.]+)(?:\(([\d.]+)%\))?", value)
+    if m is None:
+        return None, None
+    pct = float(m.group(2)) if m.group(2) is not None else None
+    return type(float(m.group(1))) if type is int else type(m.group(1)), pct
+
+
+def parse_dnadiff_report(report_file):
+    """
+    Parses a dnadiff report into {"ref": {...}, "qry": {...}} keyed by the REPORT_COLUMNS names.
+    """
+    types = dict(REPORT_COLUMNS)
+    stats = {"ref": {}, "qry": {}}
+    block = ""
+    with open(report_file, "r") as file:
+        for line in file:
+            fields = line.split()
+            if len(fields) != 3 or fields[0].startswith("["):
+                continue
+            label, ref_value, qry_value = fields
+            if label in ALIGNMENT_BLOCKS:
+                block = ALIGNMENT_BLOCKS[label]
+                key = f"{block}_alignments"
+            elif label in ALIGNMENT_KEYS:
+                key = f"{block}_{ALIGNMENT_KEYS[label]}"
+            elif label in REPORT_KEYS:
+                key = REPORT_KEYS[label]
+            else:
+                # substitution and indel breakdowns of the SNP section
+                continue
+            type = types.get(key, float)
+            for side, value in [("ref", ref_value), ("qry", qry_value)]:
+                number, pct = parse_value(value, type)
+                stats[side][key] = number
+                if key == "aligned_bases":
+                    stats[side]["aligned_bases_pct"] = pct
+    return stats
+
+
+def parse_delta(delta_file):
+    """
+    Parses a nucmer delta file, yields (ref contig, query contig, ref length, query length, alignment)
+    where an alignment is (ref start, ref end, query start, query end, errors, indel distances).
+    """
+    with open(delta_file, "r") as file:
+        file.readline()
+        file.readline()
+        ref = qry = None
+        ref_len = qry_len = 0
+        alignment = None
+        for line in file:
+            if line.startswith(">"):
+                ref, qry, ref_len, qry_len = line[1:].split()
+                ref_len, qry_len = int(ref_len), int(qry_len)
+                continue
+            fields = line.split()
+            if len(fields) == 7:
+                alignment = [int(x) for x in fields[:5]] + [[]]
+            elif len(fields) == 1 and alignment is not None:
+                distance = int(fields[0])
+                if distance == 0:
+                    yield ref, qry, ref_len, qry_len, tuple(alignment)
+                    alignment = None
+                else:
+                    alignment[5].append(distance)
+
+
+def summarise_delta(delta_file):
+    """
+    Per contig statistics of the alignments in a delta file, {"ref": [...], "qry": [...]} of CONTIG_COLUMNS rows.
+    """
+    contigs = {"ref": {}, "qry": {}}
+    for ref, qry, ref_len, qry_len, (s1, e1, s2, e2, errors, distances) in parse_delta(delta_file):
+        ref_aligned = abs(e1 - s1) + 1
+        qry_aligned = abs(e2 - s2) + 1
+        # each distance is one gap position, a distance of 1 continues a gap of the same sign
+        indel_bases = len(distances)
+        indels = sum(1 for n, d in enumerate(distances) if not (n > 0 and abs(d) == 1 and (d > 0) == (distances[n - 1] > 0)))
+        columns = ref_aligned + sum(1 for d in distances if d < 0)
+        snps = errors - indel_bases
+        for side, name, length, aligned in [("ref", ref, ref_len, ref_aligned), ("qry", qry, qry_len, qry_aligned)]:
+            entry = contigs[side].setdefault(name, {"contig": name, "length": length, "alignments": 0, "aligned_bases": 0, "columns": 0, "errors": 0, "snps": 0, "indels": 0, "indel_bases": 0})
+            entry["alignments"] += 1
+            entry["aligned_bases"] += aligned
+            entry["columns"] += columns
+            entry["errors"] += errors
+            entry["snps"] += snps
+            entry["indels"] += indels
+            entry["indel_bases"] += indel_bases
+
+    result = {}
+    for side in ["ref", "qry"]:
+        result[side] = []
+        for name, entry in contigs[side].items():
+            result[side].append(
+                {
+                    "contig": name,
+                    "length": entry["length"],
+                    "alignments": entry["alignments"],
+                    "aligned_bases": entry["aligned_bases"],
+                    "aligned_fraction": min(1.0, entry["aligned_bases"] / entry["length"]) if entry["length"] else 0.0,
+                    "identity": 100 * (entry["columns"] - entry["errors"]) / entry["columns"] if entry["columns"] else 0.0,
+                    # a contig split over several alignments has a breakpoint between each
+                    "breakpoints": entry["alignments"] - 1,
+                    "snps": entry["snps"],
+                    "indels": entry["indels"],
+                    "indel_bases": entry["indel_bases"],
+                }
+            )
+    return result
+
+
+def format_value(value, type):
+    if value is None:
+        return "n/a"
+    if type is float:
+        return f"{value:.4f}"
+    return str(value)
+
+
+def write_comparisons(output_file, comparisons):
+    with open(output_file, "w") as out:
+        header = ["sample_id", "ref", "qry"]
+        for side in ["ref", "qry"]:
+            header += [f"{side}_{name}" for name, type in REPORT_COLUMNS]
+        out.write("#" + "\t".join(header) + "\n")
+        for c in comparisons:
+            row = [c.sample_id, c.ref_name, c.qry_name]
+            for side in ["ref", "qry"]:
+                row += [format_value(c.result["report"][side].get(name), type) for name, type in REPORT_COLUMNS]
+            out.write("\t".join(row) + "\n")
+
+
+def write_contigs(output_file, comparisons):
+    with open(output_file, "w") as out:
+        header = ["sample_id", "ref", "qry", "side"] + [name for name, type in CONTIG_COLUMNS]
+        out.write("#" + "\t".join(header) + "\n")
+        for c in comparisons:
+            for side in ["ref", "qry"]:
+                for contig in c.result["contigs"][side]:
+                    row = [c.sample_id, c.ref_name, c.qry_name, side]
+                    row += [format_value(contig[name], type) for name, type in CONTIG_COLUMNS]
+                    out.write("\t".join(row) + "\n")
+
+
+def write_matrix(output_file, metric, samples, assemblies, comparisons):
+    """
+    Writes a matrix per sample, the cell of a row and a column is the statistic of the row
+    assembly in its comparison with the column assembly.
+    """
+    type = dict(REPORT_COLUMNS)[metric]
+    values = {}
+    for c in comparisons:
+        values[(c.sample_id, c.ref_name, c.qry_name)] = c.result["report"]["ref"].get(metric)
+        values[(c.sample_id, c.qry_name, c.ref_name)] = c.result["report"]["qry"].get(metric)
+    with open(output_file, "w") as out:
+        for s in samples:
+            names = [name for name, fasta_file in assemblies[s.id]]
+            out.write("#" + "\t".join(["sample_id", metric] + names) + "\n")
+            for row in names:
+                cells = [s.id, row]
+                for column in names:
+                    if row == column:
+                        cells.append("-")
+                    else:
+                        cells.append(format_value(values.get((s.id, row, column)), type))
+                out.write("\t".join(cells) + "\n")
+
+
+if __name__ == "__main__":
+    main() # type: ignore
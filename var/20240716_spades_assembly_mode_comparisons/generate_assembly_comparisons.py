@@ -39,7 +39,16 @@ from shutil import copy2
     help="working directory",
 )
 @click.option("-s", "--sample_file", required=True, help="sample file")
-def main(make_file, working_dir, sample_file):
+@click.option(
+    "-a",
+    "--assembly_modes",
+    default="isolate,metaviral,meta",
+    show_default=True,
+    help="comma separated SPAdes modes compared all vs all, e.g. isolate,careful,meta,metaviral",
+)
+@click.option("-r", "--reference_fasta_file", default="", help="reference FASTA file compared against every assembly")
+@click.option("-j", "--jobs", default=16, show_default=True, help="concurrent comparisons")
+def main(make_file, working_dir, sample_file, assembly_modes, reference_fasta_file, jobs):
     """
     Generates assembly comparisons statistics.
 
@@ -48,115 +57,35 @@ def main(make_file, working_dir, sample_file):
     print("\t{0:<20} :   {1:<10}".format("make_file", make_file))
     print("\t{0:<20} :   {1:<10}".format("working_dir", working_dir))
     print("\t{0:<20} :   {1:<10}".format("sample_file", sample_file))
+    print("\t{0:<20} :   {1:<10}".format("assembly_modes", assembly_modes))
+    print("\t{0:<20} :   {1:<10}".format("reference_fasta_file", reference_fasta_file))
+    print("\t{0:<20} :   {1:<10}".format("jobs", jobs))
 
     # create directories in destination folder directory
-    pairwise_alignments_dir = f"{working_dir}/pairwise_alignments"
-    plot_dir = f"{working_dir}/plot"
+    comparisons_dir = f"{working_dir}/comparisons"
     trace_dir = f"{working_dir}/trace"
     try:
-        os.makedirs(pairwise_alignments_dir, exist_ok=True)
-        os.makedirs(plot_dir, exist_ok=True)
+        os.makedirs(comparisons_dir, exist_ok=True)
         os.makedirs(trace_dir, exist_ok=True)
     except OSError as error:
         print(f"{error.filename} cannot be created")
 
-    nucmer = "/usr/local/mummer-4.0.0/bin/nucmer"
-    dnadiff = "/usr/local/mummer-4.0.0/bin/dnadiff"
-    aggregate_nucmer_reports = "/home/atks/programs/CAVS-pipelines/var/20240716_spades_assembly_mode_comparisons/aggregate_nucmer_reports.py"
+    compare_assemblies = "/home/atks/programs/CAVS-pipelines/var/20240716_spades_assembly_mode_comparisons/compare_assemblies.py"
 
     # initialize
     pg = PipelineGenerator(make_file)
 
-    samples = []
-    idx = 0
-    with open(sample_file, "r") as file:
-        for line in file:
-            if not line.startswith("#"):
-                idx += 1
-                sample_id, contigs_file = line.rstrip().split("\t")
-                samples.append(Sample(idx, sample_id, contigs_file))
-
-    # pairwise alignment
-    isolate_assembly_dir = f"{working_dir}/isolate"
-    metaviral_assembly_dir = f"{working_dir}/metaviral"
-    meta_assembly_dir = f"{working_dir}/meta"
-
-    #####################################
-    #isolate vs meta pairwise alignment
-    #####################################
-    all_nucmer_report_files_ok = ""
-    input_nucmer_report_files = ""
-
-    for s in samples:
-
-        #nucmer pairwise alignment
-        ref_fasta_file = f"{isolate_assembly_dir}/{s.contigs_file}"
-        query_fasta_file = f"{meta_assembly_dir}/{s.contigs_file}"
-        file_prefix = f"{pairwise_alignments_dir}/isolate_meta_{s.idx}"
-        log_file = f"{pairwise_alignments_dir}/isolate_meta_{s.idx}.nucmer.log"
-        dep = ""
-        cmd = f"{nucmer} {ref_fasta_file} {query_fasta_file} -p {file_prefix} > {log_file}"
-        tgt = f"{file_prefix}.delta.OK"
-        pg.add(tgt, dep, cmd)
-
-        #isolate vs meta dnadiff analysis
-        input_delta_file = f"{pairwise_alignments_dir}/isolate_meta_{s.idx}.delta"
-        log_file = f"{pairwise_alignments_dir}/isolate_meta_{s.idx}.dnadiff.log"
-        dep = f"{file_prefix}.delta.OK"
-        cmd = f"{dnadiff} -d {input_delta_file} -p {file_prefix} 2> {log_file}"
-        tgt = f"{file_prefix}.report.OK"
-        pg.add(tgt, dep, cmd)
-
-        input_nucmer_report_files += f" {file_prefix}.report"
-        all_nucmer_report_files_ok += f" {tgt}"
-
-    # aggregrate reports
-    tag = "isolate_meta"
-    output_txt_file = f"{plot_dir}/{tag}.txt"
-    dep = all_nucmer_report_files_ok
-    cmd = f"{aggregate_nucmer_reports} {input_nucmer_report_files} -o {output_txt_file}"
-    tgt = f"{output_txt_file}.OK"
-    pg.add(tgt, dep, cmd)
-
-    #####################################
-    #metaviral vs meta pairwise alignment
-    #####################################
-    all_nucmer_report_files_ok = ""
-    input_nucmer_report_files = ""
-
-    for s in samples:
-
-        #nucmer pairwise alignment
-        ref_fasta_file = f"{metaviral_assembly_dir}/{s.contigs_file}"
-        query_fasta_file = f"{meta_assembly_dir}/{s.contigs_file}"
-        file_prefix = f"{pairwise_alignments_dir}/metaviral_meta_{s.idx}"
-        log_file = f"{pairwise_alignments_dir}/metaviral_meta_{s.idx}.log"
-        dep = ""
-        cmd = f"{nucmer} {ref_fasta_file} {query_fasta_file} -p {file_prefix} > {log_file}"
-        tgt = f"{file_prefix}.delta.OK"
-        pg.add(tgt, dep, cmd)
-
-        #metaviral vs meta dnadiff analysis
-        input_delta_file = f"{pairwise_alignments_dir}/metaviral_meta_{s.idx}.delta"
-        log_file = f"{pairwise_alignments_dir}/metaviral_meta_{s.idx}.dnadiff.log"
-        dep = f"{file_prefix}.delta.OK"
-        cmd = f"{dnadiff} -d {input_delta_file} -p {file_prefix} 2> {log_file}"
-        tgt = f"{file_prefix}.report.OK"
-        pg.add(tgt, dep, cmd)
-
-        input_nucmer_report_files += f" {file_prefix}.report"
-        all_nucmer_report_files_ok += f" {tgt}"
-
-    # aggregrate reports
-    tag = "metaviral_meta"
-    output_txt_file = f"{plot_dir}/{tag}.txt"
-    dep = all_nucmer_report_files_ok
-    cmd = f"{aggregate_nucmer_reports} {input_nucmer_report_files} -o {output_txt_file}"
-    tgt = f"{output_txt_file}.OK"
+    # all vs all pairwise alignments of the assemblies of each sample across modes, the comparisons
+    # are cached by assembly content in the comparisons directory so that only new pairs are aligned
+    reference_option = f" -r {reference_fasta_file}" if reference_fasta_file != "" else ""
+    log_file = f"{comparisons_dir}/compare_assemblies.log"
+    dep = ""
+    tgt = f"{comparisons_dir}/comparisons.txt.OK"
+    cmd = f"{compare_assemblies} -s {sample_file} -w {working_dir} -a {assembly_modes}{reference_option} -o {comparisons_dir} -j {jobs} > {log_file}"
     pg.add(tgt, dep, cmd)
 
-    #clean up
-    pg.add_clean(f"rm -rf {pairwise_alignments_dir} {plot_dir}")
+    #clean up, the comparison cache is kept
+    pg.add_clean(f"rm -f {comparisons_dir}/*.txt {comparisons_dir}/*.OK {comparisons_dir}/*.log")
 
     # write make file
     print("Writing pipeline")
@@ -208,16 +137,5 @@ class PipelineGenerator(object):
                 f.write(f"\t{self.clean_cmd}\n")
 
 
-class Sample(object):
-    def __init__(self, idx, id, contigs_file):
-        self.idx = idx
-        self.id = id
-        self.contigs_file = contigs_file
-
-    def print(self):
-        print(f"idx           : {self.idx}")
-        print(f"id            : {self.id}")
-        print(f"contigs_file  : {self.contigs_file}")
-
 if __name__ == "__main__":
     main()  # type: ignore
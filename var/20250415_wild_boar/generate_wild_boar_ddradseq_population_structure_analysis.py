@@ -20,7 +20,6 @@
 
 import os
 import click
-import random
 
 @click.command()
 @click.option(
@@ -87,7 +86,8 @@ def main(make_file, working_dir, sample_file, population_map_file, genome_fasta_
     ##########
     ref_stacks = "/usr/local/stacks-2.68/bin/ref_map.pl"
     structure = "/usr/local/structure-2.3.4/structure"
-    fpca = "/usr/local/fratools-1.0/fpca"
+    run_structure = "/home/atks/programs/CAVS-pipelines/pipes/structure_pca_pipeline/run_structure.py"
+    compute_pca = "/home/atks/programs/CAVS-pipelines/pipes/structure_pca_pipeline/compute_pca.py"
     distruct = "/usr/local/distruct-1.1/distruct"
     bcftools = "/usr/local/bcftools-1.17/bin/bcftools"
     script_dir = "/home/atks/programs/CAVS-pipelines/var/20250415_wild_boar"
@@ -224,34 +224,28 @@ def main(make_file, working_dir, sample_file, population_map_file, genome_fasta_
         cmd = f"{vcf_to_structure} {input_vcf_file} -o {output_dir}"
         pg.add(tgt, dep, cmd)
 
-        #run structure
-        random.seed(3323)
-        for k in range(2, 5):
-            for rep in range(1, 4):
-                seed = int(1000*random.random())
-                output_dir = f"{working_dir}/{dataset}/structure"
-                input_structure_file = f"{output_dir}/{dataset}_wild_boar.structure"
-                output_structure_results_file = f"{output_dir}/K{k}_R{rep}"
-                mainparams = f"{output_dir}/mainparams"
-                extraparams = f"{output_dir}/extraparams"
-                log = f"{output_dir}/K{k}_R{rep}.log"
-                tgt = f"{output_dir}/K{k}_R{rep}.OK"
-                dep = f"{output_dir}/structure_files.OK"
-                cmd = f"{structure} -i {input_structure_file} -o {output_structure_results_file} -m {mainparams} -e {extraparams} -K {k} -D {seed} > {log}"
-                pg.add(tgt, dep, cmd)
+        #run structure for all K and replicates in parallel
+        output_dir = f"{working_dir}/{dataset}/structure"
+        input_structure_file = f"{output_dir}/{dataset}_wild_boar.structure"
+        mainparams = f"{output_dir}/mainparams"
+        extraparams = f"{output_dir}/extraparams"
+        log = f"{output_dir}/structure_runs.log"
+        tgt = f"{output_dir}/structure_runs.OK"
+        dep = f"{output_dir}/structure_files.OK"
+        cmd = f"{run_structure} -i {input_structure_file} -o {output_dir} -m {mainparams} -e {extraparams} -k 2-4 -r 3 -t 9 -s 3323 --structure {structure} > {log}"
+        pg.add(tgt, dep, cmd)
 
-        #prepare distruct files
+        #align cluster labels across replicates and K and prepare distruct files
+        output_dir = f"{working_dir}/{dataset}/structure"
+        input_structure_results_files = ""
+        log = f"{output_dir}/distruct_files.log"
+        tgt = f"{output_dir}/distruct_files.OK"
+        dep = f"{output_dir}/structure_runs.OK"
         for k in range(2, 5):
-            output_dir = f"{working_dir}/{dataset}/structure"
-            input_structure_results_files = ""
-            log = f"{output_dir}/K{k}.distruct.log"
-            tgt = f"{output_dir}/K{k}.distruct.OK"
-            dep = ""
             for rep in range(1, 4):
                 input_structure_results_files += f"{output_dir}/K{k}_R{rep}_f "
-                dep += f"{output_dir}/K{k}_R{rep}.OK "
-            cmd = f"{structure_to_clumpp_distruct} {input_structure_results_files} > {log}"
-            pg.add(tgt, dep, cmd)
+        cmd = f"{structure_to_clumpp_distruct} {input_structure_results_files} -s {output_dir}/structure_summary.txt > {log}"
+        pg.add(tgt, dep, cmd)
 
 
         for k in range(2, 5):
@@ -260,7 +254,7 @@ def main(make_file, working_dir, sample_file, population_map_file, genome_fasta_
                 input_drawparam = f"K{k}_R{rep}.drawparams"
                 log = f"{output_dir}/K{k}_R{rep}.distruct.log"
                 tgt = f"{output_dir}/K{k}_R{rep}.distruct.OK"
-                dep = f"{output_dir}/K{k}.distruct.OK "
+                dep = f"{output_dir}/distruct_files.OK "
                 cmd = f"cd {output_dir}; {distruct} -d {input_drawparam} > {log}; set $? 0"
                 pg.add(tgt, dep, cmd)
 
@@ -288,8 +282,8 @@ def main(make_file, working_dir, sample_file, population_map_file, genome_fasta_
         log = f"{output_dir}/pca.log"
         err = f"{output_dir}/pca.err"
         tgt = f"{output_dir}/pca.OK"
-        dep = f"{input_vcf_file}.OK"
-        cmd = f"cd {output_dir}; {fpca} -i {input_tg_file} > {log} 2> {err}"
+        dep = f"{output_dir}/pca_files.OK"
+        cmd = f"{compute_pca} {input_tg_file} -o {output_dir}/{dataset}_wild_boar -k 20 > {log} 2> {err}"
         pg.add(tgt, dep, cmd)
 
         #generate sample files for plotting PCA - Structure scatterplots
@@ -300,7 +294,7 @@ def main(make_file, working_dir, sample_file, population_map_file, genome_fasta_
             output_sa_file = f"{output_dir}/gisplots/K{k}.sa"
             log = f"{output_sa_file}.log"
             tgt = f"{output_sa_file}.OK"
-            dep = f"{output_dir}/pca.OK {structure_dir}/K{k}_R1.OK"
+            dep = f"{output_dir}/pca.OK {structure_dir}/structure_runs.OK"
             cmd = f"{structure_pca_to_sa} -s {input_structure_file} -p {input_pca_file} -o {output_sa_file} > {log}"
             pg.add(tgt, dep, cmd)
 
@@ -44,9 +44,8 @@ def main(pca_sa_file, gis_sa_file, output_sa_file):
     samples = {}
 
     with open(pca_sa_file, "r") as f:
-        for line in f.readlines():
-            if line.startswith("sample-id"):
-                continue
+        sample_id, *pc_ids = f.readline().split()
+        for line in f:
             sample_id, *pc = line.split()
             samples[sample_id] = SampleRecord(sample_id, *pc)
 
@@ -64,11 +63,11 @@ def main(pca_sa_file, gis_sa_file, output_sa_file):
 
     with open(output_sa_file, "w") as o:
         o.write("sample_id\tlatitude\tlongitude\tsex")
-        for i in range(int(20)):
-            o.write(f"\tPC{i+1}")
+        for pc_id in pc_ids:
+            o.write(f"\t{pc_id}")
         o.write("\n")
         with open(gis_sa_file, "r") as f:
-            for line in f.readlines():
+            for line in f:
                 sample_id, latitude, longitude, sex = line.split()
                 if latitude!="Missing" and sample_id in samples:
                     l = f"{sample_id}\t{latitude}\t{longitude}\t{sex}"
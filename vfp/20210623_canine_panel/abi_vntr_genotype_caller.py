@@ -22,6 +22,8 @@ import os
 import argparse
 import textwrap
 import re
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
 
 
 def main():
@@ -33,6 +35,8 @@ def main():
         epilog=textwrap.dedent(
             """\
            usage: abi_vntr_genotype_caller -s <sample_file> -o <output_vcf_file>
+
+           -s may be specified multiple times to genotype several plates in one VCF.
            """
         ),
     )
@@ -40,31 +44,59 @@ def main():
         "-s",
         "--sample_file",
         type=str,
+        action="append",
         required=True,
         help="input directory containing fsa.csv files from GeneticAnalyzer",
     )
     parser.add_argument(
         "-o", "--output_vcf_file", type=str, required=True, help="output VCF file"
     )
+    parser.add_argument(
+        "-t",
+        "--threads",
+        type=int,
+        default=os.cpu_count(),
+        help="number of processes used to parse fsa.csv files",
+    )
     args = parser.parse_args()
 
     for arg in vars(args):
-        print("\t{0:<20} :   {1:<10}".format(arg, getattr(args, arg) or ""))
+        print("\t{0:<20} :   {1:<10}".format(arg, str(getattr(args, arg) or "")))
 
     gmp = GeneMapperParser(args.output_vcf_file)
 
     #######################
     # aggregate sample files
     #######################
-    sa_file = open(args.sample_file, "r")
-    for line in sa_file:
-        if not line.startswith("#"):
-            id, file = line.rstrip().split("\t")
-            file = file.strip('"')
-            print(f"{id} => {file}")
-            gmp.parse(file)
+    ids = []
+    files = []
+    for sample_file in args.sample_file:
+        with open(sample_file, "r") as sa_file:
+            for line in sa_file:
+                if not line.startswith("#"):
+                    id, file = line.rstrip().split("\t")
+                    file = file.strip('"')
+                    print(f"{id} => {file}")
+                    ids.append(id)
+                    files.append(file)
+
+    # parse in parallel, genotype in sample order
+    with ProcessPoolExecutor(max_workers=args.threads) as executor:
+        for id, peaks in zip(ids, executor.map(parse_peaks, files)):
+            print(f"genotyping {id}")
+            gmp.peaks = peaks
             gmp.genotype(id)
-            gmp.write_to_vcf()
+
+    gmp.write_to_vcf()
+
+
+def parse_peaks(file_name):
+    """
+    Parses a fsa.csv file into peaks indexed by dye and size.
+    """
+    gmp = GeneMapperParser(None)
+    gmp.parse(file_name)
+    return gmp.peaks
 
 
 class GeneMapperParser(object):
@@ -131,14 +163,16 @@ class GeneMapperParser(object):
             )
         )
         self.signals = []
+        self.peaks = None
         self.sample = []
 
     def parse(self, file_name):
-        file = open(file_name, "r")
         self.signals.clear()
-        for line in file:
-            if not self.is_header(line):
-                self.parse_line(line)
+        with open(file_name, "r") as file:
+            for line in file:
+                if not self.is_header(line):
+                    self.parse_line(line)
+        self.peaks = Peaks(self.signals)
 
     def is_header(self, line):
         return True if line.startswith('"Dye"') or line.startswith("Dye") else False
@@ -174,7 +208,7 @@ class GeneMapperParser(object):
 
     def genotype(self, id):
         for vntr in self.markers:
-            vntr.genotype(id, self.signals)
+            vntr.genotype(id, self.peaks)
 
     def write_to_vcf(self):
         vcf_file = open(self.vcf_file_name, "w")
@@ -242,6 +276,27 @@ class Record(object):
         print(f"{self.dye}|{self.size}|{self.height}")
 
 
+class Peaks(object):
+    """
+    Peak records bucketed by dye and sorted by size for range lookups.
+    """
+
+    def __init__(self, records):
+        self.sizes = {}
+        self.records = {}
+        for rec in sorted(records, key=lambda rec: rec.size):
+            self.sizes.setdefault(rec.dye, []).append(rec.size)
+            self.records.setdefault(rec.dye, []).append(rec)
+
+    def in_range(self, dye, min_size, max_size):
+        if dye not in self.sizes:
+            return []
+        sizes = self.sizes[dye]
+        return self.records[dye][
+            bisect_left(sizes, min_size) : bisect_right(sizes, max_size)
+        ]
+
+
 class Individual(object):
     def __init__(self, id):
         self.id = id
@@ -269,41 +324,28 @@ class VNTR(object):
     #        self.alleles = []
     #        self.gt = ''
 
-    def genotype(self, id, signals):
+    def genotype(self, id, peaks):
         indiv = Individual(id)
 
         self.print_lite()
-        #        for rec in signals:
-        #            if rec.dye == self.dye:
-        #                rec.print_lite()
         print("=====")
 
         records_exists = False
-        for rec in signals:
-            if (
-                rec.dye == self.dye
-                and rec.size >= self.min_size
-                and rec.size <= self.max_size
-            ):
+        for rec in peaks.in_range(self.dye, self.min_size, self.max_size):
+            records_exists = True
+            #                if rec.height >=1000 and rec.height < 4000:
+            if rec.height >= 1000:
+                indiv.alleles.append(round(rec.size, 1))
+            print("\tgeno: ", end="")
+            rec.print_lite()
+        if not records_exists:
+            records_exists = False
+            for rec in peaks.in_range(self.dye, self.min_size - 2, self.max_size + 2):
                 records_exists = True
-                #                if rec.height >=1000 and rec.height < 4000:
                 if rec.height >= 1000:
                     indiv.alleles.append(round(rec.size, 1))
-                print("\tgeno: ", end="")
+                print("\textended geno: ", end="")
                 rec.print_lite()
-        if not records_exists:
-            records_exists = False
-            for rec in signals:
-                if (
-                    rec.dye == self.dye
-                    and rec.size >= self.min_size - 2
-                    and rec.size <= self.max_size + 2
-                ):
-                    records_exists = True
-                    if rec.height >= 1000:
-                        indiv.alleles.append(round(rec.size, 1))
-                    print("\textended geno: ", end="")
-                    rec.print_lite()
             if not records_exists:
                 indiv.gt_info = "ND"
                 print("Cannot find data")
@@ -348,4 +390,5 @@ class VNTR(object):
         print(f"{self.dye} : {self.min_size}-{self.max_size}")
 
 
-main()
+if __name__ == "__main__":
+    main()
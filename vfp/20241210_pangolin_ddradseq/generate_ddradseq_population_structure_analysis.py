@@ -20,7 +20,6 @@
 
 import os
 import click
-import random
 
 @click.command()
 @click.option(
@@ -117,7 +116,8 @@ def main(make_file, working_dir, sample_file, population_map_file, genome_fasta_
     vcf_to_plink = "/home/atks/programs/CAVS-pipelines/vfp/20241210_pangolin_ddradseq/vcf_to_plink.py"
     vcf_to_tg = "/home/atks/programs/CAVS-pipelines/vfp/20241210_pangolin_ddradseq/vcf_to_tg.py"
     structure = "/usr/local/structure-2.3.4/structure"
-    fpca = "/usr/local/fratools-1.0/fpca"
+    run_structure = "/home/atks/programs/CAVS-pipelines/pipes/structure_pca_pipeline/run_structure.py"
+    compute_pca = "/home/atks/programs/CAVS-pipelines/pipes/structure_pca_pipeline/compute_pca.py"
     structure_to_clumpp_distruct = "/home/atks/programs/CAVS-pipelines/vfp/20241210_pangolin_ddradseq/structure_to_clumpp_distruct.py"
     distruct = "/usr/local/distruct-1.1/distruct"
     structure_gis_to_sa = "/home/atks/programs/CAVS-pipelines/vfp/20241210_pangolin_ddradseq/structure_gis_to_sa.py"
@@ -428,34 +428,28 @@ def main(make_file, working_dir, sample_file, population_map_file, genome_fasta_
         cmd = f"{vcf_to_structure} {input_vcf_file} -o {output_dir}"
         pg.add(tgt, dep, cmd)
 
-        #run structure
-        random.seed(3323)
-        for k in range(2, 5):
-            for rep in range(1, 4):
-                seed = int(1000*random.random())
-                output_dir = f"{working_dir}/{dataset}/structure"
-                input_structure_file = f"{output_dir}/{dataset}_pangolin.structure"
-                output_structure_results_file = f"{output_dir}/K{k}_R{rep}"
-                mainparams = f"{output_dir}/mainparams"
-                extraparams = f"{output_dir}/extraparams"
-                log = f"{output_dir}/K{k}_R{rep}.log"
-                tgt = f"{output_dir}/K{k}_R{rep}.OK"
-                dep = f"{output_dir}/structure_files.OK"
-                cmd = f"{structure} -i {input_structure_file} -o {output_structure_results_file} -m {mainparams} -e {extraparams} -K {k} -D {seed} > {log}"
-                pg.add(tgt, dep, cmd)
+        #run structure for all K and replicates in parallel
+        output_dir = f"{working_dir}/{dataset}/structure"
+        input_structure_file = f"{output_dir}/{dataset}_pangolin.structure"
+        mainparams = f"{output_dir}/mainparams"
+        extraparams = f"{output_dir}/extraparams"
+        log = f"{output_dir}/structure_runs.log"
+        tgt = f"{output_dir}/structure_runs.OK"
+        dep = f"{output_dir}/structure_files.OK"
+        cmd = f"{run_structure} -i {input_structure_file} -o {output_dir} -m {mainparams} -e {extraparams} -k 2-4 -r 3 -t 9 -s 3323 --structure {structure} > {log}"
+        pg.add(tgt, dep, cmd)
 
-        #prepare distruct files
+        #align cluster labels across replicates and K and prepare distruct files
+        output_dir = f"{working_dir}/{dataset}/structure"
+        input_structure_results_files = ""
+        log = f"{output_dir}/distruct_files.log"
+        tgt = f"{output_dir}/distruct_files.OK"
+        dep = f"{output_dir}/structure_runs.OK"
         for k in range(2, 5):
-            output_dir = f"{working_dir}/{dataset}/structure"
-            input_structure_results_files = ""
-            log = f"{output_dir}/K{k}.distruct.log"
-            tgt = f"{output_dir}/K{k}.distruct.OK"
-            dep = ""
             for rep in range(1, 4):
                 input_structure_results_files += f"{output_dir}/K{k}_R{rep}_f "
-                dep += f"{output_dir}/K{k}_R{rep}.OK "
-            cmd = f"{structure_to_clumpp_distruct} {input_structure_results_files} > {log}"
-            pg.add(tgt, dep, cmd)
+        cmd = f"{structure_to_clumpp_distruct} {input_structure_results_files} -s {output_dir}/structure_summary.txt > {log}"
+        pg.add(tgt, dep, cmd)
 
 
         for k in range(2, 5):
@@ -464,7 +458,7 @@ def main(make_file, working_dir, sample_file, population_map_file, genome_fasta_
                 input_drawparam = f"K{k}_R{rep}.drawparams"
                 log = f"{output_dir}/K{k}_R{rep}.distruct.log"
                 tgt = f"{output_dir}/K{k}_R{rep}.distruct.OK"
-                dep = f"{output_dir}/K{k}.distruct.OK "
+                dep = f"{output_dir}/distruct_files.OK "
                 cmd = f"cd {output_dir}; {distruct} -d {input_drawparam} > {log}; set $? 0"
                 pg.add(tgt, dep, cmd)
 
@@ -481,7 +475,7 @@ def main(make_file, working_dir, sample_file, population_map_file, genome_fasta_
             output_sa_file = f"{output_dir}/gisplots/K{k}.sa"
             log = f"{output_dir}/gisplots/K{k}_gis.log"
             tgt = f"{output_sa_file}.OK"
-            dep = f"{output_dir}/K{k}_R{rep}.OK "
+            dep = f"{output_dir}/structure_runs.OK"
             cmd = f"{structure_gis_to_sa} -g {input_gis_sa_file} -s {input_structure_file} -o {output_sa_file} > {log}"
             pg.add(tgt, dep, cmd)
 
@@ -518,8 +512,8 @@ def main(make_file, working_dir, sample_file, population_map_file, genome_fasta_
         log = f"{output_dir}/pca.log"
         err = f"{output_dir}/pca.err"
         tgt = f"{output_dir}/pca.OK"
-        dep = f"{input_vcf_file}.OK"
-        cmd = f"cd {output_dir}; {fpca} -i {input_tg_file} > {log} 2> {err}"
+        dep = f"{output_dir}/pca_files.OK"
+        cmd = f"{compute_pca} {input_tg_file} -o {output_dir}/{dataset}_pangolin -k 20 > {log} 2> {err}"
         pg.add(tgt, dep, cmd)
 
         #generate sample files for plotting PCA - Structure scatterplots
@@ -530,7 +524,7 @@ def main(make_file, working_dir, sample_file, population_map_file, genome_fasta_
             output_sa_file = f"{output_dir}/gisplots/K{k}.sa"
             log = f"{output_sa_file}.log"
             tgt = f"{output_sa_file}.OK"
-            dep = f"{output_dir}/pca.OK {structure_dir}/K{k}_R1.OK"
+            dep = f"{output_dir}/pca.OK {structure_dir}/structure_runs.OK"
             cmd = f"{structure_pca_to_sa} -s {input_structure_file} -p {input_pca_file} -o {output_sa_file} > {log}"
             pg.add(tgt, dep, cmd)
 
@@ -74,14 +74,15 @@ def main(structure_file, pca_sa_file, output_sa_file):
     #sample-id	PC1	PC2	PC3	PC4	PC5	PC6	PC7	PC8	PC9	PC10	PC11	PC12	PC13	PC14	PC15	PC16	PC17	PC18	PC19	PC20
 
     with open(output_sa_file, "w") as o:
-        o.write("sample_id")
-        for i in range(20):
-            o.write(f"\tPC{i+1}")
-        for i in range(int(no_clusters)):
-            o.write(f"\tC{i+1}")
-        o.write("\n")
         with open(pca_sa_file, "r") as f:
-            for line in f.readlines():
+            sample_id, *pc_ids = f.readline().split()
+            o.write("sample_id")
+            for pc_id in pc_ids:
+                o.write(f"\t{pc_id}")
+            for i in range(int(no_clusters)):
+                o.write(f"\tC{i+1}")
+            o.write("\n")
+            for line in f:
                 sample_id, *pcs = line.split()
                 if sample_id in rep:
                     l = f"{sample_id}"
@@ -19,142 +19,305 @@
 # THE SOFTWARE.
 
 import os
+import math
 import click
+import numpy as np
+
+# genotype classes, missing genotypes do not make a site polymorphic
+HOM_REF = 0
+HET = 1
+HOM_ALT = 2
+MISSING = -1
+
+# pairs of sample set kinds in the joint probability of two sites being monomorphic with their signs,
+# the terms are symmetric so that X Y and Y X pairs are counted together
+VARIANCE_TERMS = [("A", "A", 1), ("B", "B", 1), ("M", "M", 1), ("A", "B", 2), ("A", "M", -2), ("B", "M", -2)]
+
 
 @click.command()
-@click.option("-n", "--subpop_size", default=5, help="subpopulation size", type=int)
-@click.option("-s", "--sample_file", help="sample file", type=str)
+@click.option("-s", "--sample_file", default="", help="sample file, all samples in the VCF file when not given", type=str)
+@click.option("-o", "--output_file", default="nonmonomorphic_subset_curve.txt", show_default=True, help="output file", type=str)
+@click.option(
+    "-n",
+    "--subpop_sizes",
+    default="",
+    help="comma separated subpopulation sizes for Monte Carlo subsampling, all sizes when not given",
+    type=str,
+)
+@click.option("-r", "--replicates", default=100, show_default=True, help="Monte Carlo subsamples per size, 0 to skip", type=int)
+@click.option("-x", "--seed", default=42, show_default=True, help="random seed for Monte Carlo subsampling", type=int)
+@click.option(
+    "-p",
+    "--max_variance_pairs",
+    default=1000000000,
+    show_default=True,
+    help="largest number of pairs of distinct sample sets for the exact variance, 0 to skip it",
+    type=int,
+)
 @click.argument("vcf_file")
-def main(vcf_file, subpop_size, sample_file):
+def main(vcf_file, sample_file, output_file, subpop_sizes, replicates, seed, max_variance_pairs):
     """
-    Compute number of monomorphic sites in subpopulations from a VCF file
+    Compute the number of non-monomorphic sites in subpopulations from a VCF file
+
+    Each site is reduced to the sets of samples that are homozygous reference, heterozygous,
+    homozygous alternative or missing, sites with the same sets are collapsed.  A site is
+    monomorphic in a subset of k samples when the subset has no heterozygote and does not have
+    both homozygotes, so over all C(N, k) subsets
+
+    \b
+    P(monomorphic) = [C(a, k) + C(b, k) - C(m, k)] / C(N, k)
+
+    where a, b and m are the numbers of samples that are homozygous reference or missing,
+    homozygous alternative or missing, and missing.  The expected number of non-monomorphic sites
+    for every k follows, and the exact variance from the joint probabilities of pairs of sites,
+    which depend only on the sizes of the pairwise intersections of these sets.  Seeded Monte Carlo
+    subsampling estimates the distribution and other statistics.  Multiallelic sites are treated
+    as reference versus non-reference.
 
-    e.g. compute_nonmonomorphic_subset_population.py
+    e.g. compute_nonmonomorphic_subset_population.py -s source.sa -o curve.txt pangolin.vcf
     """
     print("\t{0:<20} :   {1:<10}".format("vcf file", vcf_file))
-    print("\t{0:<20} :   {1:<10}".format("subpopulation size", subpop_size))
     print("\t{0:<20} :   {1:<10}".format("sample file", sample_file))
-    
-    samples = {}
-
-    with open(sample_file, "r") as file:
-        for line in file:
-            if not line.startswith("#"):
-                sample_id, rest = line.strip().split("\t", 1)
-                samples[sample_id] = 1  
-
-    print(f"Number of samples: {len(samples)}")
-
-    # read VCF file, obtain master matrix of data
-    data = []
-    subsamples_idx = []
-    no_variants = 0
-    with open(vcf_file, "r") as file:
-        for line in file:
-            if line.startswith("#"):
-                if line.startswith("#CHROM"):
-                    sample_ids = line.rstrip().split("\t")[9:]
-                    for idx,id in enumerate(sample_ids):
-                        #print(f"sample {idx}: {id}")
-                        if id in samples:
-                            subsamples_idx.append(idx)
-                    # print(f"INITsubsamples_idx length: {len(subsamples_idx)}")        
+    print("\t{0:<20} :   {1:<10}".format("output file", output_file))
+    print("\t{0:<20} :   {1:<10}".format("subpopulation sizes", subpop_sizes if subpop_sizes else "all"))
+    print("\t{0:<20} :   {1:<10}".format("replicates", replicates))
+    print("\t{0:<20} :   {1:<10}".format("seed", seed))
+    print("\t{0:<20} :   {1:<10}".format("max variance pairs", max_variance_pairs))
+
+    samples = None
+    if sample_file != "":
+        samples = {}
+        with open(sample_file, "r") as file:
+            for line in file:
+                if not line.startswith("#"):
+                    sample_id = line.strip().split("\t", 1)[0]
+                    samples[sample_id] = 1
+        print(f"Number of samples: {len(samples)}")
+
+    population = SitePatterns.from_vcf(vcf_file, samples)
+    population.print()
+    n = population.no_samples
+    if n == 0:
+        print("no samples selected")
+        exit(1)
+
+    sizes = list(range(1, n + 1))
+    expected = population.expected_nonmonomorphic()
+    sd = None
+    pairs = population.variance_pairs()
+    if pairs <= max_variance_pairs:
+        sd = np.sqrt(population.variance_nonmonomorphic())
+    else:
+        print(f"exact variance needs {pairs} pairs of sample sets, use the Monte Carlo sd or raise --max_variance_pairs")
+
+    mc_sizes = sizes if subpop_sizes == "" else [int(k) for k in subpop_sizes.split(",")]
+    mc = {}
+    if replicates > 0:
+        rng = np.random.default_rng(seed)
+        curves = population.subsample(replicates, rng)
+        for k in mc_sizes:
+            if 1 <= k <= n:
+                mc[k] = {name: curve[:, k - 1] for name, curve in curves.items()}
+
+    with open(output_file, "w") as out:
+        out.write(
+            "#k\tsubsets\texpected_nonmonomorphic\tsd_nonmonomorphic"
+            "\tmc_mean_nonmonomorphic\tmc_sd_nonmonomorphic\tmc_p2.5_nonmonomorphic\tmc_p97.5_nonmonomorphic"
+            "\tmc_mean_ts\tmc_mean_tv\tmc_mean_singletons\n"
+        )
+        for k in sizes:
+            row = [str(k), str(math.comb(n, k)), f"{expected[k]:.4f}", f"{sd[k]:.4f}" if sd is not None else "n/a"]
+            if k in mc:
+                stats = mc[k]
+                nonmonomorphic = stats["nonmonomorphic"]
+                row += [
+                    f"{nonmonomorphic.mean():.4f}",
+                    f"{nonmonomorphic.std(ddof=1) if len(nonmonomorphic) > 1 else 0:.4f}",
+                    f"{np.percentile(nonmonomorphic, 2.5):.1f}",
+                    f"{np.percentile(nonmonomorphic, 97.5):.1f}",
+                    f"{stats['ts'].mean():.4f}",
+                    f"{stats['tv'].mean():.4f}",
+                    f"{stats['singletons'].mean():.4f}",
+                ]
             else:
+                row += ["n/a"] * 7
+            out.write("\t".join(row) + "\n")
+
+    for k in sizes:
+        print(f"k={k}: {expected[k]:.2f} non-monomorphic sites" + (f" (sd {sd[k]:.2f})" if sd is not None else ""))
+
+
+class SitePatterns(object):
+    """
+    Sites of a VCF file collapsed to distinct genotype class patterns over the selected samples.
+    """
+
+    def __init__(self, sample_ids, patterns, counts, ts_counts):
+        self.sample_ids = sample_ids
+        self.no_samples = len(sample_ids)
+        self.patterns = patterns
+        self.counts = counts
+        self.ts_counts = ts_counts
+        self.no_sites = int(counts.sum())
+
+        # sets of samples whose genotypes keep a subset monomorphic for the reference or the alternative allele
+        missing = patterns == MISSING
+        self.ref_sets = (patterns == HOM_REF) | missing
+        self.alt_sets = (patterns == HOM_ALT) | missing
+        self.missing_sets = missing
+
+        # C(m, k) / C(N, k), the probability that a random k-subset lies within a given set of m samples
+        n = self.no_samples
+        self.subset_probs = np.array([[math.comb(m, k) / math.comb(n, k) for k in range(n + 1)] for m in range(n + 1)])
+
+    @classmethod
+    def from_vcf(cls, vcf_file, samples):
+        sample_ids = []
+        subsample_idx = []
+        gt_classes = {}
+        patterns = {}
+        with open(vcf_file, "r") as file:
+            for line in file:
+                if line.startswith("#"):
+                    if line.startswith("#CHROM"):
+                        for idx, id in enumerate(line.rstrip().split("\t")[9:]):
+                            if samples is None or id in samples:
+                                sample_ids.append(id)
+                                subsample_idx.append(idx)
+                    continue
                 chrom, pos, id, ref, alt, qual, filter, info, format, *genotypes = line.rstrip().split("\t")
-                subsample_genotypes = []
-                for idx in subsamples_idx:
-                    subsample_genotypes.append(genotypes[idx])
-                data.append(Variant(id, chrom, pos, ref, alt, subsample_genotypes))
-                no_variants +=1
-
-    print(f"Number of variants: {no_variants}")
-
-    c = [[0],[1]]
-    d = [l + [2] for l in c]
-    print(f"c: {c}")
-    print(f"d: {d}")
-
-    # print(f"data length: {len(data)}")
-    # print(f"subsamples_idx length: {len(subsamples_idx)}")
-    # permutate all subsamples
-    # for variant in data:
-    #   variant.print()
-    def subsets(n, k):
-        print(f"recursive step n={n} k={k}")
-        if k > n:
-            return []
-        elif k==n:
-            return [list(range(n))]
-        elif k==0:
-            return []
-        else:            
-            return subsets(n-1, k) + [l + [n-1] for l in subsets(n-1, k-1)]
-
-    subsets_list = subsets(2, 1)
-    print(f"subsets_list length: {len(subsets_list)}") 
-    print(subsets_list)
-    # for l in subsets_list:
-    #     print(l)
-    
-class Variant(object):
-    def __init__(self, id, chrom, pos, ref, alt, genotypes):
-        self.id = id
-        self.chrom = chrom
-        self.pos = pos
-        self.ref = ref
-        self.alt = alt
-        self.genotypes = []
-        for g in genotypes:
-            self.add_genotype(g)
-        self.ts = self.is_ts(ref,alt)
-        #print(f"tv: {self.tv} | {ref} | {alt}")
-
-    def is_ts(self, ref, alt):
-        return (ref == "A" and alt == "G") or \
-        (ref == "G" and alt == "A") or \
-        (ref == "C" and alt == "T") or \
-        (ref == "T" and alt == "C")
-
-    def add_genotype(self, genotype):
-        if genotype == "./.":
-            self.genotypes.append(Genotype(-1, -1, -1, -1, "-1,-1,-1"))
-        else:
-            #print(genotype)
-            gt, dp, ad, gq, gl = genotype.split(":")
-            if gt == "./.":
-                self.genotypes.append(Genotype(-1, -1, -1, -1, "-1,-1,-1"))
-            else:
-                if gt == "0/0":
-                    gt = 0
-                elif gt == "0/1":
-                    gt = 1
-                elif gt == "1/1":
-                    gt = 2
-                self.genotypes.append(Genotype(gt, int(dp), ad, int(gq), gl))
-    
-    def print(self):
-        print(f"{self.id}", end="")
-        print(f"\t{self.chrom}", end="")
-        print(f"\t{self.pos}", end="")
-        print(f"\t{self.ref}", end="")
-        print(f"\t{self.alt}", end="")
-        for g in self.genotypes:
-            g.print()
-        print("")    
-            
-class Genotype(object):
-    def __init__(self, gt, dp, ad, gq, gl):
-        self.gt = gt
-        self.dp = dp
-        if ad == -1:
-            self.ad = -1
-        else:
-            self.ad = int(ad.split(",")[1])
-        self.gq = gq
-        self.gl = gl.split(",")
+                pattern = []
+                for idx in subsample_idx:
+                    gt = genotypes[idx].split(":", 1)[0]
+                    gt_class = gt_classes.get(gt)
+                    if gt_class is None:
+                        gt_class = gt_classes[gt] = classify_genotype(gt)
+                    pattern.append(gt_class)
+                counts = patterns.setdefault(tuple(pattern), [0, 0])
+                counts[0] += 1
+                counts[1] += is_ts(ref, alt)
+
+        keys = list(patterns)
+        pattern_array = np.array(keys, dtype=np.int8).reshape(len(keys), len(sample_ids))
+        counts = np.array([patterns[key][0] for key in keys], dtype=np.int64)
+        ts_counts = np.array([patterns[key][1] for key in keys], dtype=np.int64)
+        return cls(sample_ids, pattern_array, counts, ts_counts)
+
+    def monomorphic_probs(self):
+        """
+        Probability that each pattern is monomorphic in a random k-subset, patterns x k.
+        """
+        a = self.ref_sets.sum(axis=1)
+        b = self.alt_sets.sum(axis=1)
+        m = self.missing_sets.sum(axis=1)
+        return self.subset_probs[a] + self.subset_probs[b] - self.subset_probs[m]
+
+    def expected_nonmonomorphic(self):
+        return self.no_sites - self.counts @ self.monomorphic_probs()
+
+    def distinct_sets(self):
+        """
+        Distinct sample sets of each kind with the number of sites having them.
+        """
+        sets = {}
+        for name, members in [("A", self.ref_sets), ("B", self.alt_sets), ("M", self.missing_sets)]:
+            unique, inverse = np.unique(np.packbits(members, axis=1), axis=0, return_inverse=True)
+            weights = np.bincount(inverse.ravel(), weights=self.counts, minlength=len(unique))
+            members = np.unpackbits(unique, axis=1, count=self.no_samples).astype(np.float32)
+            sets[name] = (members, weights)
+        return sets
+
+    def variance_pairs(self):
+        sizes = {name: len(weights) for name, (members, weights) in self.distinct_sets().items()}
+        return sum(sizes[x] * sizes[y] for x, y, sign in VARIANCE_TERMS)
+
+    def variance_nonmonomorphic(self, chunk_cells=1 << 22):
+        """
+        Exact variance over all k-subsets, the variance of the number of monomorphic sites.
+
+        The indicator of a monomorphic site is 1[S in A] + 1[S in B] - 1[S in M], so the joint
+        probability of a pair of sites is a signed sum of nine terms C(|X_p & Y_q|, k) / C(N, k).
+        The terms are accumulated as weighted histograms of the intersection sizes over all pairs
+        of distinct sample sets.
+        """
+        n = self.no_samples
+        sets = self.distinct_sets()
+        histogram = np.zeros(n + 1)
+        for x, y, sign in VARIANCE_TERMS:
+            x_members, x_weights = sets[x]
+            y_members, y_weights = sets[y]
+            chunk = max(1, chunk_cells // len(y_weights))
+            for start in range(0, len(x_weights), chunk):
+                end = min(start + chunk, len(x_weights))
+                sizes = np.rint(x_members[start:end] @ y_members.T).astype(np.int64).ravel()
+                pair_weights = (x_weights[start:end, None] * y_weights[None, :]).ravel()
+                histogram += sign * np.bincount(sizes, weights=pair_weights, minlength=n + 1)
+
+        joint = histogram @ self.subset_probs
+        mean = self.counts @ self.monomorphic_probs()
+        return np.maximum(joint - mean**2, 0.0)
+
+    def subsample(self, replicates, rng):
+        """
+        Statistics of random subsets of samples, replicates x subset sizes 1..N.
+
+        Each replicate is a random permutation of the samples whose first k samples form a uniformly
+        random k-subset, so that the statistics for all k are accumulated in one pass.
+        """
+        stats = {name: np.zeros((replicates, self.no_samples)) for name in ["nonmonomorphic", "ts", "tv", "singletons"]}
+        n = self.no_samples
+        called = (self.patterns != MISSING).astype(np.int16)
+        alt_counts = np.where(called, self.patterns, 0).astype(np.int16)
+        for r in range(replicates):
+            idx = rng.permutation(n)
+            sub = self.patterns[:, idx]
+            # a site becomes non-monomorphic at the first heterozygote, or once both homozygotes are seen
+            first_het = first_index(sub == HET)
+            first_hom = np.maximum(first_index(sub == HOM_REF), first_index(sub == HOM_ALT))
+            become = np.minimum(first_het, first_hom)
+            no_nonmonomorphic = np.cumsum(np.bincount(become, weights=self.counts, minlength=n + 1)[:n])
+            no_ts = np.cumsum(np.bincount(become, weights=self.ts_counts, minlength=n + 1)[:n])
+            alt = np.cumsum(alt_counts[:, idx], axis=1, dtype=np.int16)
+            ref = 2 * np.cumsum(called[:, idx], axis=1, dtype=np.int16) - alt
+            singleton = np.minimum(alt, ref) == 1
+            stats["nonmonomorphic"][r] = no_nonmonomorphic
+            stats["ts"][r] = no_ts
+            stats["tv"][r] = no_nonmonomorphic - no_ts
+            stats["singletons"][r] = self.counts @ singleton
+        return stats
 
     def print(self):
-        print(f"\t{self.gt}", end="")
+        print(f"Number of samples: {self.no_samples}")
+        print(f"Number of variants: {self.no_sites}")
+        print(f"Number of distinct genotype patterns: {len(self.counts)}")
+
+
+def first_index(flags):
+    """
+    Column of the first set flag in each row, the number of columns when there is none.
+    """
+    return np.where(flags.any(axis=1), flags.argmax(axis=1), flags.shape[1])
+
+
+def classify_genotype(gt):
+    alleles = gt.replace("|", "/").split("/")
+    if len(alleles) == 1:
+        alleles = alleles * 2
+    if "." in alleles or len(alleles) != 2:
+        return MISSING
+    if alleles[0] != alleles[1]:
+        return HET
+    return HOM_REF if alleles[0] == "0" else HOM_ALT
+
+
+def is_ts(ref, alt):
+    return (
+        (ref == "A" and alt == "G")
+        or (ref == "G" and alt == "A")
+        or (ref == "C" and alt == "T")
+        or (ref == "T" and alt == "C")
+    )
+
 
 if __name__ == "__main__":
     main() # type: ignore
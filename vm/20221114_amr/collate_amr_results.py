@@ -20,376 +20,332 @@
 
 import os
 import click
-import re
-import fnmatch
+import warnings
+import numpy as np
+import openpyxl
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl.workbook.views import BookView
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+from openpyxl.utils import get_column_letter
+
+# AST phenotype and WGS prediction codes, a confusion matrix cell is phenotype * 2 + prediction
+PHENOTYPES = ['R', 'I', 'S']
+PREDICTIONS = ['R', 'S']
+MISSING = -1
+RESFINDER_PREDICTIONS = {'Resistant': 0, 'No resistance': 1}
+
+# confusion matrix columns in phenotype/prediction order
+CELLS = ['rr', 'rs', 'ir', 'is', 'sr', 'ss']
+CONFUSION_COLUMNS = ['rr', 'ir', 'sr', 'rs', 'is', 'ss']
+METRIC_COLUMNS = ['sensitivity', 'specificity', 'very_major_error_rate', 'major_error_rate', 'categorical_agreement']
+
+# AST drugs predicted from several ResFinder drugs, rule 'all' predicts resistance only when every
+# component is predicted resistant and 'any' when one is, and the class of each AST drug when
+# ResFinder does not report it
+#
+# ast drug                          resfinder drugs                           rule    class
+DRUG_TABLE = [
+    ('trimethoprim/sulfamethoxazole', ['trimethoprim', 'sulfamethoxazole'], 'all', 'folate pathway antagonist'),
+]
+
 
 @click.command()
 @click.option('-w', '--results_dir', default=os.getcwd(), show_default=True, help='results directory')
-@click.option('-s', '--sample_file', required=True, help='sample file')
+@click.option('-s', '--sample_file', required=True, help='sample file, the isolates compared')
 @click.option('-a', '--amr_ast_results_file', required=True, help='AMR AST results file')
-def main(results_dir, sample_file, amr_ast_results_file):
+@click.option('-o', '--output_dir', default=os.getcwd(), show_default=True, help='output directory')
+@click.option('-d', '--drug_table_file', default='', help='drug table of ast drug, resfinder drugs, rule and class, extends the built in table')
+@click.option('-i', '--intermediate', default='exclude', type=click.Choice(['exclude', 'R', 'S']), show_default=True, help='intermediate AST phenotypes are excluded or counted as R or S')
+@click.option('-t', '--threads', default=os.cpu_count(), show_default=True, help='number of processes for reading ResFinder results')
+def main(results_dir, sample_file, amr_ast_results_file, output_dir, drug_table_file, intermediate, threads):
     """
     Collate AMR results
 
-    e.g. collate_amr_results.py ilm38
-   """
-    print(f"results directory: {results_dir}")
-    print(f"sample  file: {sample_file}")
-    print(f"AMR AST results file: {amr_ast_results_file}")
-
-    #read AST results file
-    samples = []
-    headers = []
-    with open(amr_ast_results_file, 'r') as file:
-        index = 0
+    Predictions of ResFinder are compared against the AST phenotypes of every isolate.  Phenotypes
+    and predictions are held as isolate x drug arrays and confusion matrices are counted per drug,
+    class, species, species and drug, and isolate.  Resistance is the positive class, a very major
+    error is a resistant isolate predicted susceptible and a major error a susceptible isolate
+    predicted resistant.
+
+    e.g. collate_amr_results.py -w resfinder -s ilm38.sa -a ast.txt -o concordance
+    """
+    print('\t{0:<20} :   {1:<10}'.format('results directory', results_dir))
+    print('\t{0:<20} :   {1:<10}'.format('sample file', sample_file))
+    print('\t{0:<20} :   {1:<10}'.format('AMR AST results file', amr_ast_results_file))
+    print('\t{0:<20} :   {1:<10}'.format('output directory', output_dir))
+    print('\t{0:<20} :   {1:<10}'.format('drug table file', drug_table_file))
+    print('\t{0:<20} :   {1:<10}'.format('intermediate', intermediate))
+    print('\t{0:<20} :   {1:<10}'.format('threads', threads))
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    drug_table = {ast_drug: (components, rule, am_class) for ast_drug, components, rule, am_class in DRUG_TABLE}
+    if drug_table_file != '':
+        drug_table.update(read_drug_table(drug_table_file))
+
+    sample_ids = set()
+    with open(sample_file, 'r') as file:
         for line in file:
-            if line.startswith('#'):
-                headers = line.rstrip().split('\t')
-            else:
-                fields = line.rstrip().split('\t')
-                sample_id = fields[0]
-                species = fields[1]
-                sample = Sample(sample_id, species)
-                for i in range(2,len(fields)):
-                    antimicrobial = Antimicrobial(headers[i])
-                    antimicrobial.ast_pheno = fields[i]
-                    sample.add_am(antimicrobial)
-                samples.append(sample)
-
-    #go through results directories
-    for sample in samples:
-        resfinder_results_file = f'{results_dir}/{sample.id}/pheno_table.txt'
-        to_process = False
-        with open(resfinder_results_file, 'r') as file:
+            if not line.startswith('#') and line.strip() != '':
+                sample_ids.add(line.rstrip().split('\t')[0])
+
+    ast = ASTTable.from_file(amr_ast_results_file, sample_ids)
+    ast.print()
+
+    # read ResFinder phenotype tables in parallel
+    resfinder_results_files = [f'{results_dir}/{id}/pheno_table.txt' for id in ast.isolates]
+    with ProcessPoolExecutor(max_workers=max(threads, 1)) as executor:
+        resfinder_results = list(executor.map(read_pheno_table, resfinder_results_files))
+
+    predictions, classes = predict(ast.drugs, resfinder_results, drug_table)
+    no_predictions = int((predictions != MISSING).sum())
+    print(f'Number of predictions: {no_predictions}')
+
+    write_summary(f'{output_dir}/summary.txt', ast, predictions)
+
+    # every isolate and drug pair with both a phenotype and a prediction is counted
+    phenotypes = ast.phenotypes
+    valid = (phenotypes != MISSING) & (predictions != MISSING)
+    cells = phenotypes * 2 + predictions
+    no_isolates, no_drugs = phenotypes.shape
+    drug_idx = np.broadcast_to(np.arange(no_drugs)[None, :], phenotypes.shape)
+    isolate_idx = np.broadcast_to(np.arange(no_isolates)[:, None], phenotypes.shape)
+    class_names = sorted(set(classes))
+    class_idx = np.broadcast_to(np.array([class_names.index(c) for c in classes])[None, :], phenotypes.shape)
+    species_names = sorted(set(ast.species))
+    species_idx = np.broadcast_to(np.array([species_names.index(s) for s in ast.species])[:, None], phenotypes.shape)
+
+    tables = [
+        ('by_drug', ['antimicrobial', 'class'], [[drug, am_class] for drug, am_class in zip(ast.drugs, classes)], drug_idx),
+        ('by_class', ['class'], [[c] for c in class_names], class_idx),
+        ('by_species', ['species'], [[s] for s in species_names], species_idx),
+        (
+            'by_species_drug',
+            ['species', 'antimicrobial'],
+            [[s, drug] for s in species_names for drug in ast.drugs],
+            species_idx * no_drugs + drug_idx,
+        ),
+        ('by_sample', ['sample-id', 'species'], [[id, s] for id, s in zip(ast.isolates, ast.species)], isolate_idx),
+    ]
+
+    sheets = []
+    for name, key_columns, keys, groups in tables:
+        confusion = confusion_matrices(groups, cells, valid, len(keys))
+        missing = np.bincount(groups[~valid], minlength=len(keys))
+        metrics = concordance_metrics(confusion, intermediate)
+        header = key_columns + ['n', 'n_missing'] + CONFUSION_COLUMNS + METRIC_COLUMNS
+        sheet = Sheet(name, header)
+        with open(f'{output_dir}/concordance.{name}.txt', 'w') as out:
+            out.write('#' + '\t'.join(header) + '\n')
+            for g, key in enumerate(keys):
+                counts = dict(zip(CELLS, confusion[g].ravel().tolist()))
+                n = sum(counts.values())
+                if n == 0 and missing[g] == 0:
+                    continue
+                values = [round(float(metrics[metric][g]), 4) if np.isfinite(metrics[metric][g]) else 'NA' for metric in METRIC_COLUMNS]
+                row = key + [n, int(missing[g])] + [counts[cell] for cell in CONFUSION_COLUMNS] + values
+                sheet.add(row)
+                out.write('\t'.join(str(value) for value in row) + '\n')
+        sheets.append(sheet)
+
+    # write out xlsx
+    wb = openpyxl.Workbook(write_only=True)
+    wb.views = [BookView(xWindow=8000, yWindow=4000, windowWidth=25000, windowHeight=20000)]
+    style = TableStyleInfo(name='TableStyleLight11', showFirstColumn=False, showLastColumn=False, showRowStripes=True, showColumnStripes=True)
+    for sheet in sheets:
+        sheet.write(wb, style)
+    wb.save(f'{output_dir}/concordance.xlsx')
+    wb.close()
+
+    print(f'Concordance written to {output_dir}')
+
+
+class ASTTable(object):
+    """
+    AST phenotypes of isolates as an isolate x drug array of PHENOTYPES codes.
+    """
+    def __init__(self, isolates, species, drugs, phenotypes):
+        self.isolates = isolates
+        self.species = species
+        self.drugs = drugs
+        self.phenotypes = phenotypes
+
+    @classmethod
+    def from_file(cls, ast_file, sample_ids):
+        codes = {p: i for i, p in enumerate(PHENOTYPES)}
+        isolates = []
+        species = []
+        rows = []
+        drugs = []
+        with open(ast_file, 'r') as file:
             for line in file:
-                if not to_process:
-                    if line.startswith('# Antimicrobial'):
-                        to_process = True
-                    else:
-                        pass
-                else:
-                    if line != '\n':
-                        fields = line.rstrip().split('\t')
-                        antimicrobial = fields[0]
-                        am_class = fields[1]
-                        pred_pheno = fields[2]
-                        if pred_pheno == 'Resistant':
-                            pred_pheno = 'R'
-                        elif pred_pheno == 'No resistance':
-                            pred_pheno = 'S'
-                        else:
-                            print(f"Unexpected prediction {pred_pheno}")
-                        match = fields[3]
-                        genetic_background = fields[4] if match == 0 else ''
-                        if antimicrobial in ('trimethoprim', 'sulfamethoxazole'):
-                            combined_antimicrobial = 'trimethoprim/sulfamethoxazole'
-                            if antimicrobial == 'trimethoprim':
-                                sample.antimicrobials[combined_antimicrobial].ast_pred = pred_pheno + "/" + sample.antimicrobials[combined_antimicrobial ].ast_pred
-                            else:
-                                sample.antimicrobials[combined_antimicrobial].ast_pred = pred_pheno
-                        else:
-                            if antimicrobial in sample.antimicrobials:
-                                sample.antimicrobials[antimicrobial].ast_pred = pred_pheno
-                    else:
-                        break
-
-    sorted_antimicrobials = sorted(samples[0].antimicrobials)
-    with open('summary.txt', 'w') as file:
+                if line.startswith('#'):
+                    drugs = [drug.strip().lower() for drug in line.rstrip('\n').split('\t')[2:]]
+                elif line.strip() != '':
+                    fields = line.rstrip('\n').split('\t')
+                    if len(sample_ids) > 0 and fields[0] not in sample_ids:
+                        continue
+                    isolates.append(fields[0])
+                    species.append(fields[1])
+                    values = fields[2:] + [''] * (len(drugs) - len(fields) + 2)
+                    # NI, not interpreted, and empty cells are missing phenotypes
+                    rows.append([codes.get(value.strip().upper(), MISSING) for value in values[:len(drugs)]])
+        phenotypes = np.array(rows, dtype=np.int8).reshape(len(rows), len(drugs))
+        return cls(isolates, species, drugs, phenotypes)
+
+    def print(self):
+        print(f'Number of isolates: {len(self.isolates)}')
+        print(f'Number of antimicrobials: {len(self.drugs)}')
+        print(f'Number of species: {len(set(self.species))}')
+
+
+def read_drug_table(drug_table_file):
+    """
+    Reads a drug table of ast drug, comma separated resfinder drugs, rule and class.
+    """
+    drug_table = {}
+    with open(drug_table_file, 'r') as file:
+        for line in file:
+            if not line.startswith('#') and line.strip() != '':
+                ast_drug, components, rule, am_class = line.rstrip('\n').split('\t')
+                if rule not in ('all', 'any'):
+                    raise click.BadParameter(f'rule of {ast_drug} is {rule}, expected all or any')
+                drug_table[ast_drug.strip().lower()] = ([c.strip().lower() for c in components.split(',')], rule, am_class)
+    return drug_table
+
+
+def read_pheno_table(resfinder_results_file):
+    """
+    Reads the first table of a ResFinder pheno_table.txt into {antimicrobial: (class, prediction code)}.
+    """
+    results = {}
+    if not os.path.exists(resfinder_results_file):
+        print(f'{resfinder_results_file} not found')
+        return results
+    to_process = False
+    with open(resfinder_results_file, 'r') as file:
+        for line in file:
+            if not to_process:
+                to_process = line.startswith('# Antimicrobial')
+            elif line.strip() == '':
+                break
+            else:
+                fields = line.rstrip('\n').split('\t')
+                results[fields[0].strip().lower()] = (fields[1], RESFINDER_PREDICTIONS.get(fields[2], MISSING))
+    return results
+
+
+def predict(drugs, resfinder_results, drug_table):
+    """
+    Maps ResFinder predictions to the AST drugs, returns an isolate x drug array of PREDICTIONS codes
+    and the class of each drug.
+    """
+    predictions = np.full((len(resfinder_results), len(drugs)), MISSING, dtype=np.int8)
+    classes = []
+    for j, drug in enumerate(drugs):
+        components, rule, am_class = drug_table.get(drug, ([drug], 'all', ''))
+        # component predictions as isolates x components, resistance is code 0
+        values = np.array(
+            [[results.get(c, ('', MISSING))[1] for c in components] for results in resfinder_results],
+            dtype=np.int8,
+        ).reshape(len(resfinder_results), len(components))
+        complete = (values != MISSING).all(axis=1)
+        resistant = (values == 0).all(axis=1) if rule == 'all' else (values == 0).any(axis=1)
+        predictions[complete, j] = np.where(resistant[complete], 0, 1)
+        if am_class == '':
+            observed = [results[drug][0] for results in resfinder_results if drug in results and results[drug][0] != 'NA']
+            am_class = observed[0] if len(observed) > 0 else 'unknown'
+        classes.append(am_class)
+    return predictions, classes
+
+
+def confusion_matrices(groups, cells, valid, no_groups):
+    """
+    Counts phenotype x prediction cells of each group in one pass, returns groups x 3 x 2.
+    """
+    keys = groups[valid].astype(np.int64) * len(CELLS) + cells[valid]
+    return np.bincount(keys, minlength=no_groups * len(CELLS)).reshape(no_groups, len(PHENOTYPES), len(PREDICTIONS))
+
+
+def concordance_metrics(confusion, intermediate):
+    """
+    Sensitivity, specificity, very major and major error rates and categorical agreement of
+    groups x 3 x 2 confusion matrices, with intermediate phenotypes excluded or counted as R or S.
+    """
+    rr, rs = confusion[:, 0, 0], confusion[:, 0, 1]
+    ir, is_ = confusion[:, 1, 0], confusion[:, 1, 1]
+    sr, ss = confusion[:, 2, 0], confusion[:, 2, 1]
+    if intermediate == 'R':
+        tp, fn, fp, tn = rr + ir, rs + is_, sr, ss
+    elif intermediate == 'S':
+        tp, fn, fp, tn = rr, rs, sr + ir, ss + is_
+    else:
+        tp, fn, fp, tn = rr, rs, sr, ss
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'sensitivity': tp / (tp + fn),
+            'specificity': tn / (tn + fp),
+            'very_major_error_rate': fn / (tp + fn),
+            'major_error_rate': fp / (fp + tn),
+            'categorical_agreement': (tp + tn) / (tp + tn + fp + fn),
+        }
+
+
+def write_summary(summary_file, ast, predictions):
+    """
+    Writes the AST phenotype and ResFinder prediction of each isolate and drug side by side.
+    """
+    order = sorted(range(len(ast.drugs)), key=lambda j: ast.drugs[j])
+    with open(summary_file, 'w') as file:
         file.write('sample-id')
-        for key in sorted_antimicrobials:
-            file.write(f'\t{key}\t')
+        for j in order:
+            file.write(f'\t{ast.drugs[j]}\t')
         file.write('\n')
-
-        for key in sorted_antimicrobials:
+        for j in order:
             file.write(f'\tAST\tresfinder')
         file.write('\n')
-
-        for sample in samples:
-            file.write(sample.id)
-            for i, antimicrobial in enumerate(sorted_antimicrobials):
-                am = sample.antimicrobials[antimicrobial]
-                file.write(f'\t{am.ast_pheno}\t{am.ast_pred}')
+        for i, id in enumerate(ast.isolates):
+            file.write(id)
+            for j in order:
+                pheno = PHENOTYPES[ast.phenotypes[i, j]] if ast.phenotypes[i, j] != MISSING else 'NI'
+                pred = PREDICTIONS[predictions[i, j]] if predictions[i, j] != MISSING else ''
+                file.write(f'\t{pheno}\t{pred}')
             file.write('\n')
 
-            #sample.print()
-
-    sample_stats = {}
-    antimicrobial_stats = {}
-    for sample in samples:
-        sample_stats[sample.id] = Stats()
-    for i, antimicrobial in enumerate(sorted_antimicrobials):
-        antimicrobial_stats[antimicrobial] = Stats()
-
-    #collect stats
-    for sample in samples:
-        for i, antimicrobial in enumerate(sorted_antimicrobials):
-            am = sample.antimicrobials[antimicrobial]
-            pheno = am.ast_pheno
-            pred = am.ast_pred
-            if '/' in pred:
-                if pred == 'R/R':
-                    pred = 'R'
-                elif pred == 'R/S':
-                    pred = 'S'
-                elif pred == 'S/R':
-                    pred = 'S'
-                elif pred == 'S/S':
-                    pred = 'S'
-            if pheno != 'NI' and pred != '':
-                sample_stats[sample.id].n += 1
-                antimicrobial_stats[antimicrobial].n += 1
-                if pheno == 'R' and pred == 'R':
-                    sample_stats[sample.id].n_r += 1
-                    sample_stats[sample.id].n_rr += 1
-                    antimicrobial_stats[antimicrobial].n_rr += 1
-                    antimicrobial_stats[antimicrobial].n_r += 1
-                elif pheno == 'I' and pred == 'R':
-                    sample_stats[sample.id].n_i += 1
-                    sample_stats[sample.id].n_ir += 1
-                    antimicrobial_stats[antimicrobial].n_ir += 1
-                    antimicrobial_stats[antimicrobial].n_i += 1
-                elif pheno == 'S' and pred == 'R':
-                    sample_stats[sample.id].n_s += 1
-                    sample_stats[sample.id].n_sr += 1
-                    antimicrobial_stats[antimicrobial].n_sr += 1
-                    antimicrobial_stats[antimicrobial].n_s += 1
-                elif pheno == 'R' and pred == 'S':
-                    sample_stats[sample.id].n_r += 1
-                    sample_stats[sample.id].n_rs += 1
-                    antimicrobial_stats[antimicrobial].n_rs += 1
-                    antimicrobial_stats[antimicrobial].n_r += 1
-                elif pheno == 'I' and pred == 'S':
-                    sample_stats[sample.id].n_i += 1
-                    sample_stats[sample.id].n_is += 1
-                    antimicrobial_stats[antimicrobial].n_is += 1
-                    antimicrobial_stats[antimicrobial].n_i += 1
-                elif pheno == 'S' and pred == 'S':
-                    sample_stats[sample.id].n_s += 1
-                    sample_stats[sample.id].n_ss += 1
-                    antimicrobial_stats[antimicrobial].n_ss += 1
-                    antimicrobial_stats[antimicrobial].n_s += 1
-                else:
-                    print(f'not caught {antimicrobial}: "{pheno}" \t "{pred}"')
-            else:
-                #adhoc!!!!!
-                if pheno == 'NI':
-                    sample_stats[sample.id].n_m += 1
-                    antimicrobial_stats[antimicrobial].n_m += 1
-                elif pheno == 'S':
-                    sample_stats[sample.id].n += 1
-                    sample_stats[sample.id].n_s += 1
-                    antimicrobial_stats[antimicrobial].n += 1
-                    antimicrobial_stats[antimicrobial].n_s += 1
-
-
-    print(f'sample-id\tn\tr\ti\ts\tni\trr\tir\tsr\trs\tis\tss')
-    for sample in samples:
-        stats = sample_stats[sample.id]
-        print(f'{sample.id}\t{stats.n}\t{stats.n_r}\t{stats.n_i}\t{stats.n_s}\t{stats.n_m}\t{stats.n_rr}\t{stats.n_ir}\t{stats.n_sr}\t{stats.n_rs}\t{stats.n_is}\t{stats.n_ss}')
-
-    print(f'antimicrobial\tn\tr\ti\ts\tni\trr\tir\tsr\trs\tis\tss')
-    for i, antimicrobial in enumerate(sorted_antimicrobials):
-        stats = antimicrobial_stats[antimicrobial]
-        print(f'{antimicrobial}\t{stats.n}\t{stats.n_r}\t{stats.n_i}\t{stats.n_s}\t{stats.n_m}\t{stats.n_rr}\t{stats.n_ir}\t{stats.n_sr}\t{stats.n_rs}\t{stats.n_is}\t{stats.n_ss}' , end="")
-        if antimicrobial != 'streptomycin':
-            print(f'\t{stats.n_ir+stats.n_sr+stats.n_rs}/{stats.n}\t{stats.n_is+stats.n_sr+stats.n_rs}/{stats.n}')
-        else:
-            print(f'\tNA')
-
-#concordance values
-#  *sample
-#  *antimicrobial
-#
-# S,I - no resistance
-# R - resistant
-#
-# collapse S,I
-# collapse I,R
-#
-# N - observations
-#
-# novel counts
-# pheno - Resistant
-# pred - not resistant
-#
-# NI - missing data
-class Stats(object):
-    def __init__(self):
-        self.n_r = 0
-        self.n_i = 0
-        self.n_s = 0
-        self.n_m = 0
-        self.n_rr = 0
-        self.n_ir = 0
-        self.n_sr = 0
-        self.n_rs = 0
-        self.n_is = 0
-        self.n_ss = 0
-        self.n = 0
-
-class Sample(object):
-    def __init__(self):
-        self.id = ''
-        self.species = ''
-        self.antimicrobials = {}
-
-    def __init__(self, id, species):
-        self.id = id
-        self.species = species
-        self.antimicrobials = {}
 
-    def add_am(self, antimicrobial):
-        self.antimicrobials[antimicrobial.id] = antimicrobial
+class Sheet(object):
+    """
+    Rows of a worksheet held until written, column widths are tracked as rows are added
+    so that the worksheet can be streamed in write only mode.
+    """
+    def __init__(self, name, header):
+        self.name = name
+        self.rows = []
+        self.widths = {}
+        self.add(header)
+
+    def add(self, row):
+        self.rows.append(row)
+        for col, value in enumerate(row, 1):
+            if value:
+                self.widths[col] = max(self.widths.get(col, 0), len(str(value)))
 
-    def print(self):
-        print(f'id      : {self.id}')
-        print(f'species : {self.species}')
-        for key in sorted(self.antimicrobials):
-            self.antimicrobials[key].print()
-
-# Antimicrobial	Class	WGS-predicted phenotype	Match	Genetic background
-# amikacin	aminoglycoside	Resistant	3	aac(6')-Iaa (aac(6')-Iaa_NC_003197)
-# colistin	polymyxin	No resistance	0
-# ampicillin+clavulanic acid	beta-lactam	No resistance	0
-# pipercallin+tazobactam	NA	NA	NA	Not in database
-# ampicillin	beta-lactam	Resistant	3	blaCTX-M-55 (blaCTX-M-55_DQ810789)
-# cefoxitin	beta-lactam	No resistance	0
-# ertapenem	beta-lactam	No resistance	0
-# tigecycline	tetracycline	No resistance	0
-#*chloramphenicol	amphenicol	No resistance	0
-#*tetracycline	tetracycline	No resistance	0
-# tobramycin	aminoglycoside	Resistant	3	aac(6')-Iaa (aac(6')-Iaa_NC_003197)
-#*azithromycin	macrolide	No resistance	0
-# ciprofloxacin	quinolone	Resistant	3	qnrB19 (qnrB19_EU432277)
-#*nalidixic acid	quinolone	No resistance	0
-# ceftazidime	beta-lactam	Resistant	3	blaCTX-M-55 (blaCTX-M-55_DQ810789)
-# imipenem	beta-lactam	No resistance	0
-# temocillin	beta-lactam	No resistance	0
-#*cefotaxime	beta-lactam	Resistant	3	blaCTX-M-55 (blaCTX-M-55_DQ810789)
-# cefepime	beta-lactam	Resistant	3	blaCTX-M-55 (blaCTX-M-55_DQ810789)
-#*sulfamethoxazole	folate pathway antagonist	No resistance	0
-#*meropenem	beta-lactam	No resistance	0
-#*gentamicin	aminoglycoside	No resistance	0
-#*trimethoprim	folate pathway antagonist	No resistance	0
-
-# Antimicrobial	Class	WGS-predicted phenotype	Match	Genetic background
-# gentamicin	aminoglycoside	No resistance	0
-# tobramycin	aminoglycoside	Resistant	3	aac(6')-Iaa (aac(6')-Iaa_NC_003197)
-# streptomycin	aminoglycoside	No resistance	0
-# amikacin	aminoglycoside	Resistant	3	aac(6')-Iaa (aac(6')-Iaa_NC_003197)
-# isepamicin	aminoglycoside	No resistance	0
-# dibekacin	aminoglycoside	No resistance	0
-# kanamycin	aminoglycoside	No resistance	0
-# neomycin	aminoglycoside	No resistance	0
-# lividomycin	aminoglycoside	No resistance	0
-# paromomycin	aminoglycoside	No resistance	0
-# ribostamycin	aminoglycoside	No resistance	0
-# unknown aminoglycoside	aminoglycoside	No resistance	0
-# butiromycin	aminoglycoside	No resistance	0
-# butirosin	aminoglycoside	No resistance	0
-# hygromycin	aminoglycoside	No resistance	0
-# netilmicin	aminoglycoside	No resistance	0
-# apramycin	aminoglycoside	No resistance	0
-# sisomicin	aminoglycoside	No resistance	0
-# arbekacin	aminoglycoside	No resistance	0
-# kasugamycin	aminoglycoside	No resistance	0
-# astromicin	aminoglycoside	No resistance	0
-# fortimicin	aminoglycoside	No resistance	0
-# spectinomycin	aminocyclitol	No resistance	0
-# fluoroquinolone	quinolone	No resistance	0
-# ciprofloxacin	quinolone	Resistant	3	qnrB19 (qnrB19_EU432277)
-# unknown quinolone	quinolone	No resistance	0
-# nalidixic acid	quinolone	No resistance	0
-# amoxicillin	beta-lactam	Resistant	3	blaCTX-M-55 (blaCTX-M-55_DQ810789)
-# amoxicillin+clavulanic acid	beta-lactam	No resistance	0
-# ampicillin	beta-lactam	Resistant	3	blaCTX-M-55 (blaCTX-M-55_DQ810789)
-# ampicillin+clavulanic acid	beta-lactam	No resistance	0
-# cefepime	beta-lactam	Resistant	3	blaCTX-M-55 (blaCTX-M-55_DQ810789)
-# cefixime	beta-lactam	No resistance	0
-# cefotaxime	beta-lactam	Resistant	3	blaCTX-M-55 (blaCTX-M-55_DQ810789)
-# cefoxitin	beta-lactam	No resistance	0
-# ceftazidime	beta-lactam	Resistant	3	blaCTX-M-55 (blaCTX-M-55_DQ810789)
-# ertapenem	beta-lactam	No resistance	0
-# imipenem	beta-lactam	No resistance	0
-# meropenem	beta-lactam	No resistance	0
-# piperacillin	beta-lactam	Resistant	3	blaCTX-M-55 (blaCTX-M-55_DQ810789)
-# piperacillin+tazobactam	beta-lactam	No resistance	0
-# unknown beta-lactam	beta-lactam	No resistance	0
-# aztreonam	beta-lactam	Resistant	3	blaCTX-M-55 (blaCTX-M-55_DQ810789)
-# cefotaxime+clavulanic acid	beta-lactam	No resistance	0
-# temocillin	beta-lactam	No resistance	0
-# ticarcillin	beta-lactam	Resistant	3	blaCTX-M-55 (blaCTX-M-55_DQ810789)
-# ceftazidime+avibactam	beta-lactam	No resistance	0
-# penicillin	beta-lactam	No resistance	0
-# ceftriaxone	beta-lactam	Resistant	3	blaCTX-M-55 (blaCTX-M-55_DQ810789)
-# ticarcillin+clavulanic acid	beta-lactam	No resistance	0
-# cephalothin	beta-lactam	No resistance	0
-# cephalotin	beta-lactam	No resistance	0
-# piperacillin+clavulanic acid	beta-lactam	No resistance	0
-# ceftiofur	under_development	No resistance	0
-# sulfamethoxazole	folate pathway antagonist	No resistance	0
-# trimethoprim	folate pathway antagonist	No resistance	0
-# fosfomycin	fosfomycin	No resistance	0
-# vancomycin	glycopeptide	No resistance	0
-# teicoplanin	glycopeptide	No resistance	0
-# bleomycin	glycopeptide	No resistance	0
-# lincomycin	lincosamide	No resistance	0
-# clindamycin	lincosamide	No resistance	0
-# dalfopristin	streptogramin a	No resistance	0
-# pristinamycin iia	streptogramin a	No resistance	0
-# virginiamycin m	streptogramin a	No resistance	0
-# quinupristin+dalfopristin	streptogramin a	No resistance	0
-# tiamulin	pleuromutilin	No resistance	0
-# carbomycin	macrolide	No resistance	0
-# erythromycin	macrolide	No resistance	0
-# azithromycin	macrolide	No resistance	0
-# oleandomycin	macrolide	No resistance	0
-# spiramycin	macrolide	No resistance	0
-# tylosin	macrolide	No resistance	0
-# telithromycin	macrolide	No resistance	0
-# tetracycline	tetracycline	No resistance	0
-# doxycycline	tetracycline	No resistance	0
-# minocycline	tetracycline	No resistance	0
-# tigecycline	tetracycline	No resistance	0
-# quinupristin	streptogramin b	No resistance	0
-# pristinamycin ia	streptogramin b	No resistance	0
-# virginiamycin s	streptogramin b	No resistance	0
-# linezolid	oxazolidinone	No resistance	0
-# chloramphenicol	amphenicol	No resistance	0
-# florfenicol	amphenicol	No resistance	0
-# colistin	polymyxin	No resistance	0
-# fusidic acid	steroid antibacterial	No resistance	0
-# mupirocin	pseudomonic acid	No resistance	0
-# rifampicin	rifamycin	No resistance	0
-# metronidazole	nitroimidazole	No resistance	0
-# narasin	ionophores	No resistance	0
-# salinomycin	ionophores	No resistance	0
-# maduramicin	ionophores	No resistance	0
-
-#specific = {True, False}
-#ast_pheno = {R, I, S, NI}
-#ast_pred = {R, S}
-class Antimicrobial(object):
-    def __init__(self):
-        self.id = ''
-        self.type = ''
-        self.specific = ''
-        self.ast_pheno = ''
-        self.ast_pred = ''
-
-    def __init__(self, id):
-        self.id = id
-        self.type = ''
-        self.specific = False
-        self.ast_pheno = ''
-        self.ast_pred = ''
+    def write(self, wb, style):
+        ws = wb.create_sheet(self.name)
+        ws.sheet_view.zoomScale = 200
+        for col, value in self.widths.items():
+            ws.column_dimensions[get_column_letter(col)].width = value
+        tab = Table(displayName=self.name, ref=f'A1:{get_column_letter(len(self.rows[0]))}{len(self.rows)}')
+        tab.tableStyleInfo = style
+        # table columns are not inferred from the cells in write only mode
+        tab.tableColumns = [TableColumn(id=i, name=str(value)) for i, value in enumerate(self.rows[0], 1)]
+        with warnings.catch_warnings():
+            # reminder to add the columns, which are added above
+            warnings.filterwarnings('ignore', 'In write-only mode you must add table columns manually')
+            ws.add_table(tab)
+        for row in self.rows:
+            ws.append(row)
 
-    def print(self):
-        print(f'\t===================')
-        print(f'\tid        : {self.id}')
-        print(f'\ttype      : {self.type}')
-        print(f'\tast_pheno : {self.ast_pheno}')
-        print(f'\tast_pred  : {self.ast_pred}')
 
 if __name__ == '__main__':
     main()
@@ -20,56 +20,283 @@
 
 import os
 import click
-import re
-from queue import PriorityQueue
+import numpy as np
+from itertools import islice
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+# NCBI genetic code tables as amino acids and start codons of the 64 codons in TCAG order
+#
+# id    name                                      amino acids                                                         starts
+GENETIC_CODES = {
+    1: ('Standard', 'FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG', '---M------**--*----M---------------M----------------------------'),
+    2: ('Vertebrate Mitochondrial', 'FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIMMTTTTNNKKSS**VVVVAAAADDEEGGGG', '----------**--------------------MMMM----------**---M------------'),
+    3: ('Yeast Mitochondrial', 'FFLLSSSSYY**CCWWTTTTPPPPHHQQRRRRIIMMTTTTNNKKSSRRVVVVAAAADDEEGGGG', '----------**----------------------MM----------------------------'),
+    4: ('Mold, Protozoan, Coelenterate Mitochondrial and Mycoplasma', 'FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG', '--MM------**-------M------------MMMM---------------M------------'),
+    5: ('Invertebrate Mitochondrial', 'FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIMMTTTTNNKKSSSSVVVVAAAADDEEGGGG', '---M------**--------------------MMMM---------------M------------'),
+    6: ('Ciliate, Dasycladacean and Hexamita Nuclear', 'FFLLSSSSYYQQCC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG', '-----------------------------------M----------------------------'),
+    9: ('Echinoderm and Flatworm Mitochondrial', 'FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIIMTTTTNNNKSSSSVVVVAAAADDEEGGGG', '-----------------------------------M---------------M------------'),
+    10: ('Euplotid Nuclear', 'FFLLSSSSYY**CCCWLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG', '-----------------------------------M----------------------------'),
+    11: ('Bacterial, Archaeal and Plant Plastid', 'FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG', '---M------**--*----M------------MMMM---------------M------------'),
+    12: ('Alternative Yeast Nuclear', 'FFLLSSSSYY**CC*WLLLSPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG', '-------------------M---------------M----------------------------'),
+    13: ('Ascidian Mitochondrial', 'FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIMMTTTTNNKKSSGGVVVVAAAADDEEGGGG', '---M------------------------------MM---------------M------------'),
+    14: ('Alternative Flatworm Mitochondrial', 'FFLLSSSSYYY*CCWWLLLLPPPPHHQQRRRRIIIMTTTTNNNKSSSSVVVVAAAADDEEGGGG', '-----------------------------------M----------------------------'),
+    16: ('Chlorophycean Mitochondrial', 'FFLLSSSSYY*LCC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG', '-----------------------------------M----------------------------'),
+    21: ('Trematode Mitochondrial', 'FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIMMTTTTNNNKSSSSVVVVAAAADDEEGGGG', '-----------------------------------M---------------M------------'),
+    22: ('Scenedesmus obliquus Mitochondrial', 'FFLLSS*SYY*LCC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG', '-----------------------------------M----------------------------'),
+    23: ('Thraustochytrium Mitochondrial', 'FF*LSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG', '--------------------------------M--M---------------M------------'),
+    24: ('Rhabdopleuridae Mitochondrial', 'FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSSKVVVVAAAADDEEGGGG', '---M---------------M---------------M---------------M------------'),
+    25: ('Candidate Division SR1 and Gracilibacteria', 'FFLLSSSSYY**CCGWLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG', '---M-------------------------------M---------------M------------'),
+}
+
+# 2 bit codes of bases in TCAG order, 4 for any other character
+BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for i, base in enumerate('TCAG'):
+    BASE_CODES[ord(base)] = i
+    BASE_CODES[ord(base.lower())] = i
+BASE_CODES[ord('U')] = BASE_CODES[ord('u')] = 0
+
+COMPLEMENT = bytes.maketrans(b'ACGTUMRWSYKVHDBNacgtumrwsykvhdbn', b'TGCAAKYWSRMBDHVNtgcaakywsrmbdhvn')
+
+FRAMES = [1, 2, 3, -1, -2, -3]
+
 
 @click.command()
 @click.option('-i', '--input_fasta_file', required=True, help='input FASTA file')
 @click.option('-o', '--output_fasta_file', required=True, help='output FASTA file')
-def main(input_fasta_file, output_fasta_file):
+@click.option('-m', '--mode', default='translate', type=click.Choice(['translate', 'orf']), show_default=True, help='translate frames or call ORFs')
+@click.option('-f', '--frames', default='1', show_default=True, help='frames to translate, comma separated from 1,2,3,-1,-2,-3 or 6 for all')
+@click.option('-g', '--genetic_code', default=11, show_default=True, type=click.Choice([str(id) for id in GENETIC_CODES]), help='NCBI genetic code table')
+@click.option('-l', '--min_length', default=30, show_default=True, help='minimum ORF length in amino acids')
+@click.option('-s', '--start_codons', default='table', show_default=True, help='comma separated start codons, table for those of the genetic code or none for stop to stop ORFs')
+@click.option('-p', '--report_partial', is_flag=True, default=False, help='report ORFs running off the end of a sequence')
+@click.option('-b', '--bed_file', default='', help='ORF BED file')
+@click.option('-r', '--gff_file', default='', help='ORF GFF3 file')
+@click.option('-t', '--threads', default=os.cpu_count(), show_default=True, help='number of processes')
+def main(input_fasta_file, output_fasta_file, mode, frames, genetic_code, min_length, start_codons, report_partial, bed_file, gff_file, threads):
     """
     Convert nucleotides to amino acids
 
+    Records of a FASTA file are translated in the chosen frames or searched for open reading
+    frames in all six frames.  Codons are translated with lookup tables over 2 bit encoded
+    sequences, a codon with a base other than ACGTU is translated as X.  Translations of frame 1
+    keep the FASTA header and drop a terminal stop so that coding sequences translate to their
+    proteins.  ORFs start at the first start codon after a stop and are written as proteins with
+    their coordinates in BED and GFF3.
+
     e.g. nt_to_aa.py -i in.fasta -o out.fasta
+         nt_to_aa.py -i contigs.fasta -o orfs.fasta -m orf -l 50 -b orfs.bed -r orfs.gff3
    """
     print(f'input FASTA file: {input_fasta_file}')
     print(f'output FASTA file: {output_fasta_file}')
+    print(f'mode: {mode}')
+    print(f'genetic code: {genetic_code} ({GENETIC_CODES[int(genetic_code)][0]})')
 
-    with open(output_fasta_file, 'w') as out_file:
-        with open(input_fasta_file, 'r') as in_file:
-            for line in in_file:
-                if line.startswith('>'):
-                    out_file.write(line)
-                else:
-                    out_file.write(nt2aa(line) + '\n')
-
-n2a = {
-   'TTT' : 'F', 'TTC' : 'F', 'TTA' : 'L', 'TTG' : 'L',
-   'TCT' : 'S', 'TCC' : 'S', 'TCA' : 'S', 'TCG' : 'S',
-   'TAT' : 'Y', 'TAC' : 'Y', 'TAA' : '', 'TAG' : '',
-   'TGT' : 'C', 'TGC' : 'C', 'TGA' : '', 'TGG' : 'W',
-   'CTT' : 'L', 'CTC' : 'L', 'CTA' : 'L', 'CTG' : 'L',
-   'CCT' : 'P', 'CCC' : 'P', 'CCA' : 'P', 'CCG' : 'P',
-   'CAT' : 'H', 'CAC' : 'H', 'CAA' : 'Q', 'CAG' : 'Q',
-   'CGT' : 'R', 'CGC' : 'R', 'CGA' : 'R', 'CGG' : 'R',
-   'ATT' : 'I', 'ATC' : 'I', 'ATA' : 'I', 'ATG' : 'M',
-   'ACT' : 'T', 'ACC' : 'T', 'ACA' : 'T', 'ACG' : 'T',
-   'AAT' : 'N', 'AAC' : 'N', 'AAA' : 'K', 'AAG' : 'K',
-   'AGT' : 'S', 'AGC' : 'S', 'AGA' : 'R', 'AGG' : 'R',
-   'GTT' : 'V', 'GTC' : 'V', 'GTA' : 'V', 'GTG' : 'V',
-   'GCT' : 'A', 'GCC' : 'A', 'GCA' : 'A', 'GCG' : 'A',
-   'GAT' : 'D', 'GAC' : 'D', 'GAA' : 'E', 'GAG' : 'E',
-   'GGT' : 'G', 'GGC' : 'G', 'GGA' : 'G', 'GGG' : 'G'
-}
+    frames = FRAMES if frames == '6' else [int(frame) for frame in frames.split(',')]
+    if any(frame not in FRAMES for frame in frames):
+        raise click.BadParameter(f'frames are from 1,2,3,-1,-2,-3')
+    code = GeneticCode(int(genetic_code), start_codons)
+
+    no_records = 0
+    no_proteins = 0
+    with open(output_fasta_file, 'w') as out_file, ProcessPoolExecutor(max_workers=max(threads, 1)) as executor:
+        bed = open(bed_file, 'w') if bed_file != '' else None
+        gff = open(gff_file, 'w') if gff_file != '' else None
+        if gff is not None:
+            gff.write('##gff-version 3\n')
+        records = read_fasta(input_fasta_file)
+        if mode == 'translate':
+            results = map_batches(executor, partial(translate_record, code=code, frames=frames), records, threads)
+            for proteins in results:
+                no_records += 1
+                for header, protein in proteins:
+                    no_proteins += 1
+                    out_file.write(f'{header}\n{protein}\n')
+        else:
+            results = map_batches(executor, partial(call_orfs, code=code, min_length=min_length, report_partial=report_partial), records, threads)
+            for orfs in results:
+                no_records += 1
+                for orf in orfs:
+                    no_proteins += 1
+                    orf.write(out_file, bed, gff)
+        if bed is not None:
+            bed.close()
+        if gff is not None:
+            gff.close()
+
+    print(f'records: {no_records}')
+    print(f'proteins: {no_proteins}')
+
+
+class GeneticCode(object):
+    """
+    Lookup tables of a genetic code indexed by codon, index 64 is a codon with an ambiguous base.
+    """
+    def __init__(self, id, start_codons='table'):
+        self.id = id
+        self.name, amino_acids, starts = GENETIC_CODES[id]
+        self.amino_acids = np.frombuffer((amino_acids + 'X').encode(), dtype=np.uint8)
+        self.stops = self.amino_acids == ord('*')
+        if start_codons == 'table':
+            self.starts = np.array([c == 'M' for c in starts] + [False])
+        elif start_codons == 'none':
+            self.starts = None
+        else:
+            self.starts = np.zeros(65, dtype=bool)
+            for codon in start_codons.upper().replace('U', 'T').split(','):
+                codes = BASE_CODES[np.frombuffer(codon.strip().encode(), dtype=np.uint8)]
+                if len(codes) != 3 or (codes > 3).any():
+                    raise click.BadParameter(f'{codon} is not a codon')
+                self.starts[codes[0] * 16 + codes[1] * 4 + codes[2]] = True
+
+    def codons(self, seq, frame):
+        """
+        Returns the codon indices of a frame of a sequence, frames -1, -2 and -3 are read from
+        the first, second and third last base of the reverse complement.
+        """
+        if frame < 0:
+            seq = seq.translate(COMPLEMENT)[::-1]
+        codes = BASE_CODES[np.frombuffer(seq.encode(), dtype=np.uint8)]
+        offset = abs(frame) - 1
+        n = (len(codes) - offset) // 3
+        codes = codes[offset:offset + 3 * n].reshape(n, 3).astype(np.int64)
+        indices = codes[:, 0] * 16 + codes[:, 1] * 4 + codes[:, 2]
+        indices[(codes > 3).any(axis=1)] = 64
+        return indices
+
+    def translate(self, indices):
+        return self.amino_acids[indices].tobytes().decode()
+
+
+def read_fasta(fasta_file):
+    """
+    Yields the header and sequence of each record of a FASTA file, sequences may span lines.
+    """
+    with open(fasta_file, 'r') as file:
+        header = None
+        seqs = []
+        for line in file:
+            if line.startswith('>'):
+                if header is not None:
+                    yield header, ''.join(seqs)
+                header = line.rstrip('\n')
+                seqs = []
+            else:
+                seqs.append(line.strip())
+        if header is not None:
+            yield header, ''.join(seqs)
+
+
+def map_batches(executor, fn, records, threads, batch_size=1024):
+    """
+    Maps records in batches so that only a batch of records is held in memory, results are in order.
+    """
+    while True:
+        batch = list(islice(records, batch_size))
+        if len(batch) == 0:
+            return
+        yield from executor.map(fn, batch, chunksize=max(1, len(batch) // (4 * max(threads, 1))))
+
+
+def translate_record(record, code, frames):
+    """
+    Translates the frames of a record, frame 1 alone keeps the header and drops a terminal stop.
+    """
+    header, seq = record
+    proteins = []
+    for frame in frames:
+        protein = code.translate(code.codons(seq, frame))
+        if frames == [1]:
+            proteins.append((header, protein[:-1] if protein.endswith('*') else protein))
+        else:
+            proteins.append((f'{header.split()[0]}_frame={frame}', protein))
+    return proteins
+
+
+class ORF(object):
+    def __init__(self, seq_id, idx, frame, start, end, protein, complete_start, complete_end):
+        self.seq_id = seq_id
+        self.id = f'{seq_id}_orf{idx}'
+        self.frame = frame
+        self.strand = '+' if frame > 0 else '-'
+        self.start = start
+        self.end = end
+        self.protein = protein
+        self.complete_start = complete_start
+        self.complete_end = complete_end
+
+    def write(self, out_file, bed, gff):
+        """
+        Writes the protein with its 1-based coordinates, and BED and GFF3 records.
+        """
+        partial = '' if self.complete_start and self.complete_end else f' partial={int(not self.complete_start)}{int(not self.complete_end)}'
+        out_file.write(f'>{self.id} {self.seq_id}:{self.start + 1}-{self.end}({self.strand}) frame={self.frame} length={len(self.protein)}{partial}\n')
+        out_file.write(f'{self.protein}\n')
+        if bed is not None:
+            bed.write(f'{self.seq_id}\t{self.start}\t{self.end}\t{self.id}\t{len(self.protein)}\t{self.strand}\n')
+        if gff is not None:
+            attributes = f'ID={self.id};frame={self.frame}'
+            if partial != '':
+                attributes += f';partial={int(not self.complete_start)}{int(not self.complete_end)}'
+            gff.write(f'{self.seq_id}\tnt_to_aa\tCDS\t{self.start + 1}\t{self.end}\t.\t{self.strand}\t0\t{attributes}\n')
+
+    def print(self):
+        print(f'id     : {self.id}')
+        print(f'frame  : {self.frame}')
+        print(f'start  : {self.start}')
+        print(f'end    : {self.end}')
+        print(f'length : {len(self.protein)}')
+
+
+def call_orfs(record, code, min_length, report_partial):
+    """
+    Calls ORFs in six frames.  Stops split a frame into segments, each ORF runs from the first
+    start codon of a segment to its stop, or from the start of the segment when start codons are
+    not used.  Segments without a stop, or ahead of the first stop, are partial ORFs.
+    """
+    header, seq = record
+    seq_id = header[1:].split()[0] if len(header) > 1 else ''
+    length = len(seq)
+    orfs = []
+    for frame in FRAMES:
+        indices = code.codons(seq, frame)
+        n = len(indices)
+        stops = np.flatnonzero(code.stops[indices])
+        # segments are [begin, end) codons, ends are stop codons or the end of the frame
+        begins = np.concatenate(([0], stops + 1))
+        ends = np.concatenate((stops, [n]))
+        complete_ends = np.concatenate((np.ones(len(stops), dtype=bool), [False]))
+        complete_starts = np.ones(len(begins), dtype=bool)
+        if code.starts is None:
+            orf_begins = begins
+            # the first segment may continue before the sequence
+            complete_starts[0] = False
+        else:
+            starts = np.flatnonzero(code.starts[indices])
+            first = np.searchsorted(starts, begins)
+            found = first < len(starts)
+            orf_begins = np.full(len(begins), n)
+            orf_begins[found] = starts[first[found]]
+        keep = (orf_begins < ends) & (ends - orf_begins >= min_length)
+        if not report_partial:
+            keep &= complete_ends & complete_starts
+        offset = abs(frame) - 1
+        for begin, end, complete_start, complete_end in zip(orf_begins[keep], ends[keep], complete_starts[keep], complete_ends[keep]):
+            protein = code.translate(indices[begin:end])
+            if code.starts is not None:
+                # alternative start codons encode methionine at the start of a protein
+                protein = 'M' + protein[1:]
+            # nucleotide coordinates include the stop codon
+            nt_begin = offset + 3 * begin
+            nt_end = offset + 3 * (end + (1 if complete_end else 0))
+            if frame > 0:
+                start, stop = nt_begin, nt_end
+            else:
+                start, stop = length - nt_end, length - nt_begin
+            orfs.append((start, stop, frame, protein, bool(complete_start), bool(complete_end)))
+    orfs.sort(key=lambda orf: (orf[0], orf[1]))
+    return [ORF(seq_id, i + 1, frame, start, stop, protein, complete_start, complete_end) for i, (start, stop, frame, protein, complete_start, complete_end) in enumerate(orfs)]
 
-def nt2aa(nt):
-    nt = nt.strip()
-    n = len(nt)
-    if n%3==0:
-        res = [n2a[nt[i:i+3]] for i in range(0,len(nt),3)]
-        return ''.join(res)
-    else:
-        return nt
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -51,6 +51,7 @@ def main(make_file, working_dir, sample_file):
     scripts_dir = f"{working_dir}/scripts"
     blast_dir = f"{working_dir}/blast"
     vibrio_contigs_db_dir = f"{blast_dir}/vibrio_contigs_db"
+    vibrio_orfs_db_dir = f"{blast_dir}/vibrio_orfs_db"
     bwa_dir = f"{working_dir}/bwa"
     bwa_db_dir = f"{bwa_dir}/db"
 
@@ -90,6 +91,7 @@ def main(make_file, working_dir, sample_file):
         os.makedirs(log_dir, exist_ok=True)
         os.makedirs(ref_dir, exist_ok=True)
         os.makedirs(vibrio_contigs_db_dir, exist_ok=True)
+        os.makedirs(vibrio_orfs_db_dir, exist_ok=True)
         os.makedirs(blast_dir, exist_ok=True)
         os.makedirs(bwa_db_dir, exist_ok=True)
     except OSError as error:
@@ -191,6 +193,37 @@ def main(make_file, working_dir, sample_file):
     cmd = f"cd {blastdb_dir}; {tblastn} -query {input_fasta} -db vibrio_contigs_db -out {output_txt}"
     pg.add(tgt, dep, cmd)
 
+    # call ORFs on vibrio contigs
+    input_fasta = f"{ref_dir}/vibrio.contigs.fasta"
+    output_fasta = f"{ref_dir}/vibrio.orfs.aa.fasta"
+    output_bed = f"{ref_dir}/vibrio.orfs.bed"
+    output_gff = f"{ref_dir}/vibrio.orfs.gff3"
+    log = f"{log_dir}/vibrio.orfs.aa.fasta.log"
+    tgt = f"{log_dir}/vibrio.orfs.aa.fasta.OK"
+    dep = f"{log_dir}/vibrio.contigs.fasta.OK"
+    cmd = f"{nt_to_aa} -i {input_fasta} -o {output_fasta} -m orf -g 11 -l 50 -b {output_bed} -r {output_gff} -t 8 > {log}"
+    pg.add(tgt, dep, cmd)
+
+    # construct protein DB from vibrio ORFs
+    blastdb_dir = vibrio_orfs_db_dir
+    input_fasta = f"{ref_dir}/vibrio.orfs.aa.fasta"
+    log = f"{log_dir}/vibrio_orfs_db.log"
+    err = f"{log_dir}/vibrio_orfs_db.err"
+    tgt = f"{log_dir}/vibrio_orfs_db.OK"
+    dep = f"{log_dir}/vibrio.orfs.aa.fasta.OK"
+    cmd = f"cd {blastdb_dir}; {makeblastdb} -in {input_fasta} -out vibrio_orfs_db -dbtype prot -parse_seqids > {log} 2> {err}"
+    pg.add(tgt, dep, cmd)
+
+    # blastp
+    blastp = "/usr/local/ncbi-blast-2.13.0+/bin/blastp"
+    blastdb_dir = vibrio_orfs_db_dir
+    input_fasta = f"{ref_dir}/pirab.aa.fasta"
+    output_txt = f"{blast_dir}/pirab.vibrio.blastp.txt"
+    tgt = f"{log_dir}/pirab.vibrio.blastp.txt.OK"
+    dep = f"{log_dir}/pirab.aa.fasta.OK {log_dir}/vibrio_orfs_db.OK"
+    cmd = f"cd {blastdb_dir}; {blastp} -query {input_fasta} -db vibrio_orfs_db -out {output_txt}"
+    pg.add(tgt, dep, cmd)
+
     # build bwa index
     bwa = "/usr/local/bwa-0.7.17/bwa"
     samtools = "/usr/local/samtools-1.16/bin/samtools"
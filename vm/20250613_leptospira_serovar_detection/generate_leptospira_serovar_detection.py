@@ -38,15 +38,34 @@ import random
     help="working directory",
 )
 @click.option("-s", "--sample_file", required=True, help="sample file")
-def main(make_file, working_dir, sample_file):
+@click.option(
+    "-n",
+    "--screen_bases",
+    default=50000000,
+    show_default=True,
+    help="bases of reads screened against the reference panel",
+)
+@click.option(
+    "-k",
+    "--top",
+    default=10,
+    show_default=True,
+    help="maximum number of panel references aligned to",
+)
+def main(make_file, working_dir, sample_file, screen_bases, top):
     """
     Leptospira characterisation  
 
+    Reads are screened against sketches of the reference panel and aligned only to the
+    references found in the sample.
+
     e.g. generate_leptospira_serovar_detection.py
     """
     print("\t{0:<20} :   {1:<10}".format("make file", make_file))
     print("\t{0:<20} :   {1:<10}".format("working dir", working_dir))
     print("\t{0:<20} :   {1:<10}".format("sample file", sample_file))
+    print("\t{0:<20} :   {1:<10}".format("screen bases", screen_bases))
+    print("\t{0:<20} :   {1:<10}".format("top", top))
 
     # read sample file
     samples = {}
@@ -88,6 +107,7 @@ def main(make_file, working_dir, sample_file):
     
     bwa = "/usr/local/bwa-0.7.17/bwa"
     samtools = "/usr/local/samtools-1.17/bin/samtools"
+    screen_references = "/usr/local/cavspipes-1.2.1/screen_references.py"
     plot_bamstats = "/usr/local/samtools-1.17/bin/plot-bamstats"
     compute_effective_coverage = "/home/atks/programs/cavspipes/vfp/compute_effective_coverage.py"
     extract_general_stats = "/home/atks/programs/cavspipes/vfp/extract_general_stats.py"
@@ -164,13 +184,23 @@ def main(make_file, working_dir, sample_file):
     # https://www.ncbi.nlm.nih.gov/assembly/GCF_014570535.1
 
     ref_seqs_acc_ids = [
-        "NZ_CP043884.1",  # chromosome 1
-        "NZ_CP043885.1",  # chromosome 2
-        "NZ_CP043886.1",  # plasmid p1
-        "NZ_CP043887.1",  # plasmid p2
-        "NZ_CP043888.1",  # plasmid p3
-        "NZ_CP043889.1",  # plasmid p4
-        "NZ_CP043890.1"   # plasmid p5
+        "NZ_CP043884.1",  # strain 782 chromosome 1
+        "NZ_CP043885.1",  # strain 782 chromosome 2
+        "NZ_CP043886.1",  # strain 782 plasmid p1
+        "NZ_CP043887.1",  # strain 782 plasmid p2
+        "NZ_CP043888.1",  # strain 782 plasmid p3
+        "NZ_CP043889.1",  # strain 782 plasmid p4
+        "NZ_CP043890.1",  # strain 782 plasmid p5
+        "NZ_CP044513.1",  # strain 611 chromosome 1
+        "NZ_CP044514.1",  # strain 611 chromosome 2
+        "NZ_CP044515.1",  # strain 611 plasmid p1
+        "NZ_CP044516.1",  # strain 611 plasmid p2
+        "NZ_CP044509.1",  # strain LJ178 chromosome 1
+        "NZ_CP044510.1",  # strain LJ178 chromosome 2
+        "NZ_CP044511.1",  # strain LJ178 plasmid p1
+        "NZ_CP044512.1",  # strain LJ178 plasmid p2
+        "NC_025197.1",    # plasmid pGui2
+        "NC_025136.1"     # plasmid pGui1
         ]
 
     fasta_files =  ""
@@ -184,27 +214,37 @@ def main(make_file, working_dir, sample_file):
         cmd = f"efetch -db nuccore -id {acc_id} -format fasta > {output_fasta_file}"
         pg.add(tgt, dep, cmd)
 
-    output_fasta_file = f"{ref_dir}/leptospira_interrogans_canicola.fasta"
-    tgt = f"{output_fasta_file}.OK"
+    #sketch reference panel, each record is a reference
+    sketch_file = f"{ref_dir}/leptospira_interrogans_canicola.sketch.npz"
+    log = f"{log_dir}/leptospira_interrogans_canicola.sketch.log"
+    tgt = f"{log_dir}/leptospira_interrogans_canicola.sketch.OK"
     dep = fasta_files_dep
-    cmd = f"cat {fasta_files} > {output_fasta_file}"
-    pg.add(tgt, dep, cmd)
-
-    #index reference sequence
-    ref_fasta_file = f"{ref_dir}/leptospira_interrogans_canicola.fasta"
-    log = f"{ref_dir}/bwa_index.log"
-    tgt = f"{ref_dir}/bwa_index.OK"
-    dep = f"{ref_fasta_file}.OK"
-    cmd = f"{bwa} index -a bwtsw {ref_fasta_file} 2> {log}"
+    cmd = f"{screen_references} sketch -g record -o {sketch_file} {fasta_files} > {log}"
     pg.add(tgt, dep, cmd)
  
     for id, sample in samples.items():
 
+        #  screen reads against the panel
+        output_prefix = f"{stats_dir}/{sample.id}"
+        ref_fasta_file = f"{align_dir}/{sample.id}.screened.fasta"
+        log = f"{log_dir}/{sample.id}.screen.log"
+        dep = f"{log_dir}/leptospira_interrogans_canicola.sketch.OK"
+        tgt = f"{log_dir}/{sample.id}.screen.OK"
+        cmd = f"{screen_references} screen -x {sketch_file} -n {screen_bases} -t {top} -c 0.05 -o {output_prefix} -f {ref_fasta_file} {sample.fastq1} {sample.fastq2} > {log}"
+        pg.add(tgt, dep, cmd)
+
+        #  index screened references
+        log = f"{log_dir}/{sample.id}.bwa_index.log"
+        dep = f"{log_dir}/{sample.id}.screen.OK"
+        tgt = f"{log_dir}/{sample.id}.bwa_index.OK"
+        cmd = f"{bwa} index {ref_fasta_file} 2> {log}"
+        pg.add(tgt, dep, cmd)
+
         #  align
         output_bam_file = f"{align_dir}/{sample.id}.bam"
         log = f"{log_dir}/{sample.id}.align.log"
         sort_log = f"{log_dir}/{sample.id}.align.sort.log"
-        dep = f"{ref_dir}/bwa_index.OK"
+        dep = f"{log_dir}/{sample.id}.bwa_index.OK"
         tgt = f"{log_dir}/{sample.id}.bam.OK"
         cmd = f"{bwa} mem -t 2 -M {ref_fasta_file} {sample.fastq1} {sample.fastq2} 2> {log} | {samtools} view -hF4 | {samtools} sort -o {output_bam_file} 2> {sort_log}"
         pg.add(tgt, dep, cmd)